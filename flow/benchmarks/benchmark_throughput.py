@@ -0,0 +1,423 @@
+"""Measures the throughput and latency of the flow benchmarks.
+
+Each benchmark environment is created from the flow_params of its module in
+flow/benchmarks, and is run for a number of fixed-seed rollouts with a
+policy that performs no action, or performs random actions. The following
+metrics are measured:
+
+- env_construction_time: time needed to create the scenario and environment
+  (in sec), which includes generating the network and starting the simulation
+- reset_time: mean and max durations of a reset (in sec)
+- env_steps_per_sec: number of environment steps per second of rollout
+- sim_steps_per_sec: number of simulation steps per second of rollout, which
+  differs from the above if the environment advances the simulation by
+  several steps per environment step (sims_per_step)
+- peak_rss: peak resident set size of the process (in MB), and of the
+  simulator processes it started
+- profile: per-phase breakdown of the steps and resets (see
+  flow.core.profiler.Profiler)
+
+Every benchmark is run in a separate process, so that the peak memory usage
+of one benchmark is not shadowed by a previous one. The results are written
+to a json file, and may be compared across commits.
+
+The synthetic scaling mode (--scale) multiplies the number of vehicles of
+every type, the rate of every inflow, and the "scaling" net parameter of the
+benchmarks that have one (the bottlenecks), so that the growth of the cost
+of each kernel with the size of the fleet may be charted. Note that scaled
+vehicles may not fit in the networks of the closed benchmarks (e.g. the
+figure eight), in which case the error is reported in the results.
+
+Usage
+    python benchmark_throughput.py --benchmarks figureeight0 merge0 \
+        --horizon 500 --scale 1 2 4 --output results.json
+"""
+
+import argparse
+from copy import deepcopy
+import json
+import logging
+import multiprocessing
+import platform
+import random
+import resource
+import subprocess
+import time
+import traceback
+
+import numpy as np
+
+import flow.envs
+from flow.core.params import InitialConfig
+from flow.core.params import TrafficLightParams
+from flow.core.params import VehicleParams
+
+# names of all benchmarks, as available in flow/benchmarks
+BENCHMARKS = [
+    "bottleneck0", "bottleneck1", "bottleneck2",
+    "figureeight0", "figureeight1", "figureeight2",
+    "grid0", "grid1",
+    "merge0", "merge1", "merge2",
+]
+
+# policies the rollouts may be performed with
+POLICIES = ["noop", "random"]
+
+
+def scale_flow_params(flow_params, scale):
+    """Return a copy of flow_params in which the fleet is scaled up.
+
+    The number of vehicles of every type and the rate of every inflow are
+    multiplied by the scale, as well as the "scaling" net parameter (the
+    number of lanes of the bottlenecks) if the scenario has one.
+
+    Parameters
+    ----------
+    flow_params : dict
+        flow-related parameters, see flow.utils.registry.make_create_env
+    scale : int
+        factor multiplying the size of the fleet
+
+    Returns
+    -------
+    dict
+        scaled flow-related parameters
+    """
+    flow_params = flow_params.copy()
+
+    vehicles = VehicleParams()
+    for type_params in flow_params['veh'].initial:
+        type_params = type_params.copy()
+        type_params['num_vehicles'] *= scale
+        vehicles.add(**type_params)
+    flow_params['veh'] = vehicles
+
+    net_params = deepcopy(flow_params['net'])
+    for inflow in net_params.inflows.get():
+        if 'vehsPerHour' in inflow:
+            inflow['vehsPerHour'] *= scale
+    if 'scaling' in net_params.additional_params:
+        net_params.additional_params['scaling'] *= scale
+    flow_params['net'] = net_params
+
+    return flow_params
+
+
+def create_env(flow_params, simulator=None):
+    """Create the environment of a benchmark.
+
+    Unlike flow.utils.registry.make_create_env, the environment is not
+    registered in gym, so that several variants of a benchmark may be created
+    in the same process.
+
+    Parameters
+    ----------
+    flow_params : dict
+        flow-related parameters, see flow.utils.registry.make_create_env
+    simulator : str, optional
+        simulator to run the benchmark on. Defaults to the simulator in
+        flow_params.
+
+    Returns
+    -------
+    flow.envs.Env
+        the environment
+    """
+    module = __import__('flow.scenarios', fromlist=[flow_params['scenario']])
+    scenario_class = getattr(module, flow_params['scenario'])
+
+    scenario = scenario_class(
+        name=flow_params['exp_tag'],
+        vehicles=deepcopy(flow_params['veh']),
+        net_params=flow_params['net'],
+        initial_config=flow_params.get('initial', InitialConfig()),
+        traffic_lights=flow_params.get('tls', TrafficLightParams()),
+    )
+
+    if hasattr(flow.envs, flow_params['env_name']):
+        env_loc = 'flow.envs'
+    else:
+        env_loc = 'flow.multiagent_envs'
+    module = __import__(env_loc, fromlist=[flow_params['env_name']])
+    env_class = getattr(module, flow_params['env_name'])
+
+    return env_class(
+        env_params=flow_params['env'],
+        sim_params=flow_params['sim'],
+        scenario=scenario,
+        simulator=simulator or flow_params['simulator'])
+
+
+def _peak_rss():
+    """Return the peak resident set size of the process and its children.
+
+    Returns
+    -------
+    float
+        peak resident set size of the current process (in MB)
+    float
+        peak resident set size of the largest terminated child process (in
+        MB), e.g. sumo
+    """
+    # ru_maxrss is given in bytes on macOS, and in kilobytes elsewhere
+    unit = 1 if platform.system() == 'Darwin' else 1024
+    return tuple(
+        resource.getrusage(who).ru_maxrss * unit / 2 ** 20
+        for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+
+
+def benchmark(benchmark_name,
+              num_rollouts=1,
+              horizon=None,
+              policy='noop',
+              seed=0,
+              scale=1,
+              simulator=None,
+              use_libsumo=False):
+    """Measure the throughput and latency of a benchmark.
+
+    Parameters
+    ----------
+    benchmark_name : str
+        name of the benchmark, e.g. "figureeight0"
+    num_rollouts : int, optional
+        number of rollouts to perform
+    horizon : int, optional
+        number of steps per rollout. Defaults to the horizon of the benchmark.
+    policy : str, optional
+        "noop" to let the rl vehicles and traffic lights be controlled by the
+        simulator, or "random" to perform random actions
+    seed : int, optional
+        seed of the simulator, the policy and the controllers
+    scale : int, optional
+        factor multiplying the size of the fleet, see scale_flow_params
+    simulator : str, optional
+        simulator to run the benchmark on. Defaults to the simulator of the
+        benchmark.
+    use_libsumo : bool, optional
+        specifies whether to run sumo in-process through libsumo
+
+    Returns
+    -------
+    dict
+        the measured metrics, see the documentation of the module
+    """
+    if policy not in POLICIES:
+        raise ValueError('policy must be one of {}, not {}'.format(
+            POLICIES, policy))
+
+    module = __import__('flow.benchmarks.{}'.format(benchmark_name),
+                        fromlist=['flow_params'])
+    flow_params = scale_flow_params(module.flow_params, scale)
+
+    sim_params = deepcopy(flow_params['sim'])
+    sim_params.render = False
+    sim_params.seed = seed
+    if use_libsumo:
+        sim_params.use_libsumo = True
+    flow_params['sim'] = sim_params
+
+    env_params = deepcopy(flow_params['env'])
+    env_params.profile = True
+    if horizon is not None:
+        env_params.horizon = horizon
+    flow_params['env'] = env_params
+
+    random.seed(seed)
+    np.random.seed(seed)
+
+    t0 = time.perf_counter()
+    env = create_env(flow_params, simulator)
+    env_construction_time = time.perf_counter() - t0
+
+    if policy == 'random' and hasattr(env.action_space, 'seed'):
+        env.action_space.seed(seed)
+
+    reset_times = []
+    num_steps = 0
+    rollout_time = 0.
+    try:
+        for _ in range(num_rollouts):
+            t0 = time.perf_counter()
+            env.reset()
+            reset_times.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            for _ in range(env_params.horizon):
+                if policy == 'random':
+                    action = env.action_space.sample()
+                else:
+                    action = None
+                _, _, done, _ = env.step(action)
+                num_steps += 1
+                if done:
+                    break
+            rollout_time += time.perf_counter() - t0
+    finally:
+        env.terminate()
+
+    peak_rss, peak_rss_children = _peak_rss()
+
+    return {
+        'benchmark': benchmark_name,
+        'scale': scale,
+        'policy': policy,
+        'seed': seed,
+        'simulator': simulator or flow_params['simulator'],
+        'use_libsumo': use_libsumo,
+        'num_vehicles': flow_params['veh'].num_vehicles,
+        'num_rollouts': num_rollouts,
+        'num_steps': num_steps,
+        'env_construction_time': env_construction_time,
+        'reset_time': {'mean': float(np.mean(reset_times)),
+                       'max': float(np.max(reset_times))},
+        'env_steps_per_sec': num_steps / rollout_time,
+        'sim_steps_per_sec':
+            num_steps * env_params.sims_per_step / rollout_time,
+        'peak_rss': {'self': peak_rss, 'children': peak_rss_children},
+        'profile': env.profiler.to_dict(),
+    }
+
+
+def _run(kwargs):
+    """Run a benchmark, and return the error instead of raising it."""
+    try:
+        return benchmark(**kwargs)
+    except Exception:
+        return dict(kwargs, error=traceback.format_exc())
+
+
+def _git_revision():
+    """Return the hash of the current commit, or None if not in a repo."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(benchmarks,
+                   scales=(1,),
+                   isolate=True,
+                   output=None,
+                   **kwargs):
+    """Run several benchmarks, at several scales.
+
+    Parameters
+    ----------
+    benchmarks : list of str
+        names of the benchmarks
+    scales : list of int, optional
+        factors multiplying the size of the fleet
+    isolate : bool, optional
+        specifies whether to run every benchmark in a separate process
+    output : str, optional
+        path to the json file the results are written to
+    kwargs : dict
+        additional arguments, see benchmark
+
+    Returns
+    -------
+    dict
+        the revision of the code, the arguments of the benchmarks, and the
+        list of results of every benchmark
+    """
+    results = {
+        'revision': _git_revision(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'params': kwargs,
+        'results': [],
+    }
+
+    for benchmark_name in benchmarks:
+        for scale in scales:
+            run_kwargs = dict(kwargs, benchmark_name=benchmark_name,
+                              scale=scale)
+            if isolate:
+                # a new process is used for every benchmark, so that the
+                # peak memory usage is measured for the benchmark only
+                pool = multiprocessing.Pool(1)
+                try:
+                    result = pool.apply(_run, (run_kwargs,))
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                result = _run(run_kwargs)
+            results['results'].append(result)
+
+            if 'error' in result:
+                logging.error(' %s (scale %d) failed:\n%s', benchmark_name,
+                              scale, result['error'])
+            else:
+                logging.info(
+                    ' %s (scale %d): %.1f env steps/s, %.1f sim steps/s',
+                    benchmark_name, scale, result['env_steps_per_sec'],
+                    result['sim_steps_per_sec'])
+
+            if output is not None:
+                with open(output, 'w') as f:
+                    json.dump(results, f, indent=2)
+
+    return results
+
+
+def create_parser():
+    """Create the parser of the command line arguments."""
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description='Measures the throughput and latency of the flow '
+                    'benchmarks.',
+        epilog='python benchmark_throughput.py --benchmarks grid0 '
+               '--horizon 200 --output results.json')
+    parser.add_argument(
+        '--benchmarks', type=str, nargs='+', default=BENCHMARKS,
+        choices=BENCHMARKS, help='Names of the benchmarks to run.')
+    parser.add_argument(
+        '--num_rollouts', type=int, default=1,
+        help='Number of rollouts per benchmark.')
+    parser.add_argument(
+        '--horizon', type=int, default=None,
+        help='Number of steps per rollout. Defaults to the horizon of every '
+             'benchmark.')
+    parser.add_argument(
+        '--policy', type=str, default='noop', choices=POLICIES,
+        help='Policy the rollouts are performed with.')
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='Seed of the simulator, the policy and the controllers.')
+    parser.add_argument(
+        '--scale', type=int, nargs='+', default=[1],
+        help='Factors multiplying the number of vehicles, the inflows and '
+             'the scaling of the networks.')
+    parser.add_argument(
+        '--simulator', type=str, default=None,
+        help='Simulator to run the benchmarks on. Defaults to the simulator '
+             'of every benchmark.')
+    parser.add_argument(
+        '--libsumo', action='store_true',
+        help='Run sumo in-process through libsumo.')
+    parser.add_argument(
+        '--no_isolate', action='store_true',
+        help='Run all benchmarks in the current process.')
+    parser.add_argument(
+        '--output', type=str, default='benchmark_results.json',
+        help='Path to the json file the results are written to.')
+    return parser
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    args = create_parser().parse_args()
+    run_benchmarks(
+        args.benchmarks,
+        scales=args.scale,
+        isolate=not args.no_isolate,
+        output=args.output,
+        num_rollouts=args.num_rollouts,
+        horizon=args.horizon,
+        policy=args.policy,
+        seed=args.seed,
+        simulator=args.simulator,
+        use_libsumo=args.libsumo)
@@ -10,6 +10,11 @@ PROJECT_PATH = osp.abspath(osp.join(osp.dirname(__file__), '..'))
 
 LOG_DIR = PROJECT_PATH + "/data"
 
+# directory of the cache of networks generated by netconvert, shared by all
+# experiments, e.g. osp.join(osp.expanduser("~"), ".cache", "flow",
+# "networks"). Networks are generated anew every time if set to None.
+NET_CACHE_DIR = None
+
 # users set both of these in their bash_rc or bash_profile
 # and also should run aws configure after installing awscli
 AWS_ACCESS_KEY = os.environ.get("AWS_ACCESS_KEY", None)
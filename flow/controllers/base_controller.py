@@ -10,8 +10,20 @@ class BaseController:
     maximum acceleration to the controller. Provides the method
     safe_action to ensure that controls are never made that could
     cause the system to crash.
+
+    Controllers whose accelerations can be computed for several vehicles at
+    once specify the names of their parameters in ``batch_params`` and
+    implement ``get_batch_accel``. All controllers of the same class and with
+    the same parameters are then evaluated by a single vectorized call (see
+    ``get_batch_actions``). Subclasses that override ``get_accel`` or
+    ``get_action`` must redefine ``batch_params`` and ``get_batch_accel`` to
+    be batched as well.
     """
 
+    # names of the attributes that parametrize the acceleration of the
+    # controller, or None if the controller does not support batching
+    batch_params = None
+
     def __init__(self,
                  veh_id,
                  car_following_params,
@@ -98,6 +110,89 @@ class BaseController:
 
         return accel
 
+    def get_batch_key(self):
+        """Return the key of the group of controllers this one belongs to.
+
+        Controllers with the same key compute their accelerations with the
+        same formula and parameters, and may therefore be evaluated together
+        through ``get_batch_action``.
+
+        Returns
+        -------
+        tuple or None
+            the key of the controller, or None if the controller does not
+            support batching
+        """
+        if self.batch_params is None:
+            return None
+
+        # the vectorized formula only applies to the class that defines it.
+        # Subclasses that override how the acceleration is computed without
+        # redefining batch_params are evaluated one vehicle at a time.
+        cls = type(self)
+        owner = next(c for c in cls.__mro__ if 'batch_params' in vars(c))
+        if any(getattr(cls, method) is not getattr(owner, method)
+               for method in ('get_accel', 'get_batch_accel', 'get_action')):
+            return None
+
+        return (cls, self.max_accel, self.accel_noise, self.fail_safe,
+                self.delay) + \
+            tuple(getattr(self, param) for param in self.batch_params)
+
+    def get_batch_accel(self, env, veh_ids):
+        """Return the accelerations of several vehicles.
+
+        The vehicles are assumed to use controllers with the same key as this
+        controller (see ``get_batch_key``).
+
+        Parameters
+        ----------
+        env: flow.envs.Env
+            state of the environment at the current time step
+        veh_ids: numpy ndarray
+            ids of the vehicles
+
+        Returns
+        -------
+        numpy ndarray
+            the acceleration of every vehicle
+        """
+        raise NotImplementedError
+
+    def get_batch_action(self, env, veh_ids):
+        """Convert the get_batch_accel() accelerations into actions.
+
+        This is the vectorized counterpart of get_action(). Noise is sampled
+        independently for every vehicle, and the failsafes are applied to all
+        vehicles at once.
+
+        Parameters
+        ----------
+        env: flow.envs.Env
+            state of the environment at the current time step
+        veh_ids: numpy ndarray
+            ids of the vehicles
+
+        Returns
+        -------
+        numpy ndarray
+            the modified form of the accelerations
+        """
+        accel = self.get_batch_accel(env, veh_ids)
+
+        # add noise to the accelerations, if requested
+        if self.accel_noise > 0:
+            accel = accel + np.random.normal(0, self.accel_noise, len(accel))
+
+        # run the failsafes, if requested
+        if self.fail_safe == 'instantaneous':
+            accel = self.get_batch_safe_action_instantaneous(
+                env, veh_ids, accel)
+        elif self.fail_safe == 'safe_velocity':
+            accel = self.get_batch_safe_velocity_action(env, veh_ids, accel)
+
+        return accel
+
     def get_safe_action_instantaneous(self, env, action):
         """Perform the "instantaneous" failsafe action.
 
@@ -125,7 +220,7 @@ class BaseController:
         lead_id = env.k.vehicle.get_leader(self.veh_id)
 
         # if there is no other vehicle in the lane, all actions are safe
-        if lead_id is None:
+        if not _has_lead(lead_id):
             return action
 
         this_vel = env.k.vehicle.get_speed(self.veh_id)
@@ -186,6 +281,50 @@ class BaseController:
             else:
                 return action
 
+    def get_batch_safe_action_instantaneous(self, env, veh_ids, action):
+        """Perform the "instantaneous" failsafe action on several vehicles.
+
+        See get_safe_action_instantaneous().
+        """
+        # if there is only one vehicle in the network, all actions are safe
+        if env.k.vehicle.num_vehicles == 1:
+            return action
+
+        has_lead = _batch_has_lead(env.k.vehicle.get_leader(veh_ids))
+        this_vel = _batch_values(env.k.vehicle.get_speed(veh_ids))
+        sim_step = env.sim_step
+        next_vel = this_vel + action * sim_step
+        h = _batch_values(env.k.vehicle.get_headway(veh_ids))
+
+        # stop immediately if the vehicle will crash into the vehicle ahead of
+        # it in the next time step
+        unsafe = has_lead & (next_vel > 0) & (
+            h < sim_step * next_vel + this_vel * 1e-3 +
+            0.5 * this_vel * sim_step)
+
+        return np.where(unsafe, -this_vel / sim_step, action)
+
+    def get_batch_safe_velocity_action(self, env, veh_ids, action):
+        """Perform the "safe_velocity" failsafe action on several vehicles.
+
+        See get_safe_velocity_action().
+        """
+        # if there is only one vehicle in the network, all actions are safe
+        if env.k.vehicle.num_vehicles == 1:
+            return action
+
+        safe_velocity = self.batch_safe_velocity(env, veh_ids)
+
+        this_vel = _batch_values(env.k.vehicle.get_speed(veh_ids))
+        sim_step = env.sim_step
+
+        safe_action = np.where(safe_velocity > 0,
+                               (safe_velocity - this_vel) / sim_step,
+                               -this_vel / sim_step)
+
+        return np.where(this_vel + action * sim_step > safe_velocity,
+                        safe_action, action)
+
     def safe_velocity(self, env):
         """Compute a safe velocity for the vehicles.
 
@@ -215,3 +354,98 @@ class BaseController:
         v_safe = 2 * h / env.sim_step + dv - this_vel * (2 * self.delay)
 
         return v_safe
+
+    def batch_safe_velocity(self, env, veh_ids):
+        """Compute the safe velocities of several vehicles.
+
+        See safe_velocity().
+        """
+        _, lead_vel = _batch_lead_state(env, veh_ids)
+        this_vel = _batch_values(env.k.vehicle.get_speed(veh_ids))
+
+        h = _batch_values(env.k.vehicle.get_headway(veh_ids))
+        dv = lead_vel - this_vel
+
+        return 2 * h / env.sim_step + dv - this_vel * (2 * self.delay)
+
+
+def get_batch_actions(env, veh_ids):
+    """Compute the actions of the acceleration controllers of several vehicles.
+
+    Controllers that support batching are grouped by their key (see
+    BaseController.get_batch_key), and the actions of every group are computed
+    by a single vectorized call. All other controllers are evaluated one
+    vehicle at a time through get_action().
+
+    Parameters
+    ----------
+    env: flow.envs.Env
+        state of the environment at the current time step
+    veh_ids: list of str
+        ids of the vehicles
+
+    Returns
+    -------
+    list of float or None
+        the action of every vehicle, in the order of veh_ids
+    """
+    actions = [None] * len(veh_ids)
+
+    # Key = batch key, Element = (controller, indices of the vehicles)
+    groups = {}
+    for i, veh_id in enumerate(veh_ids):
+        controller = env.k.vehicle.get_acc_controller(veh_id)
+        key = controller.get_batch_key()
+        if key is None:
+            actions[i] = controller.get_action(env)
+        elif key in groups:
+            groups[key][1].append(i)
+        else:
+            groups[key] = (controller, [i])
+
+    for controller, indices in groups.values():
+        group_ids = np.array([veh_ids[i] for i in indices], dtype=object)
+        accel = controller.get_batch_action(env, group_ids)
+        for i, acc in zip(indices, accel.tolist()):
+            actions[i] = acc
+
+    return actions
+
+
+def _batch_ids(values):
+    """Convert vehicle ids returned by the vehicle kernel into an array."""
+    ids = np.empty(len(values), dtype=object)
+    ids[:] = values
+    return ids
+
+
+def _has_lead(lead_id):
+    """Return whether a leader returned by the vehicle kernel is a vehicle.
+
+    Vehicles without a leader are given either None or an empty id.
+    """
+    return lead_id not in (None, "")
+
+
+def _batch_has_lead(lead_ids):
+    """Return whether each leader returned by the vehicle kernel is a vehicle.
+
+    See _has_lead().
+    """
+    return np.array([_has_lead(lead_id) for lead_id in lead_ids], dtype=bool)
+
+
+def _batch_values(values):
+    """Convert values returned by the vehicle kernel into a float array."""
+    return np.asarray(values, dtype=float)
+
+
+def _batch_lead_state(env, veh_ids):
+    """Return whether each vehicle has a leader, and the speed of the leader.
+
+    The speed of vehicles without a leader is set to the error term of the
+    vehicle kernel.
+    """
+    lead_ids = _batch_ids(env.k.vehicle.get_leader(veh_ids))
+    lead_vel = _batch_values(env.k.vehicle.get_speed(lead_ids))
+    return _batch_has_lead(lead_ids), lead_vel
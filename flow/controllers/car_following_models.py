@@ -11,12 +11,15 @@ model to return a vehicle acceleration.
 import math
 import numpy as np
 
-from flow.controllers.base_controller import BaseController
+from flow.controllers.base_controller import BaseController, \
+    _batch_ids, _batch_values, _batch_lead_state
 
 
 class CFMController(BaseController):
     """CFM controller."""
 
+    batch_params = ('k_d', 'k_v', 'k_c', 'd_des', 'v_des')
+
     def __init__(self,
                  veh_id,
                  car_following_params,
@@ -83,6 +86,18 @@ class CFMController(BaseController):
         return self.k_d*(d_l - self.d_des) + self.k_v*(lead_vel - this_vel) + \
             self.k_c*(self.v_des - this_vel)
 
+    def get_batch_accel(self, env, veh_ids):
+        """See parent class."""
+        has_lead, lead_vel = _batch_lead_state(env, veh_ids)
+        this_vel = _batch_values(env.k.vehicle.get_speed(veh_ids))
+
+        d_l = _batch_values(env.k.vehicle.get_headway(veh_ids))
+
+        accel = self.k_d*(d_l - self.d_des) + \
+            self.k_v*(lead_vel - this_vel) + self.k_c*(self.v_des - this_vel)
+
+        return np.where(has_lead, accel, self.max_accel)
+
 
 class BCMController(BaseController):
     """Bilateral car-following model controller.
@@ -90,6 +105,8 @@ class BCMController(BaseController):
     This model looks ahead and behind when computing its acceleration.
     """
 
+    batch_params = ('k_d', 'k_v', 'k_c', 'd_des', 'v_des')
+
     def __init__(self,
                  veh_id,
                  car_following_params,
@@ -168,10 +185,29 @@ class BCMController(BaseController):
             self.k_v * ((lead_vel - this_vel) - (this_vel - trail_vel)) + \
             self.k_c * (self.v_des - this_vel)
 
+    def get_batch_accel(self, env, veh_ids):
+        """See parent class."""
+        has_lead, lead_vel = _batch_lead_state(env, veh_ids)
+        this_vel = _batch_values(env.k.vehicle.get_speed(veh_ids))
+
+        trail_ids = _batch_ids(env.k.vehicle.get_follower(veh_ids))
+        trail_vel = _batch_values(env.k.vehicle.get_speed(trail_ids))
+
+        headway = _batch_values(env.k.vehicle.get_headway(veh_ids))
+        footway = _batch_values(env.k.vehicle.get_headway(trail_ids))
+
+        accel = self.k_d * (headway - footway) + \
+            self.k_v * ((lead_vel - this_vel) - (this_vel - trail_vel)) + \
+            self.k_c * (self.v_des - this_vel)
+
+        return np.where(has_lead, accel, self.max_accel)
+
 
 class OVMController(BaseController):
     """Optimal Vehicle Model controller."""
 
+    batch_params = ('alpha', 'beta', 'h_st', 'h_go', 'v_max')
+
     def __init__(self,
                  veh_id,
                  car_following_params,
@@ -247,10 +283,31 @@ class OVMController(BaseController):
 
         return self.alpha * (v_h - this_vel) + self.beta * h_dot
 
+    def get_batch_accel(self, env, veh_ids):
+        """See parent class."""
+        has_lead, lead_vel = _batch_lead_state(env, veh_ids)
+        this_vel = _batch_values(env.k.vehicle.get_speed(veh_ids))
+        h = _batch_values(env.k.vehicle.get_headway(veh_ids))
+        h_dot = lead_vel - this_vel
+
+        # V function here - input: h, output : Vh
+        v_h = np.where(
+            h <= self.h_st, 0,
+            np.where(h < self.h_go,
+                     self.v_max / 2 * (1 - np.cos(
+                         np.pi * (h - self.h_st) / (self.h_go - self.h_st))),
+                     self.v_max))
+
+        accel = self.alpha * (v_h - this_vel) + self.beta * h_dot
+
+        return np.where(has_lead, accel, self.max_accel)
+
 
 class LinearOVM(BaseController):
     """Linear OVM controller."""
 
+    batch_params = ('v_max', 'adaptation', 'h_st')
+
     def __init__(self,
                  veh_id,
                  car_following_params,
@@ -312,6 +369,20 @@ class LinearOVM(BaseController):
 
         return (v_h - this_vel) / self.adaptation
 
+    def get_batch_accel(self, env, veh_ids):
+        """See parent class."""
+        this_vel = _batch_values(env.k.vehicle.get_speed(veh_ids))
+        h = _batch_values(env.k.vehicle.get_headway(veh_ids))
+
+        # V function here - input: h, output : Vh
+        alpha = 1.689  # the average value from Nakayama paper
+        v_h = np.where(
+            h < self.h_st, 0,
+            np.where(h <= self.h_st + self.v_max / alpha,
+                     alpha * (h - self.h_st), self.v_max))
+
+        return (v_h - this_vel) / self.adaptation
+
 
 class IDMController(BaseController):
     """Intelligent Driver Model (IDM) controller.
@@ -322,6 +393,8 @@ class IDMController(BaseController):
     review E 62.2 (2000): 1805.
     """
 
+    batch_params = ('v0', 'T', 'a', 'b', 'delta', 's0')
+
     def __init__(self,
                  veh_id,
                  v0=30,
@@ -399,6 +472,24 @@ class IDMController(BaseController):
 
         return self.a * (1 - (v / self.v0)**self.delta - (s_star / h)**2)
 
+    def get_batch_accel(self, env, veh_ids):
+        """See parent class."""
+        v = _batch_values(env.k.vehicle.get_speed(veh_ids))
+        has_lead, lead_vel = _batch_lead_state(env, veh_ids)
+        h = _batch_values(env.k.vehicle.get_headway(veh_ids))
+
+        # see get_accel for a description of negative headways
+        h = np.where(np.abs(h) < 1e-3, 1e-3, h)
+
+        s_star = np.where(
+            has_lead,
+            self.s0 + np.maximum(
+                0, v * self.T + v * (v - lead_vel) /
+                (2 * np.sqrt(self.a * self.b))),
+            0)
+
+        return self.a * (1 - (v / self.v0)**self.delta - (s_star / h)**2)
+
 
 class SimCarFollowingController(BaseController):
     """Controller whose actions are purely defined by the simulator.
@@ -6,6 +6,7 @@ import numpy as np
 import time
 import os
 
+from flow.core.kernel.recorder import trajectories_to_csv
 from flow.core.util import emission_to_csv
 
 
@@ -79,7 +80,9 @@ class Experiment:
                 there are any)
             convert_to_csv: bool
                 Specifies whether to convert the emission file created by sumo
-                into a csv file
+                into a csv file. If trajectories are recorded by flow (see the
+                record_trajectories attribute of SimParams), the recorded
+                trajectories are converted instead.
 
         Returns
         -------
@@ -131,7 +134,12 @@ class Experiment:
             np.mean(mean_vels), np.std(std_vels)))
         self.env.terminate()
 
-        if convert_to_csv:
+        if convert_to_csv and self.env.k.recorder is not None:
+            # sumo does not write an emission file when trajectories are
+            # recorded by flow, and the recorder is flushed on termination
+            trajectories_to_csv(self.env.k.recorder.path)
+
+        elif convert_to_csv:
             # wait a short period of time to ensure the xml file is readable
             time.sleep(0.1)
 
@@ -0,0 +1,128 @@
+"""Script containing the step-scoped cache of derived kernel quantities."""
+
+import collections
+
+
+class StepCache(object):
+    """Memoizes quantities derived from the state of the kernel.
+
+    Derived quantities (e.g. the vehicles sorted by position, or the distance
+    of a vehicle to the next intersection) are registered under a name with
+    the function that computes them. The value of a quantity is computed the
+    first time it is requested with a given set of arguments, and is returned
+    from the cache until the cache is cleared. The cache of the Flow kernel is
+    cleared every time the kernel is updated (i.e. after every simulation
+    step) or restored to a snapshot, so values are never reused across time
+    steps.
+
+    The number of hits and misses of every quantity are counted, in order to
+    identify the quantities that are computed several times per step, and the
+    ones that are computed every time they are requested.
+
+    Usage:
+
+        >>> cache = env.k.cache
+        >>> cache.register("sorted_ids", env.sort_ids)
+        >>> sorted_ids = cache.get("sorted_ids")  # computed
+        >>> sorted_ids = cache.get("sorted_ids")  # reused
+        >>> cache.stats()
+        {'sorted_ids': {'hits': 1, 'misses': 1}}
+    """
+
+    def __init__(self):
+        """Instantiate an empty cache."""
+        # Key = name of the quantity, Element = function computing it
+        self._functions = dict()
+        # Key = (name, arguments...), Element = cached value
+        self._values = dict()
+        # number of values returned from the cache, and computed, by name
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+
+    def __contains__(self, name):
+        """Return whether a quantity with the given name is registered."""
+        return name in self._functions
+
+    def register(self, name, function):
+        """Register a derived quantity.
+
+        Registering a quantity under an existing name replaces its function
+        and removes its cached values.
+
+        Parameters
+        ----------
+        name : str
+            name of the quantity
+        function : function
+            function computing the quantity. The function is called with the
+            arguments passed to ``get``, which must be hashable.
+        """
+        self._functions[name] = function
+        self.invalidate(name)
+
+    def get(self, name, *args):
+        """Return the value of a derived quantity for the current step.
+
+        Parameters
+        ----------
+        name : str
+            name of the quantity
+        args : tuple
+            (hashable) arguments of the function of the quantity, e.g. the id
+            of a vehicle
+
+        Returns
+        -------
+        any
+            the value of the quantity
+
+        Raises
+        ------
+        KeyError
+            if no quantity with this name was registered
+        """
+        key = (name,) + args
+        try:
+            value = self._values[key]
+        except KeyError:
+            try:
+                function = self._functions[name]
+            except KeyError:
+                raise KeyError('No derived quantity named "{}".'.format(name))
+            value = self._values[key] = function(*args)
+            self.misses[name] += 1
+            return value
+
+        self.hits[name] += 1
+        return value
+
+    def invalidate(self, name):
+        """Remove the cached values of a quantity.
+
+        This should be called if the state a quantity depends on is modified
+        between two updates of the kernel (e.g. by the environment).
+        """
+        for key in [key for key in self._values if key[0] == name]:
+            del self._values[key]
+
+    def clear(self):
+        """Remove all cached values, e.g. after a simulation step."""
+        self._values.clear()
+
+    def stats(self):
+        """Return the number of hits and misses of every quantity.
+
+        Returns
+        -------
+        dict < str, dict >
+            number of values returned from the cache ("hits") and computed
+            ("misses") since the last call to ``reset_stats``, by name
+        """
+        names = sorted(set(self.hits) | set(self.misses))
+        return {name: {'hits': self.hits[name], 'misses': self.misses[name]}
+                for name in names}
+
+    def reset_stats(self):
+        """Reset the number of hits and misses of all quantities."""
+        self.hits.clear()
+        self.misses.clear()
@@ -1,10 +1,17 @@
 """Script containing the Flow kernel object for interacting with simulators."""
 
-from flow.core.kernel.simulation import TraCISimulation, AimsunKernelSimulation
-from flow.core.kernel.scenario import TraCIScenario, AimsunKernelScenario
-from flow.core.kernel.vehicle import TraCIVehicle, AimsunKernelVehicle
+from flow.core.kernel.simulation import TraCISimulation, \
+    AimsunKernelSimulation, NumpySimulation
+from flow.core.kernel.scenario import TraCIScenario, AimsunKernelScenario, \
+    NumpyScenario
+from flow.core.kernel.vehicle import TraCIVehicle, AimsunKernelVehicle, \
+    NumpyVehicle
 from flow.core.kernel.traffic_light import TraCITrafficLight, \
-    AimsunKernelTrafficLight
+    AimsunKernelTrafficLight, NumpyTrafficLight
+from flow.core.kernel.recorder import TrajectoryRecorder
+from flow.core.kernel.cache import StepCache
+from flow.core.util import ensure_dir
+import os
 
 
 class Kernel(object):
@@ -41,6 +48,15 @@ class Kernel(object):
 
     These subclasses can be modified and recycled to support various different
     traffic simulators, e.g. SUMO, AIMSUN, TruckSim, etc...
+
+    Finally, quantities derived from the state of the kernel can be memoized
+    within a simulation step in the step-scoped cache of the kernel (see
+    flow/core/kernel/cache.py), which is cleared whenever the kernel is
+    updated:
+
+    >>> k.cache.register("num_stopped", lambda: sum(
+    ...     speed == 0 for speed in k.vehicle.get_speed(k.vehicle.get_ids())))
+    >>> num_stopped = k.cache.get("num_stopped")
     """
 
     def __init__(self, simulator, sim_params):
@@ -49,7 +65,7 @@ class Kernel(object):
         Parameters
         ----------
         simulator : str
-            simulator type, must be one of {"traci"}
+            simulator type, must be one of {"traci", "aimsun", "numpy"}
         sim_params : flow.core.params.SimParams
             simulation-specific parameters
 
@@ -59,6 +75,14 @@ class Kernel(object):
             if the specified input simulator is not a valid type
         """
         self.kernel_api = None
+        self.sim_params = sim_params
+
+        # records the trajectories of vehicles (if requested), see
+        # flow.core.kernel.recorder
+        self.recorder = None
+
+        # memoizes derived quantities until the next update of the kernel
+        self.cache = StepCache()
 
         if simulator == "traci":
             self.simulation = TraCISimulation(self)
@@ -70,6 +94,11 @@ class Kernel(object):
             self.scenario = AimsunKernelScenario(self, sim_params)
             self.vehicle = AimsunKernelVehicle(self, sim_params)
             self.traffic_light = AimsunKernelTrafficLight(self)
+        elif simulator == 'numpy':
+            self.simulation = NumpySimulation(self)
+            self.scenario = NumpyScenario(self, sim_params)
+            self.vehicle = NumpyVehicle(self, sim_params)
+            self.traffic_light = NumpyTrafficLight(self)
         else:
             raise ValueError('Simulator type "{}" is not valid.'.
                              format(simulator))
@@ -82,6 +111,18 @@ class Kernel(object):
         self.vehicle.pass_api(kernel_api)
         self.traffic_light.pass_api(kernel_api)
 
+        # the recorder is created once the name of the scenario is known, and
+        # is kept if the simulation is restarted
+        if self.recorder is None \
+                and getattr(self.sim_params, "record_trajectories", False) \
+                and self.sim_params.emission_path is not None:
+            ensure_dir(self.sim_params.emission_path)
+            self.recorder = TrajectoryRecorder(
+                os.path.join(self.sim_params.emission_path,
+                             "{0}-trajectories.bin".format(
+                                 self.scenario.network.name)),
+                sim_step=self.sim_params.sim_step)
+
     def update(self, reset):
         """Update the kernel subclasses after a simulation step.
 
@@ -96,12 +137,65 @@ class Kernel(object):
             specifies whether the simulator was reset in the last simulation
             step
         """
+        self.cache.clear()
         self.vehicle.update(reset)
         self.traffic_light.update(reset)
         self.scenario.update(reset)
         self.simulation.update(reset)
 
+        if self.recorder is not None:
+            self.recorder.record(self.vehicle, reset)
+
+    def save_state(self):
+        """Capture the current state of the simulation.
+
+        The returned snapshot contains the state of the simulator, as well as
+        the state of the vehicle and traffic light kernels, so that the
+        simulation can be brought back to the current time step by
+        ``load_state``.
+
+        Returns
+        -------
+        dict
+            the snapshot of the simulation
+        """
+        return {
+            'simulation': self.simulation.save_state(),
+            'vehicle': self.vehicle.save_state(),
+            'traffic_light': self.traffic_light.save_state(),
+        }
+
+    def load_state(self, state):
+        """Restore the simulation to a snapshot taken by ``save_state``.
+
+        A snapshot may be restored any number of times, e.g. to start every
+        rollout from the same initial state, or to branch several rollouts
+        from the same intermediate state.
+
+        Parameters
+        ----------
+        state : dict
+            the snapshot of the simulation
+        """
+        self.cache.clear()
+
+        # the simulator is restored first, as the other kernels may need to
+        # re-attach themselves to the restored simulator
+        self.simulation.load_state(state['simulation'])
+        self.vehicle.load_state(state['vehicle'])
+        self.traffic_light.load_state(state['traffic_light'])
+
+        # the restored state starts a new rollout in the recorded trajectories
+        if self.recorder is not None:
+            self.recorder.record(self.vehicle, reset=True)
+
     def close(self):
         """Terminate all components within the simulation and scenario."""
-        self.scenario.close()
+        # the simulation is closed first, so that simulation instances that
+        # are being started do not lose their configuration files
         self.simulation.close()
+        self.scenario.close()
+
+        # write all recorded trajectories to the output file
+        if self.recorder is not None:
+            self.recorder.flush()
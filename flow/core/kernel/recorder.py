@@ -0,0 +1,314 @@
+"""Script containing the trajectory recorder of the Flow kernel."""
+
+from flow.core.kernel.vehicle.columnar import ColumnarVehicleState
+import csv
+import numpy as np
+import os
+import queue
+import threading
+
+# columns of the recorded trajectories, and their data types. The "id" and
+# "edge_id" columns contain indices in the tables of vehicle and edge names.
+TRAJECTORY_COLUMNS = [
+    ('rollout', np.int32),
+    ('time', np.float64),
+    ('id', np.int32),
+    ('edge_id', np.int32),
+    ('lane_number', np.int32),
+    ('relative_position', np.float64),
+    ('speed', np.float64),
+    ('x', np.float64),
+    ('y', np.float64),
+    ('angle', np.float64),
+]
+
+# default number of rows of every buffer of the recorder
+BUFFER_SIZE = 65536
+
+
+class TrajectoryRecorder(object):
+    """Records the trajectories of all vehicles into a binary columnar file.
+
+    At every simulation step, the state of all vehicles that is already
+    available in the vehicle kernel (positions, speeds, edges, lanes, and
+    orientations) is copied into preallocated buffers. Full buffers are
+    written to the output file by a background thread while the simulation
+    continues in the next buffer, so that recording does not involve any
+    serialization by the simulator, nor any parsing of its output.
+
+    The output file is a sequence of blocks, each consisting of arrays saved
+    with ``numpy.save``: the vehicle names and edge names that first appear in
+    the block, followed by one array per column of TRAJECTORY_COLUMNS. The
+    file can be read with ``load_trajectories``.
+
+    Usage:
+
+        >>> recorder = TrajectoryRecorder("./data/ring-trajectories.bin", 0.1)
+        >>> recorder.record(env.k.vehicle, reset=True)
+        >>> recorder.record(env.k.vehicle, reset=False)
+        >>> recorder.flush()
+        >>> data = load_trajectories("./data/ring-trajectories.bin")
+    """
+
+    def __init__(self, path, sim_step, buffer_size=BUFFER_SIZE,
+                 num_buffers=2):
+        """Instantiate the recorder.
+
+        Any existing file at the output path is replaced.
+
+        Parameters
+        ----------
+        path : str
+            path to the output file
+        sim_step : float
+            seconds per simulation step
+        buffer_size : int, optional
+            number of rows of every buffer
+        num_buffers : int, optional
+            number of buffers. While one buffer is being filled, the others
+            may be waiting to be written to the file.
+        """
+        self.path = path
+        self.sim_step = sim_step
+        self.buffer_size = buffer_size
+
+        # index of the current rollout and time since the start of the rollout
+        self.rollout = -1
+        self.time = 0
+
+        # Key = vehicle/edge name, Element = index of the name in the file
+        self._id_index = dict()
+        self._edge_index = dict()
+        # names that have not yet been written to the file
+        self._new_ids = []
+        self._new_edges = []
+
+        # buffer being filled, and the number of rows it contains
+        self._buffer = self._allocate()
+        self._num_rows = 0
+
+        # buffers that can be filled, and filled buffers to be written
+        self._free = queue.Queue()
+        for _ in range(num_buffers - 1):
+            self._free.put(self._allocate())
+        self._full = queue.Queue()
+
+        # first exception raised by the background thread, if any
+        self._error = None
+
+        # create an empty output file
+        with open(self.path, 'wb'):
+            pass
+
+        self._thread = threading.Thread(target=self._write_blocks)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def record(self, vehicle, reset):
+        """Record the state of all vehicles at the current time step.
+
+        Parameters
+        ----------
+        vehicle : flow.core.kernel.vehicle.KernelVehicle
+            the vehicle kernel, updated with the data of the current time step
+        reset : bool
+            specifies whether the simulator was reset in the last simulation
+            step, in which case a new rollout is started
+        """
+        if reset:
+            self.rollout += 1
+            self.time = 0
+        else:
+            self.time += self.sim_step
+
+        veh_ids, edges, columns = self._collect(vehicle)
+
+        num_vehicles = len(veh_ids)
+        if num_vehicles == 0:
+            return
+
+        columns['rollout'] = self.rollout
+        columns['time'] = self.time
+        columns['id'] = self._encode(veh_ids, self._id_index, self._new_ids)
+        # edges are encoded once per distinct edge
+        edge_names, inverse = np.unique(
+            np.asarray(edges, dtype=str), return_inverse=True)
+        columns['edge_id'] = self._encode(
+            edge_names, self._edge_index, self._new_edges)[inverse]
+
+        # copy the columns into the buffers, switching buffers when full
+        start = 0
+        while start < num_vehicles:
+            count = min(num_vehicles - start,
+                        self.buffer_size - self._num_rows)
+            end = self._num_rows + count
+            for name, _ in TRAJECTORY_COLUMNS:
+                value = columns[name]
+                if not np.isscalar(value):
+                    value = value[start:start + count]
+                self._buffer[name][self._num_rows:end] = value
+            self._num_rows = end
+            start += count
+
+            if self._num_rows == self.buffer_size:
+                self._submit()
+
+    def flush(self):
+        """Write all recorded data to the output file.
+
+        This method blocks until all buffers have been written.
+
+        Raises
+        ------
+        Exception
+            the first exception raised while writing, if any
+        """
+        if self._num_rows > 0 or len(self._new_ids) or len(self._new_edges):
+            self._submit()
+        self._full.join()
+        if self._error is not None:
+            raise self._error
+
+    def _collect(self, vehicle):
+        """Collect the names, edges, and state of all vehicles.
+
+        The state is copied directly from the columnar vehicle state of the
+        vehicle kernel if available, and is otherwise collected through the
+        getters of the vehicle kernel.
+        """
+        state = getattr(vehicle, '_state', None)
+        if isinstance(state, ColumnarVehicleState):
+            rows = state.active_rows()
+            return state.ids[rows], state.edge_names[state.edge[rows]], {
+                'lane_number': state.lane[rows],
+                'relative_position': state.position[rows],
+                'speed': state.speed[rows],
+                'x': state.x[rows],
+                'y': state.y[rows],
+                'angle': state.angle[rows],
+            }
+
+        veh_ids = list(vehicle.get_ids())
+        orientations = np.array(
+            [vehicle.get_orientation(veh_id) for veh_id in veh_ids],
+            dtype=float).reshape(-1, 3)
+        return veh_ids, vehicle.get_edge(veh_ids), {
+            'lane_number': np.asarray(vehicle.get_lane(veh_ids)),
+            'relative_position': np.asarray(vehicle.get_position(veh_ids)),
+            'speed': np.asarray(vehicle.get_speed(veh_ids)),
+            'x': orientations[:, 0],
+            'y': orientations[:, 1],
+            'angle': orientations[:, 2],
+        }
+
+    @staticmethod
+    def _encode(names, index, new_names):
+        """Return the indices of names, registering new names if needed."""
+        def encode(name):
+            try:
+                return index[name]
+            except KeyError:
+                index[name] = len(index)
+                new_names.append(name)
+                return index[name]
+
+        return np.fromiter((encode(name) for name in names), dtype=np.int32,
+                           count=len(names))
+
+    def _allocate(self):
+        """Allocate an empty buffer."""
+        return {name: np.empty(self.buffer_size, dtype=dtype)
+                for name, dtype in TRAJECTORY_COLUMNS}
+
+    def _submit(self):
+        """Pass the current buffer to the writer, and take a free buffer."""
+        if self._error is not None:
+            raise self._error
+        self._full.put((self._buffer, self._num_rows,
+                        self._new_ids, self._new_edges))
+        self._new_ids = []
+        self._new_edges = []
+        self._buffer = self._free.get()
+        self._num_rows = 0
+
+    def _write_blocks(self):
+        """Write filled buffers to the output file, in a separate thread."""
+        while True:
+            buffer, num_rows, new_ids, new_edges = self._full.get()
+            try:
+                # the blocks following a failed one would not be readable
+                if self._error is not None:
+                    continue
+                with open(self.path, 'ab') as f:
+                    np.save(f, np.array(new_ids, dtype=str))
+                    np.save(f, np.array(new_edges, dtype=str))
+                    for name, _ in TRAJECTORY_COLUMNS:
+                        np.save(f, buffer[name][:num_rows])
+            except Exception as e:
+                self._error = e
+            finally:
+                self._free.put(buffer)
+                self._full.task_done()
+
+
+def load_trajectories(path):
+    """Load the trajectories written by a TrajectoryRecorder.
+
+    Parameters
+    ----------
+    path : str
+        path to the file written by the recorder
+
+    Returns
+    -------
+    dict of numpy.ndarray
+        the columns of TRAJECTORY_COLUMNS, with the "id" and "edge_id"
+        columns containing the names of the vehicles and edges
+    """
+    ids, edges = [], []
+    columns = {name: [] for name, _ in TRAJECTORY_COLUMNS}
+
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        while f.tell() < size:
+            ids.extend(np.load(f))
+            edges.extend(np.load(f))
+            for name, _ in TRAJECTORY_COLUMNS:
+                columns[name].append(np.load(f))
+
+    data = {name: np.concatenate(columns[name]) if len(columns[name]) > 0
+            else np.array([], dtype=dtype)
+            for name, dtype in TRAJECTORY_COLUMNS}
+    data['id'] = np.array(ids, dtype=str)[data['id']]
+    data['edge_id'] = np.array(edges, dtype=str)[data['edge_id']]
+
+    return data
+
+
+def trajectories_to_csv(path, output_path=None):
+    """Convert the trajectories written by a TrajectoryRecorder into csv.
+
+    The rows of the csv file are sorted by vehicle id, and chronologically
+    for every vehicle, as in the csv files generated by
+    ``flow.core.util.emission_to_csv``.
+
+    Parameters
+    ----------
+    path : str
+        path to the file written by the recorder
+    output_path : str, optional
+        path to the csv file that will be generated, default is the same
+        directory as the recorder file, with the same name
+    """
+    if output_path is None:
+        output_path = os.path.splitext(path)[0] + '.csv'
+
+    data = load_trajectories(path)
+    order = np.lexsort((data['time'], data['rollout'], data['id']))
+    names = [name for name, _ in TRAJECTORY_COLUMNS]
+
+    with open(output_path, 'w') as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(names)
+        writer.writerows(zip(*[data[name][order].tolist()
+                               for name in names]))
@@ -1,5 +1,7 @@
 from flow.core.kernel.scenario.base import KernelScenario
 from flow.core.kernel.scenario.traci import TraCIScenario
 from flow.core.kernel.scenario.aimsun import AimsunKernelScenario
+from flow.core.kernel.scenario.numpy_sim import NumpyScenario
 
-__all__ = ["KernelScenario", "TraCIScenario", "AimsunKernelScenario"]
+__all__ = ["KernelScenario", "TraCIScenario", "AimsunKernelScenario",
+           "NumpyScenario"]
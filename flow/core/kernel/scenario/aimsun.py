@@ -161,6 +161,7 @@ class AimsunKernelScenario(KernelScenario):
         self.total_edgestarts.sort(key=lambda tup: tup[1])
 
         self.total_edgestarts_dict = dict(self.total_edgestarts)
+        self._build_position_index()
 
         # specify routes vehicles can take  # TODO: move into a method
         self.rts = self.network.routes
@@ -216,8 +217,7 @@ class AimsunKernelScenario(KernelScenario):
 
     def max_speed(self):
         """See parent class."""
-        return max(
-            self.speed_limit(edge) for edge in self.get_edge_list())
+        return self.__max_speed
 
     def num_lanes(self, edge_id):
         """See parent class."""
@@ -238,12 +238,6 @@ class AimsunKernelScenario(KernelScenario):
         return list(
             set(self._edges.keys()) - set(self._edge_list))
 
-    def get_edge(self, x):  # TODO: maybe remove
-        """See parent class."""
-        for (edge, start_pos) in reversed(self.total_edgestarts):
-            if x >= start_pos:
-                return edge, x - start_pos
-
     def get_x(self, edge, position):  # TODO: maybe remove
         """See parent class."""
         # if there was a collision which caused the vehicle to disappear,
@@ -1,5 +1,6 @@
 """Script containing the base scenario kernel class."""
 
+import bisect
 import logging
 import random
 import numpy as np
@@ -71,6 +72,19 @@ class KernelScenario(object):
         self.total_edgestarts = None
         self.total_edgestarts_dict = None
 
+        # index of the absolute positions of the edges, filled in from
+        # total_edgestarts by the _build_position_index method. The start
+        # positions are sorted, and stored both as a list (for bisections on
+        # single positions) and as an array (for vectorized searches).
+        self._start_pos = []
+        self._start_pos_array = np.zeros(0)
+        self._start_edges = np.zeros(0, dtype=object)
+        # Key = edge name, Element = index of the edge in the sorted starts
+        self._start_index = dict()
+        # Key = edge name, Element = (offset, scale), such that the absolute
+        # position of a relative position on the edge is offset + scale * pos
+        self._x_offsets = dict()
+
     def generate_network(self, network):
         """Generate the necessary prerequisites for the simulating a network.
 
@@ -152,9 +166,11 @@ class KernelScenario(object):
         """Return the names of all junctions in the network."""
         raise NotImplementedError
 
-    def get_edge(self, x):  # TODO: maybe remove
+    def get_edge(self, x):
         """Compute an edge and relative position from an absolute position.
 
+        The edge is found by bisecting the sorted start positions of the edges.
+
         Parameters
         ----------
         x : float
@@ -166,7 +182,40 @@ class KernelScenario(object):
             1st element: edge name (such as bottom, right, etc.)
             2nd element: relative position on edge
         """
-        raise NotImplementedError
+        index = bisect.bisect_right(self._start_pos, x) - 1
+        if index >= 0:
+            return self._start_edges[index], x - self._start_pos[index]
+
+    def get_edge_batch(self, xs):
+        """Compute the edges and relative positions of absolute positions.
+
+        This is the vectorized version of get_edge.
+
+        Parameters
+        ----------
+        xs : array_like
+            absolute positions in network
+
+        Returns
+        -------
+        numpy.ndarray of str
+            names of the edges. Positions located before the start of the
+            first edge are attributed an empty edge name.
+        numpy.ndarray of float
+            relative positions on the edges, or -1001 for positions located
+            before the start of the first edge
+        """
+        xs = np.asarray(xs, dtype=float)
+        index = np.searchsorted(self._start_pos_array, xs, side='right') - 1
+        invalid = index < 0
+        index[invalid] = 0
+
+        edges = self._start_edges[index]
+        positions = xs - self._start_pos_array[index]
+        edges[invalid] = ''
+        positions[invalid] = -1001
+
+        return edges, positions
 
     def get_x(self, edge, position):  # TODO: maybe remove
         """Return the absolute position on the track.
@@ -185,6 +234,84 @@ class KernelScenario(object):
         """
         raise NotImplementedError
 
+    def get_x_offsets(self, edges):
+        """Return the coefficients mapping relative positions to get_x.
+
+        The absolute position of a relative position ``pos`` on the i-th edge
+        is ``offsets[i] + scales[i] * pos``. The coefficients of every edge
+        are computed once from get_x, and are cached afterwards.
+
+        Parameters
+        ----------
+        edges : list of str or numpy.ndarray
+            names of the edges
+
+        Returns
+        -------
+        numpy.ndarray of float
+            offsets of the edges, or NaN for the edges get_x cannot locate
+        numpy.ndarray of float
+            scales of the edges, 1 for most edges, and 0 for edges whose
+            absolute position does not depend on the relative position (e.g.
+            generalized internal links)
+        """
+        cache = self._x_offsets
+        coefficients = np.empty((len(edges), 2))
+        for i, edge in enumerate(edges):
+            try:
+                coefficients[i] = cache[edge]
+            except KeyError:
+                try:
+                    offset = self.get_x(edge, 0)
+                    scale = 0. if self.get_x(edge, 1) == offset else 1.
+                except KeyError:
+                    offset, scale = np.nan, 0.
+                coefficients[i] = cache[edge] = (offset, scale)
+        return coefficients[:, 0], coefficients[:, 1]
+
+    def get_x_batch(self, edges, positions):
+        """Return the absolute positions of relative positions on edges.
+
+        This is the vectorized version of get_x.
+
+        Parameters
+        ----------
+        edges : list of str or numpy.ndarray
+            names of the edges
+        positions : array_like
+            relative positions on the edges
+
+        Returns
+        -------
+        numpy.ndarray of float
+            positions with respect to some global reference
+
+        Raises
+        ------
+        KeyError
+            if an edge cannot be located, as with get_x
+        """
+        offsets, scales = self.get_x_offsets(edges)
+        missing = np.isnan(offsets)
+        if missing.any():
+            raise KeyError(edges[np.flatnonzero(missing)[0]])
+        return offsets + scales * np.asarray(positions, dtype=float)
+
+    def _build_position_index(self):
+        """Index the start positions of the edges in total_edgestarts.
+
+        This must be called by the generate_network method of subclasses once
+        total_edgestarts is computed.
+        """
+        self._start_pos = [start for _, start in self.total_edgestarts]
+        self._start_pos_array = np.array(self._start_pos, dtype=float)
+        self._start_edges = np.empty(len(self._start_pos), dtype=object)
+        self._start_edges[:] = [edge for edge, _ in self.total_edgestarts]
+        self._start_index = dict()
+        for i, (edge, _) in reversed(list(enumerate(self.total_edgestarts))):
+            self._start_index[edge] = i
+        self._x_offsets = dict()
+
     def next_edge(self, edge, lane):
         """Return the next edge/lane pair from the given edge/lane.
 
@@ -293,12 +420,11 @@ class KernelScenario(object):
             pos = self.get_edge(x)
 
             # ensures that vehicles are not placed in an internal junction
-            while pos[0] in dict(self.internal_edgestarts).keys():
+            while pos[0] in self.internal_edgestarts_dict:
                 # find the location of the internal edge in total_edgestarts,
                 # which has the edges ordered by position
-                edges = [tup[0] for tup in self.total_edgestarts]
-                indx_edge = next(
-                    i for i, edge in enumerate(edges) if edge == pos[0])
+                indx_edge = self._start_index[pos[0]]
+                edges = self._start_edges
 
                 # take the next edge in the list, and place the car at the
                 # beginning of this edge
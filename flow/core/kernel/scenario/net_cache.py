@@ -0,0 +1,170 @@
+"""Script containing a persistent cache of networks generated by netconvert."""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import tempfile
+
+from flow.core.util import ensure_dir
+
+# version of the format of the cached entries. This should be incremented
+# whenever the generated files or the parsed network data change, so that
+# stale entries are not reused.
+CACHE_VERSION = 1
+
+# output of "netconvert --version", computed on first use
+_netconvert_version = None
+
+
+def netconvert_version():
+    """Return the version of the netconvert binary.
+
+    The version is part of the keys of the cached entries, so that networks
+    generated by another release of sumo are not reused. It is computed once
+    per process.
+
+    Returns
+    -------
+    str
+        output of "netconvert --version", or an empty string if netconvert
+        could not be run
+    """
+    global _netconvert_version
+    if _netconvert_version is None:
+        try:
+            output = subprocess.check_output(['netconvert', '--version'],
+                                             stderr=subprocess.STDOUT)
+            _netconvert_version = output.decode('utf-8', 'replace').strip()
+        except (OSError, subprocess.CalledProcessError):
+            _netconvert_version = ''
+    return _netconvert_version
+
+
+class NetworkCache(object):
+    """A content-addressed cache of generated .net.xml files.
+
+    Every entry is keyed by a hash of the inputs of netconvert (nodes, edges,
+    types, connections, and netconvert options) and of the version of
+    netconvert, and consists of the .net.xml
+    file generated from these inputs, as well as the edge and connection data
+    parsed from it. Reusing an entry hence avoids both calling netconvert and
+    parsing its output.
+
+    Entries are written to temporary files that are atomically renamed once
+    complete, so that several processes can safely share the same cache
+    directory: a reader either sees a complete entry, or no entry at all.
+    """
+
+    def __init__(self, path):
+        """Instantiate the cache.
+
+        Parameters
+        ----------
+        path : str
+            directory the cached entries are stored in. It is created if it
+            does not exist.
+        """
+        self.path = path
+        ensure_dir(self.path)
+
+    @staticmethod
+    def key(**inputs):
+        """Compute the key of an entry from the inputs of netconvert.
+
+        The version of netconvert (see ``netconvert_version``) is included in
+        the key.
+
+        Parameters
+        ----------
+        inputs : dict
+            the inputs of netconvert (nodes, edges, types, connections and
+            options). Values must be serializable to json, or convertible to
+            str.
+
+        Returns
+        -------
+        str
+            the hexadecimal digest of the inputs
+        """
+        inputs = dict(inputs,
+                      cache_version=CACHE_VERSION,
+                      netconvert_version=netconvert_version())
+        serialized = json.dumps(inputs, sort_keys=True, default=str)
+        return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+
+    def get(self, key, net_path):
+        """Load an entry from the cache, if available.
+
+        Parameters
+        ----------
+        key : str
+            key of the entry, see ``key``
+        net_path : str
+            path the cached .net.xml file is copied to
+
+        Returns
+        -------
+        (dict, dict) or None
+            the edge and connection data of the network, or None if the entry
+            is not in the cache
+        """
+        data_file, net_file = self._paths(key)
+        try:
+            with open(data_file, 'rb') as f:
+                edges, connections = pickle.load(f)
+            shutil.copyfile(net_file, net_path)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        return edges, connections
+
+    def put(self, key, net_path, edges, connections):
+        """Add an entry to the cache.
+
+        Parameters
+        ----------
+        key : str
+            key of the entry, see ``key``
+        net_path : str
+            path to the .net.xml file generated by netconvert
+        edges : dict
+            edge data parsed from the .net.xml file
+        connections : dict
+            connection data parsed from the .net.xml file
+        """
+        data_file, net_file = self._paths(key)
+
+        # the network file is stored first, as entries are only considered
+        # available once their data file exists
+        self._write_atomic(net_file, lambda f: _copy_into(net_path, f))
+        self._write_atomic(
+            data_file, lambda f: pickle.dump((edges, connections), f,
+                                             protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _paths(self, key):
+        """Return the paths of the data and network files of an entry."""
+        return (os.path.join(self.path, '%s.pkl' % key),
+                os.path.join(self.path, '%s.net.xml' % key))
+
+    def _write_atomic(self, path, write):
+        """Write a file through a temporary file in the same directory."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+def _copy_into(path, f):
+    """Copy the content of a file into an open file object."""
+    with open(path, 'rb') as src:
+        shutil.copyfileobj(src, f)
@@ -0,0 +1,283 @@
+"""Script containing the scenario kernel class of the numpy simulator."""
+
+from copy import deepcopy
+from flow.core.kernel.scenario.base import KernelScenario
+import numpy as np
+
+
+class NumpyScenario(KernelScenario):
+    """Scenario kernel for the built-in numpy simulator.
+
+    This class builds the network directly from the nodes, edges, types, and
+    connections of a flow.scenarios.Scenario object, without generating any
+    xml files or calling netconvert. The network does not contain any internal
+    links (junctions): vehicles move from the end of an edge directly onto the
+    start of the next edge.
+
+    Connections between edges are taken from the connections specified by the
+    scenario. Edges without specified connections are connected to all edges
+    that start at the node they end at, with every lane mapped to the lane of
+    the same index (or the last lane if the next edge has fewer lanes).
+
+    Scenarios imported from osm or .net.xml files are not supported.
+    """
+
+    def __init__(self, master_kernel, sim_params):
+        """See parent class."""
+        KernelScenario.__init__(self, master_kernel, sim_params)
+
+        self.network = None
+        self._edges = None
+        self._connections = None
+        self._edge_list = None
+        self._junction_list = None
+        self._shapes = None
+        self.__max_speed = None
+        self.__length = None
+        self.rts = None
+
+    def generate_network(self, network):
+        """See parent class."""
+        if network.net_params.netfile is not None \
+                or network.net_params.osm_path is not None:
+            raise ValueError('The numpy simulator does not support scenarios '
+                             'imported from osm or .net.xml files.')
+
+        self.network = network
+        self.orig_name = network.orig_name
+        self.name = network.name
+
+        # merge types into edges
+        types = {typ['id']: typ for typ in network.types or []}
+        edges = []
+        for edge in deepcopy(network.edges):
+            if 'type' in edge and edge['type'] in types:
+                for key, value in types[edge['type']].items():
+                    if key != 'id':
+                        edge.setdefault(key, value)
+            edges.append(edge)
+
+        nodes = {node['id']: (node['x'], node['y']) for node in network.nodes}
+
+        self._edges = {}
+        self._shapes = {}
+        for edge in edges:
+            # the shape of the edge, as a polyline connecting its nodes
+            shape = edge.get('shape') or \
+                [nodes[edge['from']], nodes[edge['to']]]
+            shape = np.array(shape, dtype=float)
+            seg = np.hypot(*np.diff(shape, axis=0).T)
+            self._shapes[edge['id']] = (
+                shape, np.concatenate(([0], np.cumsum(seg))))
+
+            self._edges[edge['id']] = {
+                'length': float(edge.get('length', seg.sum())),
+                'lanes': int(edge.get('numLanes', 1)),
+                'speed': float(edge.get('speed', 30)),
+                'from': edge['from'],
+                'to': edge['to'],
+            }
+
+        self._connections = self._generate_connections(
+            edges, network.connections)
+
+        # list of edges and internal links (junctions)
+        self._edge_list = [edge['id'] for edge in edges]
+        self._junction_list = []
+
+        # maximum achievable speed on any edge in the network
+        self.__max_speed = max(
+            self.speed_limit(edge) for edge in self.get_edge_list())
+
+        # length of the network, or the portion of the network in
+        # which cars are meant to be distributed
+        self.__length = sum(
+            self.edge_length(edge_id) for edge_id in self.get_edge_list()
+        )
+
+        # parameters to be specified under each unique subclass's
+        # __init__ function
+        self.edgestarts = self.network.edge_starts
+
+        # if no edge_starts are specified, generate default values to be used
+        # by the "get_x" method
+        if self.edgestarts is None:
+            length = 0
+            self.edgestarts = []
+            for edge_id in sorted(self._edge_list):
+                # the current edge starts where the last edge ended
+                self.edgestarts.append((edge_id, length))
+                # increment the total length of the network with the length of
+                # the current edge
+                length += self._edges[edge_id]['length']
+
+        # the network does not contain any internal links. The internal and
+        # intersection edge starts are nonetheless kept, so that vehicles are
+        # not placed in the space reserved for junctions by the scenario
+        self.internal_edgestarts = self.network.internal_edge_starts
+        self.intersection_edgestarts = self.network.intersection_edge_starts
+
+        # in case the user did not write the intersection edge-starts in
+        # internal edge-starts as well (because of redundancy), merge the two
+        # together
+        self.internal_edgestarts += self.intersection_edgestarts
+        seen = set()
+        self.internal_edgestarts = \
+            [item for item in self.internal_edgestarts
+             if item[1] not in seen and not seen.add(item[1])]
+        self.internal_edgestarts_dict = dict(self.internal_edgestarts)
+
+        # total_edgestarts and total_edgestarts_dict contain all of the above
+        # edges, with the former being ordered by position
+        self.total_edgestarts = self.edgestarts + self.internal_edgestarts
+        self.total_edgestarts.sort(key=lambda tup: tup[1])
+
+        self.total_edgestarts_dict = dict(self.total_edgestarts)
+        self._build_position_index()
+
+        # specify routes vehicles can take
+        self.rts = self.network.routes
+
+    def _generate_connections(self, edges, connections):
+        """Compute the next and previous edge/lane pairs of every lane.
+
+        Parameters
+        ----------
+        edges : list of dict
+            edges of the network, with their types merged in
+        connections : list of dict or dict < list of dict > or None
+            connections specified by the scenario
+
+        Returns
+        -------
+        dict < dict < dict < list < (edge, lane) > > > >
+            Key = "next" or "prev"
+                Key = name of the edge
+                    Key = lane index
+                    Element = list of edge/lane pairs that can be reached
+        """
+        if isinstance(connections, dict):
+            connections = sum(connections.values(), [])
+        connections = connections or []
+
+        next_conn = {}
+        for conn in connections:
+            from_lane = int(conn.get('fromLane', 0))
+            to_lane = int(conn.get('toLane', 0))
+            next_conn.setdefault(conn['from'], {}).setdefault(
+                from_lane, []).append((conn['to'], to_lane))
+
+        # edges without specified connections continue onto all edges that
+        # start at their end node
+        for edge in edges:
+            if edge['id'] in next_conn:
+                continue
+            from_edge = self._edges[edge['id']]
+            for other in edges:
+                to_edge = self._edges[other['id']]
+                if to_edge['from'] != from_edge['to']:
+                    continue
+                for lane in range(from_edge['lanes']):
+                    next_conn.setdefault(edge['id'], {}).setdefault(
+                        lane, []).append(
+                        (other['id'], min(lane, to_edge['lanes'] - 1)))
+
+        prev_conn = {}
+        for from_edge in next_conn:
+            for from_lane in next_conn[from_edge]:
+                for to_edge, to_lane in next_conn[from_edge][from_lane]:
+                    prev_conn.setdefault(to_edge, {}).setdefault(
+                        to_lane, []).append((from_edge, from_lane))
+
+        return {'next': next_conn, 'prev': prev_conn}
+
+    def update(self, reset):
+        """Perform no action of value (scenarios are static)."""
+        pass
+
+    def close(self):
+        """See parent class.
+
+        No files are generated by this class, so nothing needs to be deleted.
+        """
+        pass
+
+    ###########################################################################
+    #                        State acquisition methods                        #
+    ###########################################################################
+
+    def get_x(self, edge, position):
+        """See parent class."""
+        # if there was a collision which caused the vehicle to disappear,
+        # return an x value of -1001
+        if len(edge) == 0:
+            return -1001
+
+        return self.total_edgestarts_dict[edge] + position
+
+    def edge_length(self, edge_id):
+        """See parent class."""
+        try:
+            return self._edges[edge_id]['length']
+        except KeyError:
+            print('Error in edge length with key', edge_id)
+            return -1001
+
+    def length(self):
+        """See parent class."""
+        return self.__length
+
+    def speed_limit(self, edge_id):
+        """See parent class."""
+        try:
+            return self._edges[edge_id]['speed']
+        except KeyError:
+            print('Error in speed limit with key', edge_id)
+            return -1001
+
+    def num_lanes(self, edge_id):
+        """See parent class."""
+        try:
+            return self._edges[edge_id]['lanes']
+        except KeyError:
+            print('Error in num lanes with key', edge_id)
+            return -1001
+
+    def max_speed(self):
+        """See parent class."""
+        return self.__max_speed
+
+    def get_edge_list(self):
+        """See parent class."""
+        return self._edge_list
+
+    def get_junction_list(self):
+        """See parent class."""
+        return self._junction_list
+
+    def next_edge(self, edge, lane):
+        """See parent class."""
+        try:
+            return self._connections['next'][edge][lane]
+        except KeyError:
+            return []
+
+    def prev_edge(self, edge, lane):
+        """See parent class."""
+        try:
+            return self._connections['prev'][edge][lane]
+        except KeyError:
+            return []
+
+    def get_shape(self, edge):
+        """Return the shape of an edge.
+
+        Returns
+        -------
+        numpy.ndarray
+            (x, y) coordinates of the points of the polyline describing the
+            edge
+        numpy.ndarray
+            distance of every point from the start of the polyline
+        """
+        return self._shapes[edge]
@@ -1,7 +1,9 @@
 """Script containing the TraCI scenario kernel class."""
 
 from flow.core.kernel.scenario import KernelScenario
+from flow.core.kernel.scenario.net_cache import NetworkCache
 from flow.core.util import makexml, printxml, ensure_dir
+import flow.config as config
 import time
 import os
 import sys
@@ -202,6 +204,7 @@ class TraCIScenario(KernelScenario):
         self.total_edgestarts.sort(key=lambda tup: tup[1])
 
         self.total_edgestarts_dict = dict(self.total_edgestarts)
+        self._build_position_index()
 
         # create the sumo configuration files
         cfg_name = self.generate_cfg(self.network.net_params,
@@ -228,32 +231,21 @@ class TraCIScenario(KernelScenario):
         the case of import .net.xml files we do not want to delete them.
         """
         if self.network.net_params.netfile is None:
-            os.remove(self.net_path + self.nodfn)
-            os.remove(self.net_path + self.edgfn)
-            os.remove(self.net_path + self.cfgfn)
             os.remove(self.cfg_path + self.addfn)
             os.remove(self.cfg_path + self.guifn)
             os.remove(self.cfg_path + self.netfn)
             os.remove(self.cfg_path + self.roufn)
             os.remove(self.cfg_path + self.sumfn)
 
-            # the connection file is not always created
-            try:
-                os.remove(self.net_path + self.confn)
-            except OSError:
-                pass
-
-            # neither is the type file
-            try:
-                os.remove(self.net_path + self.typfn)
-            except OSError:
-                pass
-
-    def get_edge(self, x):
-        """See parent class."""
-        for (edge, start_pos) in reversed(self.total_edgestarts):
-            if x >= start_pos:
-                return edge, x - start_pos
+            # the netconvert input files are not created if the network was
+            # found in the network cache, and the connection and type files
+            # are not always created
+            for fn in [self.nodfn, self.edgfn, self.cfgfn, self.confn,
+                       self.typfn]:
+                try:
+                    os.remove(self.net_path + fn)
+                except OSError:
+                    pass
 
     def get_x(self, edge, position):
         """See parent class."""
@@ -424,13 +416,6 @@ class TraCIScenario(KernelScenario):
             if 'radius' in node:
                 node['radius'] = str(node['radius'])
 
-        # xml file for nodes; contains nodes for the boundary points with
-        # respect to the x and y axes
-        x = makexml('nodes', 'http://sumo.dlr.de/xsd/nodes_file.xsd')
-        for node_attributes in nodes:
-            x.append(E('node', **node_attributes))
-        printxml(x, self.net_path + self.nodfn)
-
         # modify the length, shape, numLanes, and speed values
         for edge in edges:
             edge['length'] = str(edge['length'])
@@ -445,6 +430,53 @@ class TraCIScenario(KernelScenario):
             if 'speed' in edge:
                 edge['speed'] = str(edge['speed'])
 
+        # modify the numLanes and speed values
+        if types is not None:
+            for typ in types:
+                if 'numLanes' in typ:
+                    typ['numLanes'] = str(typ['numLanes'])
+                if 'speed' in typ:
+                    typ['speed'] = str(typ['speed'])
+
+        # modify the fromLane and toLane values
+        if connections is not None:
+            for connection in connections:
+                if 'fromLane' in connection:
+                    connection['fromLane'] = str(connection['fromLane'])
+                if 'toLane' in connection:
+                    connection['toLane'] = str(connection['toLane'])
+                if 'signal_group' in connection:
+                    del connection['signal_group']
+
+        # check whether the user requested no-internal-links (default="true")
+        if net_params.no_internal_links:
+            no_internal_links = 'true'
+        else:
+            no_internal_links = 'false'
+
+        # reuse the network generated by an earlier call to netconvert with
+        # the same inputs, if available
+        if config.NET_CACHE_DIR is not None:
+            cache = NetworkCache(config.NET_CACHE_DIR)
+            cache_key = cache.key(
+                nodes=nodes,
+                edges=edges,
+                types=types,
+                connections=connections,
+                no_internal_links=no_internal_links)
+            cached = cache.get(cache_key, self.cfg_path + self.netfn)
+            if cached is not None:
+                return cached
+        else:
+            cache = None
+
+        # xml file for nodes; contains nodes for the boundary points with
+        # respect to the x and y axes
+        x = makexml('nodes', 'http://sumo.dlr.de/xsd/nodes_file.xsd')
+        for node_attributes in nodes:
+            x.append(E('node', **node_attributes))
+        printxml(x, self.net_path + self.nodfn)
+
         # xml file for edges
         x = makexml('edges', 'http://sumo.dlr.de/xsd/edges_file.xsd')
         for edge_attributes in edges:
@@ -454,13 +486,6 @@ class TraCIScenario(KernelScenario):
         # xml file for types: contains the the number of lanes and the speed
         # limit for the lanes
         if types is not None:
-            # modify the numLanes and speed values
-            for typ in types:
-                if 'numLanes' in typ:
-                    typ['numLanes'] = str(typ['numLanes'])
-                if 'speed' in typ:
-                    typ['speed'] = str(typ['speed'])
-
             x = makexml('types', 'http://sumo.dlr.de/xsd/types_file.xsd')
             for type_attributes in types:
                 x.append(E('type', **type_attributes))
@@ -469,27 +494,12 @@ class TraCIScenario(KernelScenario):
         # xml for connections: specifies which lanes connect to which in the
         # edges
         if connections is not None:
-            # modify the fromLane and toLane values
-            for connection in connections:
-                if 'fromLane' in connection:
-                    connection['fromLane'] = str(connection['fromLane'])
-                if 'toLane' in connection:
-                    connection['toLane'] = str(connection['toLane'])
-
             x = makexml('connections',
                         'http://sumo.dlr.de/xsd/connections_file.xsd')
             for connection_attributes in connections:
-                if 'signal_group' in connection_attributes:
-                    del connection_attributes['signal_group']
                 x.append(E('connection', **connection_attributes))
             printxml(x, self.net_path + self.confn)
 
-        # check whether the user requested no-internal-links (default="true")
-        if net_params.no_internal_links:
-            no_internal_links = 'true'
-        else:
-            no_internal_links = 'false'
-
         # xml file for configuration, which specifies:
         # - the location of all files of interest for sumo
         # - output net file
@@ -526,12 +536,20 @@ class TraCIScenario(KernelScenario):
         for _ in range(RETRIES_ON_ERROR):
             try:
                 edges_dict, conn_dict = self._import_edges_from_net()
-                return edges_dict, conn_dict
+                break
             except Exception as e:
                 print('Error during start: {}'.format(e))
                 print('Retrying in {} seconds...'.format(WAIT_ON_ERROR))
                 time.sleep(WAIT_ON_ERROR)
-        raise error
+                error = e
+        else:
+            raise error
+
+        if cache is not None:
+            cache.put(cache_key, self.cfg_path + self.netfn, edges_dict,
+                      conn_dict)
+
+        return edges_dict, conn_dict
 
     def generate_net_from_osm(self, net_params):
         """Generate .net.xml files from OpenStreetMap files.
@@ -1,6 +1,8 @@
 from flow.core.kernel.simulation.base import KernelSimulation
 from flow.core.kernel.simulation.traci import TraCISimulation
 from flow.core.kernel.simulation.aimsun import AimsunKernelSimulation
+from flow.core.kernel.simulation.numpy_sim import NumpySimulation
 
 
-__all__ = ['KernelSimulation', 'TraCISimulation', 'AimsunKernelSimulation']
+__all__ = ['KernelSimulation', 'TraCISimulation', 'AimsunKernelSimulation',
+           'NumpySimulation']
@@ -55,7 +55,10 @@ class AimsunKernelSimulation(KernelSimulation):
         # save the simulation step size (for later use)
         self.sim_step = sim_params.sim_step
 
-        self.emission_path = sim_params.emission_path
+        # the emission data is not stored if the trajectories are recorded by
+        # the flow kernel instead
+        if not getattr(sim_params, "record_trajectories", False):
+            self.emission_path = sim_params.emission_path
         if self.emission_path is not None:
             ensure_dir(self.emission_path)
 
@@ -80,6 +80,36 @@ class KernelSimulation(object):
         """
         raise NotImplementedError
 
+    def save_state(self):
+        """Capture the current state of the simulator.
+
+        Returns
+        -------
+        any
+            a snapshot of the simulator, which may be passed to ``load_state``
+        """
+        raise NotImplementedError
+
+    def load_state(self, state):
+        """Restore the simulator to a snapshot taken by ``save_state``.
+
+        Parameters
+        ----------
+        state : any
+            a snapshot of the simulator
+        """
+        raise NotImplementedError
+
+    def next_seed(self):
+        """Return the seed of the next restarted simulation.
+
+        Returns
+        -------
+        int or None
+            the seed, or None if a new random seed may be issued
+        """
+        return None
+
     def close(self):
         """Closes the current simulation instance."""
         raise NotImplementedError
@@ -0,0 +1,179 @@
+"""Script containing a buffer that pipelines TraCI set-commands."""
+
+from traci.connection import Connection
+from traci.exceptions import FatalTraCIError, TraCIException
+import collections
+import logging
+import struct
+
+# descriptions of the result types of TraCI commands
+RESULTS = {0x00: "OK", 0x01: "Not implemented", 0xFF: "Error"}
+
+# private attributes of traci connections used to pack commands into a single
+# message, which are not part of the public API of traci
+CONNECTION_INTERNALS = ("_sendExact", "_recvExact", "_string", "_queue",
+                        "_socket")
+
+
+def _defer(*args, **kwargs):
+    """Skip sending the message of a connection while commands are queued."""
+    return None
+
+
+class TraCICommandBuffer(object):
+    """Queues TraCI set-commands, and sends them to sumo in a single message.
+
+    By default, every set-command of the TraCI API (e.g. ``slowDown`` or
+    ``setColor``) is sent to sumo in its own message, and waits for its own
+    acknowledgement. Commands added to this buffer are instead only packed
+    when the buffer is flushed, typically right before the next simulation
+    step, and are all written to the socket as one message whose
+    acknowledgements are read together. This turns one round-trip per command
+    into one round-trip per simulation step. If sumo is run in-process (see
+    LibsumoConnection), or if the traci connection lacks the internals used to
+    pack the commands (e.g. after an upgrade of traci), the commands are
+    simply executed one after the other.
+
+    Every command is stored under a key, e.g. the name of a vehicle and the
+    name of the command. If a command is added under a key for which a
+    command is already queued, the earlier command is dropped, as it would
+    have been overridden by the later one anyway.
+
+    Usage:
+
+        >>> buffer = TraCICommandBuffer(traci_connection)
+        >>> buffer.add((veh_id, 'slowDown'),
+        >>>            traci_connection.vehicle.slowDown, veh_id, 10, 1)
+        >>> buffer.flush()
+    """
+
+    def __init__(self, kernel_api):
+        """Instantiate the buffer.
+
+        Parameters
+        ----------
+        kernel_api : traci.connection.Connection
+            the traci connection the commands are sent through
+        """
+        self.kernel_api = kernel_api
+
+        # whether commands are packed into a single message
+        self.pipelined = isinstance(kernel_api, Connection) and all(
+            hasattr(kernel_api, name) for name in CONNECTION_INTERNALS)
+        if isinstance(kernel_api, Connection) and not self.pipelined:
+            logging.warning(" This version of traci is not supported by the "
+                            "command buffer. Commands are sent one by one.")
+
+        # Key = key of the command, Element = (method, args, ignore_errors)
+        self._pending = collections.OrderedDict()
+
+    def __len__(self):
+        """Return the number of queued commands."""
+        return len(self._pending)
+
+    def add(self, key, method, *args, ignore_errors=False):
+        """Queue a command, replacing any command queued under the same key.
+
+        Parameters
+        ----------
+        key : hashable
+            key of the command, e.g. (vehicle name, command name)
+        method : callable
+            the method of the TraCI API issuing the command, e.g.
+            ``kernel_api.vehicle.slowDown``
+        args : tuple
+            the arguments of the method
+        ignore_errors : bool, optional
+            specifies whether errors returned by sumo for this command should
+            be ignored (e.g. if the vehicle left the network)
+        """
+        # the command is moved to the end of the queue, so that it is executed
+        # after any command added before it
+        self._pending.pop(key, None)
+        self._pending[key] = (method, args, ignore_errors)
+
+    def discard(self, obj_id):
+        """Remove all queued commands whose key starts with an object name.
+
+        This is meant to be called when an object (e.g. a vehicle) is removed
+        from the simulation before the buffer is flushed.
+        """
+        for key in [key for key in self._pending if key[0] == obj_id]:
+            del self._pending[key]
+
+    def clear(self):
+        """Remove all queued commands without sending them."""
+        self._pending.clear()
+
+    def flush(self):
+        """Send all queued commands to sumo, and wait for their results.
+
+        Raises
+        ------
+        traci.exceptions.TraCIException
+            if sumo returned an error for any command that was not added with
+            ``ignore_errors`` set to True. All other commands are still
+            executed by sumo.
+        traci.exceptions.FatalTraCIError
+            if the connection to sumo was closed
+        """
+        if len(self._pending) == 0:
+            return
+
+        commands = list(self._pending.values())
+        self._pending.clear()
+
+        if not self.pipelined:
+            self._execute(commands)
+            return
+
+        # pack the commands through the TraCI API, whose methods append every
+        # command to the message of the connection and then send it. Sending
+        # is deferred by shadowing the method of the connection sending it.
+        conn = self.kernel_api
+        conn._sendExact = _defer
+        try:
+            for method, args, _ in commands:
+                method(*args)
+            message, queue = conn._string, conn._queue
+        finally:
+            del conn._sendExact
+            conn._string = bytes()
+            conn._queue = []
+
+        if conn._socket is None:
+            raise FatalTraCIError("Connection already closed.")
+        conn._socket.sendall(struct.pack("!i", len(message) + 4) + message)
+        result = conn._recvExact()
+        if not result:
+            conn._socket.close()
+            conn._socket = None
+            raise FatalTraCIError("Connection closed by SUMO.")
+
+        # read the results of all commands before reporting the first error
+        error = None
+        for command, (_, _, ignore_errors) in zip(queue, commands):
+            prefix = result.read("!BBB")
+            err = result.readString()
+            if prefix[1] != command:
+                raise FatalTraCIError("Received answer %s for command %s." %
+                                      (prefix[1], command))
+            if (prefix[2] or err) and not ignore_errors and error is None:
+                error = TraCIException(err, prefix[1], RESULTS[prefix[2]])
+
+        if error is not None:
+            raise error
+
+    @staticmethod
+    def _execute(commands):
+        """Execute commands through an in-process API, one by one."""
+        error = None
+        for method, args, ignore_errors in commands:
+            try:
+                method(*args)
+            except TraCIException as e:
+                if not ignore_errors and error is None:
+                    error = e
+
+        if error is not None:
+            raise error
@@ -0,0 +1,162 @@
+"""Script containing an adapter running sumo in-process through libsumo."""
+
+from traci.exceptions import TraCIException
+import functools
+import numpy as np
+
+# domains of the TraCI API whose subscription results are read by flow
+SUBSCRIPTION_DOMAINS = ['vehicle', 'trafficlight', 'lane', 'edge', 'person']
+
+
+def _item(value):
+    """Convert numpy scalars to the python types accepted by libsumo.
+
+    Arrays with a single element are converted as well, since traci packs
+    them as scalars.
+    """
+    if isinstance(value, np.generic) or \
+            (isinstance(value, np.ndarray) and value.size == 1):
+        return value.item()
+    return value
+
+
+def _convert_errors(method, libsumo_exception):
+    """Wrap a libsumo method to behave like the corresponding traci method.
+
+    Numpy scalar arguments (e.g. speeds computed by controllers), which traci
+    accepts but the libsumo bindings reject, are converted to python types,
+    and the errors of the method are raised as TraCIExceptions.
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        args = [_item(arg) for arg in args]
+        kwargs = {key: _item(value) for key, value in kwargs.items()}
+        try:
+            return method(*args, **kwargs)
+        except libsumo_exception as e:
+            raise TraCIException(str(e)) from e
+    return wrapper
+
+
+class _LibsumoDomain(object):
+    """A domain of the libsumo bindings (e.g. vehicle, simulation).
+
+    Attributes are looked up in the libsumo domain once, and cached. Methods
+    are wrapped so that they accept numpy scalars, and raise the exceptions of
+    the traci package, which the flow kernels catch.
+
+    As with traci, the results of new subscriptions are added to the results
+    of all objects last returned by ``getSubscriptionResults``.
+    """
+
+    def __init__(self, domain, libsumo_exception):
+        self._domain = domain
+        self._libsumo_exception = libsumo_exception
+        # subscription results of all objects last returned
+        self._results = dict()
+
+    def __getattr__(self, name):
+        value = self._get(name)
+        setattr(self, name, value)
+        return value
+
+    def _get(self, name):
+        """Return an attribute of the libsumo domain."""
+        value = getattr(self._domain, name)
+        if callable(value):
+            value = _convert_errors(value, self._libsumo_exception)
+        return value
+
+    def getSubscriptionResults(self, objectID=None):
+        """Return the subscription results of an object, or of all objects.
+
+        This mirrors the traci API used by flow, in which the results of all
+        objects are returned if no object is specified.
+        """
+        if objectID is None:
+            self._results = self._domain.getAllSubscriptionResults()
+            return self._results
+        return self._domain.getSubscriptionResults(objectID)
+
+    def subscribe(self, objectID, *args, **kwargs):
+        """Subscribe to values of an object, see traci."""
+        self._get('subscribe')(objectID, *args, **kwargs)
+        self._results[objectID] = self._domain.getSubscriptionResults(objectID)
+
+    def subscribeLeader(self, objectID, *args, **kwargs):
+        """Subscribe to the leader of a vehicle, see traci."""
+        self._get('subscribeLeader')(objectID, *args, **kwargs)
+        self._results[objectID] = self._domain.getSubscriptionResults(objectID)
+
+
+class _LibsumoSimulationDomain(_LibsumoDomain):
+    """The simulation domain of the libsumo bindings."""
+
+    def getSubscriptionResults(self, objectID=None):
+        """Return the subscription results of the simulation."""
+        return self._domain.getSubscriptionResults()
+
+    def subscribe(self, *args, **kwargs):
+        """Subscribe to values of the simulation, see traci."""
+        self._get('subscribe')(*args, **kwargs)
+
+
+class LibsumoConnection(object):
+    """Drives a sumo simulation run in-process through libsumo.
+
+    libsumo exposes the same functions as the traci package, but runs sumo
+    within the python process, so that no sumo process needs to be started,
+    and getters and setters are function calls instead of round-trips over a
+    socket. This class exposes libsumo through the interface of a
+    ``traci.connection.Connection``, so that the TraCI kernels can be used
+    unchanged on top of it.
+
+    Only one libsumo simulation can run per process. Several simulations may
+    still be run in parallel in separate processes (e.g. with a VecEnv).
+    """
+
+    def __init__(self, sumo_call):
+        """Start a simulation in the current process.
+
+        The simulation is advanced by one step, as expected by the simulation
+        kernel.
+
+        Parameters
+        ----------
+        sumo_call : list of str
+            command a sumo process would be started with
+
+        Raises
+        ------
+        ImportError
+            if libsumo is not installed
+        """
+        import libsumo
+
+        self._libsumo = libsumo
+        exception = getattr(libsumo, 'TraCIException', TraCIException)
+
+        self.simulation = _LibsumoSimulationDomain(
+            libsumo.simulation, exception)
+        for name in SUBSCRIPTION_DOMAINS:
+            setattr(self, name, _LibsumoDomain(getattr(libsumo, name),
+                                               exception))
+
+        libsumo.start(sumo_call)
+        self.simulationStep()
+
+    def __getattr__(self, name):
+        # other domains and functions are used as provided by libsumo
+        return getattr(self._libsumo, name)
+
+    def simulationStep(self, step=0.):
+        """Advance the simulation by one step."""
+        self._libsumo.simulationStep(step)
+
+    def setOrder(self, order):
+        """Do nothing, as only one client can drive the simulation."""
+        pass
+
+    def close(self, wait=True):
+        """Terminate the simulation."""
+        self._libsumo.close()
@@ -0,0 +1,643 @@
+"""Script containing the simulation kernel class of the numpy simulator."""
+
+from flow.core.kernel.simulation import KernelSimulation
+from flow.core.kernel.vehicle.columnar import ColumnarVehicleState
+from flow.core.kernel.vehicle.multi_lane import MultiLaneHeadways, \
+    DEFAULT_HEADWAY
+from copy import deepcopy
+import numpy as np
+
+# length of every vehicle in the network (the sumo default, in meters)
+VEHICLE_LENGTH = 5.0
+
+# bits of the speed mode that are reproduced by the numpy simulator; see:
+# http://sumo.dlr.de/wiki/TraCI/Change_Vehicle_State#speed_mode_.280xb3.29
+SAFE_SPEED_BIT = 1
+MAX_ACCEL_BIT = 2
+MAX_DECEL_BIT = 4
+
+# attributes of the numpy simulator that change during a simulation, and that
+# are captured by snapshots of the simulation
+STATE_ATTRS = ['state', 'lane_data', 'time', 'departed_ids', 'arrived_ids',
+               'collided', 'rng', '_pending', '_inflows']
+
+
+class NumpySimulation(KernelSimulation):
+    """Simulation kernel for the built-in numpy simulator.
+
+    Extends flow.core.kernel.simulation.KernelSimulation
+    """
+
+    def __init__(self, master_kernel):
+        """Instantiate the numpy simulation kernel.
+
+        Parameters
+        ----------
+        master_kernel : flow.core.kernel.Kernel
+            the higher level kernel (used to call methods from other
+            sub-kernels)
+        """
+        KernelSimulation.__init__(self, master_kernel)
+
+    def start_simulation(self, scenario, sim_params):
+        """Start a numpy simulation instance.
+
+        The numpy simulator does not generate any emission output (see the
+        record_trajectories attribute of SimParams for an alternative), and
+        does not support the pyglet renderer. If rendering is set to True, the
+        simulation is run without a gui.
+
+        Raises
+        ------
+        ValueError
+            if a pyglet render mode is requested
+        """
+        if sim_params.render in ['gray', 'dgray', 'rgb', 'drgb']:
+            raise ValueError('Render mode %s is not supported by the numpy '
+                             'simulator.' % sim_params.render)
+
+        return NumpySimulator(
+            scenario=scenario,
+            sim_params=sim_params,
+            type_parameters=self.master_kernel.vehicle.type_parameters,
+            min_gap=self.master_kernel.vehicle.minGap)
+
+    def simulation_step(self):
+        """See parent class."""
+        self.kernel_api.step()
+
+    def update(self, reset):
+        """See parent class."""
+        pass
+
+    def close(self):
+        """See parent class."""
+        self.kernel_api.close()
+
+    def save_state(self):
+        """See parent class."""
+        return self.kernel_api.save_state()
+
+    def load_state(self, state):
+        """See parent class."""
+        self.kernel_api.load_state(state)
+
+    def check_collision(self):
+        """See parent class."""
+        return self.kernel_api.collided
+
+
+class NumpyVehicleState(ColumnarVehicleState):
+    """Columnar vehicle state extended with the parameters of the engine.
+
+    The "command_speed" column contains the speed requested for the next time
+    step by the vehicle kernel, or NaN if no speed was requested, and
+    "target_lane" contains the lane requested for the next time step, or -1.
+    """
+
+    FLOAT_COLUMNS = ColumnarVehicleState.FLOAT_COLUMNS + (
+        'accel', 'decel', 'tau', 'max_speed', 'speed_factor', 'command_speed')
+    INT_COLUMNS = ColumnarVehicleState.INT_COLUMNS + (
+        'speed_mode', 'target_lane')
+    OBJECT_COLUMNS = ColumnarVehicleState.OBJECT_COLUMNS + ('type_id',)
+
+    DEFAULTS = dict(
+        ColumnarVehicleState.DEFAULTS,
+        accel=1, decel=1.5, tau=1, max_speed=30, speed_factor=1,
+        command_speed=np.nan, speed_mode=31, target_lane=-1, type_id=None)
+
+
+class NumpySimulator(object):
+    """A microscopic traffic simulator implemented in numpy.
+
+    This object serves as the kernel api of the numpy simulation kernel. It
+    advances the state of all vehicles in the network with a single set of
+    vectorized operations per time step:
+
+    1. Vehicles that are not controlled through the vehicle kernel follow the
+       intelligent driver model (IDM), parametrized by the accel, decel, tau,
+       minGap, maxSpeed, and speedFactor attributes of their car following
+       params. Vehicles controlled through the vehicle kernel move at the
+       speed requested for the current time step.
+    2. The accel / decel limits and safe speed checks of the speed mode of
+       every vehicle are enforced on the requested speeds. The safe speed is
+       the speed of the Krauss model, i.e. the largest speed at which the
+       vehicle can still stop behind its leader.
+    3. Requested lane changes are performed instantaneously.
+    4. Positions are updated with the new speeds (Euler integration).
+       Vehicles that move past the end of an edge continue onto the next edge
+       of their route, and exit the network once they reach the end of their
+       route.
+    5. Vehicles added through ``add`` and vehicles from inflows are inserted
+       into the network. Inflow vehicles are only inserted if enough space is
+       available, and are otherwise delayed.
+    6. Leaders, followers, and headways are recomputed for all vehicles.
+       Vehicles on lanes that merge onto the same lane follow each other in
+       the order of their distance to the merge (zipper merge).
+
+    The network does not contain junctions: apart from merges, vehicles cross
+    from one edge to the next without interacting with vehicles on
+    conflicting edges, and traffic lights are not enforced. Vehicles do not
+    change lanes unless requested to.
+
+    Attributes
+    ----------
+    state : NumpyVehicleState
+        the state of all vehicles in the network
+    lane_data : flow.core.kernel.vehicle.multi_lane.MultiLaneHeadways
+        lane leaders, followers, headways, and tailways of all vehicles
+    time : float
+        current simulation time, in seconds
+    departed_ids : list of str
+        names of the vehicles that entered the network in the last step
+    arrived_ids : list of str
+        names of the vehicles that exited the network in the last step
+    collided : bool
+        whether any two vehicles on the same lane overlapped at the end of the
+        last step
+    """
+
+    def __init__(self, scenario, sim_params, type_parameters, min_gap):
+        """Instantiate the numpy simulator.
+
+        Parameters
+        ----------
+        scenario : flow.core.kernel.scenario.NumpyScenario
+            the scenario kernel, containing the network to simulate
+        sim_params : flow.core.params.SimParams
+            simulation-specific parameters
+        type_parameters : dict
+            parameters of every vehicle type, see
+            flow.core.params.VehicleParams
+        min_gap : dict
+            minGap attribute of every vehicle type
+        """
+        self.scenario = scenario
+        self.sim_step = sim_params.sim_step
+        self.type_parameters = type_parameters
+        self.min_gap = min_gap
+        self.routes = scenario.rts
+        self.rng = np.random.RandomState(getattr(sim_params, 'seed', None))
+
+        self.state = NumpyVehicleState()
+        self.lane_data = MultiLaneHeadways()
+
+        self.time = 0
+        self.departed_ids = []
+        self.arrived_ids = []
+        self.collided = False
+
+        # vehicles added through "add", to be inserted in the next step
+        self._pending = []
+
+        # length, speed limit, and number of lanes of each edge code
+        edges = scenario.get_edge_list()
+        codes = [self.state.edge_code(edge) for edge in edges]
+        num_codes = len(self.state.edge_names)
+        self._edge_length = np.zeros(num_codes)
+        self._edge_speed = np.zeros(num_codes)
+        self._edge_lanes = np.zeros(num_codes, dtype=np.int64)
+        for edge, code in zip(edges, codes):
+            self._edge_length[code] = scenario.edge_length(edge)
+            self._edge_speed[code] = scenario.speed_limit(edge)
+            self._edge_lanes[code] = scenario.num_lanes(edge)
+
+        # slots of the lanes that lead onto the same lane of another edge, for
+        # every lane with more than one predecessor (merges)
+        self._merges = []
+        max_lanes = max(self._edge_lanes)
+        for edge, code in zip(edges, codes):
+            for lane in range(scenario.num_lanes(edge)):
+                prev_lanes = scenario.prev_edge(edge, lane)
+                if len(prev_lanes) > 1:
+                    self._merges.append(np.array(
+                        [self.state.edge_code(prev_edge) * max_lanes +
+                         prev_lane for prev_edge, prev_lane in prev_lanes]))
+        self._max_lanes = max_lanes
+
+        # inflows, with the time at which the next vehicle is due and the
+        # number of vehicles that are due but have not been inserted yet
+        self._inflows = []
+        for inflow in scenario.network.net_params.inflows.get():
+            inflow = dict(inflow, next=float(inflow.get('begin', 0)),
+                          backlog=0, count=0)
+            if 'vehsPerHour' in inflow:
+                inflow['period'] = 3600. / float(inflow['vehsPerHour'])
+            self._inflows.append(inflow)
+
+    ###########################################################################
+    #                              Vehicle commands                           #
+    ###########################################################################
+
+    def add(self, veh_id, type_id, edge, lane, pos, speed):
+        """Add a vehicle to the network in the next simulation step.
+
+        If a vehicle with the same name is already in the network, it is
+        replaced by the new vehicle.
+
+        Parameters
+        ----------
+        veh_id : str
+            name of the vehicle
+        type_id : str
+            type of the vehicle
+        edge : str
+            name of the edge the vehicle starts on. The vehicle follows the
+            route of this edge.
+        lane : int
+            lane the vehicle starts on
+        pos : float
+            position of the vehicle on the edge
+        speed : float
+            initial speed of the vehicle
+        """
+        if type_id not in self.type_parameters:
+            raise KeyError('Vehicle type "{}" is not valid.'.format(type_id))
+        self._pending.append((veh_id, type_id, edge, int(lane), float(pos),
+                              float(speed)))
+
+    def remove(self, veh_id):
+        """Remove a vehicle from the network, if it is in the network."""
+        if veh_id in self.state:
+            self.state.remove(veh_id)
+        self._pending = [veh for veh in self._pending if veh[0] != veh_id]
+
+    def get_type(self, veh_id):
+        """Return the type of a vehicle in the network."""
+        return self.state.get(self.state.type_id, veh_id, None)
+
+    def get_ids(self):
+        """Return the names of all vehicles in the network."""
+        return self.state.ids[self.state.active_rows()].tolist()
+
+    def set_speed(self, veh_ids, speeds):
+        """Request the speeds of vehicles for the next time step."""
+        self.state.command_speed[self.state.rows(veh_ids)] = speeds
+
+    def change_lane(self, veh_id, lane):
+        """Request the lane of a vehicle for the next time step."""
+        self.state.set(self.state.target_lane, veh_id, lane)
+
+    def set_route(self, veh_id, route):
+        """Set the route of a vehicle."""
+        self.state.set(self.state.route, veh_id, list(route))
+
+    def set_max_speed(self, veh_id, max_speed):
+        """Set the maximum speed of a vehicle."""
+        self.state.set(self.state.max_speed, veh_id, max_speed)
+
+    ###########################################################################
+    #                           Simulation step                               #
+    ###########################################################################
+
+    def step(self):
+        """Advance the simulation by one time step."""
+        self.departed_ids = []
+        self.arrived_ids = []
+        self.time += self.sim_step
+
+        rows = self.state.active_rows()
+        if len(rows) > 0:
+            self._move(rows)
+
+        self._insert_pending()
+        self._insert_inflows()
+
+        self._update_neighbors()
+        self._update_orientations()
+
+    def close(self):
+        """Remove all vehicles from the network."""
+        self.state.clear()
+        self._pending = []
+
+    def save_state(self):
+        """Capture the state of the simulation at the current time step.
+
+        Returns
+        -------
+        dict
+            a copy of all attributes of the simulator that change during a
+            simulation, which may be passed to ``load_state``
+        """
+        return deepcopy({name: getattr(self, name) for name in STATE_ATTRS})
+
+    def load_state(self, state):
+        """Restore the simulation to a state returned by ``save_state``.
+
+        The "state" and "lane_data" attributes are replaced by copies of the
+        saved ones, so that objects bound to them need to be bound again.
+
+        Parameters
+        ----------
+        state : dict
+            the state of the simulation
+        """
+        for name, value in deepcopy(state).items():
+            setattr(self, name, value)
+
+    def _safe_speed(self, rows, gap, lead_speed):
+        """Return the largest speeds at which vehicles can stop in time."""
+        state = self.state
+        bt = state.decel[rows] * state.tau[rows]
+        return -bt + np.sqrt(
+            bt ** 2 + lead_speed ** 2 + 2 * state.decel[rows] *
+            np.maximum(gap - state.min_gap[rows], 0))
+
+    def _move(self, rows):
+        """Compute the new speeds, lanes, and positions of vehicles."""
+        state = self.state
+        dt = self.sim_step
+
+        speed = state.speed[rows]
+        leader = state.leader[rows]
+        has_lead = leader >= 0
+        lead_speed = np.where(has_lead, state.speed[leader], 0)
+        gap = state.headway[rows]
+        accel = state.accel[rows]
+        decel = state.decel[rows]
+        edge = state.edge[rows]
+
+        # speed of the intelligent driver model
+        v0 = np.minimum(state.max_speed[rows],
+                        self._edge_speed[edge] * state.speed_factor[rows])
+        s_star = state.min_gap[rows] + np.maximum(
+            0, speed * state.tau[rows] +
+            speed * (speed - lead_speed) / (2 * np.sqrt(accel * decel)))
+        interaction = np.where(
+            has_lead, (s_star / np.maximum(gap, 1e-3)) ** 2, 0)
+        model_accel = accel * (1 - (speed / v0) ** 4 - interaction)
+
+        safe_speed = np.where(
+            has_lead, self._safe_speed(rows, gap, lead_speed), np.inf)
+        model_speed = np.maximum(
+            np.minimum(speed + model_accel * dt, safe_speed), 0)
+
+        # speeds requested by the vehicle kernel, subject to the checks of
+        # the speed modes of the vehicles
+        command = state.command_speed[rows]
+        mode = state.speed_mode[rows]
+        command = np.where(mode & MAX_ACCEL_BIT,
+                           np.minimum(command, speed + accel * dt), command)
+        command = np.where(mode & MAX_DECEL_BIT,
+                           np.maximum(command, speed - decel * dt), command)
+        command = np.where(mode & SAFE_SPEED_BIT,
+                           np.minimum(command, safe_speed), command)
+        new_speed = np.where(np.isnan(command), model_speed,
+                             np.maximum(command, 0))
+
+        state.default_speed[rows] = model_speed
+        state.speed[rows] = new_speed
+        state.command_speed[rows] = np.nan
+
+        # perform the requested lane changes
+        target = state.target_lane[rows]
+        change = target >= 0
+        state.lane[rows[change]] = np.minimum(
+            target[change], self._edge_lanes[edge[change]] - 1)
+        state.target_lane[rows] = -1
+
+        # move the vehicles, and move vehicles that passed the end of their
+        # edges onto the next edges of their routes
+        state.position[rows] += new_speed * dt
+        past_end = state.position[rows] > self._edge_length[edge]
+        for row in rows[past_end]:
+            self._next_edge(row)
+
+    def _next_edge(self, row):
+        """Move a vehicle onto the next edges of its route.
+
+        The vehicle exits the network if it reached the end of its route.
+        """
+        state = self.state
+        while True:
+            code = state.edge[row]
+            if state.position[row] <= self._edge_length[code]:
+                return
+
+            edge = state.edge_names[code]
+            route = state.route[row] or []
+            index = route.index(edge) if edge in route else len(route)
+            if index + 1 >= len(route):
+                self.arrived_ids.append(state.ids[row])
+                state.remove(state.ids[row])
+                return
+
+            next_edge = route[index + 1]
+            next_code = state.edge_code(next_edge)
+            lanes = [to_lane for to_edge, to_lane in
+                     self.scenario.next_edge(edge, state.lane[row])
+                     if to_edge == next_edge]
+            state.lane[row] = lanes[0] if len(lanes) > 0 else \
+                min(state.lane[row], self._edge_lanes[next_code] - 1)
+            state.position[row] -= self._edge_length[code]
+            state.edge[row] = next_code
+
+    def _insert(self, veh_id, type_id, edge, lane, pos, speed):
+        """Insert a vehicle into the network."""
+        state = self.state
+        if veh_id in state:
+            state.remove(veh_id)
+
+        params = self.type_parameters[type_id]
+        cf_params = params['car_following_params']
+        controller_params = cf_params.controller_params
+
+        row = state.add(veh_id)
+        state.type_id[row] = type_id
+        state.route[row] = list(self.routes.get(edge, [edge]))
+        state.edge[row] = state.edge_code(edge)
+        state.lane[row] = lane
+        state.position[row] = pos
+        state.speed[row] = speed
+        state.default_speed[row] = speed
+        state.length[row] = VEHICLE_LENGTH
+        state.min_gap[row] = self.min_gap[type_id]
+        state.accel[row] = controller_params['accel']
+        state.decel[row] = abs(controller_params['decel'])
+        state.tau[row] = controller_params['tau']
+        state.max_speed[row] = controller_params['maxSpeed']
+        state.speed_factor[row] = controller_params['speedFactor']
+        state.speed_mode[row] = int(cf_params.speed_mode)
+
+        self.departed_ids.append(veh_id)
+
+    def _insert_pending(self):
+        """Insert the vehicles added through "add"."""
+        for veh in self._pending:
+            self._insert(*veh)
+        self._pending = []
+
+    def _insert_inflows(self):
+        """Insert the vehicles of all inflows that are due, if possible."""
+        for inflow in self._inflows:
+            end = float(inflow.get('end', np.inf))
+
+            # collect the number of vehicles that are due
+            if 'period' in inflow:
+                period = float(inflow['period'])
+                while inflow['next'] <= min(self.time, end):
+                    inflow['backlog'] += 1
+                    inflow['next'] += period
+            elif 'probability' in inflow:
+                if inflow['next'] <= self.time <= end and \
+                        self.rng.rand() < \
+                        float(inflow['probability']) * self.sim_step:
+                    inflow['backlog'] += 1
+
+            if inflow['backlog'] == 0:
+                continue
+
+            # insert the next vehicle if there is enough space
+            edge = inflow['edge']
+            type_id = inflow['vtype']
+            lane, speed = self._depart_lane_and_speed(inflow)
+            if lane is None:
+                continue
+
+            self._insert('{}.{}'.format(inflow['name'], inflow['count']),
+                         type_id, edge, lane, VEHICLE_LENGTH, speed)
+            inflow['backlog'] -= 1
+            inflow['count'] += 1
+
+    def _depart_lane_and_speed(self, inflow):
+        """Compute the lane and speed of the next vehicle of an inflow.
+
+        Returns
+        -------
+        int or None
+            lane the vehicle is inserted on, or None if no lane has enough
+            space for the vehicle
+        float
+            speed the vehicle is inserted with
+        """
+        state = self.state
+        code = state.edge_code(inflow['edge'])
+        num_lanes = self._edge_lanes[code]
+        params = self.type_parameters[inflow['vtype']]
+        controller_params = \
+            params['car_following_params'].controller_params
+        min_gap = self.min_gap[inflow['vtype']]
+        decel = abs(controller_params['decel'])
+        tau = controller_params['tau']
+
+        # the speed of the vehicle
+        max_speed = min(controller_params['maxSpeed'],
+                        self._edge_speed[code])
+        depart_speed = inflow.get('departSpeed', 0)
+        if depart_speed == 'max':
+            speed = max_speed
+        elif depart_speed == 'random':
+            speed = self.rng.uniform(0, max_speed)
+        else:
+            try:
+                speed = float(depart_speed)
+            except ValueError:
+                speed = 0
+
+        # the gap to, and speed of, the last vehicle on every lane of the edge
+        rows = state.active_rows()
+        rows = rows[state.edge[rows] == code]
+        gaps = np.full(num_lanes, np.inf)
+        lead_speeds = np.zeros(num_lanes)
+        for lane in range(num_lanes):
+            lane_rows = rows[state.lane[rows] == lane]
+            if len(lane_rows) > 0:
+                last = lane_rows[np.argmin(state.position[lane_rows])]
+                gaps[lane] = state.position[last] - state.length[last] - \
+                    VEHICLE_LENGTH
+                lead_speeds[lane] = state.speed[last]
+
+        # vehicles are inserted if they can stop behind the last vehicle
+        safe_speeds = -decel * tau + np.sqrt(
+            (decel * tau) ** 2 + lead_speeds ** 2 +
+            2 * decel * np.maximum(gaps - min_gap, 0))
+        free = (gaps >= min_gap) & (safe_speeds >= speed)
+
+        depart_lane = inflow.get('departLane', 0)
+        if depart_lane == 'random':
+            lane = self.rng.randint(num_lanes)
+        elif depart_lane in ('free', 'best', 'allowed'):
+            lane = int(np.argmax(gaps))
+        else:
+            try:
+                lane = min(int(depart_lane), num_lanes - 1)
+            except ValueError:
+                lane = 0
+
+        return (lane if free[lane] else None), speed
+
+    def _update_neighbors(self):
+        """Compute the leaders, followers, and headways of all vehicles."""
+        state = self.state
+        self.lane_data.update(self.scenario, state)
+
+        rows = state.active_rows()
+        index = self.lane_data.index_of[rows]
+        lane = state.lane[rows]
+        leader = self.lane_data.leaders[lane, index]
+        headway = self.lane_data.headways[lane, index]
+
+        # vehicles alone in a closed loop are not their own leaders
+        alone = leader == rows
+        leader[alone] = -1
+        headway[alone] = DEFAULT_HEADWAY
+
+        self.collided = bool(np.any(headway[leader >= 0] < 0))
+
+        self._merge_leaders(rows, leader, headway)
+
+        state.leader[rows] = leader
+        state.headway[rows] = headway
+        state.follower[rows] = -1
+        state.follower[leader[leader >= 0]] = rows[leader >= 0]
+
+    def _merge_leaders(self, rows, leader, headway):
+        """Assign leaders to vehicles approaching merges.
+
+        Vehicles on lanes that lead onto the same lane are ordered by their
+        distance to the end of their edge, as if they were already on the same
+        lane (zipper merge). A vehicle closer to the merge becomes the leader
+        of the vehicle behind it if it is closer than its current leader. The
+        leaders and headways are modified in place.
+        """
+        state = self.state
+        edge = state.edge[rows]
+        slot = edge * self._max_lanes + state.lane[rows]
+        for merge in self._merges:
+            index = np.flatnonzero(np.isin(slot, merge))
+            if len(index) < 2:
+                continue
+
+            dist = self._edge_length[edge[index]] - state.position[rows[index]]
+            order = np.argsort(dist, kind='mergesort')
+            index, dist = index[order], dist[order]
+            gap = dist[1:] - dist[:-1] - state.length[rows[index[:-1]]]
+
+            closer = gap < headway[index[1:]]
+            headway[index[1:][closer]] = gap[closer]
+            leader[index[1:][closer]] = rows[index[:-1][closer]]
+
+    def _update_orientations(self):
+        """Compute the coordinates and angles of all vehicles.
+
+        The angles are measured in degrees clockwise from north, as in sumo.
+        """
+        state = self.state
+        rows = state.active_rows()
+        edges = state.edge[rows]
+        for code in np.unique(edges):
+            edge_rows = rows[edges == code]
+            shape, dist = self.scenario.get_shape(state.edge_names[code])
+
+            # position along the shape of the edge
+            scale = dist[-1] / self._edge_length[code]
+            d = np.clip(state.position[edge_rows] * scale, 0, dist[-1])
+
+            seg = np.clip(np.searchsorted(dist, d, side='right') - 1,
+                          0, len(dist) - 2)
+            delta = np.diff(shape, axis=0)[seg]
+            state.x[edge_rows] = np.interp(d, dist, shape[:, 0])
+            state.y[edge_rows] = np.interp(d, dist, shape[:, 1])
+            state.angle[edge_rows] = \
+                np.degrees(np.arctan2(delta[:, 0], delta[:, 1])) % 360
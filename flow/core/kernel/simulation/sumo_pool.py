@@ -0,0 +1,275 @@
+"""Script containing utilities to start sumo instances ahead of time."""
+
+import flow.config as config
+import traci
+import sumolib
+import atexit
+import logging
+import os
+import random
+import signal
+import subprocess
+import threading
+import time
+
+# maximum time to wait for a sumo instance to accept connections (in sec)
+LISTEN_TIMEOUT = 30
+
+# time between two checks of whether sumo accepts connections (in sec)
+LISTEN_POLL_INTERVAL = 0.01
+
+# tables of the tcp sockets of the system, with the state of every socket
+PROC_NET_TCP = ["/proc/net/tcp", "/proc/net/tcp6"]
+
+# state of listening sockets in the tables above
+TCP_LISTEN = "0A"
+
+
+def wait_for_port(port, proc):
+    """Wait until a process listens on a port.
+
+    The tcp socket tables of the system are polled, so that no connection that
+    could be mistaken for a client of the process is opened. On systems
+    without these tables, this method sleeps for config.SUMO_SLEEP seconds.
+
+    Parameters
+    ----------
+    port : int
+        port the process is expected to listen on
+    proc : subprocess.Popen
+        the process
+
+    Raises
+    ------
+    RuntimeError
+        if the process terminated before listening on the port
+    """
+    if not os.path.exists(PROC_NET_TCP[0]):
+        time.sleep(config.SUMO_SLEEP)
+        return
+
+    local_port = ":{:04X}".format(port)
+    deadline = time.time() + LISTEN_TIMEOUT
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("Sumo terminated with return code {}.".format(
+                proc.returncode))
+
+        for path in PROC_NET_TCP:
+            try:
+                with open(path) as f:
+                    lines = f.readlines()[1:]
+            except IOError:
+                continue
+            for line in lines:
+                fields = line.split()
+                if fields[1].endswith(local_port) and fields[3] == TCP_LISTEN:
+                    return
+
+        time.sleep(LISTEN_POLL_INTERVAL)
+
+    # let traci's own retries take over if the port was never seen
+    logging.warning(" Sumo is not listening on port {} after {} seconds."
+                    .format(port, LISTEN_TIMEOUT))
+
+
+def start_sumo(sumo_call, port):
+    """Start a sumo instance and connect to it with traci.
+
+    The connection is set to be the first client of the instance, and the
+    simulation is advanced by one step, as expected by the simulation kernel.
+
+    Parameters
+    ----------
+    sumo_call : list of str
+        command used to start sumo, without the "--remote-port" option
+    port : int
+        port the sumo instance is run on
+
+    Returns
+    -------
+    subprocess.Popen
+        the sumo process
+    traci.connection.Connection
+        the traci connection to the sumo process
+    """
+    proc = subprocess.Popen(
+        sumo_call + ["--remote-port", str(port)], preexec_fn=os.setsid)
+
+    try:
+        wait_for_port(port, proc)
+        traci_connection = traci.connect(port, numRetries=100)
+        traci_connection.setOrder(0)
+        traci_connection.simulationStep()
+    except Exception:
+        kill_sumo(proc)
+        raise
+
+    return proc, traci_connection
+
+
+def kill_sumo(proc):
+    """Kill a sumo process, as well as the processes it started."""
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except Exception as e:
+        print("Error during teardown: {}".format(e))
+
+
+class SumoProcessPool(object):
+    """A pool of sumo instances that are started ahead of time.
+
+    Every instance is started with the same command, on its own port, and is
+    connected to once it is ready. Whenever an instance is taken from the
+    pool, a new instance is started in a background thread, so that the next
+    instance is usually ready by the time it is needed.
+
+    Instances started ahead of time are given the seeds of a sequence drawn
+    from a random number generator seeded with the seed of the pool. The seeds
+    are drawn in the calling thread, and the seed of the next instance is
+    exposed by ``next_seed``, so that seeded experiments remain reproducible.
+    Instances are only handed out if they were started with the requested
+    seed.
+    """
+
+    def __init__(self, sumo_call, size=1, seed=None):
+        """Instantiate the pool.
+
+        No instances are started until the first instance is requested.
+
+        Parameters
+        ----------
+        sumo_call : list of str
+            command used to start sumo, without the "--remote-port" and
+            "--seed" options
+        size : int, optional
+            number of instances kept ready
+        seed : int, optional
+            seed of the sequence of seeds of the instances. If not specified,
+            it is drawn from the global random number generator.
+        """
+        self.sumo_call = sumo_call
+        self.size = size
+
+        if seed is None:
+            seed = random.randint(0, 1e5)
+        self._seeds = random.Random(seed)
+
+        # instances that are ready to be used, as (process, connection, port,
+        # seed)
+        self._ready = []
+        # seeds of the instances that are ready or being started, in the order
+        # in which they are handed out
+        self._queued_seeds = []
+        # thread starting new instances, if any
+        self._thread = None
+
+        atexit.register(self.close)
+
+    def get(self, seed=None):
+        """Take a ready sumo instance from the pool.
+
+        Ready instances that were started with another seed than the
+        requested one are terminated. If no instance is ready, a new instance
+        is started with the requested seed. In both cases, the pool is then
+        refilled in the background.
+
+        Parameters
+        ----------
+        seed : int, optional
+            seed of the instance. If not specified, any ready instance is used.
+
+        Returns
+        -------
+        subprocess.Popen
+            the sumo process
+        traci.connection.Connection
+            the traci connection to the sumo process
+        int
+            the port the sumo instance is run on
+        """
+        self.wait()
+
+        instance = None
+        while len(self._ready) > 0 and instance is None:
+            proc, traci_connection, port, ready_seed = self._ready.pop(0)
+            if proc.poll() is not None:
+                logging.warning(" Discarding terminated sumo instance.")
+            elif seed is not None and ready_seed != seed:
+                logging.warning(" Discarding sumo instance started with seed "
+                                "{} instead of {}.".format(ready_seed, seed))
+                self._terminate(proc, traci_connection)
+            else:
+                instance = proc, traci_connection, port
+        self._queued_seeds = [ready[3] for ready in self._ready]
+
+        if instance is None:
+            port = sumolib.miscutils.getFreeSocketPort()
+            proc, traci_connection = start_sumo(
+                self._seeded_call(seed), port)
+            instance = proc, traci_connection, port
+
+        # the seeds of the new instances are drawn in the calling thread
+        seeds = [self._seeds.randint(0, 1e5)
+                 for _ in range(self.size - len(self._ready))]
+        self._queued_seeds.extend(seeds)
+
+        self._thread = threading.Thread(target=self._fill, args=(seeds,))
+        self._thread.daemon = True
+        self._thread.start()
+
+        return instance
+
+    def next_seed(self):
+        """Return the seed of the next instance handed out by the pool.
+
+        Returns
+        -------
+        int or None
+            seed of the next ready instance, or None if no instance is ready
+            or being started
+        """
+        if len(self._queued_seeds) == 0:
+            return None
+        return self._queued_seeds[0]
+
+    def close(self):
+        """Terminate all ready instances."""
+        self.wait()
+        for proc, traci_connection, _, _ in self._ready:
+            self._terminate(proc, traci_connection)
+        self._ready = []
+        self._queued_seeds = []
+
+    @staticmethod
+    def _terminate(proc, traci_connection):
+        """Close the connection to an instance, and kill its process."""
+        try:
+            traci_connection.close()
+        except Exception:
+            pass
+        kill_sumo(proc)
+
+    def _seeded_call(self, seed):
+        """Return the command used to start sumo with a given seed."""
+        if seed is None:
+            return list(self.sumo_call)
+        return self.sumo_call + ["--seed", str(seed)]
+
+    def _fill(self, seeds):
+        """Start instances with the specified seeds."""
+        for seed in seeds:
+            port = sumolib.miscutils.getFreeSocketPort()
+            try:
+                proc, traci_connection = start_sumo(
+                    self._seeded_call(seed), port)
+            except Exception as e:
+                logging.warning(" Could not prewarm sumo: {}".format(e))
+                return
+            self._ready.append((proc, traci_connection, port, seed))
+
+    def wait(self):
+        """Wait for the instances being started to be ready."""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
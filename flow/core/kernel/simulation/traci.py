@@ -1,16 +1,19 @@
 """Script containing the TraCI simulation kernel class."""
 
 from flow.core.kernel.simulation import KernelSimulation
+from flow.core.kernel.simulation.sumo_pool import SumoProcessPool, \
+    start_sumo
+from flow.core.kernel.simulation.command_buffer import TraCICommandBuffer
+from flow.core.kernel.simulation.libsumo_api import LibsumoConnection
 from flow.core.util import ensure_dir
-import flow.config as config
 import traci.constants as tc
-import traci
+import atexit
 import traceback
 import os
-import time
 import logging
-import subprocess
+import shutil
 import signal
+import tempfile
 
 
 # Number of retries on restarting SUMO before giving up
@@ -35,6 +38,14 @@ class TraCISimulation(KernelSimulation):
         KernelSimulation.__init__(self, master_kernel)
         # contains the subprocess.Popen instance used to start traci
         self.sumo_proc = None
+        # pool of sumo instances started ahead of time, used when the
+        # simulation is restarted upon every reset
+        self.sumo_pool = None
+        # directory containing the files of the saved simulation states
+        self.state_dir = None
+        # set-commands issued during a step, sent together before the next
+        # simulation step
+        self.command_buffer = None
 
     def pass_api(self, kernel_api):
         """See parent class.
@@ -42,7 +53,11 @@ class TraCISimulation(KernelSimulation):
         Also initializes subscriptions.
         """
         KernelSimulation.pass_api(self, kernel_api)
+        self.command_buffer = TraCICommandBuffer(kernel_api)
+        self._subscribe()
 
+    def _subscribe(self):
+        """Subscribe to the simulation parameters needed by the kernels."""
         # subscribe some simulation parameters needed to check for entering,
         # exiting, and colliding vehicles
         self.kernel_api.simulation.subscribe([
@@ -52,7 +67,11 @@ class TraCISimulation(KernelSimulation):
         ])
 
     def simulation_step(self):
-        """See parent class."""
+        """See parent class.
+
+        The set-commands queued in the command buffer are sent beforehand.
+        """
+        self.command_buffer.flush()
         self.kernel_api.simulationStep()
 
     def update(self, reset):
@@ -60,8 +79,42 @@ class TraCISimulation(KernelSimulation):
         pass
 
     def close(self):
-        """See parent class."""
+        """See parent class.
+
+        Instances started ahead of time are kept, as the simulation may be
+        restarted. They are killed by stop_prewarmed_instances.
+        """
         self.kernel_api.close()
+        if self.sumo_pool is not None:
+            self.sumo_pool.wait()
+
+    def save_state(self):
+        """See parent class.
+
+        The state of sumo is saved to a file, whose path is returned. The
+        files are deleted when the python process exits.
+        """
+        if self.state_dir is None:
+            self.state_dir = tempfile.mkdtemp(prefix='flow_state_')
+            atexit.register(shutil.rmtree, self.state_dir, True)
+
+        fd, path = tempfile.mkstemp(suffix='.xml', dir=self.state_dir)
+        os.close(fd)
+        self.command_buffer.flush()
+        self.kernel_api.simulation.saveState(path)
+
+        return path
+
+    def load_state(self, state):
+        """See parent class.
+
+        Commands queued for the current state are discarded. Subscriptions
+        to simulation parameters are renewed, as sumo may drop them when
+        loading a state.
+        """
+        self.command_buffer.clear()
+        self.kernel_api.simulation.loadState(state)
+        self._subscribe()
 
     def check_collision(self):
         """See parent class."""
@@ -73,96 +126,148 @@ class TraCISimulation(KernelSimulation):
         This method uses the configuration files created by the scenario class
         to initialize a sumo instance. Also initializes a traci connection to
         interface with sumo from Python.
+
+        If the simulation is restarted upon every reset, instances are taken
+        from a pool of instances started ahead of time (see the
+        prewarm_instances attribute of SumoParams).
+
+        If the use_libsumo attribute of SumoParams is set to True, sumo is
+        instead run within the current process through libsumo, see
+        LibsumoConnection.
         """
+        use_libsumo = getattr(sim_params, "use_libsumo", False)
+        if use_libsumo and (sim_params.render is True
+                            or sim_params.num_clients > 1):
+            raise ValueError("libsumo cannot be used with the sumo gui or "
+                             "multiple clients.")
+
+        sumo_binary = "sumo-gui" if sim_params.render is True else "sumo"
+
+        # command used to start sumo, without the port and seed, which are
+        # specific to every instance
+        sumo_call = [
+            sumo_binary, "-c", scenario.cfg,
+            "--num-clients", str(sim_params.num_clients),
+            "--step-length", str(sim_params.sim_step)
+        ]
+
+        # add step logs (if requested)
+        if sim_params.no_step_log:
+            sumo_call.append("--no-step-log")
+
+        # add the lateral resolution of the sublanes (if requested)
+        if sim_params.lateral_resolution is not None:
+            sumo_call.append("--lateral-resolution")
+            sumo_call.append(str(sim_params.lateral_resolution))
+
+        # add the emission path to the sumo command (if requested and if the
+        # trajectories are not recorded by the flow kernel instead)
+        if sim_params.emission_path is not None \
+                and not getattr(sim_params, "record_trajectories", False):
+            ensure_dir(sim_params.emission_path)
+            emission_out = sim_params.emission_path + \
+                "{0}-emission.xml".format(scenario.name)
+            sumo_call.append("--emission-output")
+            sumo_call.append(emission_out)
+        else:
+            emission_out = None
+
+        if sim_params.overtake_right:
+            sumo_call.append("--lanechange.overtake-right")
+            sumo_call.append("true")
+
+        if not sim_params.print_warnings:
+            sumo_call.append("--no-warnings")
+            sumo_call.append("true")
+
+        # set the time it takes for a gridlock teleport to occur
+        sumo_call.append("--time-to-teleport")
+        sumo_call.append(str(int(sim_params.teleport_time)))
+
+        # check collisions at intersections
+        sumo_call.append("--collision.check-junctions")
+        sumo_call.append("true")
+
+        logging.debug(" Cfg file: " + str(scenario.cfg))
+        if sim_params.num_clients > 1:
+            logging.info(" Num clients are" + str(sim_params.num_clients))
+        logging.debug(" Emission file: " + str(emission_out))
+        logging.debug(" Step length: " + str(sim_params.sim_step))
+
+        if use_libsumo:
+            self.stop_prewarmed_instances()
+            self.sumo_proc = None
+            if sim_params.seed is not None:
+                sumo_call.append("--seed")
+                sumo_call.append(str(sim_params.seed))
+            logging.info(" Starting SUMO in-process with libsumo")
+            return LibsumoConnection(sumo_call)
+
+        # instances are only started ahead of time if they are not expected
+        # to be started with other options or be visible to the user
+        use_pool = sim_params.restart_instance \
+            and getattr(sim_params, "prewarm_instances", 0) > 0 \
+            and sim_params.render is not True \
+            and emission_out is None \
+            and sim_params.num_clients == 1
+
+        if not use_pool:
+            self.stop_prewarmed_instances()
+        elif self.sumo_pool is None or self.sumo_pool.sumo_call != sumo_call:
+            self.stop_prewarmed_instances()
+            self.sumo_pool = SumoProcessPool(
+                sumo_call, size=sim_params.prewarm_instances,
+                seed=sim_params.seed)
+
         error = None
         for _ in range(RETRIES_ON_ERROR):
             try:
-                # port number the sumo instance will be run on
-                port = sim_params.port
-
-                sumo_binary = "sumo-gui" if sim_params.render is True \
-                    else "sumo"
-
-                # command used to start sumo
-                sumo_call = [
-                    sumo_binary, "-c", scenario.cfg,
-                    "--remote-port", str(sim_params.port),
-                    "--num-clients", str(sim_params.num_clients),
-                    "--step-length", str(sim_params.sim_step)
-                ]
-
-                # add step logs (if requested)
-                if sim_params.no_step_log:
-                    sumo_call.append("--no-step-log")
-
-                # add the lateral resolution of the sublanes (if requested)
-                if sim_params.lateral_resolution is not None:
-                    sumo_call.append("--lateral-resolution")
-                    sumo_call.append(str(sim_params.lateral_resolution))
-
-                # add the emission path to the sumo command (if requested)
-                if sim_params.emission_path is not None:
-                    ensure_dir(sim_params.emission_path)
-                    emission_out = sim_params.emission_path + \
-                        "{0}-emission.xml".format(scenario.name)
-                    sumo_call.append("--emission-output")
-                    sumo_call.append(emission_out)
-                else:
-                    emission_out = None
-
-                if sim_params.overtake_right:
-                    sumo_call.append("--lanechange.overtake-right")
-                    sumo_call.append("true")
+                if use_pool:
+                    self.sumo_proc, traci_connection, sim_params.port = \
+                        self.sumo_pool.get(seed=sim_params.seed)
+                    logging.info(" Using SUMO on port " + str(sim_params.port))
+                    return traci_connection
 
                 # specify a simulation seed (if requested)
+                call = list(sumo_call)
                 if sim_params.seed is not None:
-                    sumo_call.append("--seed")
-                    sumo_call.append(str(sim_params.seed))
-
-                if not sim_params.print_warnings:
-                    sumo_call.append("--no-warnings")
-                    sumo_call.append("true")
-
-                # set the time it takes for a gridlock teleport to occur
-                sumo_call.append("--time-to-teleport")
-                sumo_call.append(str(int(sim_params.teleport_time)))
-
-                # check collisions at intersections
-                sumo_call.append("--collision.check-junctions")
-                sumo_call.append("true")
+                    call.append("--seed")
+                    call.append(str(sim_params.seed))
 
-                logging.info(" Starting SUMO on port " + str(port))
-                logging.debug(" Cfg file: " + str(scenario.cfg))
-                if sim_params.num_clients > 1:
-                    logging.info(" Num clients are" +
-                                 str(sim_params.num_clients))
-                logging.debug(" Emission file: " + str(emission_out))
-                logging.debug(" Step length: " + str(sim_params.sim_step))
+                logging.info(" Starting SUMO on port " + str(sim_params.port))
 
                 # Opening the I/O thread to SUMO
-                self.sumo_proc = subprocess.Popen(
-                    sumo_call, preexec_fn=os.setsid)
-
-                # wait a small period of time for the subprocess to activate
-                # before trying to connect with traci
-                if os.environ.get("TEST_FLAG", 0):
-                    time.sleep(0.1)
-                else:
-                    time.sleep(config.SUMO_SLEEP)
-
-                traci_connection = traci.connect(port, numRetries=100)
-                traci_connection.setOrder(0)
-                traci_connection.simulationStep()
+                self.sumo_proc, traci_connection = start_sumo(
+                    call, sim_params.port)
 
                 return traci_connection
             except Exception as e:
                 print("Error during start: {}".format(traceback.format_exc()))
                 error = e
-                self.teardown_sumo()
+                if self.sumo_proc is not None:
+                    self.teardown_sumo()
         raise error
 
+    def next_seed(self):
+        """See parent class.
+
+        If instances are started ahead of time, this is the seed of the next
+        instance of the pool.
+        """
+        if self.sumo_pool is None:
+            return None
+        return self.sumo_pool.next_seed()
+
+    def stop_prewarmed_instances(self):
+        """Kill the sumo instances that were started ahead of time, if any."""
+        if self.sumo_pool is not None:
+            self.sumo_pool.close()
+            self.sumo_pool = None
+
     def teardown_sumo(self):
-        """Kill the sumo subprocess instance."""
+        """Kill the sumo subprocess instance, if any."""
+        if self.sumo_proc is None:
+            return
         try:
             os.killpg(self.sumo_proc.pid, signal.SIGTERM)
         except Exception as e:
@@ -1,7 +1,8 @@
 from flow.core.kernel.traffic_light.base import KernelTrafficLight
 from flow.core.kernel.traffic_light.traci import TraCITrafficLight
 from flow.core.kernel.traffic_light.aimsun import AimsunKernelTrafficLight
+from flow.core.kernel.traffic_light.numpy_sim import NumpyTrafficLight
 
 
 __all__ = ["KernelTrafficLight", "TraCITrafficLight",
-           "AimsunKernelTrafficLight"]
+           "AimsunKernelTrafficLight", "NumpyTrafficLight"]
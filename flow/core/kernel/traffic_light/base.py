@@ -1,5 +1,7 @@
 """Script containing the base traffic light kernel class."""
 
+from copy import deepcopy
+
 
 class KernelTrafficLight(object):
     """Base traffic light kernel.
@@ -50,6 +52,32 @@ class KernelTrafficLight(object):
         """
         self.kernel_api = kernel_api
 
+    def save_state(self):
+        """Capture the current state of the traffic light kernel.
+
+        By default, all attributes of the kernel except for the references to
+        the master kernel and the kernel api are copied.
+
+        Returns
+        -------
+        dict
+            a snapshot of the kernel, which may be passed to ``load_state``
+        """
+        return deepcopy({key: value for key, value in self.__dict__.items()
+                         if key not in ('master_kernel', 'kernel_api')})
+
+    def load_state(self, state):
+        """Restore the traffic light kernel to a snapshot from ``save_state``.
+
+        The snapshot is copied, so that it may be restored several times.
+
+        Parameters
+        ----------
+        state : dict
+            a snapshot of the kernel
+        """
+        self.__dict__.update(deepcopy(state))
+
     def update(self, reset):
         """Update the states and phases of the traffic lights.
 
@@ -0,0 +1,78 @@
+"""Script containing the traffic light kernel class of the numpy simulator."""
+
+from flow.core.kernel.traffic_light import KernelTrafficLight
+
+
+class NumpyTrafficLight(KernelTrafficLight):
+    """Traffic light kernel for the built-in numpy simulator.
+
+    The states of the traffic lights are stored, so that they can be set and
+    read by environments, but they are not enforced on the vehicles: the
+    numpy simulator does not model junctions.
+    """
+
+    def __init__(self, master_kernel):
+        """Instantiate the numpy traffic light kernel.
+
+        Parameters
+        ----------
+        master_kernel : flow.core.kernel.Kernel
+            the higher level kernel (used to call methods from other
+            sub-kernels)
+        """
+        KernelTrafficLight.__init__(self, master_kernel)
+
+        self.__tls = dict()  # current state of every traffic light
+
+        # names of nodes with traffic lights
+        self.__ids = []
+
+        # number of traffic light nodes
+        self.num_traffic_lights = 0
+
+    def pass_api(self, kernel_api):
+        """See parent class.
+
+        The traffic lights and their initial states are collected from the
+        traffic light parameters of the scenario here.
+        """
+        KernelTrafficLight.pass_api(self, kernel_api)
+
+        properties = kernel_api.scenario.network.traffic_lights \
+            .get_properties()
+
+        # names of nodes with traffic lights
+        self.__ids = list(properties.keys())
+
+        # number of traffic light nodes
+        self.num_traffic_lights = len(self.__ids)
+
+        # the initial state of every traffic light is the state of its first
+        # phase, if phases were specified
+        self.__tls = dict()
+        for node_id in self.__ids:
+            phases = properties[node_id].get("phases", [])
+            self.__tls[node_id] = phases[0]["state"] if len(phases) else ""
+
+    def update(self, reset):
+        """See parent class."""
+        pass
+
+    def get_ids(self):
+        """See parent class."""
+        return self.__ids
+
+    def set_state(self, node_id, state, link_index="all"):
+        """See parent class."""
+        if link_index == "all":
+            # if lights on all lanes are changed
+            self.__tls[node_id] = state
+        else:
+            # if lights on a single lane is changed
+            tls = list(self.__tls[node_id])
+            tls[link_index] = state
+            self.__tls[node_id] = "".join(tls)
+
+    def get_state(self, node_id):
+        """See parent class."""
+        return self.__tls[node_id]
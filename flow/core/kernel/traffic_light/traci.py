@@ -58,15 +58,22 @@ class TraCITrafficLight(KernelTrafficLight):
         return self.__ids
 
     def set_state(self, node_id, state, link_index="all"):
-        """See parent class."""
+        """See parent class.
+
+        The commands are queued in the command buffer, and sent to sumo
+        before the next simulation step.
+        """
+        commands = self.master_kernel.simulation.command_buffer
         if link_index == "all":
             # if lights on all lanes are changed
-            self.kernel_api.trafficlight.setRedYellowGreenState(
-                tlsID=node_id, state=state)
+            commands.add((node_id, 'setRedYellowGreenState'),
+                         self.kernel_api.trafficlight.setRedYellowGreenState,
+                         node_id, state)
         else:
             # if lights on a single lane is changed
-            self.kernel_api.trafficlight.setLinkState(
-                tlsID=node_id, tlsLinkIndex=link_index, state=state)
+            commands.add((node_id, 'setLinkState', link_index),
+                         self.kernel_api.trafficlight.setLinkState,
+                         node_id, link_index, state)
 
     def get_state(self, node_id):
         """See parent class."""
@@ -1,6 +1,9 @@
 from flow.core.kernel.vehicle.base import KernelVehicle
+from flow.core.kernel.vehicle.columnar_kernel import ColumnarKernelVehicle
 from flow.core.kernel.vehicle.traci import TraCIVehicle
 from flow.core.kernel.vehicle.aimsun import AimsunKernelVehicle
+from flow.core.kernel.vehicle.numpy_sim import NumpyVehicle
 
 
-__all__ = ['KernelVehicle', 'TraCIVehicle', 'AimsunKernelVehicle']
+__all__ = ['KernelVehicle', 'ColumnarKernelVehicle', 'TraCIVehicle',
+           'AimsunKernelVehicle', 'NumpyVehicle']
@@ -1,5 +1,6 @@
 """Script containing the base vehicle kernel class."""
 from flow.core.kernel.vehicle.base import KernelVehicle
+from flow.core.kernel.vehicle.counters import TrafficCounters
 import collections
 import numpy as np
 from copy import deepcopy
@@ -48,13 +49,9 @@ class AimsunKernelVehicle(KernelVehicle):
         # list of vehicle ids located in each edge in the network
         self._ids_by_edge = dict()
 
-        # number of vehicles that entered the network for every time-step
-        self._num_departed = []
-        self._departed_ids = []
-
-        # number of vehicles to exit the network for every time-step
-        self._num_arrived = []
-        self._arrived_ids = []
+        # rolling counters of the vehicles that entered and exited the network
+        # over the last time-steps
+        self._counters = TrafficCounters(self.sim_step)
 
         # contains conversion from Flow-ID to Aimsun-ID
         self._id_aimsun2flow = {}
@@ -115,14 +112,27 @@ class AimsunKernelVehicle(KernelVehicle):
         for aimsun_id in added_vehicles:
             self._add_departed(aimsun_id)
 
-        # remove the exited vehicles
-        if not reset:
+        if reset:
+            self._counters.clear()
+        else:
+            # update the counters of departed and arrived vehicles
+            self._counters.append(
+                [self._id_aimsun2flow[aimsun_id]
+                 for aimsun_id in added_vehicles],
+                [self._id_aimsun2flow.get(aimsun_id, aimsun_id)
+                 for aimsun_id in exited_vehicles])
+
+            # remove the exited vehicles
             for veh_id in exited_vehicles:
                 self.remove(veh_id)
 
-        for veh_id in self.__ids:
-            aimsun_id = self._id_flow2aimsun[veh_id]
+        # collect the tracking information, leader, and next section of all
+        # vehicles in a single round trip with the server
+        bulk_info = self.kernel_api.get_bulk_tracking_info(
+            [self._id_flow2aimsun[veh_id] for veh_id in self.__ids])
 
+        for veh_id, (tracking_info, lead_id, next_section) in \
+                zip(self.__ids, bulk_info):
             # update the vehicle's tracking information
             (self.__vehicles[veh_id]['tracking_info'].CurrentPos,
              self.__vehicles[veh_id]['tracking_info'].distance2End,
@@ -145,10 +155,9 @@ class AimsunKernelVehicle(KernelVehicle):
              self.__vehicles[veh_id]['tracking_info'].idLaneFrom,
              self.__vehicles[veh_id]['tracking_info'].idSectionTo,
              self.__vehicles[veh_id]['tracking_info'].idLaneTo) = \
-                self.kernel_api.get_vehicle_tracking_info(aimsun_id)
+                tracking_info
 
             # get the leader, follower, and headway for each vehicle
-            lead_id = self.kernel_api.get_vehicle_leader(aimsun_id)
             if lead_id < -1:
                 self.__vehicles[veh_id]['leader'] = None
                 self.__vehicles[veh_id]['headway'] = 1000
@@ -158,8 +167,6 @@ class AimsunKernelVehicle(KernelVehicle):
                 self.__vehicles[lead_id]['follower'] = veh_id
                 # FIXME
                 inf_veh = self.__vehicles[veh_id]['tracking_info']
-                next_section = self.kernel_api.get_next_section(
-                    aimsun_id, inf_veh.idSection)
                 inf_veh_leader = self.__vehicles[lead_id]['tracking_info']
                 static_inf_leader = self.__vehicles[lead_id]['static_info']
 
@@ -176,6 +183,28 @@ class AimsunKernelVehicle(KernelVehicle):
 
                 self.__vehicles[veh_id]['headway'] = gap
 
+        # update the aggregates of the virtual detectors
+        self._update_detectors()
+
+    def _update_detectors(self):
+        """Update the virtual detectors from the tracking info of vehicles.
+
+        The vehicles are indexed by their position in the list of all ids.
+        """
+        if len(self.detectors) == 0:
+            return
+
+        veh_ids = self.__ids
+        edges = np.array(self.get_edge(veh_ids), dtype=object)
+        self.detectors.update(
+            lambda edge: np.flatnonzero(edges == edge),
+            lane=np.array(self.get_lane(veh_ids), dtype=np.int64),
+            position=np.array(self.get_position(veh_ids), dtype=float),
+            speed=np.array(self.get_speed(veh_ids), dtype=float),
+            length=np.array(self.get_length(veh_ids), dtype=float),
+            is_rl=np.array([veh_id in self.__rl_ids for veh_id in veh_ids],
+                           dtype=bool))
+
     def _add_departed(self, aimsun_id):
         """See parent class."""
         # get vehicle information from API
@@ -303,12 +332,18 @@ class AimsunKernelVehicle(KernelVehicle):
 
     def apply_acceleration(self, veh_ids, acc):
         """See parent class."""
+        aimsun_ids = []
+        speeds = []
         for i, veh_id in enumerate(veh_ids):
             if acc[i] is not None:
                 this_vel = self.get_speed(veh_id)
                 next_vel = max(this_vel + acc[i] * self.sim_step, 0)
-                aimsun_id = self._id_flow2aimsun[veh_id]
-                self.kernel_api.set_speed(aimsun_id, next_vel)
+                aimsun_ids.append(self._id_flow2aimsun[veh_id])
+                speeds.append(next_vel)
+
+        # set the speeds of all vehicles in a single round trip
+        if len(aimsun_ids) > 0:
+            self.kernel_api.set_bulk_speed(aimsun_ids, speeds)
 
     def apply_lane_change(self, veh_ids, direction):
         """Apply an instantaneous lane-change to a set of vehicles.
@@ -443,29 +478,54 @@ class AimsunKernelVehicle(KernelVehicle):
     def get_ids_by_edge(self, edges):
         """See parent class."""
         if isinstance(edges, (list, np.ndarray)):
-            return sum([self.get_ids_by_edge(edge) for edge in edges], [])
+            ids_by_edge = collections.defaultdict(list)
+            for veh_id in self.__ids:
+                ids_by_edge[self.get_edge(veh_id)].append(veh_id)
+            return [veh_id for edge in edges for veh_id in ids_by_edge[edge]]
         return [veh for veh in self.__ids if self.get_edge(veh) == edges]
 
+    def get_k_closest_to_edge_end(self, edge, k):
+        """See parent class."""
+        veh_ids = self.get_ids_by_edge(edge)
+        order = np.argsort(self.get_position(veh_ids), kind='mergesort')
+        return np.array(veh_ids, dtype=object)[order[::-1][:k]]
+
+    def get_ids_in_segment(self, edge, start=0, end=float('inf'), lane=None):
+        """See parent class."""
+        veh_ids = [veh_id for veh_id in self.get_ids_by_edge(edge)
+                   if lane is None or self.get_lane(veh_id) == lane]
+        pos = np.array(self.get_position(veh_ids), dtype=float)
+        order = np.argsort(pos, kind='mergesort')
+        order = order[(pos[order] >= start) & (pos[order] < end)]
+        return np.array(veh_ids, dtype=object)[order]
+
+    def get_ids_within(self, veh_id, distance):
+        """See parent class."""
+        pos = self.get_position(veh_id)
+        veh_ids = self.get_ids_in_segment(
+            self.get_edge(veh_id), pos - distance,
+            np.nextafter(pos + distance, np.inf))
+        return veh_ids[veh_ids != veh_id]
+
     def get_inflow_rate(self, time_span):
         """See parent class."""
-        if len(self._num_departed) == 0:
-            return 0
-        num_inflow = self._num_departed[-int(time_span / self.sim_step):]
-        return 3600 * sum(num_inflow) / (len(num_inflow) * self.sim_step)
+        return self._counters.inflow_rate(time_span)
 
     def get_outflow_rate(self, time_span):
         """See parent class."""
-        if len(self._num_arrived) == 0:
-            return 0
-        num_outflow = self._num_arrived[-int(time_span / self.sim_step):]
-        return 3600 * sum(num_outflow) / (len(num_outflow) * self.sim_step)
+        return self._counters.outflow_rate(time_span)
 
     def get_num_arrived(self):
         """See parent class."""
-        if len(self._num_arrived) > 0:
-            return self._num_arrived[-1]
-        else:
-            return 0
+        return self._counters.num_arrived
+
+    def get_arrived_ids(self):
+        """See parent class."""
+        return self._counters.arrived_ids
+
+    def get_departed_ids(self):
+        """See parent class."""
+        return self._counters.departed_ids
 
     def get_type(self, veh_id):
         """See parent class."""
@@ -597,6 +657,8 @@ class AimsunKernelVehicle(KernelVehicle):
 
     def get_last_lc(self, veh_id, error=-1001):
         """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_last_lc(veh, error) for veh in veh_id]
         return self.__vehicles[veh_id]["last_lc"]
 
     def get_acc_controller(self, veh_id, error=None):
@@ -613,6 +675,8 @@ class AimsunKernelVehicle(KernelVehicle):
 
     def get_x_by_id(self, veh_id):
         """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_x_by_id(veh) for veh in veh_id]
         return self.master_kernel.scenario.get_x(self.get_edge(veh_id),
                                                  self.get_position(veh_id))
 
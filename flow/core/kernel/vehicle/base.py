@@ -1,5 +1,11 @@
 """Script containing the base vehicle kernel class."""
 
+from copy import deepcopy
+
+import numpy as np
+
+from flow.core.kernel.vehicle.detectors import Detectors, SegmentGrid
+
 
 class KernelVehicle(object):
     """Flow vehicle kernel.
@@ -52,6 +58,10 @@ class KernelVehicle(object):
         self.kernel_api = None
         self.sim_step = sim_params.sim_step
 
+        # virtual detectors declared by the environment, updated at every
+        # step of the kernel (see add_detector)
+        self.detectors = Detectors()
+
     def pass_api(self, kernel_api):
         """Acquire the kernel api that was generated by the simulation kernel.
 
@@ -62,6 +72,32 @@ class KernelVehicle(object):
         """
         self.kernel_api = kernel_api
 
+    def save_state(self):
+        """Capture the current state of the vehicle kernel.
+
+        By default, all attributes of the kernel except for the references to
+        the master kernel and the kernel api are copied.
+
+        Returns
+        -------
+        dict
+            a snapshot of the kernel, which may be passed to ``load_state``
+        """
+        return deepcopy({key: value for key, value in self.__dict__.items()
+                         if key not in ('master_kernel', 'kernel_api')})
+
+    def load_state(self, state):
+        """Restore the vehicle kernel to a snapshot taken by ``save_state``.
+
+        The snapshot is copied, so that it may be restored several times.
+
+        Parameters
+        ----------
+        state : dict
+            a snapshot of the kernel
+        """
+        self.__dict__.update(deepcopy(state))
+
     ###########################################################################
     #               Methods for interacting with the simulator                #
     ###########################################################################
@@ -179,6 +215,78 @@ class KernelVehicle(object):
         """
         raise NotImplementedError
 
+    def add_detector(self, name, edge, start=0, end=None, num_segments=1,
+                     lanes=None, rl=None):
+        """Declare a virtual detector (or grid of detectors) on an edge.
+
+        The segment [start, end) of the edge is split into ``num_segments``
+        segments of equal length, and every segment is split into the lanes
+        covered by the detector. The number of vehicles, the mean speed, the
+        density, flow and occupancy of every cell of this grid are then
+        computed at every step of the kernel in a single vectorized pass over
+        the state of all vehicles, and are available from ``get_detector``.
+        A virtual loop detector is declared by covering a single lane with a
+        single segment.
+
+        Detectors persist until they are replaced by a detector with the same
+        name. Their aggregates are computed starting from the next update of
+        the kernel.
+
+        Parameters
+        ----------
+        name : str
+            name of the detector
+        edge : str
+            name of the edge covered by the detector
+        start : float, optional
+            position of the start of the first segment on the edge (in m)
+        end : float, optional
+            position of the end of the last segment on the edge (in m).
+            Defaults to the end of the edge, in which case the last segment
+            contains all vehicles beyond its start.
+        num_segments : int, optional
+            number of segments of the detector
+        lanes : int or list of int, optional
+            lane(s) covered by the detector. Defaults to all lanes of the edge
+        rl : bool, optional
+            specifies whether only RL vehicles (True) or only non-RL vehicles
+            (False) are detected. All vehicles are detected by default.
+
+        Returns
+        -------
+        flow.core.kernel.vehicle.detectors.SegmentGrid
+            the detector
+        """
+        scenario = self.master_kernel.scenario
+        extend = end is None
+        if extend:
+            end = scenario.edge_length(edge)
+        if lanes is None:
+            lanes = range(scenario.num_lanes(edge))
+        elif isinstance(lanes, int):
+            lanes = [lanes]
+
+        grid = SegmentGrid(name, edge,
+                           bounds=np.linspace(start, end, num_segments + 1),
+                           lanes=lanes, rl=rl, extend=extend)
+        self.detectors.add(grid)
+        return grid
+
+    def get_detector(self, name):
+        """Return a virtual detector declared with ``add_detector``.
+
+        The aggregates of the detector are stored in its ``count``,
+        ``total_speed``, ``mean_speed``, ``density``, ``flow`` and
+        ``occupancy`` attributes, as arrays of shape (number of segments,
+        number of lanes); see flow.core.kernel.vehicle.detectors.SegmentGrid.
+
+        Raises
+        ------
+        KeyError
+            if no detector with this name was declared
+        """
+        return self.detectors.get(name)
+
     ###########################################################################
     # Methods to visually distinguish vehicles by {RL, observed, unobserved}  #
     ###########################################################################
@@ -260,17 +368,85 @@ class KernelVehicle(object):
         """
         raise NotImplementedError
 
+    def get_k_closest_to_edge_end(self, edge, k):
+        """Return the names of the k vehicles closest to the end of an edge.
+
+        Parameters
+        ----------
+        edge : str
+            name of the edge
+        k : int
+            maximum number of vehicles to return
+
+        Returns
+        -------
+        numpy.ndarray
+            names of the vehicles, ordered from the vehicle closest to the end
+            of the edge to the farthest one
+        """
+        raise NotImplementedError
+
+    def get_ids_in_segment(self, edge, start=0, end=float('inf'), lane=None):
+        """Return the names of the vehicles in a segment of an edge.
+
+        Parameters
+        ----------
+        edge : str
+            name of the edge
+        start : float, optional
+            position of the start of the segment on the edge (included)
+        end : float, optional
+            position of the end of the segment on the edge (excluded)
+        lane : int, optional
+            lane of the segment. All lanes are covered if not specified.
+
+        Returns
+        -------
+        numpy.ndarray
+            names of the vehicles, ordered by position
+        """
+        raise NotImplementedError
+
+    def get_ids_within(self, veh_id, distance):
+        """Return the names of the vehicles close to a vehicle.
+
+        Only vehicles located on the edge of the vehicle, on any lane, are
+        returned.
+
+        Parameters
+        ----------
+        veh_id : str
+            name of the vehicle
+        distance : float
+            maximum distance between the positions of the vehicles (in m)
+
+        Returns
+        -------
+        numpy.ndarray
+            names of the vehicles (excluding the vehicle itself), ordered by
+            position
+        """
+        raise NotImplementedError
+
     def get_inflow_rate(self, time_span):
         """Return the inflow rate (in veh/hr) of vehicles from the network.
 
-        This value is computed over the specified **time_span** seconds.
+        This value is computed over the specified **time_span** seconds, or
+        over the time elapsed since the last reset if it is shorter. Rates
+        over any number of time spans are computed in constant time from the
+        rolling counters of the kernel (see
+        flow.core.kernel.vehicle.counters).
         """
         raise NotImplementedError
 
     def get_outflow_rate(self, time_span):
         """Return the outflow rate (in veh/hr) of vehicles from the network.
 
-        This value is computed over the specified **time_span** seconds.
+        This value is computed over the specified **time_span** seconds, or
+        over the time elapsed since the last reset if it is shorter. Rates
+        over any number of time spans are computed in constant time from the
+        rolling counters of the kernel (see
+        flow.core.kernel.vehicle.counters).
         """
         raise NotImplementedError
 
@@ -635,12 +811,12 @@ class KernelVehicle(object):
 
         Parameters
         ----------
-        veh_id : str
-            vehicle identifier
+        veh_id : str or list of str or numpy.ndarray
+            vehicle identifier, or list of vehicle identifiers
 
         Returns
         -------
-        float
+        float or list of float or numpy.ndarray
         """
         raise NotImplementedError
 
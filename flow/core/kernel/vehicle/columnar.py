@@ -0,0 +1,339 @@
+"""Script containing the columnar vehicle state store."""
+
+import numpy as np
+
+# number of rows allocated by the store upon initialization
+INITIAL_CAPACITY = 64
+
+
+class ColumnarVehicleState(object):
+    """Array-backed storage of the per-step state of vehicles.
+
+    Every vehicle in the network is assigned a row when it is added to the
+    store. This row remains fixed until the vehicle is removed, after which it
+    is recycled for vehicles that enter the network later on. All quantities
+    that are updated at every simulation step (speeds, positions, headways,
+    leaders, etc...) are stored in contiguous numpy arrays indexed by these
+    rows, so that collecting the state of several vehicles reduces to a single
+    indexing operation.
+
+    Edges are stored as integer codes. The names of the edges are recovered
+    from the ``edge_names`` array, whose first element (code 0) is reserved
+    for vehicles that are not located on any edge. Leaders and followers are
+    stored as rows, with -1 denoting the absence of a leader/follower.
+
+    Usage:
+
+        >>> state = ColumnarVehicleState()
+        >>> row = state.add("human_0")
+        >>> state.speed[row] = 5.
+        >>> state.get(state.speed, np.array(["human_0"]), error=-1001)
+        array([5.])
+    """
+
+    FLOAT_COLUMNS = ('speed', 'default_speed', 'position', 'headway',
+                     'length', 'min_gap', 'x', 'y', 'angle')
+    INT_COLUMNS = ('lane', 'edge', 'leader', 'follower')
+    OBJECT_COLUMNS = ('route',)
+
+    # value assigned to every column of a newly added vehicle
+    DEFAULTS = {
+        'speed': 0, 'default_speed': 0, 'position': 0, 'headway': 1e3,
+        'length': 0, 'min_gap': 0, 'x': -1001, 'y': -1001, 'angle': -1001,
+        'lane': 0, 'edge': 0, 'leader': -1, 'follower': -1, 'route': None,
+    }
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        """Instantiate the columnar vehicle state.
+
+        Parameters
+        ----------
+        capacity : int, optional
+            number of rows allocated upon initialization. The store doubles in
+            size whenever it runs out of rows.
+        """
+        self.capacity = 0
+
+        # Key = vehicle ID, Element = row assigned to the vehicle
+        self._index = dict()
+        # rows that were released by removed vehicles and may be reused
+        self._free = []
+        # number of rows that have been assigned at least once
+        self.num_rows = 0
+
+        # id of the vehicle occupying each row (None if the row is empty)
+        self.ids = np.empty(0, dtype=object)
+        # specifies whether a row is currently occupied by a vehicle
+        self.active = np.zeros(0, dtype=bool)
+
+        for name in self.FLOAT_COLUMNS:
+            setattr(self, name, np.zeros(0, dtype=np.float64))
+        for name in self.INT_COLUMNS:
+            setattr(self, name, np.zeros(0, dtype=np.int64))
+        for name in self.OBJECT_COLUMNS:
+            setattr(self, name, np.empty(0, dtype=object))
+
+        # names of the edges, with code 0 reserved for "no edge"
+        self.edge_names = np.array([""], dtype=object)
+        self._edge_codes = {"": 0}
+
+        self._grow(max(capacity, 1))
+
+    def __len__(self):
+        """Return the number of vehicles in the store."""
+        return len(self._index)
+
+    def __contains__(self, veh_id):
+        """Check whether a vehicle is in the store."""
+        return veh_id in self._index
+
+    def _grow(self, capacity):
+        """Extend all columns to the specified number of rows."""
+        extra = capacity - self.capacity
+
+        self.ids = np.concatenate((self.ids, np.empty(extra, dtype=object)))
+        self.active = np.concatenate(
+            (self.active, np.zeros(extra, dtype=bool)))
+
+        for name in self.FLOAT_COLUMNS + self.INT_COLUMNS:
+            column = getattr(self, name)
+            pad = np.full(extra, self.DEFAULTS[name], dtype=column.dtype)
+            setattr(self, name, np.concatenate((column, pad)))
+        for name in self.OBJECT_COLUMNS:
+            column = getattr(self, name)
+            setattr(self, name,
+                    np.concatenate((column, np.empty(extra, dtype=object))))
+
+        self.capacity = capacity
+
+    ###########################################################################
+    #                        Adding and removing rows                         #
+    ###########################################################################
+
+    def add(self, veh_id):
+        """Assign a row to a vehicle and reset its state to default values.
+
+        If the vehicle is already in the store, its current row is returned and
+        its state is left untouched.
+
+        Parameters
+        ----------
+        veh_id : str
+            name of the vehicle
+
+        Returns
+        -------
+        int
+            row assigned to the vehicle
+        """
+        if veh_id in self._index:
+            return self._index[veh_id]
+
+        if self._free:
+            row = self._free.pop()
+        else:
+            if self.num_rows == self.capacity:
+                self._grow(2 * self.capacity)
+            row = self.num_rows
+            self.num_rows += 1
+
+        for name in self.FLOAT_COLUMNS + self.INT_COLUMNS + \
+                self.OBJECT_COLUMNS:
+            getattr(self, name)[row] = self.DEFAULTS[name]
+
+        self.ids[row] = veh_id
+        self.active[row] = True
+        self._index[veh_id] = row
+
+        return row
+
+    def remove(self, veh_id):
+        """Release the row of a vehicle.
+
+        Any leader/follower references to the removed vehicle are cleared, so
+        that the row can safely be recycled.
+
+        Parameters
+        ----------
+        veh_id : str
+            name of the vehicle
+
+        Raises
+        ------
+        KeyError
+            if the vehicle is not in the store
+        """
+        row = self._index.pop(veh_id)
+        self.ids[row] = None
+        self.active[row] = False
+        self.route[row] = None
+
+        n = self.num_rows
+        self.leader[:n][self.leader[:n] == row] = -1
+        self.follower[:n][self.follower[:n] == row] = -1
+        self.leader[row] = -1
+        self.follower[row] = -1
+
+        self._free.append(row)
+
+    def clear(self):
+        """Remove all vehicles from the store."""
+        for veh_id in list(self._index.keys()):
+            self.remove(veh_id)
+
+    ###########################################################################
+    #                          Row and edge lookups                           #
+    ###########################################################################
+
+    def row(self, veh_id):
+        """Return the row of a vehicle, or -1 if it is not in the store."""
+        return self._index.get(veh_id, -1)
+
+    def rows(self, veh_ids):
+        """Return the rows of a collection of vehicles.
+
+        Vehicles that are not in the store are assigned a row of -1.
+
+        Parameters
+        ----------
+        veh_ids : list of str or numpy.ndarray
+            names of the vehicles
+
+        Returns
+        -------
+        numpy.ndarray of int
+            rows of the vehicles
+        """
+        get = self._index.get
+        return np.fromiter((get(veh_id, -1) for veh_id in veh_ids),
+                           dtype=np.int64, count=len(veh_ids))
+
+    def active_rows(self):
+        """Return the rows of all vehicles currently in the store."""
+        return np.flatnonzero(self.active[:self.num_rows])
+
+    def edge_code(self, edge):
+        """Return the integer code of an edge, registering it if needed."""
+        try:
+            return self._edge_codes[edge]
+        except KeyError:
+            code = len(self.edge_names)
+            self._edge_codes[edge] = code
+            self.edge_names = np.append(self.edge_names, np.array(
+                [edge], dtype=object))
+            return code
+
+    def lookup_edge(self, edge):
+        """Return the integer code of an edge, or 0 if it is not registered."""
+        return self._edge_codes.get(edge, 0)
+
+    def edge_codes(self, edges):
+        """Return the integer codes of a collection of edges."""
+        codes = self._edge_codes
+        return np.fromiter(
+            (codes[edge] if edge in codes else self.edge_code(edge)
+             for edge in edges), dtype=np.int64, count=len(edges))
+
+    ###########################################################################
+    #                            State acquisition                            #
+    ###########################################################################
+
+    def get(self, values, veh_id, error):
+        """Collect the values of a column for one or several vehicles.
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            the column the values are collected from, e.g. ``self.speed``
+        veh_id : str or list of str or numpy.ndarray
+            vehicle id, or list of vehicle ids
+        error : any
+            value that is returned if a vehicle is not found
+
+        Returns
+        -------
+        any
+            a single element if a single vehicle id was provided, a list if a
+            list of ids was provided, and a numpy array if the ids were
+            provided as a numpy array.
+        """
+        if isinstance(veh_id, np.ndarray):
+            return self.gather(values, self.rows(veh_id), error)
+        elif isinstance(veh_id, list):
+            get = self._index.get
+            return [error if row is None else values.item(row)
+                    for row in (get(vid) for vid in veh_id)]
+
+        row = self._index.get(veh_id)
+        if row is None:
+            return error
+        return values.item(row)
+
+    def set(self, values, veh_id, value):
+        """Set the value of a column for a single vehicle.
+
+        Raises
+        ------
+        KeyError
+            if the vehicle is not in the store
+        """
+        values[self._index[veh_id]] = value
+
+    def gather(self, values, rows, error):
+        """Collect the values of a column at the specified rows.
+
+        Rows of -1 (i.e. vehicles that are not in the network) are replaced
+        with the error term.
+        """
+        out = values[rows]
+        missing = rows < 0
+        if missing.any():
+            out = np.where(missing, error, out)
+        return out
+
+    def get_edge(self, veh_id, error):
+        """Return the names of the edges the specified vehicles are on."""
+        names = self.edge_names
+        if isinstance(veh_id, np.ndarray):
+            rows = self.rows(veh_id)
+            return np.where(rows < 0, error, names[self.edge[rows]])
+        elif isinstance(veh_id, list):
+            get = self._index.get
+            return [error if row is None else names[self.edge[row]]
+                    for row in (get(vid) for vid in veh_id)]
+
+        row = self._index.get(veh_id)
+        if row is None:
+            return error
+        return names[self.edge[row]]
+
+    def get_neighbor(self, values, veh_id, error):
+        """Return the names of the leaders or followers of vehicles.
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            either ``self.leader`` or ``self.follower``
+        veh_id : str or list of str or numpy.ndarray
+            vehicle id, or list of vehicle ids
+        error : any
+            value that is returned if a vehicle is not found
+
+        Returns
+        -------
+        str or None
+            the name of the neighbor, or None if the vehicle has no neighbor
+        """
+        if isinstance(veh_id, np.ndarray):
+            rows = self.rows(veh_id)
+            neighbors = values[rows]
+            out = np.where(neighbors < 0, None, self.ids[neighbors])
+            return np.where(rows < 0, error, out)
+        elif isinstance(veh_id, list):
+            return [self.get_neighbor(values, vid, error) for vid in veh_id]
+
+        row = self._index.get(veh_id)
+        if row is None:
+            return error
+        neighbor = values[row]
+        return None if neighbor < 0 else self.ids[neighbor]
@@ -0,0 +1,518 @@
+"""Script containing the base class of vehicle kernels with columnar states."""
+
+from flow.core.kernel.vehicle.base import KernelVehicle
+from flow.core.kernel.vehicle.counters import TrafficCounters
+import numpy as np
+import collections
+import warnings
+from flow.controllers.car_following_models import SimCarFollowingController
+from flow.controllers.rlcontroller import RLController
+from flow.controllers.lane_change_controllers import SimLaneChangeController
+
+
+class ColumnarKernelVehicle(KernelVehicle):
+    """Base class of the vehicle kernels storing a columnar vehicle state.
+
+    The state of the vehicles at the current time step is stored in a
+    columnar vehicle state (see flow.core.kernel.vehicle.columnar), and the
+    multi-lane data of the vehicles in a multi-lane engine (see
+    flow.core.kernel.vehicle.multi_lane). This class contains the bookkeeping
+    of the vehicles (ids, controllers, lane changes, inflows and outflows) and
+    all state getters, which read from these two stores. Sub-classes bind the
+    stores to ``_state`` and ``_lane_data``, keep them up to date with the
+    simulator, and implement the methods sending commands to the simulator.
+
+    Extends flow.core.kernel.vehicle.base.KernelVehicle
+    """
+
+    def __init__(self,
+                 master_kernel,
+                 sim_params):
+        """See parent class."""
+        KernelVehicle.__init__(self, master_kernel, sim_params)
+
+        self.__ids = []  # ids of all vehicles
+        self.__human_ids = []  # ids of human-driven vehicles
+        self.__controlled_ids = []  # ids of flow-controlled vehicles
+        self.__controlled_lc_ids = []  # ids of flow lc-controlled vehicles
+        self.__rl_ids = []  # ids of rl-controlled vehicles
+        self.__observed_ids = []  # ids of the observed vehicles
+
+        # vehicles: Key = Vehicle ID, Value = Dictionary describing the vehicle
+        # Ordered dictionary used to keep neural net inputs in order
+        self.__vehicles = collections.OrderedDict()
+
+        # columnar state of the vehicles, and lane leaders, followers,
+        # headways, and tailways of all vehicles (set by sub-classes)
+        self._state = None
+        self._lane_data = None
+
+        # coefficients mapping the relative positions of vehicles to absolute
+        # positions, for every edge code of the columnar state (see
+        # _get_x_offsets), and the edge names they were computed for
+        self._x_names = None
+        self._x_offsets = np.zeros(0)
+        self._x_scales = np.zeros(0)
+
+        # total number of vehicles in the network
+        self.num_vehicles = 0
+        # number of rl vehicles in the network
+        self.num_rl_vehicles = 0
+
+        # contains the parameters associated with each type of vehicle
+        self.type_parameters = {}
+
+        # contain the minGap attribute of each type of vehicle
+        self.minGap = {}
+
+        # rolling counters of the vehicles that entered and exited the network
+        # over the last time-steps
+        self._counters = TrafficCounters(self.sim_step)
+
+    def initialize(self, vehicles):
+        """Initialize vehicle state information.
+
+        Parameters
+        ----------
+        vehicles : flow.core.params.VehicleParams
+            initial vehicle parameter information, including the types of
+            individual vehicles and their initial speeds
+        """
+        self.type_parameters = vehicles.type_parameters
+        self.minGap = vehicles.minGap
+        self.num_vehicles = 0
+        self.num_rl_vehicles = 0
+
+    def _update_vehicles(self, reset, departed_ids, arrived_ids):
+        """Update the bookkeeping of the vehicles after a simulation step.
+
+        This is meant to be called by ``update``, once the vehicles that
+        entered and exited the network have been added and removed, and the
+        columnar state and multi-lane data have been updated.
+
+        Parameters
+        ----------
+        reset : bool
+            specifies whether the simulator was reset in the last simulation
+            step
+        departed_ids : list of str
+            names of the vehicles that entered the network
+        arrived_ids : list of str
+            names of the vehicles that exited the network
+        """
+        if reset:
+            self.time_counter = 0
+
+            # reset all necessary values
+            self.prev_last_lc = dict()
+            for veh_id in self.__rl_ids:
+                self.__vehicles[veh_id]["last_lc"] = -float("inf")
+                self.prev_last_lc[veh_id] = -float("inf")
+            self._counters.clear()
+        else:
+            self.time_counter += 1
+
+            # updated the list of departed and arrived vehicles
+            self._counters.append(departed_ids, arrived_ids)
+
+        # update the "last_lc" variable
+        for veh_id in self.__rl_ids:
+            lane = self.get_lane(veh_id)
+            if lane != self.__vehicles[veh_id]["lane"] and not reset:
+                self.__vehicles[veh_id]["last_lc"] = self.time_counter
+            self.__vehicles[veh_id]["lane"] = lane
+
+        # make sure the rl vehicle list is still sorted
+        self.__rl_ids.sort()
+
+        # update the aggregates of the virtual detectors
+        self.detectors.update_columnar(
+            self._state, self._lane_data, self.__rl_ids)
+
+    def _add_vehicle(self, veh_id, veh_type):
+        """Add a vehicle that entered the network to the bookkeeping.
+
+        This is meant to be called by sub-classes when a vehicle enters the
+        network from an inflow or reset, once it was added to the columnar
+        state.
+
+        Parameters
+        ----------
+        veh_id: str
+            name of the vehicle
+        veh_type: str
+            type of vehicle
+
+        Raises
+        ------
+        KeyError
+            if the type of the vehicle is unknown
+        """
+        if veh_type not in self.type_parameters:
+            raise KeyError("Entering vehicle is not a valid type.")
+
+        self.num_vehicles += 1
+        self.__ids.append(veh_id)
+        self.__vehicles[veh_id] = dict()
+
+        # specify the type
+        self.__vehicles[veh_id]["type"] = veh_type
+
+        car_following_params = \
+            self.type_parameters[veh_type]["car_following_params"]
+
+        # specify the acceleration controller class
+        accel_controller = \
+            self.type_parameters[veh_type]["acceleration_controller"]
+        self.__vehicles[veh_id]["acc_controller"] = \
+            accel_controller[0](veh_id,
+                                car_following_params=car_following_params,
+                                **accel_controller[1])
+
+        # specify the lane-changing controller class
+        lc_controller = \
+            self.type_parameters[veh_type]["lane_change_controller"]
+        self.__vehicles[veh_id]["lane_changer"] = \
+            lc_controller[0](veh_id=veh_id, **lc_controller[1])
+
+        # specify the routing controller class
+        rt_controller = self.type_parameters[veh_type]["routing_controller"]
+        if rt_controller is not None:
+            self.__vehicles[veh_id]["router"] = \
+                rt_controller[0](veh_id=veh_id, router_params=rt_controller[1])
+        else:
+            self.__vehicles[veh_id]["router"] = None
+
+        # add the vehicle's id to the list of vehicle ids
+        if accel_controller[0] == RLController:
+            self.__rl_ids.append(veh_id)
+            self.num_rl_vehicles += 1
+        else:
+            self.__human_ids.append(veh_id)
+            if accel_controller[0] != SimCarFollowingController:
+                self.__controlled_ids.append(veh_id)
+            if lc_controller[0] != SimLaneChangeController:
+                self.__controlled_lc_ids.append(veh_id)
+
+        # set the "last_lc" parameter of the vehicle
+        self.__vehicles[veh_id]["last_lc"] = -float("inf")
+        self.__vehicles[veh_id]["lane"] = self.get_lane(veh_id)
+
+        # specify the initial speed
+        self.__vehicles[veh_id]["initial_speed"] = \
+            self.type_parameters[veh_type]["initial_speed"]
+
+        # make sure that the order of rl_ids is kept sorted
+        self.__rl_ids.sort()
+
+    def _remove_vehicle(self, veh_id):
+        """Remove a vehicle from the bookkeeping, if it is there.
+
+        Parameters
+        ----------
+        veh_id: str
+            name of the vehicle
+        """
+        try:
+            # remove from the vehicles kernel
+            del self.__vehicles[veh_id]
+            self.__ids.remove(veh_id)
+            self.num_vehicles -= 1
+
+            # remove it from all other ids (if it is there)
+            if veh_id in self.__human_ids:
+                self.__human_ids.remove(veh_id)
+                if veh_id in self.__controlled_ids:
+                    self.__controlled_ids.remove(veh_id)
+                if veh_id in self.__controlled_lc_ids:
+                    self.__controlled_lc_ids.remove(veh_id)
+            else:
+                self.__rl_ids.remove(veh_id)
+                self.num_rl_vehicles -= 1
+
+            # make sure that the rl ids remain sorted
+            self.__rl_ids.sort()
+        except KeyError:
+            pass
+
+    def get_orientation(self, veh_id):
+        """See parent class."""
+        state = self._state
+        return [state.get(state.x, veh_id, -1001),
+                state.get(state.y, veh_id, -1001),
+                state.get(state.angle, veh_id, -1001)]
+
+    def get_type(self, veh_id):
+        """Return the type of the vehicle of veh_id."""
+        return self.__vehicles[veh_id]["type"]
+
+    def get_ids(self):
+        """See parent class."""
+        return self.__ids
+
+    def get_human_ids(self):
+        """See parent class."""
+        return self.__human_ids
+
+    def get_controlled_ids(self):
+        """See parent class."""
+        return self.__controlled_ids
+
+    def get_controlled_lc_ids(self):
+        """See parent class."""
+        return self.__controlled_lc_ids
+
+    def get_rl_ids(self):
+        """See parent class."""
+        return self.__rl_ids
+
+    def set_observed(self, veh_id):
+        """See parent class."""
+        if veh_id not in self.__observed_ids:
+            self.__observed_ids.append(veh_id)
+
+    def remove_observed(self, veh_id):
+        """See parent class."""
+        if veh_id in self.__observed_ids:
+            self.__observed_ids.remove(veh_id)
+
+    def get_observed_ids(self):
+        """See parent class."""
+        return self.__observed_ids
+
+    def get_ids_by_edge(self, edges):
+        """See parent class."""
+        return self._state.ids[
+            self._lane_data.rows_by_edge(self._state, edges)].tolist()
+
+    def get_k_closest_to_edge_end(self, edge, k):
+        """See parent class."""
+        return self._state.ids[
+            self._lane_data.rows_closest_to_end(self._state, edge, k)]
+
+    def get_ids_in_segment(self, edge, start=0, end=float('inf'), lane=None):
+        """See parent class."""
+        return self._state.ids[self._lane_data.rows_in_segment(
+            self._state, edge, start, end, lane)]
+
+    def get_ids_within(self, veh_id, distance):
+        """See parent class."""
+        return self._state.ids[self._lane_data.rows_within(
+            self._state.row(veh_id), distance)]
+
+    def get_inflow_rate(self, time_span):
+        """See parent class."""
+        return self._counters.inflow_rate(time_span)
+
+    def get_outflow_rate(self, time_span):
+        """See parent class."""
+        return self._counters.outflow_rate(time_span)
+
+    def get_num_arrived(self):
+        """See parent class."""
+        return self._counters.num_arrived
+
+    def get_arrived_ids(self):
+        """See parent class."""
+        return self._counters.arrived_ids
+
+    def get_departed_ids(self):
+        """See parent class."""
+        return self._counters.departed_ids
+
+    def get_speed(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._state.get(self._state.speed, veh_id, error)
+
+    def get_default_speed(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._state.get(self._state.default_speed, veh_id, error)
+
+    def get_position(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._state.get(self._state.position, veh_id, error)
+
+    def get_edge(self, veh_id, error=""):
+        """See parent class."""
+        return self._state.get_edge(veh_id, error)
+
+    def get_lane(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._state.get(self._state.lane, veh_id, error)
+
+    def get_route(self, veh_id, error=list()):
+        """See parent class."""
+        return self._state.get(self._state.route, veh_id, error)
+
+    def get_length(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._state.get(self._state.length, veh_id, error)
+
+    def get_leader(self, veh_id, error=""):
+        """See parent class."""
+        return self._state.get_neighbor(self._state.leader, veh_id, error)
+
+    def get_follower(self, veh_id, error=""):
+        """See parent class."""
+        return self._state.get_neighbor(self._state.follower, veh_id, error)
+
+    def get_headway(self, veh_id, error=-1001):
+        """See parent class."""
+        return self._state.get(self._state.headway, veh_id, error)
+
+    def get_last_lc(self, veh_id, error=-1001):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_last_lc(vehID, error) for vehID in veh_id]
+
+        if veh_id not in self.__rl_ids:
+            warnings.warn('Vehicle {} is not RL vehicle, "last_lc" term set to'
+                          ' {}.'.format(veh_id, error))
+            return error
+        else:
+            return self.__vehicles.get(veh_id, {}).get("last_lc", error)
+
+    def get_acc_controller(self, veh_id, error=None):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_acc_controller(vehID, error) for vehID in veh_id]
+        return self.__vehicles.get(veh_id, {}).get("acc_controller", error)
+
+    def get_lane_changing_controller(self, veh_id, error=None):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [
+                self.get_lane_changing_controller(vehID, error)
+                for vehID in veh_id
+            ]
+        return self.__vehicles.get(veh_id, {}).get("lane_changer", error)
+
+    def get_routing_controller(self, veh_id, error=None):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [
+                self.get_routing_controller(vehID, error) for vehID in veh_id
+            ]
+        return self.__vehicles.get(veh_id, {}).get("router", error)
+
+    def get_lane_headways(self, veh_id, error=list()):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_lane_headways(vehID, error) for vehID in veh_id]
+        return self._lane_data.get(
+            self._lane_data.headways, self._state.row(veh_id), error)
+
+    def get_lane_leaders_speed(self, veh_id, error=list()):
+        """See parent class."""
+        lane_leaders = self.get_lane_leaders(veh_id)
+        return [0 if lane_leader == '' else self.get_speed(lane_leader)
+                for lane_leader in lane_leaders]
+
+    def get_lane_followers_speed(self, veh_id, error=list()):
+        """See parent class."""
+        lane_followers = self.get_lane_followers(veh_id)
+        return [0 if lane_follower == '' else self.get_speed(lane_follower)
+                for lane_follower in lane_followers]
+
+    def get_lane_leaders(self, veh_id, error=list()):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_lane_leaders(vehID, error) for vehID in veh_id]
+        return self._lane_data.get_neighbors(
+            self._lane_data.leaders, self._state.row(veh_id),
+            self._state.ids, error)
+
+    def get_lane_tailways(self, veh_id, error=list()):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_lane_tailways(vehID, error) for vehID in veh_id]
+        return self._lane_data.get(
+            self._lane_data.tailways, self._state.row(veh_id), error)
+
+    def get_lane_followers(self, veh_id, error=list()):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_lane_followers(vehID, error) for vehID in veh_id]
+        return self._lane_data.get_neighbors(
+            self._lane_data.followers, self._state.row(veh_id),
+            self._state.ids, error)
+
+    def apply_lane_change(self, veh_ids, direction):
+        """See parent class.
+
+        The lane changes are sent to the simulator through
+        ``_change_lane``.
+        """
+        # if any of the directions are not -1, 0, or 1, raise a ValueError
+        if any(d not in [-1, 0, 1] for d in direction):
+            raise ValueError(
+                "Direction values for lane changes may only be: -1, 0, or 1.")
+
+        for i, veh_id in enumerate(veh_ids):
+            # check for no lane change
+            if direction[i] == 0:
+                continue
+
+            # compute the target lane, and clip it so vehicle don't try to lane
+            # change out of range
+            this_lane = self.get_lane(veh_id)
+            this_edge = self.get_edge(veh_id)
+            target_lane = min(
+                max(this_lane + direction[i], 0),
+                self.master_kernel.scenario.num_lanes(this_edge) - 1)
+
+            # perform the requested lane action
+            if target_lane != this_lane:
+                self._change_lane(veh_id, int(target_lane))
+
+                if veh_id in self.get_rl_ids():
+                    self.prev_last_lc[veh_id] = \
+                        self.__vehicles[veh_id]["last_lc"]
+
+    def _change_lane(self, veh_id, target_lane):
+        """Send a lane change command to the simulator.
+
+        Parameters
+        ----------
+        veh_id : str
+            name of the vehicle
+        target_lane : int
+            lane the vehicle should move to
+        """
+        raise NotImplementedError
+
+    def get_x_by_id(self, veh_id):
+        """See parent class.
+
+        The positions of a list or array of vehicles are computed in a single
+        vectorized pass over the columnar state. Vehicles on edges without a
+        known start position are given a position of NaN.
+        """
+        if isinstance(veh_id, (list, np.ndarray)):
+            rows = self._state.rows(veh_id)
+            offsets, scales = self._get_x_offsets()
+            codes = np.where(rows < 0, 0, self._state.edge[rows])
+            x = offsets[codes] + scales[codes] * self._state.position[rows]
+            return x.tolist() if isinstance(veh_id, list) else x
+
+        if self.get_edge(veh_id) == '':
+            # occurs when a vehicle crashes is teleported for some other reason
+            return 0.
+        return self.master_kernel.scenario.get_x(
+            self.get_edge(veh_id), self.get_position(veh_id))
+
+    def _get_x_offsets(self):
+        """Return the coefficients of get_x for every edge code.
+
+        The coefficients are recomputed whenever new edges are registered in
+        the columnar state. Vehicles with no edge (code 0) are given a
+        position of 0.
+        """
+        names = self._state.edge_names
+        if self._x_names is not names:
+            self._x_offsets, self._x_scales = \
+                self.master_kernel.scenario.get_x_offsets(names)
+            self._x_offsets[0] = 0.
+            self._x_scales[0] = 0.
+            self._x_names = names
+        return self._x_offsets, self._x_scales
@@ -0,0 +1,192 @@
+"""Script containing the rolling counters of departed/arrived vehicles."""
+
+# time span (in seconds) covered by the counters upon initialization. Larger
+# windows are supported by growing the counters when they are first requested.
+DEFAULT_WINDOW = 3600
+
+
+class RollingCounter(object):
+    """Windowed sums of a per-step count in constant memory.
+
+    The counter stores the running (prefix) sums of the counts of the last
+    ``capacity`` time steps in a ring buffer, so that the sum or rate over any
+    window of up to ``capacity`` steps is computed from two elements of the
+    buffer, regardless of the length of the window or of the rollout. Counts
+    older than ``capacity`` steps are discarded, and windows that are longer
+    than the number of stored steps are computed over all stored steps.
+
+    The ids attached to the count of the most recent time step are stored as
+    well (e.g. the ids of the vehicles that arrived in the last time step).
+
+    Usage:
+
+        >>> counter = RollingCounter(capacity=3)
+        >>> for ids in (["a"], [], ["b", "c"], ["d"]):
+        ...     counter.append(ids)
+        >>> counter.sum(2), counter.sum(3), counter.last
+        (3, 3, 1)
+        >>> counter.rate(2, sim_step=0.5)  # veh/hr over the last 2 steps
+        10800.0
+    """
+
+    def __init__(self, capacity):
+        """Instantiate the counter.
+
+        Parameters
+        ----------
+        capacity : int
+            maximum number of time steps covered by the windows of the
+            counter. See ``reserve`` to grow the counter afterwards.
+        """
+        self.capacity = max(int(capacity), 1)
+        # prefix sums of the counts, indexed by time step modulo the length of
+        # the buffer. The element of the current step is the total count.
+        self._sums = [0] * (self.capacity + 1)
+        # number of time steps recorded since the last reset, and number of
+        # these steps whose counts are still stored in the buffer
+        self.num_steps = 0
+        self._num_stored = 0
+        # count and ids of the most recent time step
+        self.last = 0
+        self.last_ids = []
+
+    def clear(self):
+        """Remove all recorded counts, keeping the capacity of the counter."""
+        self._sums = [0] * (self.capacity + 1)
+        self.num_steps = 0
+        self._num_stored = 0
+        self.last = 0
+        self.last_ids = []
+
+    def append(self, ids):
+        """Record the ids (and their number) for a new time step."""
+        total = self._sums[self.num_steps % len(self._sums)]
+        self.num_steps += 1
+        self._num_stored = min(self._num_stored + 1, self.capacity)
+        self.last = len(ids)
+        self.last_ids = ids
+        self._sums[self.num_steps % len(self._sums)] = total + self.last
+
+    def reserve(self, capacity):
+        """Grow the counter to cover windows of up to ``capacity`` steps.
+
+        Counts that are still stored in the buffer are preserved, so that
+        windows requested repeatedly from the start of a rollout remain exact.
+        """
+        capacity = int(capacity)
+        if capacity <= self.capacity:
+            return
+
+        sums = [0] * (capacity + 1)
+        for step in range(self.num_steps - self._num_stored,
+                          self.num_steps + 1):
+            sums[step % len(sums)] = self._sums[step % len(self._sums)]
+        self._sums = sums
+        self.capacity = capacity
+
+    def window(self, num_steps):
+        """Return the number of steps a window of ``num_steps`` covers.
+
+        Windows span at least one step, and at most the number of steps whose
+        counts are still stored in the counter.
+        """
+        return min(max(int(num_steps), 1), self._num_stored)
+
+    def sum(self, num_steps):
+        """Return the sum of the counts of the last ``num_steps`` steps."""
+        window = self.window(num_steps)
+        length = len(self._sums)
+        return self._sums[self.num_steps % length] \
+            - self._sums[(self.num_steps - window) % length]
+
+    def rate(self, num_steps, sim_step):
+        """Return the rate (per hour) of the last ``num_steps`` steps.
+
+        Parameters
+        ----------
+        num_steps : int
+            number of time steps in the window. The counter is grown if the
+            window exceeds its capacity.
+        sim_step : float
+            seconds per simulation step
+
+        Returns
+        -------
+        float
+            average count per hour over the window, or 0 if no steps were
+            recorded
+        """
+        self.reserve(num_steps)
+        window = self.window(num_steps)
+        if window == 0:
+            return 0
+        return 3600 * self.sum(window) / (window * sim_step)
+
+
+class TrafficCounters(object):
+    """Rolling counters of the vehicles departing and arriving in a network.
+
+    Inflow and outflow rates are computed from ``RollingCounter`` objects,
+    and are available for any number of windows simultaneously at a constant
+    cost per query and constant memory over arbitrarily long rollouts.
+    """
+
+    def __init__(self, sim_step, window=DEFAULT_WINDOW):
+        """Instantiate the counters.
+
+        Parameters
+        ----------
+        sim_step : float
+            seconds per simulation step
+        window : float, optional
+            time span (in seconds) covered by the counters upon
+            initialization. Rates requested over longer time spans grow the
+            counters up to that time span.
+        """
+        self.sim_step = sim_step
+        capacity = self.num_steps(window)
+        self.departed = RollingCounter(capacity)
+        self.arrived = RollingCounter(capacity)
+
+    def num_steps(self, time_span):
+        """Return the number of simulation steps in a time span."""
+        return int(time_span / self.sim_step)
+
+    def clear(self):
+        """Remove all recorded departures and arrivals."""
+        self.departed.clear()
+        self.arrived.clear()
+
+    def append(self, departed_ids, arrived_ids):
+        """Record the vehicles that departed and arrived in a time step."""
+        self.departed.append(departed_ids)
+        self.arrived.append(arrived_ids)
+
+    def inflow_rate(self, time_span):
+        """Return the inflow rate (in veh/hr) over a time span (in sec)."""
+        return self.departed.rate(self.num_steps(time_span), self.sim_step)
+
+    def outflow_rate(self, time_span):
+        """Return the outflow rate (in veh/hr) over a time span (in sec)."""
+        return self.arrived.rate(self.num_steps(time_span), self.sim_step)
+
+    @property
+    def num_arrived(self):
+        """Return the number of vehicles that arrived in the last step."""
+        return self.arrived.last
+
+    @property
+    def arrived_ids(self):
+        """Return the ids of the vehicles that arrived in the last step.
+
+        0 is returned if no steps were recorded since the last reset.
+        """
+        return self.arrived.last_ids if self.arrived.num_steps > 0 else 0
+
+    @property
+    def departed_ids(self):
+        """Return the ids of the vehicles that departed in the last step.
+
+        0 is returned if no steps were recorded since the last reset.
+        """
+        return self.departed.last_ids if self.departed.num_steps > 0 else 0
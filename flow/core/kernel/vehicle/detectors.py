@@ -0,0 +1,260 @@
+"""Script containing the virtual detectors of the vehicle kernels."""
+
+import collections
+
+import numpy as np
+
+
+class SegmentGrid(object):
+    """Virtual detector aggregating the vehicles in segments of an edge.
+
+    The edge is split into consecutive segments ``[bounds[i], bounds[i+1])``
+    along its length, and each segment is split into the lanes covered by the
+    detector, resulting in a grid of cells of shape (number of segments,
+    number of lanes). If the grid is extended, its last segment also contains
+    the vehicles located at or beyond its end (e.g. at the end of the edge, or
+    on lanes that are slightly longer than the edge). Vehicles are assigned to
+    a cell based on the position of their front bumper. A virtual loop
+    detector is a grid with a single segment and a single lane.
+
+    The following quantities are available for every cell after every update
+    of the vehicle kernel, as arrays of shape (number of segments, number of
+    lanes):
+
+    * count: number of vehicles
+    * total_speed: sum of the speeds of the vehicles (m/s)
+    * mean_speed: mean speed of the vehicles, or 0 if the cell is empty (m/s)
+    * density: number of vehicles per unit length (veh/km)
+    * flow: sum of the speeds of the vehicles per unit length (veh/hr). This
+      is the instantaneous flow through the cell, which is equal to the
+      product of the density and the mean speed.
+    * occupancy: fraction of the length of the segment covered by the lengths
+      of its vehicles, capped at 1
+    """
+
+    def __init__(self, name, edge, bounds, lanes, rl=None, extend=False):
+        """Instantiate the grid.
+
+        Parameters
+        ----------
+        name : str
+            name of the detector
+        edge : str
+            name of the edge covered by the detector
+        bounds : array_like
+            increasing positions (in meters from the start of the edge)
+            delimiting the segments of the grid
+        lanes : list of int
+            lanes covered by the detector, in the order of the columns of the
+            grid. Vehicles on other lanes are not detected.
+        rl : bool, optional
+            specifies whether only RL vehicles (True) or only non-RL vehicles
+            (False) are detected. All vehicles are detected by default.
+        extend : bool, optional
+            specifies whether the last segment also contains the vehicles
+            located at or beyond its end
+        """
+        self.name = name
+        self.edge = edge
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.lanes = list(lanes)
+        self.rl = rl
+        self.extend = extend
+
+        if self.bounds.ndim != 1 or len(self.bounds) < 2 \
+                or np.any(np.diff(self.bounds) <= 0):
+            raise ValueError(
+                'Detector "{}" requires at least two increasing segment '
+                'bounds.'.format(name))
+        if len(self.lanes) == 0 or min(self.lanes) < 0:
+            raise ValueError(
+                'Detector "{}" requires at least one lane.'.format(name))
+
+        self.num_segments = len(self.bounds) - 1
+        self.num_lanes = len(self.lanes)
+        self.size = self.num_segments * self.num_lanes
+
+        # length of every segment, and column of every lane in the grid (-1 if
+        # the lane is not covered)
+        self.segment_length = np.diff(self.bounds)
+        self.column = -np.ones(max(self.lanes) + 1, dtype=np.int64)
+        self.column[self.lanes] = np.arange(self.num_lanes)
+
+        shape = (self.num_segments, self.num_lanes)
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.total_speed = np.zeros(shape)
+        self.mean_speed = np.zeros(shape)
+        self.density = np.zeros(shape)
+        self.flow = np.zeros(shape)
+        self.occupancy = np.zeros(shape)
+
+    def cells(self, lanes, positions):
+        """Return the cells of the vehicles on the edge of the grid.
+
+        Parameters
+        ----------
+        lanes : numpy.ndarray
+            lanes of the vehicles
+        positions : numpy.ndarray
+            positions of the vehicles on the edge
+
+        Returns
+        -------
+        numpy.ndarray
+            flat index of the cell of every vehicle (segment-major), or -1 if
+            the vehicle is not covered by the grid
+        """
+        segment = np.searchsorted(self.bounds, positions, side='right') - 1
+        if self.extend:
+            segment[segment >= self.num_segments] = self.num_segments - 1
+
+        column = -np.ones(len(lanes), dtype=np.int64)
+        known = (lanes >= 0) & (lanes < len(self.column))
+        column[known] = self.column[lanes[known]]
+
+        valid = (segment >= 0) & (segment < self.num_segments) & (column >= 0)
+        return np.where(valid, segment * self.num_lanes + column, -1)
+
+    def set(self, count, total_speed, total_length):
+        """Set the aggregates of the grid from flat per-cell sums."""
+        shape = (self.num_segments, self.num_lanes)
+        length = self.segment_length[:, None]
+        self.count = count.reshape(shape)
+        self.total_speed = total_speed.reshape(shape)
+        self.mean_speed = np.divide(
+            self.total_speed, self.count,
+            out=np.zeros(shape), where=self.count > 0)
+        self.density = 1000 * self.count / length
+        self.flow = 3600 * self.total_speed / length
+        self.occupancy = np.minimum(total_length.reshape(shape) / length, 1)
+
+
+class Detectors(object):
+    """Collection of the virtual detectors of a vehicle kernel.
+
+    Detectors are declared once, and are updated at every step of the vehicle
+    kernel from the columnar vehicle state. The vehicles of the edge of each
+    detector are retrieved from the sorted spatial index of the multi-lane
+    engine, and the vehicles of all detectors are then binned into the cells
+    of all detectors in a single vectorized pass.
+
+    Usage:
+
+        >>> detectors = Detectors()
+        >>> detectors.add(SegmentGrid("bottleneck", "4", [0, 70, 140], [0, 1]))
+        >>> # done by the vehicle kernel at every step
+        >>> detectors.update_columnar(state, lane_data)
+        >>> detectors.get("bottleneck").count
+        array([[3, 2],
+               [0, 1]])
+    """
+
+    def __init__(self):
+        """Instantiate an empty collection of detectors."""
+        # Key = name of the detector, Element = SegmentGrid object
+        self._grids = collections.OrderedDict()
+
+    def __contains__(self, name):
+        """Return whether a detector with the given name exists."""
+        return name in self._grids
+
+    def __len__(self):
+        """Return the number of detectors."""
+        return len(self._grids)
+
+    def add(self, grid):
+        """Add a detector, replacing any detector with the same name."""
+        self._grids[grid.name] = grid
+
+    def remove(self, name):
+        """Remove a detector."""
+        del self._grids[name]
+
+    def get(self, name):
+        """Return the detector with the given name.
+
+        Raises
+        ------
+        KeyError
+            if no detector with this name was declared
+        """
+        try:
+            return self._grids[name]
+        except KeyError:
+            raise KeyError('No detector named "{}".'.format(name))
+
+    def update(self, rows_by_edge, lane, position, speed, length,
+               is_rl=None):
+        """Update the aggregates of all detectors.
+
+        The vehicles are described by arrays indexed by "rows" (e.g. the rows
+        of the columnar vehicle state).
+
+        Parameters
+        ----------
+        rows_by_edge : function
+            function returning the rows of the vehicles on an edge
+        lane : numpy.ndarray
+            lane of every vehicle
+        position : numpy.ndarray
+            position of every vehicle on its edge
+        speed : numpy.ndarray
+            speed of every vehicle
+        length : numpy.ndarray
+            length of every vehicle
+        is_rl : numpy.ndarray, optional
+            whether every vehicle is an RL vehicle. Required by detectors
+            that only detect RL or non-RL vehicles.
+        """
+        if len(self._grids) == 0:
+            return
+
+        # cell of every detected vehicle, in the concatenated cells of all
+        # detectors
+        grids = list(self._grids.values())
+        offsets = np.cumsum([0] + [grid.size for grid in grids])
+        rows = [np.zeros(0, dtype=np.int64)]
+        cells = [np.zeros(0, dtype=np.int64)]
+        for grid, offset in zip(grids, offsets):
+            grid_rows = rows_by_edge(grid.edge)
+            if grid.rl is not None:
+                grid_rows = grid_rows[is_rl[grid_rows] == grid.rl]
+            grid_cells = grid.cells(lane[grid_rows], position[grid_rows])
+            rows.append(grid_rows[grid_cells >= 0])
+            cells.append(grid_cells[grid_cells >= 0] + offset)
+        rows = np.concatenate(rows)
+        cells = np.concatenate(cells)
+
+        size = offsets[-1]
+        count = np.bincount(cells, minlength=size)
+        total_speed = np.bincount(cells, weights=speed[rows], minlength=size)
+        total_length = np.bincount(
+            cells, weights=length[rows], minlength=size)
+
+        for grid, start, end in zip(grids, offsets[:-1], offsets[1:]):
+            grid.set(count[start:end], total_speed[start:end],
+                     total_length[start:end])
+
+    def update_columnar(self, state, lane_data, rl_ids=()):
+        """Update the aggregates of all detectors from the columnar state.
+
+        Parameters
+        ----------
+        state : flow.core.kernel.vehicle.columnar.ColumnarVehicleState
+            columnar vehicle state
+        lane_data : flow.core.kernel.vehicle.multi_lane.MultiLaneHeadways
+            multi-lane engine, updated for the current time step
+        rl_ids : list of str, optional
+            names of the RL vehicles in the network
+        """
+        if len(self._grids) == 0:
+            return
+
+        # RL vehicles that are not in the state (e.g. that just arrived) are
+        # assigned a row of -1, and are skipped
+        rl_rows = state.rows(list(rl_ids))
+        is_rl = np.zeros(state.capacity, dtype=bool)
+        is_rl[rl_rows[rl_rows >= 0]] = True
+        self.update(lambda edge: lane_data.rows_by_edge(state, edge),
+                    state.lane, state.position, state.speed, state.length,
+                    is_rl)
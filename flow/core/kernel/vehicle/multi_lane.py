@@ -0,0 +1,539 @@
+"""Script containing the vectorized multi-lane leader/follower engine."""
+
+import numpy as np
+
+# headway/tailway assigned to lanes with no leader/follower
+DEFAULT_HEADWAY = 1000
+
+
+class MultiLaneHeadways(object):
+    """Vectorized computation of lane leaders, followers, headways, tailways.
+
+    At every time step, all vehicles in the network are sorted once by edge
+    and position, and once by (edge, lane, position). The lane leaders and
+    followers of every vehicle are then recovered for all lanes of its edge
+    simultaneously from cumulative per-lane vehicle counts, without searching
+    the lanes of every vehicle individually. Lanes that have no leader
+    (follower) on the current edge are resolved by walking a precomputed table
+    of successor (predecessor) lanes, for all vehicles at once.
+
+    Each (edge, lane) pair is represented by a "slot", computed as
+    ``edge_code * max_lanes + lane``, where ``edge_code`` is the integer code
+    of the edge in the columnar vehicle state.
+
+    The results are stored in arrays of shape (max_lanes, number of vehicles).
+    The index of a vehicle in these arrays is available from its row in the
+    columnar state through ``index_of``. Leaders and followers are stored as
+    rows, with -1 denoting the absence of a vehicle.
+
+    The sorted vehicles also serve as a spatial index of the network, which
+    answers queries on the vehicles of an edge (or of a segment of it) in time
+    proportional to the number of vehicles returned, up to a bisection.
+    """
+
+    def __init__(self):
+        """Instantiate the multi-lane engine."""
+        # maximum number of lanes in the network
+        self.max_lanes = 0
+        # number of edges and junctions in the network
+        self.num_edges = 0
+        # number of edge codes covered by the lane tables
+        self.num_codes = 0
+
+        # slot of the first successor/predecessor of each slot (-1 if none)
+        self.next_slot = np.zeros(0, dtype=np.int64)
+        self.prev_slot = np.zeros(0, dtype=np.int64)
+        # length of the edge of each slot
+        self.slot_length = np.zeros(0)
+        # number of lanes of each edge code
+        self.edge_lanes = np.zeros(0, dtype=np.int64)
+
+        # rows of the vehicles sorted by edge and position in the last time
+        # step, used to warm-start the sort of the next time step. The edge
+        # codes and positions of these vehicles are stored as well.
+        self._edge_order = np.zeros(0, dtype=np.int64)
+        self.edge_order_code = np.zeros(0, dtype=np.int64)
+        self.edge_order_pos = np.zeros(0)
+
+        # rows and positions of the vehicles sorted by edge, lane, and
+        # position, as well as the range of indices in these arrays covered by
+        # every edge code and every slot. Since both orders start with the
+        # edge, the range covered by an edge code is the same in the (edge,
+        # position) order.
+        self.sorted_rows = np.zeros(0, dtype=np.int64)
+        self.sorted_pos = np.zeros(0)
+        self.edge_start = np.zeros(0, dtype=np.int64)
+        self.edge_end = np.zeros(0, dtype=np.int64)
+        self.slot_start = np.zeros(0, dtype=np.int64)
+        self.slot_end = np.zeros(0, dtype=np.int64)
+
+        # multi-lane data of every vehicle, and the index of every row in these
+        # arrays (-1 if the data of the vehicle was not computed)
+        self.index_of = np.zeros(0, dtype=np.int64)
+        self.num_lanes = np.zeros(0, dtype=np.int64)
+        self.leaders = np.zeros((0, 0), dtype=np.int64)
+        self.followers = np.zeros((0, 0), dtype=np.int64)
+        self.headways = np.zeros((0, 0))
+        self.tailways = np.zeros((0, 0))
+
+    def build_tables(self, scenario, state):
+        """Precompute the successor/predecessor lanes of every lane.
+
+        Parameters
+        ----------
+        scenario : flow.core.kernel.scenario.KernelScenario
+            scenario kernel, used to collect the network's connections
+        state : flow.core.kernel.vehicle.columnar.ColumnarVehicleState
+            columnar vehicle state, used to assign codes to edges
+        """
+        edges = scenario.get_edge_list() + scenario.get_junction_list()
+        self.num_edges = len(edges)
+        self.max_lanes = max([scenario.num_lanes(edge) for edge in edges])
+
+        # collect the first successor/predecessor of every (edge, lane) pair
+        connections = []
+        for edge in edges:
+            for lane in range(scenario.num_lanes(edge)):
+                next_edge = scenario.next_edge(edge, lane)
+                prev_edge = scenario.prev_edge(edge, lane)
+                connections.append((
+                    edge, lane,
+                    next_edge[0] if len(next_edge) > 0 else None,
+                    prev_edge[0] if len(prev_edge) > 0 else None))
+
+        # assign codes to all edges before the tables are allocated
+        for edge in edges:
+            state.edge_code(edge)
+        for _, _, next_pair, prev_pair in connections:
+            for pair in (next_pair, prev_pair):
+                if pair is not None:
+                    state.edge_code(pair[0])
+
+        num_lanes = self.max_lanes
+        self.num_codes = len(state.edge_names)
+        self.next_slot = np.full(self.num_codes * num_lanes, -1, np.int64)
+        self.prev_slot = np.full(self.num_codes * num_lanes, -1, np.int64)
+        self.slot_length = np.zeros(self.num_codes * num_lanes)
+        self.edge_lanes = np.zeros(self.num_codes, dtype=np.int64)
+
+        for edge in edges:
+            code = state.edge_code(edge)
+            self.edge_lanes[code] = scenario.num_lanes(edge)
+            self.slot_length[code * num_lanes:(code + 1) * num_lanes] = \
+                scenario.edge_length(edge)
+
+        for edge, lane, next_pair, prev_pair in connections:
+            slot = state.edge_code(edge) * num_lanes + lane
+            if next_pair is not None:
+                self.next_slot[slot] = \
+                    state.edge_code(next_pair[0]) * num_lanes + next_pair[1]
+            if prev_pair is not None:
+                self.prev_slot[slot] = \
+                    state.edge_code(prev_pair[0]) * num_lanes + prev_pair[1]
+
+    def update(self, scenario, state):
+        """Compute the multi-lane data of all vehicles in the network.
+
+        Parameters
+        ----------
+        scenario : flow.core.kernel.scenario.KernelScenario
+            scenario kernel
+        state : flow.core.kernel.vehicle.columnar.ColumnarVehicleState
+            columnar vehicle state, with up-to-date edges, lanes, and positions
+        """
+        if self.num_codes == 0 or len(state.edge_names) > self.num_codes:
+            self.build_tables(scenario, state)
+
+        max_lanes = self.max_lanes
+        num_slots = self.num_codes * max_lanes
+        capacity = state.capacity
+
+        # collect all vehicles that are located on a known edge and lane
+        rows = state.active_rows()
+        edge = state.edge[rows]
+        lane = state.lane[rows]
+        rows = self._presort(
+            rows[(edge > 0) & (lane >= 0) & (lane < max_lanes)], capacity)
+        num_veh = len(rows)
+
+        # sort the vehicles by edge and position. The sort is stable and
+        # starts from the order of the previous time step, in which vehicles
+        # are almost always already sorted, so it runs in close to linear time
+        pos = state.position[rows]
+        offset = pos.min() if num_veh > 0 else 0
+        span = pos.max() - offset + 1 if num_veh > 0 else 1
+        order = np.argsort(state.edge[rows] * span + (pos - offset),
+                           kind='mergesort')
+        rows = rows[order]
+        edge, lane, pos = state.edge[rows], state.lane[rows], pos[order]
+        self._edge_order = rows
+        self.edge_order_code = edge
+        self.edge_order_pos = pos
+        length = state.length[rows]
+
+        # number of vehicles in each slot, and range of slot-ordered indices
+        # covered by every slot and every edge
+        slot = edge * max_lanes + lane
+        counts = np.bincount(slot, minlength=num_slots)
+        ends = np.cumsum(counts)
+        starts = ends - counts
+        self.slot_start = starts
+        self.slot_end = ends
+        self.edge_start = starts[::max_lanes]
+        self.edge_end = ends[max_lanes - 1::max_lanes]
+
+        self.index_of = np.full(capacity, -1, dtype=np.int64)
+        self.index_of[rows] = np.arange(num_veh)
+        self.num_lanes = self.edge_lanes[edge]
+        if num_veh == 0:
+            self.sorted_rows = rows
+            self.sorted_pos = pos
+            self.leaders = np.zeros((max_lanes, 0), dtype=np.int64)
+            self.followers = np.zeros((max_lanes, 0), dtype=np.int64)
+            self.headways = np.zeros((max_lanes, 0))
+            self.tailways = np.zeros((max_lanes, 0))
+            return
+
+        # All per-lane quantities below are arrays of shape
+        # (max_lanes, number of vehicles), where element (j, k) corresponds
+        # to lane j of the edge of the k-th vehicle in the (edge, position)
+        # order.
+        lanes = np.arange(max_lanes)[:, None]
+        query = edge * max_lanes + lanes
+        valid = lanes < self.num_lanes
+        own = lanes == lane
+
+        # number of vehicles in each lane of the vehicle's edge located
+        # strictly behind the vehicle, computed from the cumulative number of
+        # vehicles in each lane in the (edge, position) order
+        in_lane = own.astype(np.int64)
+        behind = np.cumsum(in_lane, axis=1) - in_lane
+        index = np.arange(num_veh)
+        edge_first = self.edge_start[edge]
+        own_rank = behind[lane, index] - behind[lane, edge_first]
+        new_group = np.ones(num_veh, dtype=bool)
+        new_group[1:] = (edge[1:] != edge[:-1]) | (pos[1:] != pos[:-1])
+        group_start = np.maximum.accumulate(np.where(new_group, index, 0))
+        behind = np.take(behind, group_start, axis=1) - \
+            np.take(behind, edge_first, axis=1)
+
+        # sort the vehicles by edge, lane, and position ("slot order"). The
+        # slot-ordered index of every vehicle is the start of its slot plus
+        # the number of vehicles in front of it in the same slot.
+        slot_index = starts[slot] + own_rank
+        slot_rows = np.empty_like(rows)
+        slot_rows[slot_index] = rows
+        slot_pos = np.empty_like(pos)
+        slot_pos[slot_index] = pos
+        slot_length = np.empty_like(length)
+        slot_length[slot_index] = length
+        self.sorted_rows = slot_rows
+        self.sorted_pos = slot_pos
+
+        # slot-ordered index of the first vehicle in every lane that is not
+        # behind the vehicle. In the vehicle's own lane, this may be the
+        # vehicle itself, in which case the leader is the vehicle after it.
+        start = starts.take(query)
+        end = ends.take(query)
+        first = start + behind
+        is_self = own & (first == slot_index)
+        lead = first + is_self
+        follow = first - 1
+
+        has_lead = valid & (lead < end)
+        has_follow = valid & (first > start)
+        np.minimum(lead, num_veh - 1, out=lead)
+        np.maximum(follow, 0, out=follow)
+
+        leaders = np.where(has_lead, slot_rows.take(lead), -1)
+        followers = np.where(has_follow, slot_rows.take(follow), -1)
+        headways = np.where(
+            has_lead, slot_pos.take(lead) - pos - slot_length.take(lead),
+            DEFAULT_HEADWAY)
+        tailways = np.where(
+            has_follow, pos - slot_pos.take(follow) - length,
+            DEFAULT_HEADWAY)
+
+        # if a lane leader is not found, check the next edges
+        ln, veh = np.divmod(np.flatnonzero(valid & ~has_lead), num_veh)
+        cur = query[ln, veh]
+        add_length = np.zeros(len(veh))
+        for _ in range(self.num_edges):
+            if len(veh) == 0:
+                break
+
+            # stop for vehicles with no edge/lane pairs in front of them
+            nxt = self.next_slot[cur]
+            keep = nxt >= 0
+            veh, ln, add_length = veh[keep], ln[keep], add_length[keep]
+            add_length += self.slot_length[cur[keep]]
+            cur = nxt[keep]
+
+            found = ends[cur] > starts[cur]
+            head = starts[cur[found]]
+            leaders[ln[found], veh[found]] = slot_rows[head]
+            headways[ln[found], veh[found]] = \
+                slot_pos[head] - pos[veh[found]] + add_length[found] \
+                - slot_length[head]
+
+            veh, ln, cur, add_length = \
+                veh[~found], ln[~found], cur[~found], add_length[~found]
+
+        # if a lane follower is not found, check the previous edges
+        ln, veh = np.divmod(np.flatnonzero(valid & ~has_follow), num_veh)
+        cur = query[ln, veh]
+        add_length = np.zeros(len(veh))
+        for _ in range(self.num_edges):
+            if len(veh) == 0:
+                break
+
+            # stop for vehicles with no edge/lane pairs behind them
+            prv = self.prev_slot[cur]
+            keep = prv >= 0
+            veh, ln, add_length = veh[keep], ln[keep], add_length[keep]
+            cur = prv[keep]
+            add_length += self.slot_length[cur]
+
+            found = ends[cur] > starts[cur]
+            tail = ends[cur[found]] - 1
+            followers[ln[found], veh[found]] = slot_rows[tail]
+            tailways[ln[found], veh[found]] = \
+                pos[veh[found]] - slot_pos[tail] + add_length[found] \
+                - length[veh[found]]
+
+            veh, ln, cur, add_length = \
+                veh[~found], ln[~found], cur[~found], add_length[~found]
+
+        self.leaders = leaders
+        self.followers = followers
+        self.headways = headways
+        self.tailways = tailways
+
+    def _presort(self, rows, capacity):
+        """Order rows as in the last time step, with new rows placed last."""
+        mark = np.zeros(capacity, dtype=bool)
+        mark[rows] = True
+        prev = self._edge_order[self._edge_order < capacity]
+        prev = prev[mark[prev]]
+        mark[prev] = False
+        return np.concatenate((prev, np.flatnonzero(mark)))
+
+    def _index(self, row):
+        """Return the index of the data of a row, or -1 if not computed."""
+        if 0 <= row < len(self.index_of):
+            return self.index_of[row]
+        return -1
+
+    def get(self, values, row, error):
+        """Return the multi-lane data of a vehicle as a list.
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            one of ``self.headways`` or ``self.tailways``
+        row : int
+            row of the vehicle in the columnar state (-1 if not found)
+        error : any
+            value that is returned if the data is not available
+
+        Returns
+        -------
+        list of float
+            Index = lane index, Element = value at this lane
+        """
+        index = self._index(row)
+        if index < 0:
+            return error
+        return values[:self.num_lanes[index], index].tolist()
+
+    def get_neighbors(self, values, row, ids, error):
+        """Return the lane leaders or followers of a vehicle as a list.
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            one of ``self.leaders`` or ``self.followers``
+        row : int
+            row of the vehicle in the columnar state (-1 if not found)
+        ids : numpy.ndarray
+            vehicle id of every row in the columnar state
+        error : any
+            value that is returned if the data is not available
+
+        Returns
+        -------
+        list of str
+            Index = lane index, Element = name of the vehicle at this lane, or
+            an empty string if there is no such vehicle
+        """
+        index = self._index(row)
+        if index < 0:
+            return error
+        return ["" if neighbor < 0 else ids[neighbor]
+                for neighbor in values[:self.num_lanes[index], index]]
+
+    def set(self, name, row, data):
+        """Overwrite the multi-lane data of a vehicle.
+
+        The data can only be overwritten for vehicles whose data was computed
+        during the last update.
+
+        Parameters
+        ----------
+        name : str
+            name of the multi-lane data array, one of "leaders", "followers",
+            "headways", or "tailways"
+        row : int
+            row of the vehicle in the columnar state
+        data : list
+            Index = lane index, Element = value at this lane
+
+        Raises
+        ------
+        KeyError
+            if the data of the vehicle was not computed
+        """
+        index = self._index(row)
+        if index < 0:
+            raise KeyError(row)
+        getattr(self, name)[:len(data), index] = data
+        self.num_lanes[index] = len(data)
+
+    def get_ids_by_edge(self, state, edge):
+        """Return the names of all vehicles on an edge.
+
+        The vehicles are ordered by lane, and then by position.
+        """
+        return state.ids[self.rows_by_edge(state, edge)].tolist()
+
+    ###########################################################################
+    #                             Spatial queries                             #
+    ###########################################################################
+
+    def _edge_range(self, state, edge):
+        """Return the range of sorted indices covered by an edge."""
+        code = state.lookup_edge(edge)
+        if code <= 0 or code >= len(self.edge_start):
+            return 0, 0
+        return self.edge_start[code], self.edge_end[code]
+
+    def rows_by_edge(self, state, edges):
+        """Return the rows of all vehicles on one or several edges.
+
+        The vehicles are ordered by edge (in the order of the edges), by lane,
+        and then by position. This runs in time proportional to the number of
+        edges and vehicles returned.
+
+        Parameters
+        ----------
+        state : flow.core.kernel.vehicle.columnar.ColumnarVehicleState
+            columnar vehicle state
+        edges : str or list of str
+            name of the edge(s)
+
+        Returns
+        -------
+        numpy.ndarray
+            rows of the vehicles in the columnar state
+        """
+        if isinstance(edges, str):
+            start, end = self._edge_range(state, edges)
+            return self.sorted_rows[start:end]
+        return np.concatenate(
+            [np.zeros(0, dtype=np.int64)] +
+            [self.sorted_rows[slice(*self._edge_range(state, edge))]
+             for edge in edges])
+
+    def rows_closest_to_end(self, state, edge, k):
+        """Return the rows of the k vehicles closest to the end of an edge.
+
+        Parameters
+        ----------
+        state : flow.core.kernel.vehicle.columnar.ColumnarVehicleState
+            columnar vehicle state
+        edge : str
+            name of the edge
+        k : int
+            maximum number of vehicles to return
+
+        Returns
+        -------
+        numpy.ndarray
+            rows of the vehicles in the columnar state, ordered from the
+            vehicle closest to the end of the edge to the farthest one
+        """
+        start, end = self._edge_range(state, edge)
+        return self._edge_order[max(start, end - k):end][::-1]
+
+    def rows_in_segment(self, state, edge, start, end, lane=None):
+        """Return the rows of the vehicles in a segment of an edge.
+
+        The segment is located in logarithmic time by bisecting the sorted
+        positions of the vehicles on the edge.
+
+        Parameters
+        ----------
+        state : flow.core.kernel.vehicle.columnar.ColumnarVehicleState
+            columnar vehicle state
+        edge : str
+            name of the edge
+        start : float
+            position of the start of the segment on the edge (included)
+        end : float
+            position of the end of the segment on the edge (excluded)
+        lane : int, optional
+            lane of the segment. All lanes are covered if not specified.
+
+        Returns
+        -------
+        numpy.ndarray
+            rows of the vehicles in the columnar state, ordered by position
+        """
+        if lane is None:
+            rows, positions = self._edge_order, self.edge_order_pos
+            first, last = self._edge_range(state, edge)
+        else:
+            rows, positions = self.sorted_rows, self.sorted_pos
+            code = state.lookup_edge(edge)
+            slot = code * self.max_lanes + lane
+            if code <= 0 or not 0 <= lane < self.max_lanes \
+                    or slot >= len(self.slot_start):
+                return rows[:0]
+            first, last = self.slot_start[slot], self.slot_end[slot]
+
+        positions = positions[first:last]
+        return rows[first + np.searchsorted(positions, start):
+                    first + np.searchsorted(positions, end)]
+
+    def rows_within(self, row, distance):
+        """Return the rows of the vehicles close to a vehicle.
+
+        The vehicles are collected on all lanes of the edge of the vehicle,
+        in logarithmic time plus the number of vehicles returned. Vehicles on
+        other edges are not collected.
+
+        Parameters
+        ----------
+        row : int
+            row of the vehicle in the columnar state (-1 if not found)
+        distance : float
+            maximum distance between the positions of the vehicles (in m)
+
+        Returns
+        -------
+        numpy.ndarray
+            rows of the vehicles in the columnar state (excluding the
+            vehicle), ordered by position
+        """
+        index = self._index(row)
+        if index < 0:
+            return self._edge_order[:0]
+
+        code = self.edge_order_code[index]
+        first, last = self.edge_start[code], self.edge_end[code]
+        positions = self.edge_order_pos[first:last]
+        pos = self.edge_order_pos[index]
+        rows = self._edge_order[
+            first + np.searchsorted(positions, pos - distance, 'left'):
+            first + np.searchsorted(positions, pos + distance, 'right')]
+        return rows[rows != row]
@@ -0,0 +1,175 @@
+"""Script containing the vehicle kernel class of the numpy simulator."""
+
+from flow.core.kernel.vehicle.columnar_kernel import ColumnarKernelVehicle
+import numpy as np
+
+# colors for vehicles
+WHITE = (255, 255, 255)
+CYAN = (0, 255, 255)
+RED = (255, 0, 0)
+
+
+class NumpyVehicle(ColumnarKernelVehicle):
+    """Flow vehicle kernel for the built-in numpy simulator.
+
+    The state of the vehicles is stored by the simulator in a columnar vehicle
+    state (see flow.core.kernel.vehicle.columnar), which is shared with this
+    kernel. All state getters therefore read directly from the arrays updated
+    by the simulator, without any data being copied between the two.
+
+    Extends flow.core.kernel.vehicle.columnar_kernel.ColumnarKernelVehicle
+    """
+
+    def __init__(self,
+                 master_kernel,
+                 sim_params):
+        """See parent class."""
+        ColumnarKernelVehicle.__init__(self, master_kernel, sim_params)
+
+        # colors of the vehicles: Key = Vehicle ID, Element = (r, g, b)
+        self._colors = dict()
+
+    def pass_api(self, kernel_api):
+        """See parent class.
+
+        The columnar vehicle state of the simulator is bound here.
+        """
+        ColumnarKernelVehicle.pass_api(self, kernel_api)
+        self._state = kernel_api.state
+        self._lane_data = kernel_api.lane_data
+
+    def load_state(self, state):
+        """See parent class.
+
+        The columnar vehicle state of the simulator, restored with the
+        simulator, is bound again here.
+        """
+        ColumnarKernelVehicle.load_state(self, state)
+        self._state = self.kernel_api.state
+        self._lane_data = self.kernel_api.lane_data
+
+    def update(self, reset):
+        """See parent class.
+
+        The state of the vehicles is updated by the simulator. This method
+        only adds vehicles that entered the network to the vehicles class, and
+        removes vehicles that exited the network.
+
+        Parameters
+        ----------
+        reset : bool
+            specifies whether the simulator was reset in the last simulation
+            step
+        """
+        arrived_ids = list(self.kernel_api.arrived_ids)
+        departed_ids = list(self.kernel_api.departed_ids)
+
+        # remove exiting vehicles from the vehicles class
+        for veh_id in arrived_ids:
+            self.remove(veh_id)
+
+        # add entering vehicles into the vehicles class
+        for veh_id in departed_ids:
+            if veh_id in self.get_ids():
+                # the vehicle was replaced in the network, and only its
+                # controllers and other bookkeeping need to be kept
+                continue
+            self._add_departed(veh_id, self.kernel_api.get_type(veh_id))
+
+        self._update_vehicles(reset, departed_ids, arrived_ids)
+
+    def _add_departed(self, veh_id, veh_type):
+        """Add a vehicle that entered the network from an inflow or reset.
+
+        Parameters
+        ----------
+        veh_id: str
+            name of the vehicle
+        veh_type: str
+            type of vehicle
+        """
+        self._add_vehicle(veh_id, veh_type)
+
+        # vehicles are white until colored otherwise
+        self._colors[veh_id] = WHITE
+
+    def remove(self, veh_id):
+        """See parent class."""
+        # remove from the simulator
+        self.kernel_api.remove(veh_id)
+        self._colors.pop(veh_id, None)
+        self._remove_vehicle(veh_id)
+
+    def get_timestep(self, veh_id):
+        """See parent class."""
+        return int(round(self.kernel_api.time * 1000))
+
+    def get_timedelta(self, veh_id):
+        """See parent class."""
+        return int(round(self.sim_step * 1000))
+
+    def apply_acceleration(self, veh_ids, acc):
+        """See parent class."""
+        commands = [(vid, a) for vid, a in zip(veh_ids, acc)
+                    if a is not None and vid in self._state]
+        if len(commands) == 0:
+            return
+
+        veh_ids = np.array([vid for vid, _ in commands], dtype=object)
+        acc = np.array([a for _, a in commands], dtype=float)
+        this_vel = self.get_speed(veh_ids)
+        next_vel = np.maximum(this_vel + acc * self.sim_step, 0)
+        self.kernel_api.set_speed(veh_ids, next_vel)
+
+    def _change_lane(self, veh_id, target_lane):
+        """See parent class."""
+        self.kernel_api.change_lane(veh_id, target_lane)
+
+    def choose_routes(self, veh_ids, route_choices):
+        """See parent class."""
+        for i, veh_id in enumerate(veh_ids):
+            if route_choices[i] is not None:
+                self.kernel_api.set_route(veh_id, route_choices[i])
+
+    def update_vehicle_colors(self):
+        """See parent class.
+
+        The colors of all vehicles are updated as follows:
+        - red: autonomous (rl) vehicles
+        - white: unobserved human-driven vehicles
+        - cyan: observed human-driven vehicles
+        """
+        for veh_id in self.get_rl_ids():
+            # color rl vehicles red
+            self.set_color(veh_id=veh_id, color=RED)
+
+        # color vehicles white if not observed and cyan if observed
+        for veh_id in self.get_human_ids():
+            color = CYAN if veh_id in self.get_observed_ids() else WHITE
+            self.set_color(veh_id=veh_id, color=color)
+
+        # clear the list of observed vehicles
+        for veh_id in self.get_observed_ids():
+            self.remove_observed(veh_id)
+
+    def get_color(self, veh_id):
+        """See parent class."""
+        return self._colors[veh_id]
+
+    def set_color(self, veh_id, color):
+        """See parent class."""
+        self._colors[veh_id] = tuple(color)
+
+    def add(self, veh_id, type_id, edge, pos, lane, speed):
+        """See parent class."""
+        self.kernel_api.add(veh_id, type_id, edge, lane, pos, speed)
+
+    def get_max_speed(self, veh_id, error=-1001):
+        """See parent class."""
+        if isinstance(veh_id, (list, np.ndarray)):
+            return [self.get_max_speed(vehID, error) for vehID in veh_id]
+        return self._state.get(self._state.max_speed, veh_id, error)
+
+    def set_max_speed(self, veh_id, max_speed):
+        """See parent class."""
+        self.kernel_api.set_max_speed(veh_id, max_speed)
@@ -0,0 +1,145 @@
+"""Script containing the incremental ordering of vehicles by a key."""
+
+import numpy as np
+
+
+class VehicleOrder(object):
+    """Vehicles ordered by a per-vehicle key, e.g. their absolute position.
+
+    The order of the vehicles is kept between updates of their keys and is
+    repaired incrementally: vehicles that entered the network are appended
+    to the previous order, and the order is then checked in a single
+    vectorized pass and only re-sorted if some keys are out of order. The
+    re-sort uses a stable sort (timsort) on the previously ordered keys,
+    which runs in near-linear time on the almost-sorted arrays produced by
+    a few lane changes and overtakes. Vehicles with equal keys keep their
+    previous relative order.
+
+    Besides the keys, the structure stores optional per-vehicle columns
+    (e.g. the previous positions of the vehicles) that are aligned with the
+    vehicles it tracks.
+
+    Usage:
+
+        >>> order = VehicleOrder(columns={"prev_pos": np.nan})
+        >>> order.sync(["a", "b", "c"])
+        >>> order.set_keys([10., 5., 20.])
+        >>> order.sorted_ids
+        ['b', 'a', 'c']
+        >>> order.order
+        array([1, 0, 2])
+    """
+
+    def __init__(self, default=-1001, columns=None):
+        """Instantiate an empty ordering.
+
+        Parameters
+        ----------
+        default : float, optional
+            key of the vehicles whose key was never set
+        columns : dict < str, float >, optional
+            names of additional per-vehicle columns, and the values of these
+            columns for the vehicles that are added to the ordering
+        """
+        self.default = default
+        self._fill = dict(columns or {})
+
+        # ids of the tracked vehicles, and index of every id in the list
+        self.ids = []
+        self._index = dict()
+        # key and additional columns of every tracked vehicle
+        self.keys = np.zeros(0)
+        self.columns = {name: np.zeros(0) for name in self._fill}
+        # indices of the tracked vehicles (in self.ids) sorted by their keys
+        self.order = np.zeros(0, dtype=np.int64)
+        # cached sorted list of ids
+        self._sorted_ids = []
+
+    def __len__(self):
+        """Return the number of tracked vehicles."""
+        return len(self.ids)
+
+    def sync(self, veh_ids):
+        """Track exactly the specified vehicles.
+
+        Vehicles that are no longer specified are removed from the ordering,
+        and new vehicles are added with the default key and column values.
+        Nothing is done if the vehicles did not change since the last call.
+
+        Parameters
+        ----------
+        veh_ids : list of str
+            ids of the vehicles (e.g. all vehicles in the network)
+        """
+        if veh_ids == self.ids:
+            return
+
+        # previous index of every vehicle (-1 for new vehicles)
+        get = self._index.get
+        rows = np.array([get(veh_id, -1) for veh_id in veh_ids],
+                        dtype=np.int64)
+        kept = rows >= 0
+
+        # previous order of the kept vehicles, followed by the new vehicles
+        new_index = -np.ones(len(self.ids), dtype=np.int64)
+        new_index[rows[kept]] = np.flatnonzero(kept)
+        order = new_index[self.order]
+        self.order = np.concatenate((order[order >= 0], np.flatnonzero(~kept)))
+
+        self.keys = self._realign(self.keys, rows, kept, self.default)
+        for name, fill in self._fill.items():
+            self.columns[name] = self._realign(
+                self.columns[name], rows, kept, fill)
+
+        self.ids = list(veh_ids)
+        self._index = {veh_id: i for i, veh_id in enumerate(self.ids)}
+        self._repair()
+
+    @staticmethod
+    def _realign(values, rows, kept, fill):
+        """Return the values of the vehicles at their new indices."""
+        out = np.full(len(rows), fill, dtype=float)
+        out[kept] = values[rows[kept]]
+        return out
+
+    def set_keys(self, keys):
+        """Set the keys of the tracked vehicles and repair their order.
+
+        Parameters
+        ----------
+        keys : array_like
+            key of every tracked vehicle, in the order of ``ids``
+        """
+        self.keys = np.asarray(keys, dtype=float)
+        self._repair()
+
+    def _repair(self):
+        """Restore the order of the vehicles after their keys changed."""
+        keys = self.keys[self.order]
+        if np.any(keys[1:] < keys[:-1]):
+            self.order = self.order[np.argsort(keys, kind='mergesort')]
+        self._sorted_ids = None
+
+    @property
+    def sorted_ids(self):
+        """Return the ids of the tracked vehicles sorted by their keys."""
+        if self._sorted_ids is None:
+            ids = self.ids
+            self._sorted_ids = [ids[i] for i in self.order]
+        return self._sorted_ids
+
+    def as_dict(self, values=None):
+        """Return the keys (or the values of a column) of every vehicle.
+
+        Parameters
+        ----------
+        values : numpy.ndarray, optional
+            values aligned with ``ids`` (e.g. a column). Defaults to the keys.
+
+        Returns
+        -------
+        dict < str, float >
+            value of every tracked vehicle
+        """
+        values = self.keys if values is None else values
+        return dict(zip(self.ids, values.tolist()))
@@ -355,7 +355,10 @@ class SimParams(object):
                  save_render=False,
                  sight_radius=25,
                  show_radius=False,
-                 pxpm=2):
+                 pxpm=2,
+                 reset_from_snapshot=False,
+                 record_trajectories=False,
+                 renderer="pyglet"):
         """Instantiate SimParams.
 
         Parameters
@@ -380,14 +383,36 @@ class SimParams(object):
         emission_path: str, optional
             Path to the folder in which to create the emissions output.
             Emissions output is not generated if this value is not specified
-        save_render: bool, optional
-            specifies whether to save rendering data to disk
+        save_render: bool or str, optional
+            specifies whether to save rendering data to disk. If set to
+            "video", the frames are encoded into a video with ffmpeg instead
+            of being saved as PNG images.
         sight_radius: int, optional
             sets the radius of observation for RL vehicles (meter)
         show_radius: bool, optional
             specifies whether to render the radius of RL observation
         pxpm: int, optional
             specifies rendering resolution (pixel / meter)
+        reset_from_snapshot: bool, optional
+            specifies whether to reset the simulation by restoring a snapshot
+            of the state of the simulation at the start of the first rollout,
+            instead of removing and re-adding all vehicles. Snapshots are not
+            used if "restart_instance" is set to True, or if vehicles are
+            shuffled upon reset.
+        record_trajectories: bool, optional
+            specifies whether to record the trajectories of all vehicles in
+            the flow kernel instead of generating the emission output of the
+            simulator. The trajectories are written to a binary columnar file
+            in "emission_path" (see flow.core.kernel.recorder). Trajectories
+            are not recorded if "emission_path" is not specified.
+        renderer: str, optional
+            renderer used if "render" is set to one of the pyglet rendering
+            modes ("gray", "dgray", "rgb" or "drgb")
+
+            * "pyglet": render the frames with pyglet, which requires access
+              to a display
+            * "numpy": render the frames offscreen with numpy, which does not
+              require a display and is faster during training
         """
         self.sim_step = sim_step
         self.render = render
@@ -397,6 +422,9 @@ class SimParams(object):
         self.sight_radius = sight_radius
         self.pxpm = pxpm
         self.show_radius = show_radius
+        self.reset_from_snapshot = reset_from_snapshot
+        self.record_trajectories = record_trajectories
+        self.renderer = renderer
 
 
 class AimsunParams(SimParams):
@@ -437,8 +465,10 @@ class AimsunParams(SimParams):
         emission_path: str, optional
             Path to the folder in which to create the emissions output.
             Emissions output is not generated if this value is not specified
-        save_render: bool, optional
-            specifies whether to save rendering data to disk
+        save_render: bool or str, optional
+            specifies whether to save rendering data to disk. If set to
+            "video", the frames are encoded into a video with ffmpeg instead
+            of being saved as PNG images.
         sight_radius: int, optional
             sets the radius of observation for RL vehicles (meter)
         show_radius: bool, optional
@@ -479,7 +509,12 @@ class SumoParams(SimParams):
                  print_warnings=True,
                  teleport_time=-1,
                  num_clients=1,
-                 sumo_binary=None):
+                 sumo_binary=None,
+                 prewarm_instances=0,
+                 reset_from_snapshot=False,
+                 record_trajectories=False,
+                 use_libsumo=False,
+                 renderer="pyglet"):
         """Instantiate SumoParams.
 
         Attributes
@@ -506,8 +541,10 @@ class SumoParams(SimParams):
             "dgray": dynamic grayscale rendering
             "rgb": static RGB rendering
             "drgb": dynamic RGB rendering, which is good for visualization
-        save_render: bool, optional
-            specifies whether to save rendering data to disk
+        save_render: bool or str, optional
+            specifies whether to save rendering data to disk. If set to
+            "video", the frames are encoded into a video with ffmpeg instead
+            of being saved as PNG images.
         sight_radius: int, optional
             sets the radius of observation for RL vehicles (meter)
         show_radius: bool, optional
@@ -531,11 +568,42 @@ class SumoParams(SimParams):
             they teleport after teleport_time seconds
         num_clients: int, optional
             Number of clients that will connect to Traci
+        prewarm_instances: int, optional
+            number of sumo instances that are started and connected to ahead
+            of time when "restart_instance" is set to True, so that restarting
+            the simulation upon reset does not wait for sumo to start. The
+            seeds of these instances are drawn from a sequence seeded with
+            "seed". Defaults to 0, in which case every instance is started on
+            demand. Instances are never prewarmed when rendering with
+            sumo-gui, generating emission outputs, or using multiple clients.
+        reset_from_snapshot: bool, optional
+            specifies whether to reset the simulation by restoring a snapshot
+            of the state of the simulation at the start of the first rollout
+            (saved with sumo's saveState), instead of removing and re-adding
+            all vehicles. Snapshots are not used if "restart_instance" is set
+            to True, or if vehicles are shuffled upon reset.
+        record_trajectories: bool, optional
+            specifies whether to record the trajectories of all vehicles in
+            the flow kernel instead of generating sumo's xml emission output.
+            The trajectories are written to a binary columnar file in
+            "emission_path" (see flow.core.kernel.recorder). Trajectories are
+            not recorded if "emission_path" is not specified.
+        use_libsumo: bool, optional
+            specifies whether to run sumo within the python process through
+            the libsumo bindings, instead of starting a sumo process and
+            communicating with it through TraCI over a socket. This requires
+            libsumo to be installed, and cannot be used with sumo-gui or
+            multiple clients. Only one such simulation can run per process.
+        renderer: str, optional
+            renderer used if "render" is set to one of the pyglet rendering
+            modes: "pyglet" (requires access to a display) or "numpy"
+            (renders offscreen, see flow.renderer.numpy_renderer)
 
         """
         super(SumoParams, self).__init__(
             sim_step, render, restart_instance, emission_path, save_render,
-            sight_radius, show_radius, pxpm)
+            sight_radius, show_radius, pxpm, reset_from_snapshot,
+            record_trajectories, renderer)
         self.port = port
         self.lateral_resolution = lateral_resolution
         self.no_step_log = no_step_log
@@ -544,6 +612,8 @@ class SumoParams(SimParams):
         self.print_warnings = print_warnings
         self.teleport_time = teleport_time
         self.num_clients = num_clients
+        self.prewarm_instances = prewarm_instances
+        self.use_libsumo = use_libsumo
 
 
 class EnvParams:
@@ -559,7 +629,10 @@ class EnvParams:
                  horizon=500,
                  warmup_steps=0,
                  sims_per_step=1,
-                 evaluate=False):
+                 evaluate=False,
+                 profile=False,
+                 profile_interval=None,
+                 profile_path=None):
         """Instantiate EnvParams.
 
         Attributes
@@ -582,6 +655,18 @@ class EnvParams:
                 flag indicating that the evaluation reward should be used
                 so the evaluation reward should be used rather than the
                 normal reward
+            profile: bool, optional
+                specifies whether to time the phases of the steps and resets
+                of the environment (see flow.core.profiler). The durations of
+                the phases of a step are then returned under "timings" in the
+                info dict of the step.
+            profile_interval: int, optional
+                number of steps between two logged summaries of the timings,
+                if "profile" is set to True. No summary is logged if not
+                specified.
+            profile_path: str, optional
+                path to a json file the timings are written to together with
+                every summary, and when the environment is terminated
 
         """
         self.additional_params = \
@@ -590,6 +675,9 @@ class EnvParams:
         self.warmup_steps = warmup_steps
         self.sims_per_step = sims_per_step
         self.evaluate = evaluate
+        self.profile = profile
+        self.profile_interval = profile_interval
+        self.profile_path = profile_path
 
     def get_additional_param(self, key):
         """Return a variable from additional_params."""
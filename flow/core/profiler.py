@@ -0,0 +1,230 @@
+"""Script containing a low-overhead profiler of the phases of environments."""
+
+import collections
+import json
+import logging
+import time
+
+
+class _NullPhase(object):
+    """Context manager timing nothing, used when profiling is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase(object):
+    """Context manager timing one execution of a phase."""
+
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class PhaseStats(object):
+    """Aggregate statistics of the executions of one phase."""
+
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+
+    def add(self, duration):
+        """Account for one execution of the phase, lasting duration sec."""
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    @property
+    def mean(self):
+        """Return the mean duration of an execution of the phase."""
+        return self.total / self.count if self.count > 0 else 0.
+
+    def to_dict(self):
+        """Return the statistics as a dict."""
+        return {'count': self.count, 'total': self.total, 'mean': self.mean,
+                'max': self.max}
+
+
+class Profiler(object):
+    """Times the phases of an environment, and counts events.
+
+    Phases are timed with a monotonic clock by wrapping them in
+    ``with profiler.phase(name):`` blocks. Phases may be nested, in which
+    case the time of the inner phases is also accounted for in the outer
+    phase. Events (e.g. the number of vehicles controlled) are counted with
+    ``count``.
+
+    Every phase is aggregated into a PhaseStats object, available through
+    ``stats``. The durations of the phases executed since the last call to
+    ``start_step`` are available through ``last_step``, e.g. to be returned
+    in the info dict of an environment.
+
+    If ``log_interval`` is specified, a summary of the statistics is logged
+    every ``log_interval`` steps, and is written to ``path`` as json if
+    specified.
+
+    If the profiler is disabled, ``phase`` returns a shared context manager
+    doing nothing, and ``count`` returns immediately, so that instrumented
+    code runs at nearly no cost.
+
+    Usage:
+
+        >>> profiler = Profiler(enabled=True)
+        >>> with profiler.phase('step'):
+        >>>     with profiler.phase('step.simulation_step'):
+        >>>         env.k.simulation.simulation_step()
+        >>> profiler.stats['step.simulation_step'].mean
+    """
+
+    def __init__(self, enabled=False, log_interval=None, path=None):
+        """Instantiate the profiler.
+
+        Parameters
+        ----------
+        enabled : bool, optional
+            specifies whether to time phases and count events
+        log_interval : int, optional
+            number of steps between two summaries of the statistics. No
+            summary is logged if not specified.
+        path : str, optional
+            path to a json file the statistics are written to together with
+            every summary, and by ``dump``
+        """
+        self.enabled = enabled
+        self.log_interval = log_interval
+        self.path = path
+
+        # Key = phase name, Element = PhaseStats of the phase
+        self.stats = collections.OrderedDict()
+        # Key = event name, Element = number of occurrences
+        self.counters = collections.OrderedDict()
+        # Key = phase name, Element = time spent in the phase in the last step
+        self.last_step = dict()
+        # number of steps since the creation of the profiler
+        self.num_steps = 0
+
+    def phase(self, name):
+        """Return a context manager timing a phase.
+
+        Parameters
+        ----------
+        name : str
+            name of the phase, e.g. "step.simulation_step"
+        """
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def add_time(self, name, duration):
+        """Account for the execution of a phase timed outside the profiler.
+
+        Parameters
+        ----------
+        name : str
+            name of the phase
+        duration : float
+            duration of the execution (in sec)
+        """
+        if not self.enabled:
+            return
+        try:
+            stats = self.stats[name]
+        except KeyError:
+            stats = self.stats[name] = PhaseStats()
+        stats.add(duration)
+        self.last_step[name] = self.last_step.get(name, 0.) + duration
+
+    def count(self, name, num=1):
+        """Increment the counter of an event.
+
+        Parameters
+        ----------
+        name : str
+            name of the event
+        num : int, optional
+            number of occurrences of the event
+        """
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + num
+
+    def start_step(self):
+        """Mark the start of a step, clearing the durations of the last step.
+
+        A summary of the statistics is logged (and written) if the number of
+        steps reaches a multiple of ``log_interval``.
+        """
+        if not self.enabled:
+            return
+        self.last_step = dict()
+        self.num_steps += 1
+        if self.log_interval and self.num_steps % self.log_interval == 0:
+            self.log()
+            if self.path is not None:
+                self.dump()
+
+    def to_dict(self):
+        """Return the statistics and counters as a dict."""
+        return {
+            'num_steps': self.num_steps,
+            'phases': collections.OrderedDict(
+                (name, stats.to_dict()) for name, stats in self.stats.items()),
+            'counters': dict(self.counters),
+        }
+
+    def summary(self):
+        """Return a table of the statistics, sorted by total time."""
+        lines = ['{:<40} {:>8} {:>10} {:>10} {:>10}'.format(
+            'phase', 'count', 'total (s)', 'mean (ms)', 'max (ms)')]
+        for name, stats in sorted(self.stats.items(),
+                                  key=lambda item: -item[1].total):
+            lines.append('{:<40} {:>8} {:>10.3f} {:>10.3f} {:>10.3f}'.format(
+                name, stats.count, stats.total, 1e3 * stats.mean,
+                1e3 * stats.max))
+        for name, num in self.counters.items():
+            lines.append('{:<40} {:>8}'.format(name, num))
+        return '\n'.join(lines)
+
+    def log(self):
+        """Log a summary of the statistics."""
+        logging.info(' Profile after %d steps:\n%s', self.num_steps,
+                     self.summary())
+
+    def dump(self, path=None):
+        """Write the statistics and counters to a json file.
+
+        Parameters
+        ----------
+        path : str, optional
+            path to the file. Defaults to the path of the profiler.
+        """
+        with open(path or self.path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def reset_stats(self):
+        """Clear all statistics and counters."""
+        self.stats.clear()
+        self.counters.clear()
+        self.last_step = dict()
+        self.num_steps = 0
@@ -1,8 +1,193 @@
-"""This script contains of series of reward functions."""
+"""This script contains of series of reward functions.
+
+Every reward function accepts either an environment or a ``RewardState``
+snapshot of the environment. Snapshots gather the kernel arrays used by the
+reward functions (speeds, headways, leaders, ...) at most once and share them
+between all the reward terms evaluated on the same snapshot, so that
+composite rewards (see ``compose``) cost about one pass over the vehicles of
+the network regardless of their number of terms.
+"""
 
 import numpy as np
 
 
+def _cached(method):
+    """Turn a method of a snapshot into a property computed at most once."""
+    name = '_' + method.__name__
+
+    def getter(self):
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            value = self.__dict__[name] = method(self)
+            return value
+
+    return property(getter, doc=method.__doc__)
+
+
+class RewardState(object):
+    """Snapshot of the kernel arrays used by the reward functions.
+
+    The arrays are gathered lazily from the kernel of the environment the
+    first time they are requested, and are then reused by all the reward
+    functions evaluated on the snapshot. A snapshot is meant to be created
+    once per time step (e.g. in ``compute_reward``), after the kernel was
+    updated, and discarded afterwards.
+
+    Usage:
+
+        >>> state = RewardState(env)
+        >>> reward = desired_velocity(state) + rl_forward_progress(state)
+    """
+
+    def __init__(self, env):
+        """Instantiate the snapshot.
+
+        Parameters
+        ----------
+        env : flow.envs.Env
+            the environment variable, which contains information on the
+            current state of the system.
+        """
+        self.env = env
+        self.k = env.k
+        self.env_params = env.env_params
+        self.sim_step = env.sim_step
+
+    def gather(self, getter, veh_ids, **kwargs):
+        """Return the values of a kernel getter for several vehicles.
+
+        Parameters
+        ----------
+        getter : function
+            getter of the vehicle kernel, e.g. ``env.k.vehicle.get_speed``
+        veh_ids : numpy.ndarray
+            ids of the vehicles
+        kwargs : dict
+            additional arguments of the getter (e.g. the error term)
+
+        Returns
+        -------
+        numpy.ndarray
+            values of the getter for every vehicle
+        """
+        if len(veh_ids) == 0:
+            return np.zeros(0)
+        return np.asarray(getter(veh_ids, **kwargs))
+
+    @_cached
+    def ids(self):
+        """Return the ids of all vehicles in the network."""
+        return np.array(self.k.vehicle.get_ids(), dtype=object)
+
+    @_cached
+    def speeds(self):
+        """Return the speeds of all vehicles in the network."""
+        return self.gather(self.k.vehicle.get_speed, self.ids)
+
+    @_cached
+    def rl_ids(self):
+        """Return the ids of the RL vehicles in the network."""
+        return np.array(self.k.vehicle.get_rl_ids(), dtype=object)
+
+    @_cached
+    def rl_speeds(self):
+        """Return the speeds of the RL vehicles."""
+        return self.gather(self.k.vehicle.get_speed, self.rl_ids)
+
+    @_cached
+    def rl_headways(self):
+        """Return the headways of the RL vehicles."""
+        return self.gather(self.k.vehicle.get_headway, self.rl_ids)
+
+    @_cached
+    def rl_followers(self):
+        """Return the followers of the RL vehicles ("" if none)."""
+        followers = self.gather(self.k.vehicle.get_follower, self.rl_ids)
+        return np.array([veh_id or "" for veh_id in followers], dtype=object)
+
+    @_cached
+    def rl_follower_headways(self):
+        """Return the headways of the followers of the RL vehicles.
+
+        The headway of RL vehicles without a follower is set to -1001.
+        """
+        headways = np.full(len(self.rl_ids), -1001.)
+        followers = self.rl_followers
+        present = followers != ""
+        if present.any():
+            headways[present] = self.gather(
+                self.k.vehicle.get_headway, followers[present])
+        return headways
+
+    @_cached
+    def max_speed(self):
+        """Return the maximum speed on any edge of the network.
+
+        This is a static quantity of the network, which the scenario kernels
+        compute once per network.
+        """
+        return self.k.scenario.max_speed()
+
+
+def snapshot(env):
+    """Return a snapshot of the environment for the reward functions.
+
+    Parameters
+    ----------
+    env : flow.envs.Env or RewardState
+        the environment variable, or an existing snapshot (which is returned
+        as is)
+
+    Returns
+    -------
+    RewardState
+        the snapshot of the environment
+    """
+    if isinstance(env, RewardState):
+        return env
+    return RewardState(env)
+
+
+def compose(*terms):
+    """Create a reward function summing several weighted reward terms.
+
+    All terms are evaluated on a single snapshot of the environment, so that
+    the arrays they need are only collected once.
+
+    Usage:
+
+        >>> reward_fn = compose(
+        ...     (1, desired_velocity),
+        ...     (0.1, rl_forward_progress, {"gain": 1}),
+        ... )
+        >>> reward = reward_fn(env)
+
+    Parameters
+    ----------
+    terms : tuple
+        terms of the reward, each specified as a (weight, reward function)
+        or a (weight, reward function, keyword arguments) tuple. Reward
+        functions are called with the snapshot of the environment as their
+        first argument.
+
+    Returns
+    -------
+    function
+        reward function taking the environment (or a snapshot) as its only
+        argument, and returning the weighted sum of the terms
+    """
+    terms = [(term[0], term[1], term[2] if len(term) > 2 else {})
+             for term in terms]
+
+    def reward_fn(env):
+        state = snapshot(env)
+        return sum(weight * fn(state, **kwargs)
+                   for weight, fn, kwargs in terms)
+
+    return reward_fn
+
+
 def desired_velocity(env, fail=False, edge_list=None):
     """Encourage proximity to a desired velocity.
 
@@ -21,7 +206,7 @@ def desired_velocity(env, fail=False, edge_list=None):
 
     Parameters
     ----------
-    env : flow.envs.Env
+    env : flow.envs.Env or RewardState
         the environment variable, which contains information on the current
         state of the system.
     fail : bool, optional
@@ -30,18 +215,19 @@ def desired_velocity(env, fail=False, edge_list=None):
         list of edges the reward is computed over. If no edge_list is defined,
         the reward is computed over all edges
     """
+    state = snapshot(env)
     if edge_list is None:
-        veh_ids = env.k.vehicle.get_ids()
+        vel = state.speeds
     else:
-        veh_ids = env.k.vehicle.get_ids_by_edge(edge_list)
+        veh_ids = np.array(state.k.vehicle.get_ids_by_edge(edge_list),
+                           dtype=object)
+        vel = state.gather(state.k.vehicle.get_speed, veh_ids)
+    num_vehicles = len(vel)
 
-    vel = np.array(env.k.vehicle.get_speed(veh_ids))
-    num_vehicles = len(veh_ids)
-
-    if any(vel < -100) or fail:
+    if np.any(vel < -100) or fail:
         return 0.
 
-    target_vel = env.env_params.additional_params['target_velocity']
+    target_vel = state.env_params.additional_params['target_velocity']
     max_cost = np.array([target_vel] * num_vehicles)
     max_cost = np.linalg.norm(max_cost)
 
@@ -52,9 +238,9 @@ def desired_velocity(env, fail=False, edge_list=None):
 
 
 def average_velocity(env, fail=False):
-    vel = np.array(env.k.vehicle.get_speed(env.k.vehicle.get_ids()))
+    vel = snapshot(env).speeds
 
-    if any(vel < -100) or fail:
+    if np.any(vel < -100) or fail:
         return 0.
     if len(vel) == 0:
         return 0.
@@ -63,16 +249,17 @@ def average_velocity(env, fail=False):
 
 
 def total_velocity(env, fail=False):
-    vel = np.array(env.k.vehicle.get_speed(env.k.vehicle.get_ids()))
+    vel = snapshot(env).speeds
 
-    if any(vel < -100) or fail:
+    if np.any(vel < -100) or fail:
         return 0.
     if len(vel) != 0:
-        return sum(vel)
+        return np.sum(vel)
 
 
 def reward_density(env):
-    return env.k.vehicle.get_num_arrived() / env.sim_step
+    state = snapshot(env)
+    return state.k.vehicle.get_num_arrived() / state.sim_step
 
 
 def rl_forward_progress(env, gain=0.1):
@@ -80,14 +267,13 @@ def rl_forward_progress(env, gain=0.1):
 
     Parameters
     ----------
-    env: flow.envs.Env
+    env: flow.envs.Env or RewardState
         the environment variable, which contains information on the current
         state of the system.
     gain: float
         specifies how much to reward the RL vehicles
     """
-    rl_velocity = env.k.vehicle.get_speed(env.k.vehicle.get_rl_ids())
-    rl_norm_vel = np.linalg.norm(rl_velocity, 1)
+    rl_norm_vel = np.linalg.norm(snapshot(env).rl_speeds, 1)
     return rl_norm_vel * gain
 
 
@@ -104,46 +290,45 @@ def min_delay(env):
 
     Parameters
     ----------
-    env: flow.envs.Env
+    env: flow.envs.Env or RewardState
         the environment variable, which contains information on the current
         state of the system.
     """
-    vel = np.array(env.k.vehicle.get_speed(env.k.vehicle.get_ids()))
+    state = snapshot(env)
+    vel = state.speeds
 
     vel = vel[vel >= -1e-6]
-    v_top = max(
-        env.k.scenario.speed_limit(edge)
-        for edge in env.k.scenario.get_edge_list())
-    time_step = env.sim_step
-
-    max_cost = time_step * sum(vel.shape)
-    try:
-        cost = time_step * sum((v_top - vel) / v_top)
-        return max((max_cost - cost) / max_cost, 0)
-    except ZeroDivisionError:
+    v_top = state.max_speed
+    time_step = state.sim_step
+
+    max_cost = time_step * len(vel)
+    if max_cost == 0:
         return 0
 
+    cost = time_step * np.sum((v_top - vel) / v_top)
+    return max((max_cost - cost) / max_cost, 0)
+
 
 def min_delay_unscaled(env):
     """The average delay for all vehicles in the system
 
     Parameters
     ----------
-    env: flow.envs.Env
+    env: flow.envs.Env or RewardState
         the environment variable, which contains information on the current
         state of the system.
     """
-
-    vel = np.array(env.k.vehicle.get_speed(env.k.vehicle.get_ids()))
+    state = snapshot(env)
+    vel = state.speeds
+    if len(vel) == 0:
+        return 0
 
     vel = vel[vel >= -1e-6]
-    v_top = max(
-        env.k.scenario.speed_limit(edge)
-        for edge in env.k.scenario.get_edge_list())
-    time_step = env.sim_step
+    v_top = state.max_speed
+    time_step = state.sim_step
 
-    cost = time_step * sum((v_top - vel) / v_top)
-    return cost / len(env.k.vehicle.get_ids())
+    cost = time_step * np.sum((v_top - vel) / v_top)
+    return cost / len(state.ids)
 
 
 def penalize_standstill(env, gain=1):
@@ -155,23 +340,19 @@ def penalize_standstill(env, gain=1):
 
     Parameters
     ----------
-    env: flow.envs.Env
+    env: flow.envs.Env or RewardState
         the environment variable, which contains information on the current
         state of the system.
     gain : float
         multiplicative factor on the action penalty
     """
-    veh_ids = env.k.vehicle.get_ids()
-    vel = np.array(env.k.vehicle.get_speed(veh_ids))
-    num_standstill = len(vel[vel == 0])
+    num_standstill = np.count_nonzero(snapshot(env).speeds == 0)
     penalty = gain * num_standstill
     return -penalty
 
 
 def penalize_near_standstill(env, thresh=0.3, gain=1):
-    veh_ids = env.k.vehicle.get_ids()
-    vel = np.array(env.k.vehicle.get_speed(veh_ids))
-    penalize = len(vel[vel < thresh])
+    penalize = np.count_nonzero(snapshot(env).speeds < thresh)
     penalty = gain * penalize
     return -penalty
 
@@ -197,10 +378,9 @@ def penalize_headway_variance(vehicles,
     penalty_exponent: float, optional
         used to allow exponential punishing of smaller headways
     """
+    headways = np.array(vehicles.get_headway(list(vids)), dtype=float)
     headways = penalty_gain * np.power(
-        np.array(
-            [vehicles.get_headway(veh_id) / normalization
-             for veh_id in vids]), penalty_exponent)
+        headways / normalization, penalty_exponent)
     return -np.var(headways)
 
 
@@ -215,7 +395,7 @@ def punish_small_rl_headways(env,
 
     Parameters
     ----------
-    env: flow.envs.Env
+    env: flow.envs.Env or RewardState
         the environment variable, which contains information on the current
         state of the system.
     headway_threshold: float
@@ -225,12 +405,11 @@ def punish_small_rl_headways(env,
     penalty_exponent: float, optional
         used to allow exponential punishing of smaller headways
     """
-    headway_penalty = 0
-    for veh_id in env.k.vehicle.get_rl_ids():
-        if env.k.vehicle.get_headway(veh_id) < headway_threshold:
-            headway_penalty += \
-                (((headway_threshold - env.k.vehicle.get_headway(veh_id)) /
-                  headway_threshold) ** penalty_exponent) * penalty_gain
+    headways = snapshot(env).rl_headways
+    headways = headways[headways < headway_threshold]
+    headway_penalty = np.sum(
+        ((headway_threshold - headways) / headway_threshold)
+        ** penalty_exponent) * penalty_gain
 
     return -np.abs(headway_penalty)
 
@@ -243,18 +422,15 @@ def punish_rl_lane_changes(env, penalty=1):
 
     Parameters
     ----------
-    env: flow.envs.Env
+    env: flow.envs.Env or RewardState
         the environment variable, which contains information on the current
         state of the system.
     penalty : float, optional
         penalty imposed on the reward function for any rl lane change action
     """
-    total_lane_change_penalty = 0
-    for veh_id in env.k.vehicle.get_rl_ids():
-        if env.k.vehicle.get_last_lc(veh_id) == env.timer:
-            total_lane_change_penalty -= penalty
-
-    return total_lane_change_penalty
+    state = snapshot(env)
+    last_lc = state.gather(state.k.vehicle.get_last_lc, state.rl_ids)
+    return -penalty * np.count_nonzero(last_lc == state.env.time_counter)
 
 
 def punish_queues_in_lane(env, edge, lane, penalty_gain=1, penalty_exponent=1):
@@ -264,7 +440,7 @@ def punish_queues_in_lane(env, edge, lane, penalty_gain=1, penalty_exponent=1):
 
     Parameters
     ----------
-    env : flow.envs.Env
+    env : flow.envs.Env or RewardState
         contains the state of the environment at a time-step
     edge: str
         The edge on which to penalize queues
@@ -281,13 +457,13 @@ def punish_queues_in_lane(env, edge, lane, penalty_gain=1, penalty_exponent=1):
         total reward (in this case a negative cost) corresponding to the queues
         in the lane in question
     """
-    # IDs of all vehicles in passed-in lane
-    lane_ids = [
-        veh_id for veh_id in env.k.vehicle.get_ids_by_edge(edge)
-        if env.k.vehicle.get_lane(veh_id) == lane
-    ]
+    state = snapshot(env)
+    # lanes of all vehicles on the passed-in edge
+    veh_ids = np.array(state.k.vehicle.get_ids_by_edge(edge), dtype=object)
+    lanes = state.gather(state.k.vehicle.get_lane, veh_ids)
+    num_lane_ids = np.count_nonzero(lanes == lane)
 
-    return -1 * (len(lane_ids) ** penalty_exponent) * penalty_gain
+    return -1 * (num_lane_ids ** penalty_exponent) * penalty_gain
 
 
 def reward_rl_opening_headways(env, reward_gain=0.1, reward_exponent=1):
@@ -295,7 +471,7 @@ def reward_rl_opening_headways(env, reward_gain=0.1, reward_exponent=1):
 
     Parameters
     ----------
-    env : flow.envs.Env
+    env : flow.envs.Env or RewardState
         contains the state of the environment at a time-step
     reward_gain : int, optional
         Multiplicative gain on reward
@@ -307,14 +483,11 @@ def reward_rl_opening_headways(env, reward_gain=0.1, reward_exponent=1):
     float
         Reward value
     """
-    total_reward = 0
-    for rl_id in env.k.vehicle.get_rl_ids():
-        follower_id = env.k.vehicle.get_follower(rl_id)
-        if not follower_id:
-            continue
-        follower_headway = env.k.vehicle.get_headway(follower_id)
-        if follower_headway < 0:
-            continue
-        total_reward += follower_headway ** reward_exponent
+    state = snapshot(env)
+    # RL vehicles without a follower have a negative follower headway, and are
+    # therefore excluded as well
+    headways = state.rl_follower_headways
+    headways = headways[(state.rl_followers != "") & (headways >= 0)]
+    total_reward = np.sum(headways ** reward_exponent)
 
     return total_reward * reward_gain
@@ -8,9 +8,14 @@ E : etree.Element
 """
 import csv
 import errno
+import heapq
 import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
 from lxml import etree
-from xml.etree import ElementTree
 
 E = etree.Element
 
@@ -40,13 +45,171 @@ def ensure_dir(path):
     return path
 
 
-def emission_to_csv(emission_path, output_path=None):
+# columns of the files generated from emission files, and whether they contain
+# numerical (True) or string (False) values
+EMISSION_COLUMNS = [
+    ('time', True), ('CO', True), ('y', True), ('CO2', True),
+    ('electricity', True), ('type', False), ('id', False), ('eclass', False),
+    ('waiting', True), ('NOx', True), ('fuel', True), ('HC', True),
+    ('x', True), ('route', False), ('relative_position', True),
+    ('noise', True), ('angle', True), ('PMx', True), ('speed', True),
+    ('edge_id', False), ('lane_number', False)
+]
+
+# index of the vehicle id in the rows generated from emission files
+_ID_INDEX = [name for name, _ in EMISSION_COLUMNS].index('id')
+
+# default number of rows held in memory while converting emission files
+EMISSION_CHUNK_SIZE = 100000
+
+
+def _iter_emission_rows(emission_path):
+    """Yield the data of every vehicle at every time step of an emission file.
+
+    The file is parsed incrementally, and every time step is discarded once
+    its data has been yielded, so that memory usage does not grow with the
+    size of the file. Vehicles with missing attributes are skipped.
+
+    Yields
+    ------
+    tuple
+        the values of the columns in EMISSION_COLUMNS
+    """
+    for _, time in etree.iterparse(
+            emission_path, events=('end',), tag='timestep', recover=True):
+        t = float(time.attrib['time'])
+
+        for car in time:
+            try:
+                edge_id, _, lane_number = car.attrib['lane'].rpartition('_')
+                yield (
+                    t,
+                    float(car.attrib['CO']),
+                    float(car.attrib['y']),
+                    float(car.attrib['CO2']),
+                    float(car.attrib['electricity']),
+                    car.attrib['type'],
+                    car.attrib['id'],
+                    car.attrib['eclass'],
+                    float(car.attrib['waiting']),
+                    float(car.attrib['NOx']),
+                    float(car.attrib['fuel']),
+                    float(car.attrib['HC']),
+                    float(car.attrib['x']),
+                    car.attrib['route'],
+                    float(car.attrib['pos']),
+                    float(car.attrib['noise']),
+                    float(car.attrib['angle']),
+                    float(car.attrib['PMx']),
+                    float(car.attrib['speed']),
+                    edge_id,
+                    lane_number,
+                )
+            except KeyError:
+                continue
+
+        # free the memory used by the time step and all previous ones
+        time.clear()
+        while time.getprevious() is not None:
+            del time.getparent()[0]
+
+
+def _iter_sorted_emission(emission_path, chunk_size=EMISSION_CHUNK_SIZE):
+    """Yield the rows of an emission file in chunks, sorted by vehicle id.
+
+    Rows of the same vehicle are kept in chronological order. If the file
+    contains more than ``chunk_size`` rows, the rows are sorted with an
+    external merge sort: every chunk of rows is sorted in memory and written
+    to a temporary file, and the sorted chunks are then merged.
+
+    Parameters
+    ----------
+    emission_path : str
+        path to the emission file
+    chunk_size : int
+        maximum number of rows held in memory at any time
+
+    Yields
+    ------
+    list of tuple
+        at most ``chunk_size`` consecutive sorted rows
+    """
+    def by_id(row):
+        return row[_ID_INDEX]
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        run_paths = []
+        chunk = []
+        for row in _iter_emission_rows(emission_path):
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                run_paths.append(_write_run(tmp_dir, sorted(chunk, key=by_id)))
+                chunk = []
+
+        # if the file fits in a single chunk, no merging is needed
+        if len(run_paths) == 0:
+            if len(chunk) > 0:
+                yield sorted(chunk, key=by_id)
+            return
+
+        if len(chunk) > 0:
+            run_paths.append(_write_run(tmp_dir, sorted(chunk, key=by_id)))
+        chunk = None
+
+        # merge the sorted runs. For equal ids, rows from earlier runs come
+        # first, which keeps the rows of every vehicle in chronological order
+        run_files = [open(path, 'rb') for path in run_paths]
+        try:
+            merged = heapq.merge(
+                *[_read_run(f) for f in run_files], key=by_id)
+            out = []
+            for row in merged:
+                out.append(row)
+                if len(out) == chunk_size:
+                    yield out
+                    out = []
+            if len(out) > 0:
+                yield out
+        finally:
+            for f in run_files:
+                f.close()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _write_run(tmp_dir, rows):
+    """Write sorted rows to a temporary file, and return its path."""
+    fd, path = tempfile.mkstemp(dir=tmp_dir)
+    with os.fdopen(fd, 'wb') as f:
+        pickler = pickle.Pickler(f, protocol=pickle.HIGHEST_PROTOCOL)
+        for row in rows:
+            pickler.dump(row)
+    return path
+
+
+def _read_run(f):
+    """Yield the rows of a file written by _write_run."""
+    unpickler = pickle.Unpickler(f)
+    while True:
+        try:
+            yield unpickler.load()
+        except EOFError:
+            return
+
+
+def emission_to_csv(emission_path, output_path=None,
+                    chunk_size=EMISSION_CHUNK_SIZE):
     """Convert an emission file generated by sumo into a csv file.
 
     Note that the emission file contains information generated by sumo, not
     flow. This means that some data, such as absolute position, is not
     immediately available from the emission file, but can be recreated.
 
+    The emission file is converted in a streaming fashion, so that files that
+    do not fit in memory can be converted as well. The rows of the csv file
+    are sorted by vehicle id, and chronologically for every vehicle.
+
     Parameters
     ----------
     emission_path: str
@@ -54,54 +217,115 @@ def emission_to_csv(emission_path, output_path=None):
     output_path: str
         path to the csv file that will be generated, default is the same
         directory as the emission file, with the same name
+    chunk_size: int, optional
+        maximum number of rows held in memory during the conversion
     """
-    parser = etree.XMLParser(recover=True)
-    tree = ElementTree.parse(emission_path, parser=parser)
-    root = tree.getroot()
+    # default output path
+    if output_path is None:
+        output_path = emission_path[:-3] + 'csv'
 
-    # parse the xml data into a dict
-    out_data = []
-    for time in root.findall('timestep'):
-        t = float(time.attrib['time'])
+    # output the data into a csv file
+    with open(output_path, 'w') as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow([name for name, _ in EMISSION_COLUMNS])
+        for rows in _iter_sorted_emission(emission_path, chunk_size):
+            writer.writerows(rows)
 
-        for car in time:
-            out_data.append(dict())
-            try:
-                out_data[-1]['time'] = t
-                out_data[-1]['CO'] = float(car.attrib['CO'])
-                out_data[-1]['y'] = float(car.attrib['y'])
-                out_data[-1]['CO2'] = float(car.attrib['CO2'])
-                out_data[-1]['electricity'] = float(car.attrib['electricity'])
-                out_data[-1]['type'] = car.attrib['type']
-                out_data[-1]['id'] = car.attrib['id']
-                out_data[-1]['eclass'] = car.attrib['eclass']
-                out_data[-1]['waiting'] = float(car.attrib['waiting'])
-                out_data[-1]['NOx'] = float(car.attrib['NOx'])
-                out_data[-1]['fuel'] = float(car.attrib['fuel'])
-                out_data[-1]['HC'] = float(car.attrib['HC'])
-                out_data[-1]['x'] = float(car.attrib['x'])
-                out_data[-1]['route'] = car.attrib['route']
-                out_data[-1]['relative_position'] = float(car.attrib['pos'])
-                out_data[-1]['noise'] = float(car.attrib['noise'])
-                out_data[-1]['angle'] = float(car.attrib['angle'])
-                out_data[-1]['PMx'] = float(car.attrib['PMx'])
-                out_data[-1]['speed'] = float(car.attrib['speed'])
-                out_data[-1]['edge_id'] = car.attrib['lane'].rpartition('_')[0]
-                out_data[-1]['lane_number'] = car.attrib['lane'].\
-                    rpartition('_')[-1]
-            except KeyError:
-                del out_data[-1]
 
-    # sort the elements of the dictionary by the vehicle id
-    out_data = sorted(out_data, key=lambda k: k['id'])
+def emission_to_columnar(emission_path, output_path=None, file_format='npz',
+                         chunk_size=EMISSION_CHUNK_SIZE):
+    """Convert an emission file generated by sumo into a columnar file.
+
+    Every column of EMISSION_COLUMNS is stored as a separate array, sorted by
+    vehicle id, and chronologically for every vehicle. Numerical columns are
+    stored as floats, and all other columns as strings. The following file
+    formats are supported:
+
+    * "npz": a numpy .npz archive, with one array per column. The columns are
+      held in memory until the file is written.
+    * "parquet": an Apache Parquet file, written with pyarrow in row groups of
+      ``chunk_size`` rows.
+    * "hdf5": an HDF5 file, written with h5py, with one dataset per column.
+      The datasets are extended by ``chunk_size`` rows at a time.
+
+    Parameters
+    ----------
+    emission_path: str
+        path to the emission file that should be converted
+    output_path: str, optional
+        path to the file that will be generated, default is the same
+        directory as the emission file, with the same name and the extension
+        of the file format
+    file_format: str, optional
+        one of "npz", "parquet", or "hdf5"
+    chunk_size: int, optional
+        maximum number of rows held in memory during the conversion (except
+        for the columns of npz files)
+
+    Raises
+    ------
+    ValueError
+        if the file format is not valid
+    ImportError
+        if the library needed to write the file format is not installed
+    """
+    extensions = {'npz': 'npz', 'parquet': 'parquet', 'hdf5': 'h5'}
+    if file_format not in extensions:
+        raise ValueError('File format "{}" is not valid.'.format(file_format))
 
     # default output path
     if output_path is None:
-        output_path = emission_path[:-3] + 'csv'
+        output_path = emission_path[:-3] + extensions[file_format]
 
-    # output the dict data into a csv file
-    keys = out_data[0].keys()
-    with open(output_path, 'w') as output_file:
-        dict_writer = csv.DictWriter(output_file, keys)
-        dict_writer.writeheader()
-        dict_writer.writerows(out_data)
+    chunks = (_to_columns(rows)
+              for rows in _iter_sorted_emission(emission_path, chunk_size))
+
+    if file_format == 'npz':
+        columns = {name: [] for name, _ in EMISSION_COLUMNS}
+        for chunk in chunks:
+            for name, _ in EMISSION_COLUMNS:
+                columns[name].append(chunk[name])
+        np.savez(output_path, **{
+            name: np.concatenate(columns[name]) if len(columns[name]) > 0
+            else np.array([], dtype=float if numerical else str)
+            for name, numerical in EMISSION_COLUMNS})
+
+    elif file_format == 'parquet':
+        import pyarrow
+        import pyarrow.parquet
+
+        types = [pyarrow.float64() if numerical else pyarrow.string()
+                 for _, numerical in EMISSION_COLUMNS]
+        schema = pyarrow.schema(
+            [(name, typ) for (name, _), typ in zip(EMISSION_COLUMNS, types)])
+        writer = pyarrow.parquet.ParquetWriter(output_path, schema)
+        try:
+            for chunk in chunks:
+                writer.write_table(pyarrow.Table.from_arrays(
+                    [pyarrow.array(chunk[name].tolist(), type=typ)
+                     for (name, _), typ in zip(EMISSION_COLUMNS, types)],
+                    schema=schema))
+        finally:
+            writer.close()
+
+    else:
+        import h5py
+
+        with h5py.File(output_path, 'w') as f:
+            datasets = {
+                name: f.create_dataset(
+                    name, shape=(0,), maxshape=(None,),
+                    dtype=float if numerical else h5py.special_dtype(vlen=str))
+                for name, numerical in EMISSION_COLUMNS}
+            for chunk in chunks:
+                for name, dataset in datasets.items():
+                    size = dataset.shape[0]
+                    dataset.resize((size + len(chunk[name]),))
+                    dataset[size:] = chunk[name]
+
+
+def _to_columns(rows):
+    """Convert rows of an emission file into a dict of numpy arrays."""
+    columns = list(zip(*rows))
+    return {name: np.array(column, dtype=float if numerical else str)
+            for (name, numerical), column in zip(EMISSION_COLUMNS, columns)}
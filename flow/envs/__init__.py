@@ -13,6 +13,7 @@ from flow.envs.loop.wave_attenuation import WaveAttenuationEnv, \
     WaveAttenuationPOEnv
 from flow.envs.merge import WaveAttenuationMergePOEnv
 from flow.envs.test import TestEnv
+from flow.envs.vec_env import VecEnv
 
 __all__ = [
     'Env', 'AccelEnv', 'LaneChangeAccelEnv',
@@ -20,5 +21,5 @@ __all__ = [
     'WaveAttenuationMergePOEnv', 'TwoLoopsMergePOEnv', 'BottleneckEnv',
     'BottleNeckAccelEnv', 'WaveAttenuationEnv', 'WaveAttenuationPOEnv',
     'TrafficLightGridEnv', 'PO_TrafficLightGridEnv', 'DesiredVelocityEnv',
-    'TestEnv', 'BayBridgeEnv',
+    'TestEnv', 'BayBridgeEnv', 'VecEnv',
 ]
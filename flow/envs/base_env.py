@@ -8,6 +8,7 @@ import traceback
 import numpy as np
 import random
 from flow.renderer.pyglet_renderer import PygletRenderer as Renderer
+from flow.renderer.numpy_renderer import NumpyRenderer
 
 import gym
 from gym.spaces import Box
@@ -25,6 +26,8 @@ except ImportError:
 
 from flow.core.util import ensure_dir
 from flow.core.kernel import Kernel
+from flow.core.profiler import Profiler
+from flow.controllers.base_controller import get_batch_actions
 from flow.utils.exceptions import FatalFlowError
 
 # pick out the correct class definition
@@ -63,7 +66,8 @@ class Env(*classdef):
     scenario : flow.scenarios.Scenario
         see flow/scenarios/base_scenario.py
     simulator : str
-        the simulator used, one of {'traci', 'aimsun'}. Defaults to 'traci'
+        the simulator used, one of {'traci', 'aimsun', 'numpy'}. Defaults to
+        'traci'
     """
 
     def __init__(self, env_params, sim_params, scenario, simulator='traci'):
@@ -74,12 +78,16 @@ class Env(*classdef):
         self.env_params = env_params
         self.scenario = scenario
         self.sim_params = sim_params
-        time_stamp = ''.join(str(time.time()).split('.'))
-        if os.environ.get("TEST_FLAG", 0):
-            # 1.0 works with stress_test_start 10k times
-            time.sleep(1.0 * int(time_stamp[-6:]) / 1e6)
-        # FIXME: this is sumo-specific
-        self.sim_params.port = sumolib.miscutils.getFreeSocketPort()
+        # the numpy simulator and libsumo run in-process, and do not need a
+        # port
+        if simulator != 'numpy' \
+                and not getattr(sim_params, 'use_libsumo', False):
+            time_stamp = ''.join(str(time.time()).split('.'))
+            if os.environ.get("TEST_FLAG", 0):
+                # 1.0 works with stress_test_start 10k times
+                time.sleep(1.0 * int(time_stamp[-6:]) / 1e6)
+            # FIXME: this is sumo-specific
+            self.sim_params.port = sumolib.miscutils.getFreeSocketPort()
         # time_counter: number of steps taken since the start of a rollout
         self.time_counter = 0
         # step_counter: number of total steps taken
@@ -88,6 +96,9 @@ class Env(*classdef):
         #   Key = Vehicle ID,
         #   Entry = (type_id, route_id, lane_index, lane_pos, speed, pos)
         self.initial_state = {}
+        # initial_snapshot: state of the simulation at the start of the first
+        # rollout, if resets restore snapshots (see SimParams)
+        self.initial_snapshot = None
         self.state = None
         self.obs_var_labels = []
 
@@ -97,13 +108,20 @@ class Env(*classdef):
         # the simulator used by this environment
         self.simulator = simulator
 
+        # timings of the phases of the steps and resets (if requested)
+        self.profiler = Profiler(
+            enabled=getattr(env_params, 'profile', False),
+            log_interval=getattr(env_params, 'profile_interval', None),
+            path=getattr(env_params, 'profile_path', None))
+
         # create the Flow kernel
         self.k = Kernel(simulator=self.simulator,
                         sim_params=sim_params)
 
         # use the scenario class's network parameters to generate the necessary
         # scenario components within the scenario kernel
-        self.k.scenario.generate_network(scenario)
+        with self.profiler.phase('generate_network'):
+            self.k.scenario.generate_network(scenario)
 
         # initial the vehicles kernel using the VehicleParams object
         self.k.vehicle.initialize(deepcopy(scenario.vehicles))
@@ -111,8 +129,9 @@ class Env(*classdef):
         # initialize the simulation using the simulation kernel. This will use
         # the scenario kernel as an input in order to determine what network
         # needs to be simulated.
-        kernel_api = self.k.simulation.start_simulation(
-            scenario=self.k.scenario, sim_params=sim_params)
+        with self.profiler.phase('start_simulation'):
+            kernel_api = self.k.simulation.start_simulation(
+                scenario=self.k.scenario, sim_params=sim_params)
 
         # pass the kernel api to the kernel and it's subclasses
         self.k.pass_api(kernel_api)
@@ -150,8 +169,15 @@ class Env(*classdef):
                 lane_poly = [i for pt in _lane_poly for i in pt]
                 network.append(lane_poly)
 
-            # instantiate a pyglet renderer
-            self.renderer = Renderer(
+            # instantiate a pyglet (or headless numpy) renderer
+            renderer = getattr(self.sim_params, 'renderer', 'pyglet')
+            if renderer == 'pyglet':
+                renderer_class = Renderer
+            elif renderer == 'numpy':
+                renderer_class = NumpyRenderer
+            else:
+                raise ValueError('Renderer %s is not supported!' % renderer)
+            self.renderer = renderer_class(
                 network,
                 self.sim_params.render,
                 save_render,
@@ -184,10 +210,19 @@ class Env(*classdef):
         render: bool, optional
             specifies whether to use the gui
         """
+        with self.profiler.phase('restart_simulation'):
+            self._restart_simulation(sim_params, render)
+
+    def _restart_simulation(self, sim_params, render):
+        """Restart the simulation instance, see restart_simulation."""
         self.k.close()
 
+        # snapshots of the simulation cannot be restored in the new instance
+        self.initial_snapshot = None
+
         # killed the sumo process if using sumo/TraCI
-        if self.simulator == 'traci':
+        if self.simulator == 'traci' \
+                and self.k.simulation.sumo_proc is not None:
             self.k.simulation.sumo_proc.kill()
 
         if render is not None:
@@ -197,10 +232,12 @@ class Env(*classdef):
             ensure_dir(sim_params.emission_path)
             self.sim_params.emission_path = sim_params.emission_path
 
-        self.k.scenario.generate_network(self.scenario)
+        with self.profiler.phase('generate_network'):
+            self.k.scenario.generate_network(self.scenario)
         self.k.vehicle.initialize(deepcopy(self.scenario.vehicles))
-        kernel_api = self.k.simulation.start_simulation(
-            scenario=self.k.scenario, sim_params=self.sim_params)
+        with self.profiler.phase('start_simulation'):
+            kernel_api = self.k.simulation.start_simulation(
+                scenario=self.k.scenario, sim_params=self.sim_params)
         self.k.pass_api(kernel_api)
 
         self.setup_initial_state()
@@ -261,70 +298,88 @@ class Env(*classdef):
         info: dict
             contains other diagnostic information from the previous action
         """
+        profiler = self.profiler
+        profiler.start_step()
+        step_start = time.perf_counter()
+
         for _ in range(self.env_params.sims_per_step):
             self.time_counter += 1
             self.step_counter += 1
 
             # perform acceleration actions for controlled human-driven vehicles
-            if len(self.k.vehicle.get_controlled_ids()) > 0:
-                accel = []
-                for veh_id in self.k.vehicle.get_controlled_ids():
-                    action = self.k.vehicle.get_acc_controller(
-                        veh_id).get_action(self)
-                    accel.append(action)
-                self.k.vehicle.apply_acceleration(
-                    self.k.vehicle.get_controlled_ids(), accel)
+            # (controllers of the same type and parameters are evaluated
+            # together in a single vectorized call)
+            with profiler.phase('step.controllers'):
+                if len(self.k.vehicle.get_controlled_ids()) > 0:
+                    profiler.count('controlled_vehicles',
+                                   len(self.k.vehicle.get_controlled_ids()))
+                    accel = get_batch_actions(
+                        self, self.k.vehicle.get_controlled_ids())
+                    self.k.vehicle.apply_acceleration(
+                        self.k.vehicle.get_controlled_ids(), accel)
 
             # perform lane change actions for controlled human-driven vehicles
-            if len(self.k.vehicle.get_controlled_lc_ids()) > 0:
-                direction = []
-                for veh_id in self.k.vehicle.get_controlled_lc_ids():
-                    target_lane = self.k.vehicle.get_lane_changing_controller(
-                        veh_id).get_action(self)
-                    direction.append(target_lane)
-                self.k.vehicle.apply_lane_change(
-                    self.k.vehicle.get_controlled_lc_ids(),
-                    direction=direction)
+            with profiler.phase('step.lane_changes'):
+                if len(self.k.vehicle.get_controlled_lc_ids()) > 0:
+                    direction = []
+                    for veh_id in self.k.vehicle.get_controlled_lc_ids():
+                        target_lane = \
+                            self.k.vehicle.get_lane_changing_controller(
+                                veh_id).get_action(self)
+                        direction.append(target_lane)
+                    self.k.vehicle.apply_lane_change(
+                        self.k.vehicle.get_controlled_lc_ids(),
+                        direction=direction)
 
             # perform (optionally) routing actions for all vehicles in the
             # network, including RL and SUMO-controlled vehicles
-            routing_ids = []
-            routing_actions = []
-            for veh_id in self.k.vehicle.get_ids():
-                if self.k.vehicle.get_routing_controller(veh_id) \
-                        is not None:
-                    routing_ids.append(veh_id)
-                    route_contr = self.k.vehicle.get_routing_controller(
-                        veh_id)
-                    routing_actions.append(route_contr.choose_route(self))
+            with profiler.phase('step.routing'):
+                routing_ids = []
+                routing_actions = []
+                for veh_id in self.k.vehicle.get_ids():
+                    if self.k.vehicle.get_routing_controller(veh_id) \
+                            is not None:
+                        routing_ids.append(veh_id)
+                        route_contr = self.k.vehicle.get_routing_controller(
+                            veh_id)
+                        routing_actions.append(route_contr.choose_route(self))
 
-            self.k.vehicle.choose_routes(routing_ids, routing_actions)
+                self.k.vehicle.choose_routes(routing_ids, routing_actions)
 
-            self.apply_rl_actions(rl_actions)
+            with profiler.phase('step.apply_rl_actions'):
+                self.apply_rl_actions(rl_actions)
 
-            self.additional_command()
+            with profiler.phase('step.additional_command'):
+                self.additional_command()
 
             # advance the simulation in the simulator by one step
-            self.k.simulation.simulation_step()
+            with profiler.phase('step.simulation_step'):
+                self.k.simulation.simulation_step()
 
             # store new observations in the vehicles and traffic lights class
-            self.k.update(reset=False)
+            with profiler.phase('step.kernel_update'):
+                self.k.update(reset=False)
 
             # update the colors of vehicles
             if self.sim_params.render:
-                self.k.vehicle.update_vehicle_colors()
+                with profiler.phase('step.update_colors'):
+                    self.k.vehicle.update_vehicle_colors()
 
             # crash encodes whether the simulator experienced a collision
-            crash = self.k.simulation.check_collision()
+            with profiler.phase('step.check_collision'):
+                crash = self.k.simulation.check_collision()
 
             # stop collecting new simulation steps if there is a collision
             if crash:
+                profiler.count('crashes')
                 break
 
             # render a frame
-            self.render()
+            with profiler.phase('step.render'):
+                self.render()
 
-        states = self.get_state()
+        with profiler.phase('step.get_state'):
+            states = self.get_state()
 
         # collect information of the state of the network based on the
         # environment class used
@@ -340,8 +395,13 @@ class Env(*classdef):
         infos = {}
 
         # compute the reward
-        rl_clipped = self.clip_actions(rl_actions)
-        reward = self.compute_reward(rl_clipped, fail=crash)
+        with profiler.phase('step.compute_reward'):
+            rl_clipped = self.clip_actions(rl_actions)
+            reward = self.compute_reward(rl_clipped, fail=crash)
+
+        if profiler.enabled:
+            profiler.add_time('step', time.perf_counter() - step_start)
+            infos['timings'] = profiler.last_step
 
         return next_observation, reward, done, infos
 
@@ -364,6 +424,9 @@ class Env(*classdef):
         # reset the time counter
         self.time_counter = 0
 
+        profiler = self.profiler
+        reset_start = time.perf_counter()
+
         # warn about not using restart_instance when using inflows
         if len(self.scenario.net_params.inflows.get()) > 0 and \
                 not self.sim_params.restart_instance:
@@ -382,11 +445,18 @@ class Env(*classdef):
         if self.sim_params.restart_instance or \
                 (self.step_counter > 2e6 and self.simulator != 'aimsun'):
             self.step_counter = 0
-            # issue a random seed to induce randomness into the next rollout
-            self.sim_params.seed = random.randint(0, 1e5)
-
+            # issue a random seed to induce randomness into the next rollout,
+            # unless a sumo instance was started ahead of time with its seed
+            seed = self.k.simulation.next_seed()
+            if seed is None:
+                seed = random.randint(0, 1e5)
+            self.sim_params.seed = seed
+
+            # the virtual detectors declared by the environment are kept
+            detectors = self.k.vehicle.detectors
             self.k.vehicle = deepcopy(self.initial_vehicles)
             self.k.vehicle.master_kernel = self.k
+            self.k.vehicle.detectors = detectors
             # restart the sumo instance
             self.restart_simulation(self.sim_params)
 
@@ -394,6 +464,55 @@ class Env(*classdef):
         elif self.scenario.initial_config.shuffle:
             self.setup_initial_state()
 
+        if self.initial_snapshot is not None:
+            # restore the state of the simulation at the start of the first
+            # rollout, which includes the initial vehicles
+            with profiler.phase('reset.load_snapshot'):
+                self.k.load_state(self.initial_snapshot)
+        else:
+            with profiler.phase('reset.reset_vehicles'):
+                self.reset_vehicles()
+
+            # store the state of the simulation for the next resets
+            if self.sim_params.reset_from_snapshot \
+                    and not self.sim_params.restart_instance \
+                    and not self.scenario.initial_config.shuffle:
+                with profiler.phase('reset.save_snapshot'):
+                    self.initial_snapshot = self.k.save_state()
+
+        with profiler.phase('reset.get_state'):
+            states = self.get_state()
+
+        # collect information of the state of the network based on the
+        # environment class used
+        self.state = np.asarray(states).T
+
+        # observation associated with the reset (no warm-up steps)
+        observation = np.copy(states)
+
+        profiler.add_time('reset', time.perf_counter() - reset_start)
+
+        # perform (optional) warm-up steps before training
+        for _ in range(self.env_params.warmup_steps):
+            observation, _, _, _ = self.step(rl_actions=None)
+
+        # render a frame
+        self.render(reset=True)
+
+        return observation
+
+    def reset_vehicles(self):
+        """Replace all vehicles in the network by the initial vehicles.
+
+        The vehicles are placed at the positions specified by the initial
+        state of the environment, and the simulation is advanced by one step
+        for the vehicles to enter the network.
+
+        Raises
+        ------
+        flow.utils.exceptions.FatalFlowError
+            if not all initial vehicles entered the network
+        """
         # clear all vehicles from the network and the vehicles class
         if self.simulator == 'traci':
             for veh_id in self.k.kernel_api.vehicle.getIDList():  # FIXME: hack
@@ -442,10 +561,12 @@ class Env(*classdef):
                     speed=speed)
 
         # advance the simulation in the simulator by one step
-        self.k.simulation.simulation_step()
+        with self.profiler.phase('reset.simulation_step'):
+            self.k.simulation.simulation_step()
 
         # update the information in each kernel to match the current state
-        self.k.update(reset=True)
+        with self.profiler.phase('reset.kernel_update'):
+            self.k.update(reset=True)
 
         # update the colors of vehicles
         if self.sim_params.render:
@@ -461,24 +582,6 @@ class Env(*classdef):
                 msg += '- {}: {}\n'.format(veh_id, self.initial_state[veh_id])
             raise FatalFlowError(msg=msg)
 
-        states = self.get_state()
-
-        # collect information of the state of the network based on the
-        # environment class used
-        self.state = np.asarray(states).T
-
-        # observation associated with the reset (no warm-up steps)
-        observation = np.copy(states)
-
-        # perform (optional) warm-up steps before training
-        for _ in range(self.env_params.warmup_steps):
-            observation, _, _, _ = self.step(rl_actions=None)
-
-        # render a frame
-        self.render(reset=True)
-
-        return observation
-
     def additional_command(self):
         """Additional commands that may be performed by the step method."""
         pass
@@ -602,6 +705,14 @@ class Env(*classdef):
             )
             self.k.close()
 
+            # write the timings of the environment (if requested)
+            if self.profiler.enabled and self.profiler.path is not None:
+                self.profiler.dump()
+
+            # kill the sumo instances started ahead of time, if any
+            if self.simulator == 'traci':
+                self.k.simulation.stop_prewarmed_instances()
+
             # close pyglet renderer
             if self.sim_params.render in ['gray', 'dgray', 'rgb', 'drgb']:
                 self.renderer.close()
@@ -688,17 +799,10 @@ class Env(*classdef):
                                           machine_logs)
 
         # get local observation of RL vehicles
-        self.sights = []
-        for id in human_idlist:
-            # Force tracking human vehicles by adding "track" in vehicle id.
-            # The tracked human vehicles will be treated as machine vehicles.
-            if "track" in id:
-                orientation = self.k.vehicle.get_orientation(id)
-                sight = self.renderer.get_sight(
-                    orientation, id)
-                self.sights.append(sight)
-        for id in machine_idlist:
-            orientation = self.k.vehicle.get_orientation(id)
-            sight = self.renderer.get_sight(
-                orientation, id)
-            self.sights.append(sight)
+        # Force tracking human vehicles by adding "track" in vehicle id.
+        # The tracked human vehicles will be treated as machine vehicles.
+        sight_ids = [id for id in human_idlist if "track" in id] \
+            + list(machine_idlist)
+        self.sights = self.renderer.get_sights(
+            [self.k.vehicle.get_orientation(id) for id in sight_ids],
+            sight_ids)
@@ -15,7 +15,6 @@ from flow.core.params import InFlows, NetParams
 from flow.core.params import SumoCarFollowingParams, SumoLaneChangeParams
 from flow.core.params import VehicleParams
 
-from collections import defaultdict
 from copy import deepcopy
 
 import numpy as np
@@ -107,7 +106,6 @@ class BottleneckEnv(Env):
         env_add_params = self.env_params.additional_params
         # tells how scaled the number of lanes are
         self.scaling = scenario.net_params.additional_params.get("scaling")
-        self.edge_dict = defaultdict(list)
         self.cars_waiting_for_toll = dict()
         self.cars_before_ramp = dict()
         self.toll_wait_time = np.abs(
@@ -144,27 +142,13 @@ class BottleneckEnv(Env):
         self.smoothed_num = np.zeros(10)  # averaged number of vehs in '4'
         self.outflow_index = 0
 
+        # virtual detectors covering the edges of the bottleneck, used to
+        # compute its density and the average speed of its vehicles
+        for edge in ['3', '4', '5']:
+            self.k.vehicle.add_detector('bottleneck_' + edge, edge)
+
     def additional_command(self):
         super().additional_command()
-        # build a list of vehicles and their edges and positions
-        self.edge_dict = defaultdict(list)
-        # update the dict with all the edges in edge_list
-        # so we can look forward for edges
-        self.edge_dict.update((k, [[]
-                                   for _ in range(MAX_LANES * self.scaling)])
-                              for k in EDGE_LIST)
-        for veh_id in self.k.vehicle.get_ids():
-            try:
-                edge = self.k.vehicle.get_edge(veh_id)
-                if edge not in self.edge_dict:
-                    self.edge_dict.update({
-                        edge: [[] for _ in range(MAX_LANES * self.scaling)]
-                    })
-                lane = self.k.vehicle.get_lane(veh_id)  # integer
-                pos = self.k.vehicle.get_position(veh_id)
-                self.edge_dict[edge][lane].append((veh_id, pos))
-            except Exception:
-                pass
         if not self.disable_tb:
             self.apply_toll_bridge_control()
         if not self.disable_ramp_metering:
@@ -202,27 +186,26 @@ class BottleneckEnv(Env):
             self.cars_before_ramp.__delitem__(veh_id)
 
         for lane in range(NUM_RAMP_METERS * self.scaling):
-            cars_in_lane = self.edge_dict[EDGE_BEFORE_RAMP_METER][lane]
-
-            for car in cars_in_lane:
-                veh_id, pos = car
-                if pos > RAMP_METER_AREA:
-                    if veh_id not in self.cars_waiting_for_toll:
-                        if self.simulator == 'traci':
-                            # Disable lane changes inside Toll Area
-                            lane_change_mode = \
-                                self.k.kernel_api.vehicle.getLaneChangeMode(
-                                    veh_id)
-                            self.k.kernel_api.vehicle.setLaneChangeMode(
-                                veh_id, 512)
-                        else:
-                            lane_change_mode = None
-                        color = self.k.vehicle.get_color(veh_id)
-                        self.k.vehicle.set_color(veh_id, (0, 255, 255))
-                        self.cars_before_ramp[veh_id] = {
-                            'lane_change_mode': lane_change_mode,
-                            'color': color
-                        }
+            cars_in_lane = self.k.vehicle.get_ids_in_segment(
+                EDGE_BEFORE_RAMP_METER, RAMP_METER_AREA, lane=lane)
+
+            for veh_id in cars_in_lane:
+                if veh_id not in self.cars_waiting_for_toll:
+                    if self.simulator == 'traci':
+                        # Disable lane changes inside Toll Area
+                        lane_change_mode = \
+                            self.k.kernel_api.vehicle.getLaneChangeMode(
+                                veh_id)
+                        self.k.kernel_api.vehicle.setLaneChangeMode(
+                            veh_id, 512)
+                    else:
+                        lane_change_mode = None
+                    color = self.k.vehicle.get_color(veh_id)
+                    self.k.vehicle.set_color(veh_id, (0, 255, 255))
+                    self.cars_before_ramp[veh_id] = {
+                        'lane_change_mode': lane_change_mode,
+                        'color': color
+                    }
 
     def alinea(self):
         """Implementation of ALINEA from Toll Plaza Merging Traffic Control
@@ -281,32 +264,30 @@ class BottleneckEnv(Env):
         traffic_light_states = ["G"] * NUM_TOLL_LANES * self.scaling
 
         for lane in range(NUM_TOLL_LANES * self.scaling):
-            cars_in_lane = self.edge_dict[EDGE_BEFORE_TOLL][lane]
-
-            for car in cars_in_lane:
-                veh_id, pos = car
-                if pos > TOLL_BOOTH_AREA:
-                    if veh_id not in self.cars_waiting_for_toll:
-                        # Disable lane changes inside Toll Area
-                        if self.simulator == 'traci':
-                            lane_change_mode = self.k.kernel_api.vehicle.\
-                                getLaneChangeMode(veh_id)
-                            self.k.kernel_api.vehicle.setLaneChangeMode(
-                                veh_id, 512)
-                        else:
-                            lane_change_mode = None
-                        color = self.k.vehicle.get_color(veh_id)
-                        self.k.vehicle.set_color(veh_id, (255, 0, 255))
-                        self.cars_waiting_for_toll[veh_id] = \
-                            {'lane_change_mode': lane_change_mode,
-                             'color': color}
+            cars_in_lane = self.k.vehicle.get_ids_in_segment(
+                EDGE_BEFORE_TOLL, TOLL_BOOTH_AREA, lane=lane)
+
+            for veh_id in cars_in_lane:
+                if veh_id not in self.cars_waiting_for_toll:
+                    # Disable lane changes inside Toll Area
+                    if self.simulator == 'traci':
+                        lane_change_mode = self.k.kernel_api.vehicle.\
+                            getLaneChangeMode(veh_id)
+                        self.k.kernel_api.vehicle.setLaneChangeMode(
+                            veh_id, 512)
+                    else:
+                        lane_change_mode = None
+                    color = self.k.vehicle.get_color(veh_id)
+                    self.k.vehicle.set_color(veh_id, (255, 0, 255))
+                    self.cars_waiting_for_toll[veh_id] = \
+                        {'lane_change_mode': lane_change_mode,
+                         'color': color}
+                elif self.k.vehicle.get_position(veh_id) > 50:
+                    if self.toll_wait_time[lane] < 0:
+                        traffic_light_states[lane] = "G"
                     else:
-                        if pos > 50:
-                            if self.toll_wait_time[lane] < 0:
-                                traffic_light_states[lane] = "G"
-                            else:
-                                traffic_light_states[lane] = "r"
-                                self.toll_wait_time[lane] -= 1
+                        traffic_light_states[lane] = "r"
+                        self.toll_wait_time[lane] -= 1
 
         newTLState = "".join(traffic_light_states)
 
@@ -336,21 +317,23 @@ class BottleneckEnv(Env):
 
     def get_bottleneck_density(self, lanes=None):
         BOTTLE_NECK_LEN = 280
-        bottleneck_ids = self.k.vehicle.get_ids_by_edge(['3', '4'])
-        if lanes:
-            veh_ids = [
-                veh_id for veh_id in bottleneck_ids
-                if str(self.k.vehicle.get_edge(veh_id)) + "_" +
-                str(self.k.vehicle.get_lane(veh_id)) in lanes
-            ]
-        else:
-            veh_ids = self.k.vehicle.get_ids_by_edge(['3', '4'])
-        return len(veh_ids) / BOTTLE_NECK_LEN
+        num_vehicles = 0
+        for edge in ['3', '4']:
+            count = self.k.vehicle.get_detector('bottleneck_' + edge).count
+            if lanes:
+                num_vehicles += sum(
+                    count[0, lane] for lane in range(count.shape[1])
+                    if edge + "_" + str(lane) in lanes)
+            else:
+                num_vehicles += count.sum()
+        return num_vehicles / BOTTLE_NECK_LEN
 
     def get_avg_bottleneck_velocity(self):
-        veh_ids = self.k.vehicle.get_ids_by_edge(['3', '4', '5'])
-        return sum(self.k.vehicle.get_speed(veh_ids)) / len(veh_ids) \
-            if len(veh_ids) != 0 else 0
+        detectors = [self.k.vehicle.get_detector('bottleneck_' + edge)
+                     for edge in ['3', '4', '5']]
+        num_vehicles = sum(detector.count.sum() for detector in detectors)
+        total_speed = sum(detector.total_speed.sum() for detector in detectors)
+        return total_speed / num_vehicles if num_vehicles != 0 else 0
 
     # Dummy action and observation spaces
     @property
@@ -537,8 +520,9 @@ class BottleNeckAccelEnv(BottleneckEnv):
         """See class definition."""
         num_rl = self.k.vehicle.num_rl_vehicles
         lane_change_acts = np.abs(np.round(rl_actions[1::2])[:num_rl])
-        return (rewards.desired_velocity(self) + rewards.rl_forward_progress(
-            self, gain=0.1) - rewards.boolean_action_penalty(
+        state = rewards.RewardState(self)
+        return (rewards.desired_velocity(state) + rewards.rl_forward_progress(
+            state, gain=0.1) - rewards.boolean_action_penalty(
                 lane_change_acts, gain=1.0))
 
     def _apply_rl_actions(self, actions):
@@ -679,6 +663,14 @@ class DesiredVelocityEnv(BottleneckEnv):
             self.obs_slices[edge] = np.linspace(0, edge_length,
                                                 num_segments + 1)
 
+        # virtual detectors counting the rl and non-rl vehicles in each lane
+        # of each observed segment
+        for i, edge in enumerate(EDGE_LIST):
+            for rl in [False, True]:
+                self.k.vehicle.add_detector(
+                    self._obs_detector(edge, rl), edge,
+                    num_segments=self.num_obs_segments[i], rl=rl)
+
         # self.symmetric is True if all lanes in a segment
         # have same action, else False
         self.symmetric = additional_params.get("symmetric")
@@ -745,62 +737,33 @@ class DesiredVelocityEnv(BottleneckEnv):
         # number of rl vehicles in each segment in each lane
         # mean speed in each segment, and mean rl speed in each
         # segment in each lane
-        num_vehicles_list = []
-        num_rl_vehicles_list = []
-        vehicle_speeds_list = []
-        rl_speeds_list = []
         NUM_VEHICLE_NORM = 20
-        for i, edge in enumerate(EDGE_LIST):
-            num_lanes = self.k.scenario.num_lanes(edge)
-            num_vehicles = np.zeros((self.num_obs_segments[i], num_lanes))
-            num_rl_vehicles = np.zeros((self.num_obs_segments[i], num_lanes))
-            vehicle_speeds = np.zeros((self.num_obs_segments[i], num_lanes))
-            rl_vehicle_speeds = np.zeros((self.num_obs_segments[i], num_lanes))
-            ids = self.k.vehicle.get_ids_by_edge(edge)
-            lane_list = self.k.vehicle.get_lane(ids)
-            pos_list = self.k.vehicle.get_position(ids)
-            for i, id in enumerate(ids):
-                segment = np.searchsorted(self.obs_slices[edge],
-                                          pos_list[i]) - 1
-                if id in self.k.vehicle.get_rl_ids():
-                    rl_vehicle_speeds[segment, lane_list[i]] \
-                        += self.k.vehicle.get_speed(id)
-                    num_rl_vehicles[segment, lane_list[i]] += 1
-                else:
-                    vehicle_speeds[segment, lane_list[i]] \
-                        += self.k.vehicle.get_speed(id)
-                    num_vehicles[segment, lane_list[i]] += 1
-
-            # normalize
-
-            num_vehicles /= NUM_VEHICLE_NORM
-            num_rl_vehicles /= NUM_VEHICLE_NORM
-            num_vehicles_list += num_vehicles.flatten().tolist()
-            num_rl_vehicles_list += num_rl_vehicles.flatten().tolist()
-            vehicle_speeds_list += vehicle_speeds.flatten().tolist()
-            rl_speeds_list += rl_vehicle_speeds.flatten().tolist()
-
-        unnorm_veh_list = np.asarray(num_vehicles_list) * \
-            NUM_VEHICLE_NORM
-        unnorm_rl_list = np.asarray(num_rl_vehicles_list) * \
-            NUM_VEHICLE_NORM
-        # compute the mean speed if the speed isn't zero
-        num_rl = len(num_rl_vehicles_list)
-        num_veh = len(num_vehicles_list)
-        mean_speed = np.nan_to_num([
-            vehicle_speeds_list[i] / unnorm_veh_list[i]
-            if int(unnorm_veh_list[i]) else 0 for i in range(num_veh)
-        ])
-        mean_speed_norm = mean_speed / 50
-        mean_rl_speed = np.nan_to_num([
-            rl_speeds_list[i] / unnorm_rl_list[i]
-            if int(unnorm_rl_list[i]) else 0 for i in range(num_rl)
-        ]) / 50
+        human = [self.k.vehicle.get_detector(self._obs_detector(edge, False))
+                 for edge in EDGE_LIST]
+        rl = [self.k.vehicle.get_detector(self._obs_detector(edge, True))
+              for edge in EDGE_LIST]
+
+        # the counts and mean speeds of every segment and lane, as computed by
+        # the virtual detectors of the observed edges
+        num_vehicles_list = np.concatenate(
+            [detector.count.flatten() for detector in human]) \
+            / NUM_VEHICLE_NORM
+        num_rl_vehicles_list = np.concatenate(
+            [detector.count.flatten() for detector in rl]) / NUM_VEHICLE_NORM
+        mean_speed_norm = np.concatenate(
+            [detector.mean_speed.flatten() for detector in human]) / 50
+        mean_rl_speed = np.concatenate(
+            [detector.mean_speed.flatten() for detector in rl]) / 50
         outflow = np.asarray(
             self.k.vehicle.get_outflow_rate(20 * self.sim_step) / 2000.0)
         return np.concatenate((num_vehicles_list, num_rl_vehicles_list,
                                mean_speed_norm, mean_rl_speed, [outflow]))
 
+    @staticmethod
+    def _obs_detector(edge, rl):
+        """Return the name of the detector of an observed edge."""
+        return 'obs_{}_{}'.format('rl' if rl else 'human', edge)
+
     def _apply_rl_actions(self, rl_actions):
         """
         RL actions are split up into 3 levels.
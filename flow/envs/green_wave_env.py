@@ -79,6 +79,11 @@ class TrafficLightGridEnv(Env):
 
         super().__init__(env_params, sim_params, scenario, simulator)
 
+        # the distances of vehicles to the next intersection are computed at
+        # most once per simulation step
+        self.k.cache.register(
+            'intersection_dist', self.find_intersection_dist)
+
         # Saving env variables for plotting
         self.steps = env_params.horizon
         self.obs_var_labels = {
@@ -160,8 +165,9 @@ class TrafficLightGridEnv(Env):
                        self.k.scenario.network.inner_length)
 
         # get the state arrays
+        max_speed = self.k.scenario.max_speed()
         speeds = [
-            self.k.vehicle.get_speed(veh_id) / self.k.scenario.max_speed()
+            self.k.vehicle.get_speed(veh_id) / max_speed
             for veh_id in self.k.vehicle.get_ids()
         ]
         dist_to_intersec = [
@@ -262,9 +268,10 @@ class TrafficLightGridEnv(Env):
             the intersection the vehicle will be arriving at)
         """
         if isinstance(veh_ids, list):
-            return [self.find_intersection_dist(veh_id) for veh_id in veh_ids]
+            return [self.k.cache.get('intersection_dist', veh_id)
+                    for veh_id in veh_ids]
         else:
-            return self.find_intersection_dist(veh_ids)
+            return self.k.cache.get('intersection_dist', veh_ids)
 
     def find_intersection_dist(self, veh_id):
         """Return distance from the vehicle's current position to the position
@@ -404,25 +411,11 @@ class TrafficLightGridEnv(Env):
         """
         if k < 0:
             raise IndexError("k must be greater than 0")
+        if not isinstance(edges, list):
+            edges = [edges]
         dists = []
-
-        def sort_lambda(veh_id):
-            return self.get_distance_to_intersection(veh_id)
-
-        if isinstance(edges, list):
-            for edge in edges:
-                vehicles = self.k.vehicle.get_ids_by_edge(edge)
-                dist = sorted(
-                    vehicles,
-                    key=sort_lambda
-                )
-                dists += dist[:k]
-        else:
-            vehicles = self.k.vehicle.get_ids_by_edge(edges)
-            dist = sorted(
-                vehicles,
-                key=lambda veh_id: self.get_distance_to_intersection(veh_id))
-            dists += dist[:k]
+        for edge in edges:
+            dists.extend(self.k.vehicle.get_k_closest_to_edge_end(edge, k))
         return dists
 
 
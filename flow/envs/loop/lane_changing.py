@@ -105,9 +105,7 @@ class LaneChangeAccelEnv(AccelEnv):
 
         # punish excessive lane changes by reducing the reward by a set value
         # every time an rl car changes lanes (10% of max reward)
-        for veh_id in self.k.vehicle.get_rl_ids():
-            if self.k.vehicle.get_last_lc(veh_id) == self.time_counter:
-                reward -= 0.1
+        reward += rewards.punish_rl_lane_changes(self, penalty=0.1)
 
         return reward
 
@@ -120,14 +118,12 @@ class LaneChangeAccelEnv(AccelEnv):
             self.k.scenario.num_lanes(edge)
             for edge in self.k.scenario.get_edge_list())
 
-        speed = [self.k.vehicle.get_speed(veh_id) / max_speed
-                 for veh_id in self.sorted_ids]
-        pos = [self.k.vehicle.get_x_by_id(veh_id) / length
-               for veh_id in self.sorted_ids]
-        lane = [self.k.vehicle.get_lane(veh_id) / max_lanes
-                for veh_id in self.sorted_ids]
+        sorted_ids = list(self.sorted_ids)
+        speed = np.array(self.k.vehicle.get_speed(sorted_ids)) / max_speed
+        pos = np.array(self.k.vehicle.get_x_by_id(sorted_ids)) / length
+        lane = np.array(self.k.vehicle.get_lane(sorted_ids)) / max_lanes
 
-        return np.array(speed + pos + lane)
+        return np.concatenate((speed, pos, lane))
 
     def _apply_rl_actions(self, actions):
         """See class definition."""
@@ -216,11 +212,11 @@ class LaneChangeAccelPOEnv(LaneChangeAccelEnv):
         ]
 
         self.visible = []
-        for i, rl_id in enumerate(self.k.vehicle.get_rl_ids()):
-            # normalizers
-            max_length = self.k.scenario.length()
-            max_speed = self.k.scenario.max_speed()
+        # normalizers
+        max_length = self.k.scenario.length()
+        max_speed = self.k.scenario.max_speed()
 
+        for i, rl_id in enumerate(self.k.vehicle.get_rl_ids()):
             # set to 1000 since the absence of a vehicle implies a large
             # headway
             headway = [1] * self.num_lanes
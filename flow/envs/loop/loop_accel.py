@@ -1,6 +1,7 @@
 """Environment for training the acceleration behavior of vehicles in a loop."""
 
 from flow.core import rewards
+from flow.core.kernel.vehicle.ordering import VehicleOrder
 from flow.envs.base_env import Env
 
 from gym.spaces.box import Box
@@ -62,13 +63,15 @@ class AccelEnv(Env):
                 raise KeyError(
                     'Environment parameter \'{}\' not supplied'.format(p))
 
-        # variables used to sort vehicles by their initial position plus
-        # distance traveled
-        self.prev_pos = dict()
-        self.absolute_position = dict()
+        # vehicles ordered by their absolute position (their initial position
+        # plus distance traveled), along with their previous positions
+        self.vehicle_order = VehicleOrder(columns={'prev_pos': np.nan})
 
         super().__init__(env_params, sim_params, scenario, simulator)
 
+        # the sorted ids are computed at most once per simulation step
+        self.k.cache.register('sorted_ids', self._sort_ids)
+
     @property
     def action_space(self):
         """See class definition."""
@@ -105,12 +108,13 @@ class AccelEnv(Env):
 
     def get_state(self):
         """See class definition."""
-        speed = [self.k.vehicle.get_speed(veh_id) / self.k.scenario.max_speed()
-                 for veh_id in self.sorted_ids]
-        pos = [self.k.vehicle.get_x_by_id(veh_id) / self.k.scenario.length()
-               for veh_id in self.sorted_ids]
+        sorted_ids = list(self.sorted_ids)
+        speed = np.array(self.k.vehicle.get_speed(sorted_ids)) \
+            / self.k.scenario.max_speed()
+        pos = np.array(self.k.vehicle.get_x_by_id(sorted_ids)) \
+            / self.k.scenario.length()
 
-        return np.array(speed + pos)
+        return np.concatenate((speed, pos))
 
     def additional_command(self):
         """See parent class.
@@ -123,19 +127,25 @@ class AccelEnv(Env):
             for veh_id in self.k.vehicle.get_human_ids():
                 self.k.vehicle.set_observed(veh_id)
 
-        # update the "absolute_position" variable
-        for veh_id in self.k.vehicle.get_ids():
-            this_pos = self.k.vehicle.get_x_by_id(veh_id)
+        # update the absolute positions of the vehicles
+        veh_ids = self.k.vehicle.get_ids()
+        this_pos = np.array(self.k.vehicle.get_x_by_id(veh_ids), dtype=float)
+
+        order = self.vehicle_order
+        order.sync(veh_ids)
+        prev_pos = order.columns['prev_pos']
 
-            if this_pos == -1001:
-                # in case the vehicle isn't in the network
-                self.absolute_position[veh_id] = -1001
-            else:
-                change = this_pos - self.prev_pos.get(veh_id, this_pos)
-                self.absolute_position[veh_id] = \
-                    (self.absolute_position.get(veh_id, this_pos) + change) \
-                    % self.k.scenario.length()
-                self.prev_pos[veh_id] = this_pos
+        # vehicles that were never positioned start from their current position
+        new = np.isnan(prev_pos)
+        change = this_pos - np.where(new, this_pos, prev_pos)
+        absolute_position = np.where(new, this_pos, order.keys) + change
+
+        # in case a vehicle isn't in the network
+        valid = this_pos != -1001
+        order.columns['prev_pos'] = np.where(valid, this_pos, prev_pos)
+        order.set_keys(np.where(
+            valid, absolute_position % self.k.scenario.length(), -1001))
+        self.k.cache.invalidate('sorted_ids')
 
     @property
     def sorted_ids(self):
@@ -149,14 +159,26 @@ class AccelEnv(Env):
         list of str
             a list of all vehicle IDs sorted by position
         """
+        return self.k.cache.get('sorted_ids')
+
+    def _sort_ids(self):
+        """Sort the vehicle ids, see ``sorted_ids``."""
         if self.env_params.additional_params['sort_vehicles']:
-            return sorted(self.k.vehicle.get_ids(), key=self._get_abs_position)
+            self.vehicle_order.sync(self.k.vehicle.get_ids())
+            return self.vehicle_order.sorted_ids
         else:
             return self.k.vehicle.get_ids()
 
-    def _get_abs_position(self, veh_id):
-        """Return the absolute position of a vehicle."""
-        return self.absolute_position.get(veh_id, -1001)
+    @property
+    def absolute_position(self):
+        """Return the absolute position of every vehicle, by id."""
+        return self.vehicle_order.as_dict()
+
+    @property
+    def prev_pos(self):
+        """Return the previous position of every vehicle, by id."""
+        return self.vehicle_order.as_dict(
+            self.vehicle_order.columns['prev_pos'])
 
     def reset(self):
         """See parent class.
@@ -166,8 +188,14 @@ class AccelEnv(Env):
         """
         obs = super().reset()
 
-        for veh_id in self.k.vehicle.get_ids():
-            self.absolute_position[veh_id] = self.k.vehicle.get_x_by_id(veh_id)
-            self.prev_pos[veh_id] = self.k.vehicle.get_x_by_id(veh_id)
+        veh_ids = self.k.vehicle.get_ids()
+        pos = np.array(self.k.vehicle.get_x_by_id(veh_ids), dtype=float)
+        self.vehicle_order.sync(veh_ids)
+        self.vehicle_order.columns['prev_pos'] = pos
+        self.vehicle_order.set_keys(pos)
+
+        # the vehicles were sorted with the absolute positions of the previous
+        # rollout during the reset
+        self.k.cache.invalidate('sorted_ids')
 
         return obs
@@ -2,6 +2,7 @@
 
 from flow.envs.base_env import Env
 from flow.core import rewards
+from flow.core.kernel.vehicle.ordering import VehicleOrder
 from gym.spaces.box import Box
 import numpy as np
 
@@ -75,8 +76,13 @@ class TwoLoopsMergePOEnv(Env):
         self.obs_var_labels = \
             ["speed", "pos", "queue_length", "velocity_stats"]
 
+        # vehicles ordered by their position, repaired at every step
+        self.vehicle_order = VehicleOrder()
+
         super().__init__(env_params, sim_params, scenario, simulator)
 
+        self.k.cache.register('sorted_ids', self._sort_ids)
+
     @property
     def observation_space(self):
         """See class definition."""
@@ -206,9 +212,12 @@ class TwoLoopsMergePOEnv(Env):
         environment are sorted with regards to which ring this currently
         reside on.
         """
-        pos = [self.k.vehicle.get_x_by_id(veh_id)
-               for veh_id in self.k.vehicle.get_ids()]
-        sorted_indx = np.argsort(pos)
-        sorted_ids = np.array(self.k.vehicle.get_ids())[sorted_indx]
+        return self.k.cache.get('sorted_ids')
+
+    def _sort_ids(self):
+        """Sort the vehicle ids by position, see ``sorted_ids``."""
+        veh_ids = self.k.vehicle.get_ids()
+        self.vehicle_order.sync(veh_ids)
+        self.vehicle_order.set_keys(self.k.vehicle.get_x_by_id(veh_ids))
 
-        return sorted_ids
+        return np.array(self.vehicle_order.sorted_ids)
@@ -115,10 +115,7 @@ class WaveAttenuationEnv(Env):
         if rl_actions is None:
             return 0
 
-        vel = np.array([
-            self.k.vehicle.get_speed(veh_id)
-            for veh_id in self.k.vehicle.get_ids()
-        ])
+        vel = np.array(self.k.vehicle.get_speed(self.k.vehicle.get_ids()))
 
         if any(vel < -100) or kwargs['fail']:
             return 0.
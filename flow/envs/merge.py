@@ -119,10 +119,17 @@ class WaveAttenuationMergePOEnv(Env):
         max_speed = self.k.scenario.max_speed()
         max_length = self.k.scenario.length()
 
+        # absolute positions of the rl vehicles and their leaders, computed
+        # in a single pass each
+        lead_ids = [self.k.vehicle.get_leader(rl_id) for rl_id in self.rl_veh]
+        rl_x = self.k.vehicle.get_x_by_id(list(self.rl_veh))
+        lead_x = self.k.vehicle.get_x_by_id(
+            [lead_id or "" for lead_id in lead_ids])
+
         observation = [0 for _ in range(5 * self.num_rl)]
         for i, rl_id in enumerate(self.rl_veh):
             this_speed = self.k.vehicle.get_speed(rl_id)
-            lead_id = self.k.vehicle.get_leader(rl_id)
+            lead_id = lead_ids[i]
             follower = self.k.vehicle.get_follower(rl_id)
 
             if lead_id in ["", None]:
@@ -132,8 +139,7 @@ class WaveAttenuationMergePOEnv(Env):
             else:
                 self.leader.append(lead_id)
                 lead_speed = self.k.vehicle.get_speed(lead_id)
-                lead_head = self.k.vehicle.get_x_by_id(lead_id) \
-                    - self.k.vehicle.get_x_by_id(rl_id) \
+                lead_head = lead_x[i] - rl_x[i] \
                     - self.k.vehicle.get_length(rl_id)
 
             if follower in ["", None]:
@@ -155,27 +161,27 @@ class WaveAttenuationMergePOEnv(Env):
 
     def compute_reward(self, rl_actions, **kwargs):
         """See class definition."""
+        state = rewards.RewardState(self)
         if self.env_params.evaluate:
-            return np.mean(self.k.vehicle.get_speed(self.k.vehicle.get_ids()))
+            return np.mean(state.speeds)
         else:
             # return a reward of 0 if a collision occurred
             if kwargs["fail"]:
                 return 0
 
             # reward high system-level velocities
-            cost1 = rewards.desired_velocity(self, fail=kwargs["fail"])
+            cost1 = rewards.desired_velocity(state, fail=kwargs["fail"])
 
             # penalize small time headways
-            cost2 = 0
             t_min = 1  # smallest acceptable time headway
-            for rl_id in self.rl_veh:
-                lead_id = self.k.vehicle.get_leader(rl_id)
-                if lead_id not in ["", None] \
-                        and self.k.vehicle.get_speed(rl_id) > 0:
-                    t_headway = max(
-                        self.k.vehicle.get_headway(rl_id) /
-                        self.k.vehicle.get_speed(rl_id), 0)
-                    cost2 += min((t_headway - t_min) / t_min, 0)
+            rl_ids = np.array(self.rl_veh, dtype=object)
+            leaders = state.gather(self.k.vehicle.get_leader, rl_ids)
+            speeds = state.gather(self.k.vehicle.get_speed, rl_ids)
+            headways = state.gather(self.k.vehicle.get_headway, rl_ids)
+            has_leader = [lead_id not in ["", None] for lead_id in leaders]
+            valid = np.array(has_leader, dtype=bool) & (speeds > 0)
+            t_headway = np.maximum(headways[valid] / speeds[valid], 0)
+            cost2 = np.sum(np.minimum((t_headway - t_min) / t_min, 0))
 
             # weights for cost1, cost2, and cost3, respectively
             eta1, eta2 = 1.00, 0.10
@@ -0,0 +1,254 @@
+"""Contains an environment that steps several environments at once."""
+
+import multiprocessing
+import random
+
+import numpy as np
+
+
+class _SubEnv(object):
+    """A single environment of a VecEnv, reset at the end of every rollout.
+
+    A rollout ends if the environment reports a crash, or after the number of
+    steps specified by the horizon of its EnvParams.
+    """
+
+    def __init__(self, create_env, seed=None):
+        """Create the environment."""
+        # seed the random number generators used by the environment, so that
+        # environments created in forked processes do not share their noise
+        np.random.seed(seed)
+        random.seed(seed)
+
+        self.env = create_env()
+        self.horizon = self.env.env_params.horizon
+        self.num_steps = 0
+
+    def reset(self):
+        """Reset the environment, and return the initial observation."""
+        self.num_steps = 0
+        return self.env.reset()
+
+    def step(self, action):
+        """Advance the environment, and reset it if its rollout ended."""
+        obs, reward, done, info = self.env.step(action)
+        self.num_steps += 1
+
+        done = bool(done) or self.num_steps >= self.horizon
+        if done:
+            # the observation returned is the first one of the next rollout
+            info = dict(info, terminal_observation=obs)
+            obs = self.reset()
+
+        return obs, reward, done, info
+
+    def close(self):
+        """Terminate the environment."""
+        self.env.unwrapped.terminate()
+
+
+def _worker(remote, parent_remote, create_env, seed):
+    """Run a sub-environment in a separate process.
+
+    The worker waits for (command, data) tuples on its end of a pipe, and
+    answers every command except "close" with a single message.
+    """
+    parent_remote.close()
+    sub_env = _SubEnv(create_env, seed)
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == 'step':
+                remote.send(sub_env.step(data))
+            elif cmd == 'reset':
+                remote.send(sub_env.reset())
+            elif cmd == 'spaces':
+                remote.send((sub_env.env.observation_space,
+                             sub_env.env.action_space))
+            elif cmd == 'close':
+                break
+            else:
+                raise ValueError('Unknown command "{}".'.format(cmd))
+    finally:
+        sub_env.close()
+        remote.close()
+
+
+class VecEnv(object):
+    """A batch of identical environments stepped together.
+
+    The environments are created from the same flow_params, and every call to
+    ``step`` advances all of them by one step. If ``parallel`` is set to True,
+    each environment runs in its own process, and all environments are stepped
+    concurrently, so that the latency of the communication with the simulator
+    of one environment is hidden behind the computation of the others. If set
+    to False, the environments are stepped one after the other in the current
+    process, which is preferable for in-process simulators (e.g. the numpy
+    simulator).
+
+    Observations, rewards, and dones are returned as arrays whose first
+    dimension is the index of the environment. Every environment is reset as
+    soon as its rollout ends, i.e. if it crashed or reached its horizon. In
+    this case, the observation returned by ``step`` is the first observation
+    of the new rollout, and the last observation of the previous rollout is
+    available under "terminal_observation" in the info dict of the
+    environment.
+
+    Only single agent environments are supported.
+
+    Usage:
+
+        >>> env = VecEnv(flow_params, num_envs=8)
+        >>> obs = env.reset()  # shape (8,) + env.observation_space.shape
+        >>> obs, rewards, dones, infos = env.step(actions)
+        >>> env.close()
+    """
+
+    def __init__(self,
+                 flow_params,
+                 num_envs,
+                 parallel=True,
+                 version=0,
+                 render=None,
+                 seed=None):
+        """Instantiate the environments.
+
+        Parameters
+        ----------
+        flow_params : dict
+            flow-related parameters, see flow.utils.registry.make_create_env
+        num_envs : int
+            number of environments
+        parallel : bool, optional
+            specifies whether to run every environment in a separate process
+        version : int, optional
+            environment version number of the first environment. The i-th
+            environment is registered with version ``version + i``.
+        render : bool, optional
+            specifies whether to use the gui during execution. This overrides
+            the render attribute in SumoParams
+        seed : int, optional
+            seed of the random number generators of the first environment.
+            The i-th environment is seeded with ``seed + i``. If not
+            specified, the environments are seeded randomly.
+        """
+        # imported here, as the registry imports flow.envs
+        from flow.utils.registry import make_create_env
+
+        self.num_envs = num_envs
+        self.parallel = parallel
+        self.closed = False
+
+        create_envs = [
+            make_create_env(flow_params, version=version + i, render=render)[0]
+            for i in range(num_envs)
+        ]
+        seeds = [None if seed is None else seed + i for i in range(num_envs)]
+
+        if parallel:
+            self.remotes, work_remotes = zip(
+                *[multiprocessing.Pipe() for _ in range(num_envs)])
+            self.processes = [
+                multiprocessing.Process(
+                    target=_worker,
+                    args=(work_remote, remote, create_env, env_seed),
+                    daemon=True)
+                for work_remote, remote, create_env, env_seed in zip(
+                    work_remotes, self.remotes, create_envs, seeds)
+            ]
+            for process in self.processes:
+                process.start()
+            for work_remote in work_remotes:
+                work_remote.close()
+
+            self.remotes[0].send(('spaces', None))
+            self.observation_space, self.action_space = self.remotes[0].recv()
+        else:
+            self.envs = [_SubEnv(create_env, env_seed)
+                         for create_env, env_seed in zip(create_envs, seeds)]
+            self.observation_space = self.envs[0].env.observation_space
+            self.action_space = self.envs[0].env.action_space
+
+    def reset(self):
+        """Reset all environments.
+
+        Returns
+        -------
+        numpy ndarray
+            the initial observation of every environment
+        """
+        if self.parallel:
+            for remote in self.remotes:
+                remote.send(('reset', None))
+            return np.stack([remote.recv() for remote in self.remotes])
+        else:
+            return np.stack([env.reset() for env in self.envs])
+
+    def step(self, actions):
+        """Advance all environments by one step.
+
+        Parameters
+        ----------
+        actions : array_like
+            the actions of every environment, indexed by environment
+
+        Returns
+        -------
+        numpy ndarray
+            the next observation of every environment
+        numpy ndarray
+            the reward of every environment
+        numpy ndarray of bool
+            whether the rollout of every environment ended in this step
+        list of dict
+            the info dict of every environment
+        """
+        self.step_async(actions)
+        return self.step_wait()
+
+    def step_async(self, actions):
+        """Send the actions to all environments, without waiting for results.
+
+        In sequential mode, the environments are stepped in ``step_wait``.
+        """
+        if len(actions) != self.num_envs:
+            raise ValueError('Expected {} actions, got {}.'.format(
+                self.num_envs, len(actions)))
+
+        if self.parallel:
+            for remote, action in zip(self.remotes, actions):
+                remote.send(('step', action))
+        else:
+            self._actions = actions
+
+    def step_wait(self):
+        """Wait for the results of the last call to ``step_async``.
+
+        See ``step`` for a description of the returned values.
+        """
+        if self.parallel:
+            results = [remote.recv() for remote in self.remotes]
+        else:
+            results = [env.step(action)
+                       for env, action in zip(self.envs, self._actions)]
+            self._actions = None
+
+        obs, rewards, dones, infos = zip(*results)
+        return np.stack(obs), np.array(rewards, dtype=float), \
+            np.array(dones, dtype=bool), list(infos)
+
+    def close(self):
+        """Terminate all environments."""
+        if self.closed:
+            return
+
+        if self.parallel:
+            for remote in self.remotes:
+                remote.send(('close', None))
+            for process in self.processes:
+                process.join()
+        else:
+            for env in self.envs:
+                env.close()
+
+        self.closed = True
@@ -1,16 +1,13 @@
 from copy import deepcopy
 import numpy as np
 import random
-import traceback
+import time
 from gym.spaces import Box
 
-from traci.exceptions import FatalTraCIError
-from traci.exceptions import TraCIException
-
 from ray.rllib.env import MultiAgentEnv
 
 from flow.envs.base_env import Env
-from flow.utils.exceptions import FatalFlowError
+from flow.controllers.base_controller import get_batch_actions
 
 
 class MultiEnv(MultiAgentEnv, Env):
@@ -46,64 +43,83 @@ class MultiEnv(MultiAgentEnv, Env):
         info: dict
             contains other diagnostic information from the previous action
         """
+        profiler = self.profiler
+        profiler.start_step()
+        step_start = time.perf_counter()
+
         for _ in range(self.env_params.sims_per_step):
             self.time_counter += 1
             self.step_counter += 1
 
             # perform acceleration actions for controlled human-driven vehicles
-            if len(self.k.vehicle.get_controlled_ids()) > 0:
-                accel = []
-                for veh_id in self.k.vehicle.get_controlled_ids():
-                    accel_contr = self.k.vehicle.get_acc_controller(veh_id)
-                    action = accel_contr.get_action(self)
-                    accel.append(action)
-                self.k.vehicle.apply_acceleration(
-                    self.k.vehicle.get_controlled_ids(), accel)
+            # (controllers of the same type and parameters are evaluated
+            # together in a single vectorized call)
+            with profiler.phase('step.controllers'):
+                if len(self.k.vehicle.get_controlled_ids()) > 0:
+                    profiler.count('controlled_vehicles',
+                                   len(self.k.vehicle.get_controlled_ids()))
+                    accel = get_batch_actions(
+                        self, self.k.vehicle.get_controlled_ids())
+                    self.k.vehicle.apply_acceleration(
+                        self.k.vehicle.get_controlled_ids(), accel)
 
             # perform lane change actions for controlled human-driven vehicles
-            if len(self.k.vehicle.get_controlled_lc_ids()) > 0:
-                direction = []
-                for veh_id in self.k.vehicle.get_controlled_lc_ids():
-                    target_lane = self.k.vehicle.get_lane_changing_controller(
-                        veh_id).get_action(self)
-                    direction.append(target_lane)
-                self.k.vehicle.apply_lane_change(
-                    self.k.vehicle.get_controlled_lc_ids(),
-                    direction=direction)
+            with profiler.phase('step.lane_changes'):
+                if len(self.k.vehicle.get_controlled_lc_ids()) > 0:
+                    direction = []
+                    for veh_id in self.k.vehicle.get_controlled_lc_ids():
+                        target_lane = \
+                            self.k.vehicle.get_lane_changing_controller(
+                                veh_id).get_action(self)
+                        direction.append(target_lane)
+                    self.k.vehicle.apply_lane_change(
+                        self.k.vehicle.get_controlled_lc_ids(),
+                        direction=direction)
 
             # perform (optionally) routing actions for all vehicle in the
             # network, including rl and sumo-controlled vehicles
-            routing_ids = []
-            routing_actions = []
-            for veh_id in self.k.vehicle.get_ids():
-                if self.k.vehicle.get_routing_controller(veh_id) is not None:
-                    routing_ids.append(veh_id)
-                    route_contr = self.k.vehicle.get_routing_controller(veh_id)
-                    routing_actions.append(route_contr.choose_route(self))
-            self.k.vehicle.choose_routes(routing_ids, routing_actions)
-
-            self.apply_rl_actions(rl_actions)
-
-            self.additional_command()
+            with profiler.phase('step.routing'):
+                routing_ids = []
+                routing_actions = []
+                for veh_id in self.k.vehicle.get_ids():
+                    if self.k.vehicle.get_routing_controller(veh_id) \
+                            is not None:
+                        routing_ids.append(veh_id)
+                        route_contr = self.k.vehicle.get_routing_controller(
+                            veh_id)
+                        routing_actions.append(route_contr.choose_route(self))
+                self.k.vehicle.choose_routes(routing_ids, routing_actions)
+
+            with profiler.phase('step.apply_rl_actions'):
+                self.apply_rl_actions(rl_actions)
+
+            with profiler.phase('step.additional_command'):
+                self.additional_command()
 
             # advance the simulation in the simulator by one step
-            self.k.simulation.simulation_step()
+            with profiler.phase('step.simulation_step'):
+                self.k.simulation.simulation_step()
 
             # store new observations in the vehicles and traffic lights class
-            self.k.update(reset=False)
+            with profiler.phase('step.kernel_update'):
+                self.k.update(reset=False)
 
             # update the colors of vehicles
             if self.sim_params.render:
-                self.k.vehicle.update_vehicle_colors()
+                with profiler.phase('step.update_colors'):
+                    self.k.vehicle.update_vehicle_colors()
 
             # crash encodes whether the simulator experienced a collision
-            crash = self.k.simulation.check_collision()
+            with profiler.phase('step.check_collision'):
+                crash = self.k.simulation.check_collision()
 
             # stop collecting new simulation steps if there is a collision
             if crash:
+                profiler.count('crashes')
                 break
 
-        states = self.get_state()
+        with profiler.phase('step.get_state'):
+            states = self.get_state()
         done = {key: key in self.k.vehicle.get_arrived_ids()
                 for key in states.keys()}
         if crash:
@@ -112,8 +128,15 @@ class MultiEnv(MultiAgentEnv, Env):
             done['__all__'] = False
         infos = {key: {} for key in states.keys()}
 
-        clipped_actions = self.clip_actions(rl_actions)
-        reward = self.compute_reward(clipped_actions, fail=crash)
+        with profiler.phase('step.compute_reward'):
+            clipped_actions = self.clip_actions(rl_actions)
+            reward = self.compute_reward(clipped_actions, fail=crash)
+
+        # the timings of the step are shared by all agents
+        if profiler.enabled:
+            profiler.add_time('step', time.perf_counter() - step_start)
+            for info in infos.values():
+                info['timings'] = profiler.last_step
 
         return states, reward, done, infos
 
@@ -136,6 +159,9 @@ class MultiEnv(MultiAgentEnv, Env):
         # reset the time counter
         self.time_counter = 0
 
+        profiler = self.profiler
+        reset_start = time.perf_counter()
+
         # warn about not using restart_instance when using inflows
         if len(self.scenario.net_params.inflows.get()) > 0 and \
                 not self.sim_params.restart_instance:
@@ -166,72 +192,23 @@ class MultiEnv(MultiAgentEnv, Env):
         elif self.scenario.initial_config.shuffle:
             self.setup_initial_state()
 
-        # clear all vehicles from the network and the vehicles class
-        if self.simulator == 'traci':
-            for veh_id in self.k.kernel_api.vehicle.getIDList():  # FIXME: hack
-                try:
-                    self.k.vehicle.remove(veh_id)
-                except (FatalTraCIError, TraCIException):
-                    pass
-
-        # clear all vehicles from the network and the vehicles class
-        # FIXME (ev, ak) this is weird and shouldn't be necessary
-        for veh_id in list(self.k.vehicle.get_ids()):
-            # do not try to remove the vehicles from the network in the first
-            # step after initializing the network, as there will be no vehicles
-            if self.step_counter == 0:
-                continue
-            try:
-                self.k.vehicle.remove(veh_id)
-            except (FatalTraCIError, TraCIException):
-                print("Error during start: {}".format(traceback.format_exc()))
-
-        # reintroduce the initial vehicles to the network
-        for veh_id in self.initial_ids:
-            type_id, edge, lane_index, pos, speed = \
-                self.initial_state[veh_id]
-
-            try:
-                self.k.vehicle.add(
-                    veh_id=veh_id,
-                    type_id=type_id,
-                    edge=edge,
-                    lane=lane_index,
-                    pos=pos,
-                    speed=speed)
-            except (FatalTraCIError, TraCIException):
-                # if a vehicle was not removed in the first attempt, remove it
-                # now and then reintroduce it
-                self.k.vehicle.remove(veh_id)
-                if self.simulator == 'traci':
-                    self.k.kernel_api.vehicle.remove(veh_id)  # FIXME: hack
-                self.k.vehicle.add(
-                    veh_id=veh_id,
-                    type_id=type_id,
-                    edge=edge,
-                    lane=lane_index,
-                    pos=pos,
-                    speed=speed)
-
-        # advance the simulation in the simulator by one step
-        self.k.simulation.simulation_step()
-
-        # update the information in each kernel to match the current state
-        self.k.update(reset=True)
-
-        # update the colors of vehicles
-        if self.sim_params.render:
-            self.k.vehicle.update_vehicle_colors()
-
-        # check to make sure all vehicles have been spawned
-        if len(self.initial_ids) > self.k.vehicle.num_vehicles:
-            missing_vehicles = list(
-                set(self.initial_ids) - set(self.k.vehicle.get_ids()))
-            msg = '\nNot enough vehicles have spawned! Bad start?\n' \
-                  'Missing vehicles / initial state:\n'
-            for veh_id in missing_vehicles:
-                msg += '- {}: {}\n'.format(veh_id, self.initial_state[veh_id])
-            raise FatalFlowError(msg=msg)
+        if self.initial_snapshot is not None:
+            # restore the state of the simulation at the start of the first
+            # rollout, which includes the initial vehicles
+            with profiler.phase('reset.load_snapshot'):
+                self.k.load_state(self.initial_snapshot)
+        else:
+            with profiler.phase('reset.reset_vehicles'):
+                self.reset_vehicles()
+
+            # store the state of the simulation for the next resets
+            if self.sim_params.reset_from_snapshot \
+                    and not self.sim_params.restart_instance \
+                    and not self.scenario.initial_config.shuffle:
+                with profiler.phase('reset.save_snapshot'):
+                    self.initial_snapshot = self.k.save_state()
+
+        profiler.add_time('reset', time.perf_counter() - reset_start)
 
         # perform (optional) warm-up steps before training
         for _ in range(self.env_params.warmup_steps):
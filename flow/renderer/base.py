@@ -0,0 +1,477 @@
+"""Contains the base renderer class."""
+
+import matplotlib.cm as cm
+import matplotlib.colors as colors
+import numpy as np
+import cv2
+import imutils
+import os
+from os.path import expanduser
+import time
+import copy
+from flow.renderer.writer import RenderWriter
+HOME = expanduser("~")
+
+# rendering modes supported by the renderers
+MODES = [True, False, "rgb", "drgb", "gray", "dgray"]
+
+
+def truncate_colormap(cmap, minval=0.25, maxval=0.75, n=100):
+    """Truncate a matplotlib colormap.
+    """
+
+    new_cmap = colors.LinearSegmentedColormap.from_list(
+        'trunc({n},{a:.2f},{b:.2f})'.format(n=cmap.name, a=minval, b=maxval),
+        cmap(np.linspace(minval, maxval, n)))
+    return new_cmap
+
+
+class BaseRenderer(object):
+    """Base renderer class.
+
+    Contains the geometry of the rendered frames, which maps the coordinates
+    of the network (in meters) to pixels, the colors of the lanes and
+    vehicles, the storage of the rendered frames, and the extraction of the
+    local observations (sights) of vehicles from the last rendered frame.
+    Subclasses implement ``_draw``, which draws a frame and stores it in
+    ``self.frame`` as a (height, width, 3) BGR array whose first row is the
+    top of the network.
+    """
+
+    def __init__(self, network, mode,
+                 save_render=False,
+                 path=HOME+"/flow_rendering",
+                 sight_radius=50,
+                 show_radius=False,
+                 pxpm=2):
+        """Instantiate a renderer class.
+
+            Parameters
+            ----------
+            network: list
+                A list of road network polygons
+            mode: str or bool
+                False: no rendering
+                True: delegate rendering to sumo-gui for back-compatibility
+                "gray": static grayscale rendering, which is good for training
+                "dgray": dynamic grayscale rendering
+                "rgb": static RGB rendering
+                "drgb": dynamic RGB rendering, which is good for visualization
+            save_render: bool or str
+                Specify whether to save rendering data to disk
+                True: save the frames as PNG images
+                "video": encode the frames into a video with ffmpeg
+            path: str
+                Specify where to store the rendering data
+            sight_radius: int
+                Set the radius of observation for RL vehicles (meter)
+            show_radius: bool
+                Specify whether to render the radius of RL observation
+            pxpm: int
+                Specify rendering resolution (pixel / meter)
+        """
+        self.mode = mode
+        if self.mode not in MODES:
+            raise ValueError("Mode %s is not supported!" % self.mode)
+        self.save_render = save_render
+        self.root_path = path
+        self.path = path + '/' + time.strftime("%Y-%m-%d-%H%M%S")
+        self.network = network
+        # writer of the rendering data, created when data is first saved
+        self.writer = None
+        if self.save_render:
+            self._get_writer()
+        self.sight_radius = sight_radius
+        self.pxpm = pxpm  # Pixel per meter
+        self.show_radius = show_radius
+        self.time = 0
+        self.frame = None
+
+        # circular masks of the sights, by radius, and buffers of the
+        # batched sights (see get_sights)
+        self._sight_masks = dict()
+        self._sight_buffers = None
+
+        self.lane_polys = copy.deepcopy(network)
+        lane_polys_flat = [pt for poly in network for pt in poly]
+
+        polys_x = np.asarray(lane_polys_flat[::2])
+        width = int(polys_x.max() - polys_x.min())
+        shift = polys_x.min() - 2
+        scale = (width - 4) / width
+        self.width = (width + 2*self.sight_radius) * self.pxpm
+        self.x_shift = shift - self.sight_radius
+        self.x_scale = scale
+
+        polys_y = np.asarray(lane_polys_flat[1::2])
+        height = int(polys_y.max() - polys_y.min())
+        shift = polys_y.min() - 2
+        scale = (height - 4) / height
+        self.height = (height + 2*self.sight_radius) * self.pxpm
+        self.y_shift = shift - self.sight_radius
+        self.y_scale = scale
+
+        self.lane_colors = []
+        for lane_poly in self.lane_polys:
+            lane_poly[::2] = [(x-self.x_shift)*self.x_scale*self.pxpm
+                              for x in lane_poly[::2]]
+            lane_poly[1::2] = [(y-self.y_shift)*self.y_scale*self.pxpm
+                               for y in lane_poly[1::2]]
+            if "d" in self.mode:
+                color = [c for _ in range(int(len(lane_poly)/2))
+                         for c in [224, 224, 224]]
+            else:
+                color = [c for _ in range(int(len(lane_poly)/2))
+                         for c in [200, 200, 0]]
+            self.lane_colors.append(color)
+
+        # colormaps of the vehicles in the dynamic modes
+        self.human_cmap = truncate_colormap(cm.Greens, 0.2, 0.8)
+        self.machine_cmap = truncate_colormap(cm.Blues, 0.2, 0.8)
+
+    def render(self,
+               human_orientations,
+               machine_orientations,
+               human_dynamics,
+               machine_dynamics,
+               human_logs,
+               machine_logs,
+               save_render=None,
+               sight_radius=None,
+               show_radius=None):
+        """Update the rendering frame.
+
+            Parameters
+            ----------
+            human_orientations: list
+                A list contains orientations of all human vehicles
+                An orientation is a list contains [x, y, angle].
+            machine_orientations: list
+                A list contains orientations of all RL vehicles
+                An orientation is a list contains [x, y, angle].
+            human_dynamics: list
+                A list contains the speed of all human vehicles normalized by
+                max speed, i.e., speed/max_speed
+                This is used to dynamically color human vehicles based on its
+                velocity.
+            machine_dynamics: list
+                A list contains the speed of all RL vehicles normalized by
+                max speed, i.e., speed/max_speed
+                This is used to dynamically color RL vehicles based on its
+                velocity.
+            human_logs: list
+                A list contains the timestep (ms), timedelta (ms), and id of
+                all human vehicles
+            machine_logs: list
+                A list contains the timestep (ms), timedelta (ms), and id of
+                all RL vehicles
+            save_render: bool
+                Specify whether to Specify whether to save rendering data to
+                disk
+            sight_radius: int
+                Set the radius of observation for RL vehicles (meter)
+            show_radius: bool
+                Specify whether to render the radius of RL observation
+
+            Returns
+            -------
+            numpy.ndarray
+                the rendered frame, in grayscale in the "gray" modes
+        """
+
+        if save_render is None:
+            save_render = self.save_render
+        if sight_radius is not None:
+            sight_radius = sight_radius * self.pxpm
+        else:
+            sight_radius = self.sight_radius
+        if show_radius is None:
+            show_radius = self.show_radius
+
+        if save_render:
+            # the data is written in the background, and is copied in case
+            # the lists are modified by the caller
+            self._get_writer().append_data([
+                [list(o) for o in human_orientations],
+                [list(o) for o in machine_orientations],
+                list(human_dynamics),
+                list(machine_dynamics),
+                [list(log) for log in human_logs],
+                [list(log) for log in machine_logs]])
+
+        self.time += 1
+
+        human_conditions, machine_conditions = self.vehicle_colors(
+            human_dynamics, machine_dynamics)
+        self._draw(human_orientations, machine_orientations,
+                   human_conditions, machine_conditions,
+                   sight_radius if show_radius else 0)
+
+        if "gray" in self.mode:
+            _frame = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
+        else:
+            _frame = self.frame
+        if save_render:
+            self._get_writer().write_frame(_frame, self.time)
+        return _frame
+
+    def _draw(self, human_orientations, machine_orientations,
+              human_colors, machine_colors, sight_radius):
+        """Draw a frame and store it in ``self.frame``.
+
+            Parameters
+            ----------
+            human_orientations: list
+                A list contains orientations of all human vehicles
+            machine_orientations: list
+                A list contains orientations of all RL vehicles
+            human_colors: list
+                A list contains the [r, g, b] colors of all human vehicles
+            machine_colors: list
+                A list contains the [r, g, b] colors of all RL vehicles
+            sight_radius: float
+                Radius of the circles drawn around the RL vehicles, which is
+                multiplied by the resolution of the frame (pxpm). No circle is
+                drawn if the radius is 0.
+        """
+        raise NotImplementedError
+
+    def vehicle_colors(self, human_dynamics, machine_dynamics):
+        """Return the colors of the human and RL vehicles.
+
+            Parameters
+            ----------
+            human_dynamics: list
+                normalized speeds of the human vehicles
+            machine_dynamics: list
+                normalized speeds of the RL vehicles
+
+            Returns
+            -------
+            list of list of int
+                [r, g, b] colors of the human vehicles
+            list of list of int
+                [r, g, b] colors of the RL vehicles
+        """
+        if "d" in self.mode:
+            # the colormaps are evaluated for all vehicles at once
+            human_conditions = (255 * self.human_cmap(
+                np.asarray(human_dynamics, dtype=float))[:, :3]).astype(
+                    np.uint8).tolist() if len(human_dynamics) > 0 else []
+            machine_conditions = (255 * self.machine_cmap(
+                np.asarray(machine_dynamics, dtype=float))[:, :3]).astype(
+                    np.uint8).tolist() if len(machine_dynamics) > 0 else []
+        else:
+            human_conditions = [[0, 128, 128] for d in human_dynamics]
+            machine_conditions = [[255, 255, 255] for d in machine_dynamics]
+        return human_conditions, machine_conditions
+
+    def to_pixels(self, x, y):
+        """Map network coordinates (meters) to pixel coordinates.
+
+        The returned pixel coordinates have their origin at the bottom left
+        corner of the frame.
+        """
+        return (x-self.x_shift)*self.x_scale*self.pxpm, \
+            (y-self.y_shift)*self.y_scale*self.pxpm
+
+    def get_sight(self, orientation, id, sight_radius=None, save_render=None):
+        """Return the local observation of a vehicle.
+
+            Parameters
+            ----------
+            orientation: list
+                An orientation is a list contains [x, y, angle]
+            id: str
+                The vehicle to observe for
+            sight_radius: int
+                Set the radius of observation for RL vehicles (meter)
+            save_render: bool
+                Specify whether to save rendering data to disk
+        """
+
+        if sight_radius is not None:
+            sight_radius = sight_radius * self.pxpm
+        else:
+            sight_radius = self.sight_radius * self.pxpm
+        if save_render is None:
+            save_render = self.save_render
+
+        x, y, ang = orientation
+        x, y = self.to_pixels(x, y)
+        x_med = x
+        y_med = self.height - y
+        x_min = int(x_med - sight_radius)
+        y_min = int(y_med - sight_radius)
+        x_max = int(x_med + sight_radius)
+        y_max = int(y_med + sight_radius)
+        fixed_sight = self.frame[y_min:y_max, x_min:x_max]
+        height, width = fixed_sight.shape[0:2]
+        mask = np.zeros((height, width), np.uint8)
+        cv2.circle(mask, (int(sight_radius), int(sight_radius)),
+                   int(sight_radius), (255, 255, 255), thickness=-1)
+        rotated_sight = cv2.bitwise_and(fixed_sight, fixed_sight, mask=mask)
+        rotated_sight = imutils.rotate(rotated_sight, ang)
+        if "gray" in self.mode:
+            _rotated_sight = cv2.cvtColor(rotated_sight, cv2.COLOR_BGR2GRAY)
+        else:
+            _rotated_sight = rotated_sight
+        if save_render:
+            self._get_writer().write_image(
+                "sight_%s_%06d.png" % (id, self.time), _rotated_sight)
+        return _rotated_sight
+
+    def get_sights(self, orientations, ids, sight_radius=None,
+                   save_render=None):
+        """Return the local observations of several vehicles.
+
+        This is the batched equivalent of ``get_sight``, and returns the same
+        sights. The circular mask of the sights is cached for every radius,
+        the rotation matrices of all vehicles are computed at once, and every
+        sight is masked and rotated by two native calls that write into
+        buffers reused across calls, instead of allocating the crop, mask and
+        rotated image of every vehicle.
+
+            Parameters
+            ----------
+            orientations: list
+                A list contains the orientations [x, y, angle] of the
+                vehicles
+            ids: list
+                The vehicles to observe for
+            sight_radius: int
+                Set the radius of observation for RL vehicles (meter)
+            save_render: bool
+                Specify whether to save rendering data to disk
+
+            Returns
+            -------
+            numpy.ndarray
+                (n, size, size, 3) array of the sights of the vehicles, or
+                (n, size, size) array in the "gray" modes, where size is twice
+                the radius of observation in pixels. The array is overwritten
+                by the next call; it should be copied to be kept.
+        """
+        if sight_radius is not None:
+            sight_radius = sight_radius * self.pxpm
+        else:
+            sight_radius = self.sight_radius * self.pxpm
+        if save_render is None:
+            save_render = self.save_render
+
+        radius = int(sight_radius)
+        size = 2 * radius
+        mask = self._sight_mask(radius)
+        orientations = np.asarray(orientations, dtype=float).reshape(-1, 3)
+        num = len(orientations)
+        crop, sights, gray_sights = self._sight_buffer(num, size)
+
+        # top left corner of the sight of every vehicle in the frame
+        x, y = self.to_pixels(orientations[:, 0], orientations[:, 1])
+        x_min = (x - sight_radius).astype(int)
+        y_min = (self.height - y - sight_radius).astype(int)
+
+        # matrices of the rotations of the sights around their centers (see
+        # cv2.getRotationMatrix2D, which is used by imutils.rotate)
+        ang = np.radians(orientations[:, 2])
+        alpha, beta = np.cos(ang), np.sin(ang)
+        center = size // 2
+        rotations = np.empty((num, 2, 3))
+        rotations[:, 0, 0] = alpha
+        rotations[:, 0, 1] = beta
+        rotations[:, 0, 2] = (1 - alpha) * center - beta * center
+        rotations[:, 1, 0] = -beta
+        rotations[:, 1, 1] = alpha
+        rotations[:, 1, 2] = beta * center + (1 - alpha) * center
+
+        for i in range(num):
+            x0, y0 = x_min[i], y_min[i]
+            if x0 >= 0 and y0 >= 0 and x0 + size <= self.width \
+                    and y0 + size <= self.height:
+                cv2.bitwise_and(self.frame[y0:y0 + size, x0:x0 + size],
+                                mask, dst=crop)
+            else:
+                # the parts of the sight outside of the frame are black
+                crop.fill(0)
+                xs, ys = max(x0, 0), max(y0, 0)
+                xe = min(x0 + size, self.width)
+                ye = min(y0 + size, self.height)
+                if xs < xe and ys < ye:
+                    crop[ys - y0:ye - y0, xs - x0:xe - x0] = cv2.bitwise_and(
+                        self.frame[ys:ye, xs:xe],
+                        mask[ys - y0:ye - y0, xs - x0:xe - x0])
+            cv2.warpAffine(crop, rotations[i], (size, size), dst=sights[i])
+
+        if "gray" in self.mode:
+            if num > 0:
+                cv2.cvtColor(sights[:num].reshape(num * size, size, -1),
+                             cv2.COLOR_BGR2GRAY,
+                             dst=gray_sights[:num].reshape(num * size, size))
+            sights = gray_sights[:num]
+        else:
+            sights = sights[:num]
+
+        if save_render:
+            writer = self._get_writer()
+            for veh_id, sight in zip(ids, sights):
+                writer.write_image(
+                    "sight_%s_%06d.png" % (veh_id, self.time), sight)
+        return sights
+
+    def _sight_mask(self, radius):
+        """Return the circular mask of the sights of a given radius.
+
+        The mask is the disk drawn by ``get_sight``, repeated for every
+        channel of the frame, so that it can be combined with the frame by a
+        bitwise and.
+        """
+        if radius not in self._sight_masks:
+            mask = np.zeros((2 * radius, 2 * radius), np.uint8)
+            cv2.circle(mask, (radius, radius), radius, (255, 255, 255),
+                       thickness=-1)
+            self._sight_masks[radius] = np.repeat(
+                mask[..., None], self.frame.shape[2], axis=2)
+        return self._sight_masks[radius]
+
+    def _sight_buffer(self, num, size):
+        """Return buffers large enough for the sights of num vehicles.
+
+        The buffers are the masked crop of a sight, and the rotated (and
+        grayscale) sights of all vehicles. They are reallocated, with twice
+        the required capacity, only if they are too small.
+        """
+        if self._sight_buffers is not None:
+            crop, sights, _ = self._sight_buffers
+            if len(sights) >= num and crop.shape[0] == size:
+                return self._sight_buffers
+
+        capacity = max(2 * num, 1)
+        channels = self.frame.shape[2]
+        self._sight_buffers = (
+            np.zeros((size, size, channels), np.uint8),
+            np.zeros((capacity, size, size, channels), np.uint8),
+            np.zeros((capacity, size, size), np.uint8))
+        return self._sight_buffers
+
+    def close(self):
+        """Terminate the renderer.
+        """
+
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def _get_writer(self):
+        """Return the writer of the rendering data, creating it if needed.
+
+        The rendering data is written in a new directory, named after the
+        time at which the writer is created, and starts with the network.
+        """
+        if self.writer is None:
+            if not os.path.exists(self.root_path):
+                os.mkdir(self.root_path)
+            os.mkdir(self.path)
+            self.writer = RenderWriter(
+                self.path, video=self.save_render == "video")
+            self.writer.append_data(self.network)
+        return self.writer
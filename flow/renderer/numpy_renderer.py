@@ -0,0 +1,217 @@
+"""Contains the numpy renderer class."""
+
+import numpy as np
+from flow.renderer.base import BaseRenderer, HOME
+
+
+class NumpyRenderer(BaseRenderer):
+    """Headless renderer drawing the frames with numpy.
+
+    Produces the same frames and sights as the pyglet renderer, without
+    requiring a display or an OpenGL context, which makes it suitable for
+    training on servers. The static road network is rasterized once into a
+    lane layer when the renderer is created. Every frame is then a copy of
+    this layer, on which the vehicles of the frame are stamped in a few
+    vectorized operations: the triangles of all vehicles are filled by
+    evaluating their edge functions on a small window of pixels around
+    every vehicle, and the observation radii of the RL vehicles are drawn by
+    sampling their circles.
+
+    Usage:
+
+        >>> renderer = NumpyRenderer(network, "gray", sight_radius=25)
+        >>> frame = renderer.render(human_orientations, machine_orientations,
+        ...                         human_dynamics, machine_dynamics,
+        ...                         human_logs, machine_logs)
+        >>> sight = renderer.get_sight(machine_orientations[0], "rl_0")
+    """
+
+    # size of the triangle of a vehicle (meter)
+    vehicle_size = 4.5
+    # color of the background of the frames (BGR)
+    background = 32
+
+    def __init__(self, network, mode,
+                 save_render=False,
+                 path=HOME+"/flow_rendering",
+                 sight_radius=50,
+                 show_radius=False,
+                 pxpm=2):
+        """Instantiate a numpy renderer class.
+
+        See parent class.
+        """
+        super(NumpyRenderer, self).__init__(
+            network, mode,
+            save_render=save_render,
+            path=path,
+            sight_radius=sight_radius,
+            show_radius=show_radius,
+            pxpm=pxpm)
+
+        # static layer containing the road network
+        self.lane_layer = np.full((self.height, self.width, 3),
+                                  self.background, dtype=np.uint8)
+        for lane_poly, lane_color in zip(self.lane_polys, self.lane_colors):
+            points = np.asarray(lane_poly, dtype=float).reshape(-1, 2)
+            self._stamp_polyline(self.lane_layer, points, lane_color[:3])
+        self.frame = self.lane_layer.copy()
+
+        # offsets of the points sampled on circles, by radius
+        self._circles = dict()
+
+    def _draw(self, human_orientations, machine_orientations,
+              human_colors, machine_colors, sight_radius):
+        """See parent class."""
+        np.copyto(self.frame, self.lane_layer)
+
+        orientations = list(human_orientations) + list(machine_orientations)
+        if len(orientations) == 0:
+            return
+        orientations = np.asarray(orientations, dtype=float).reshape(-1, 3)
+        colors = np.asarray(list(human_colors) + list(machine_colors),
+                            dtype=np.uint8).reshape(-1, 3)
+        x, y = self.to_pixels(orientations[:, 0], orientations[:, 1])
+        self._stamp_triangles(x, y, orientations[:, 2], colors)
+
+        num_human = len(human_orientations)
+        if sight_radius != 0 and len(orientations) > num_human:
+            self._stamp_circles(x[num_human:], y[num_human:],
+                                sight_radius * self.pxpm,
+                                colors[num_human:])
+
+    def _stamp(self, frame, x, y, colors):
+        """Set the color of the pixels containing points of the frame.
+
+        Parameters
+        ----------
+        frame : numpy.ndarray
+            (height, width, 3) BGR frame, modified in place
+        x : numpy.ndarray
+            horizontal coordinates of the points (pixels from the left)
+        y : numpy.ndarray
+            vertical coordinates of the points (pixels from the bottom)
+        colors : numpy.ndarray
+            (n, 3) [r, g, b] colors of the points. Points drawn later are
+            drawn on top of earlier ones.
+        """
+        col = np.floor(x).astype(np.int64)
+        row = self.height - 1 - np.floor(y).astype(np.int64)
+        valid = (col >= 0) & (col < self.width) \
+            & (row >= 0) & (row < self.height)
+        frame[row[valid], col[valid]] = colors[valid][:, ::-1]
+
+    def _stamp_polyline(self, frame, points, color):
+        """Draw a line strip with a thickness of one pixel.
+
+        Parameters
+        ----------
+        frame : numpy.ndarray
+            (height, width, 3) BGR frame, modified in place
+        points : numpy.ndarray
+            (n, 2) pixel coordinates of the vertices of the line strip
+        color : list of int
+            [r, g, b] color of the line strip
+        """
+        if len(points) < 2:
+            return
+        start, end = points[:-1], points[1:]
+        # sample every segment with a spacing of at most half a pixel
+        num = np.ceil(2 * np.abs(end - start).max(axis=1)).astype(np.int64)
+        num = np.maximum(num, 1)
+        segment = np.repeat(np.arange(len(start)), num + 1)
+        offset = np.arange(len(segment)) - np.repeat(
+            np.cumsum(num + 1) - (num + 1), num + 1)
+        t = (offset / num[segment])[:, None]
+        samples = start[segment] + t * (end - start)[segment]
+        self._stamp(frame, samples[:, 0], samples[:, 1],
+                    np.tile(np.asarray(color, dtype=np.uint8),
+                            (len(samples), 1)))
+
+    def _stamp_triangles(self, x, y, angles, colors):
+        """Fill the triangles of vehicles.
+
+        The vertices of the triangles are the same as the ones of the pyglet
+        renderer. A pixel is filled if its center is inside the triangle.
+
+        Parameters
+        ----------
+        x : numpy.ndarray
+            horizontal pixel coordinates of the front of the vehicles
+        y : numpy.ndarray
+            vertical pixel coordinates of the front of the vehicles
+        angles : numpy.ndarray
+            angles of the vehicles (degrees)
+        colors : numpy.ndarray
+            (n, 3) [r, g, b] colors of the vehicles
+        """
+        ang = np.radians(angles)
+        s = self.vehicle_size * self.pxpm
+        sin, cos = np.sin(ang), np.cos(ang)
+        sin_, cos_ = np.sin(np.pi/2 - ang), np.cos(np.pi/2 - ang)
+        x1_ = x - s * self.x_scale * sin
+        y1_ = y - s * self.y_scale * cos
+        # (n, 3) coordinates of the vertices of every triangle
+        vx = np.stack((x, x1_ + 0.25*s*self.x_scale*sin_,
+                       x1_ - 0.25*s*self.x_scale*sin_), axis=1)
+        vy = np.stack((y, y1_ - 0.25*s*self.y_scale*cos_,
+                       y1_ + 0.25*s*self.y_scale*cos_), axis=1)
+
+        # (n, m) centers of the pixels in the bounding box of every triangle,
+        # which are all enclosed in windows of the same size
+        x_min = np.floor(vx.min(axis=1))
+        y_min = np.floor(vy.min(axis=1))
+        size = int(max(np.max(vx.max(axis=1) - x_min),
+                       np.max(vy.max(axis=1) - y_min))) + 1
+        dy, dx = np.mgrid[0:size, 0:size]
+        px = x_min[:, None] + dx.ravel() + 0.5
+        py = y_min[:, None] + dy.ravel() + 0.5
+
+        # edge functions of the three edges of every triangle
+        inside_pos = np.ones(px.shape, dtype=bool)
+        inside_neg = np.ones(px.shape, dtype=bool)
+        for i, j in ((0, 1), (1, 2), (2, 0)):
+            edge = (vx[:, j] - vx[:, i])[:, None] * (py - vy[:, i, None]) \
+                - (vy[:, j] - vy[:, i])[:, None] * (px - vx[:, i, None])
+            inside_pos &= edge >= 0
+            inside_neg &= edge <= 0
+        inside = inside_pos | inside_neg
+
+        vehicle = np.broadcast_to(np.arange(len(x))[:, None], px.shape)
+        self._stamp(self.frame, px[inside], py[inside],
+                    colors[vehicle[inside]])
+
+    def _stamp_circles(self, x, y, radius, colors):
+        """Draw circles with a thickness of one pixel around vehicles.
+
+        Parameters
+        ----------
+        x : numpy.ndarray
+            horizontal pixel coordinates of the centers of the circles
+        y : numpy.ndarray
+            vertical pixel coordinates of the centers of the circles
+        radius : float
+            radius of the circles (pixels)
+        colors : numpy.ndarray
+            (n, 3) [r, g, b] colors of the circles
+        """
+        if radius not in self._circles:
+            # the circles are polygons with the same vertices as in the
+            # pyglet renderer, sampled with a spacing of at most half a pixel
+            num_vertices = int(self.pxpm * 50)
+            vertices = np.arange(num_vertices + 1) / num_vertices
+            step = 2 * np.pi * radius / num_vertices
+            num = max(int(np.ceil(2 * step)), 1)
+            t = np.linspace(0, 1, num, endpoint=False)
+            angle = np.radians(360 * vertices)
+            cx = radius * self.x_scale * np.cos(angle)
+            cy = radius * self.y_scale * np.sin(angle)
+            self._circles[radius] = (
+                (cx[:-1, None] + t * np.diff(cx)[:, None]).ravel(),
+                (cy[:-1, None] + t * np.diff(cy)[:, None]).ravel())
+        sx, sy = self._circles[radius]
+
+        self._stamp(self.frame,
+                    (x[:, None] + sx).ravel(),
+                    (y[:, None] + sy).ravel(),
+                    np.repeat(colors, len(sx), axis=0))
@@ -0,0 +1,223 @@
+"""Contains the asynchronous writer of the rendering data."""
+
+import cv2
+import numpy as np
+import os
+import queue
+import subprocess
+import threading
+
+# name of the video of the frames, and of the file of the rendering data
+VIDEO_NAME = "frames.mp4"
+DATA_NAME = "data.npy"
+
+
+class RenderWriter(object):
+    """Writes rendered frames and rendering data to disk in the background.
+
+    Images are encoded and written by a background thread, which receives
+    them through a bounded queue. The simulation thread only copies the
+    images into the queue, and waits if the writer falls behind by more than
+    ``queue_size`` items, so that the memory used by the writer stays
+    constant. Frames are either saved as individual PNG images, or streamed
+    into the input pipe of an ffmpeg process that encodes them into a video.
+
+    The rendering data (the network and the vehicles of every frame) is
+    appended to a single file in chunks of ``chunk_size`` records, each saved
+    with ``numpy.save``, instead of being kept in memory until the end of the
+    simulation. The file can be read with ``load_render_data``.
+
+    Usage:
+
+        >>> writer = RenderWriter("~/flow_rendering/2019-01-01-000000")
+        >>> writer.append_data(network)
+        >>> writer.write_frame(frame, 1)
+        >>> writer.write_image("sight_rl_0_000001.png", sight)
+        >>> writer.close()
+        >>> data = load_render_data(
+        ...     "~/flow_rendering/2019-01-01-000000/data.npy")
+    """
+
+    def __init__(self, path, video=False, fps=25, queue_size=64,
+                 chunk_size=100):
+        """Instantiate the writer.
+
+        Parameters
+        ----------
+        path : str
+            directory in which the frames and data are written
+        video : bool, optional
+            specifies whether to encode the frames into a video (VIDEO_NAME)
+            with ffmpeg, instead of saving them as PNG images
+        fps : int, optional
+            frame rate of the video
+        queue_size : int, optional
+            maximum number of items waiting to be written
+        chunk_size : int, optional
+            number of records of rendering data per chunk of the data file
+        """
+        self.path = path
+        self.video = video
+        self.fps = fps
+        self.chunk_size = chunk_size
+
+        # ffmpeg process encoding the video, started with the first frame
+        self._encoder = None
+        # records of rendering data that have not been written yet
+        self._records = []
+        # first exception raised by the background thread, if any
+        self._error = None
+
+        # create an empty data file
+        with open(os.path.join(self.path, DATA_NAME), 'wb'):
+            pass
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._write)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write_frame(self, frame, index):
+        """Write a rendered frame.
+
+        Parameters
+        ----------
+        frame : numpy.ndarray
+            BGR or grayscale frame. The frame is copied, and may be modified
+            after this call.
+        index : int
+            index of the frame, used to name the PNG images
+        """
+        if self.video:
+            self._put(('frame', None, frame.copy()))
+        else:
+            self.write_image("frame_%06d.png" % index, frame)
+
+    def write_image(self, name, image):
+        """Write an image as a PNG file.
+
+        Parameters
+        ----------
+        name : str
+            name of the file, in the directory of the writer
+        image : numpy.ndarray
+            BGR or grayscale image. The image is copied, and may be modified
+            after this call.
+        """
+        self._put(('image', name, image.copy()))
+
+    def append_data(self, record):
+        """Append a record to the rendering data.
+
+        The record must not be modified after this call.
+        """
+        self._put(('data', None, record))
+
+    def close(self):
+        """Write all pending items, and stop the writer.
+
+        This method blocks until all items have been written.
+
+        Raises
+        ------
+        Exception
+            the first exception raised while writing, if any
+        """
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _put(self, item):
+        """Pass an item to the background thread."""
+        if self._error is not None:
+            raise self._error
+        self._queue.put(item)
+
+    def _write(self):
+        """Write the items of the queue, in a separate thread."""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    self._flush_data()
+                    self._close_encoder()
+                    return
+                kind, name, value = item
+                if self._error is not None:
+                    continue
+                if kind == 'frame':
+                    self._encode(value)
+                elif kind == 'image':
+                    cv2.imwrite(os.path.join(self.path, name), value)
+                else:
+                    self._records.append(value)
+                    if len(self._records) >= self.chunk_size:
+                        self._flush_data()
+            except Exception as e:
+                if self._error is None:
+                    self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _encode(self, frame):
+        """Pass a frame to the video encoder."""
+        if self._encoder is None:
+            height, width = frame.shape[:2]
+            self._encoder = subprocess.Popen(
+                ['ffmpeg', '-y', '-loglevel', 'error',
+                 '-f', 'rawvideo',
+                 '-pix_fmt', 'bgr24' if frame.ndim == 3 else 'gray',
+                 '-s', '%dx%d' % (width, height),
+                 '-r', str(self.fps),
+                 '-i', '-',
+                 # yuv420p videos require an even width and height
+                 '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                 '-pix_fmt', 'yuv420p',
+                 os.path.join(self.path, VIDEO_NAME)],
+                stdin=subprocess.PIPE)
+        self._encoder.stdin.write(np.ascontiguousarray(frame).tobytes())
+
+    def _close_encoder(self):
+        """Wait for the video encoder to finish the video."""
+        if self._encoder is not None:
+            self._encoder.stdin.close()
+            self._encoder.wait()
+            self._encoder = None
+
+    def _flush_data(self):
+        """Append the pending records to the data file."""
+        if len(self._records) == 0:
+            return
+        # records are stored one by one, so that nested lists are not
+        # converted to arrays
+        chunk = np.empty(len(self._records), dtype=object)
+        for i, record in enumerate(self._records):
+            chunk[i] = record
+        with open(os.path.join(self.path, DATA_NAME), 'ab') as f:
+            np.save(f, chunk)
+        self._records = []
+
+
+def load_render_data(path):
+    """Load the rendering data written by a RenderWriter.
+
+    Parameters
+    ----------
+    path : str
+        path to the data file
+
+    Returns
+    -------
+    list
+        the records of the data file. For data written by a renderer, the
+        first record is the road network, and the other records contain the
+        orientations, dynamics and logs of the human and RL vehicles of every
+        frame.
+    """
+    records = []
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        while f.tell() < size:
+            records.extend(np.load(f, allow_pickle=True).tolist())
+    return records
@@ -4,6 +4,7 @@ import time
 import logging
 import struct
 
+import flow.utils.aimsun.bulk as bulk
 import flow.utils.aimsun.constants as ac
 import flow.utils.aimsun.struct as aimsun_struct
 
@@ -158,6 +159,30 @@ class FlowAimsunAPI(object):
 
             return unpacked_data
 
+    def _send_bulk_command(self, command_type, values):
+        """Send a command and its values in a single round trip.
+
+        Unlike ``_send_command``, the command type and the encoded values are
+        sent together in a single length-prefixed message, and the server
+        replies with a single length-prefixed message, without waiting for
+        confirmations in between. This is used by the commands applying to
+        many vehicles at once.
+
+        Parameters
+        ----------
+        command_type : flow.utils.aimsun.constants.*
+            the command the client would like Aimsun to execute
+        values : bytes
+            encoded values of the command
+
+        Returns
+        -------
+        bytes
+            the encoded values returned by the Aimsun server
+        """
+        self.s.sendall(bulk.pack_request(command_type, values))
+        return bulk.recv_reply(self.s)
+
     def simulation_step(self):
         """Advance the simulation by one step.
 
@@ -262,6 +287,25 @@ class FlowAimsunAPI(object):
                            values=(veh_id, speed),
                            out_format='i')
 
+    def set_bulk_speed(self, veh_ids, speeds):
+        """Set the speeds of several vehicles in a single round trip.
+
+        Parameters
+        ----------
+        veh_ids : list of int
+            names of the vehicles in Aimsun
+        speeds : list of float
+            target speed of every vehicle
+
+        Returns
+        -------
+        int
+            number of vehicles whose speed was set
+        """
+        data = self._send_bulk_command(
+            ac.VEH_SET_BULK_SPEED, bulk.pack_speeds(veh_ids, speeds))
+        return bulk.FRAME_LENGTH.unpack(data)[0]
+
     def apply_lane_change(self, veh_id, direction):
         """Set the lane change action of a specific vehicle.
 
@@ -427,6 +471,28 @@ class FlowAimsunAPI(object):
             values=(veh_id,),
             out_format='f f f f f f f f f f f f f i i i i i i i i')
 
+    def get_bulk_tracking_info(self, veh_ids):
+        """Return the tracking information of several vehicles.
+
+        The tracking information, leader, and next section of all vehicles are
+        collected in a single round trip, instead of three per vehicle.
+
+        Parameters
+        ----------
+        veh_ids : list of int
+            names of the vehicles in Aimsun
+
+        Returns
+        -------
+        list of (tuple, int, int)
+            for every vehicle, the tracking information (in the format of
+            ``get_vehicle_tracking_info``), the name of the leader, and the
+            next section
+        """
+        data = self._send_bulk_command(
+            ac.VEH_GET_BULK_TRACKING, bulk.pack_ids(veh_ids))
+        return bulk.unpack_tracking(data)
+
     def get_vehicle_leader(self, veh_id):
         """Return the leader of a specific vehicle.
 
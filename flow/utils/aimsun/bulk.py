@@ -0,0 +1,283 @@
+"""Messages of the commands applying to several vehicles at once.
+
+These commands are sent with their values in a single length-prefixed
+message, and are answered with a single length-prefixed message. The module
+is shared by the Flow client (see FlowAimsunAPI) and the Aimsun server scripts
+(see flow/utils/aimsun/run.py), and is therefore compatible with both
+Python 2 and Python 3.
+"""
+from __future__ import absolute_import
+
+import struct
+
+import flow.utils.aimsun.constants as ac
+
+# first byte of the messages of these commands. Since the other commands are
+# sent as ASCII digits, it lets the server distinguish the two kinds of
+# messages.
+FRAME_MARKER = b'#'
+
+# header of the requests: marker, command type, and size of the values (in
+# bytes)
+FRAME_HEADER = struct.Struct('=c i i')
+
+# header of the replies: size of the values (in bytes). Also used to encode
+# the status of the commands.
+FRAME_LENGTH = struct.Struct('=i')
+
+# names of the attributes of the tracking information of a vehicle (see
+# flow.utils.aimsun.struct.InfVeh) that are sent to the client, and their
+# format
+TRACKING_FIELDS = (
+    'CurrentPos', 'distance2End', 'xCurrentPos', 'yCurrentPos',
+    'zCurrentPos', 'xCurrentPosBack', 'yCurrentPosBack', 'zCurrentPosBack',
+    'CurrentSpeed', 'TotalDistance', 'SectionEntranceT', 'CurrentStopTime',
+    'stopped', 'idSection', 'segment', 'numberLane', 'idJunction',
+    'idSectionFrom', 'idLaneFrom', 'idSectionTo', 'idLaneTo')
+TRACKING_FORMAT = 'f f f f f f f f f f f f f i i i i i i i i'
+
+# tracking information, leader, and next section of a vehicle
+BULK_TRACKING = struct.Struct('=13f 8i i i')
+
+
+###############################################################################
+#                                   Framing                                   #
+###############################################################################
+
+def pack_request(command_type, values):
+    """Return the message of a command and its values.
+
+    Parameters
+    ----------
+    command_type : flow.utils.aimsun.constants.*
+        the command
+    values : bytes
+        encoded values of the command
+
+    Returns
+    -------
+    bytes
+        the message sent to the server
+    """
+    return FRAME_HEADER.pack(FRAME_MARKER, command_type, len(values)) + values
+
+
+def recv_request(conn, data):
+    """Receive the rest of a request from the client.
+
+    Parameters
+    ----------
+    conn : socket.socket
+        socket for server connection
+    data : bytes
+        beginning of the request, already received from the client
+
+    Returns
+    -------
+    int
+        command type
+    bytes
+        encoded values of the command
+    """
+    while len(data) < FRAME_HEADER.size:
+        data += conn.recv(2048)
+    _, command_type, size = FRAME_HEADER.unpack(data[:FRAME_HEADER.size])
+    data = data[FRAME_HEADER.size:]
+    if len(data) < size:
+        data += recv_exactly(conn, size - len(data))
+    return command_type, bytes(data)
+
+
+def pack_reply(values):
+    """Return the message of the reply to a command.
+
+    Parameters
+    ----------
+    values : bytes
+        encoded values returned to the client
+
+    Returns
+    -------
+    bytes
+        the message sent to the client
+    """
+    return FRAME_LENGTH.pack(len(values)) + values
+
+
+def recv_reply(conn):
+    """Receive the reply to a command from the server.
+
+    Parameters
+    ----------
+    conn : socket.socket
+        socket for client connection
+
+    Returns
+    -------
+    bytearray
+        encoded values returned by the server
+    """
+    size, = FRAME_LENGTH.unpack(recv_exactly(conn, FRAME_LENGTH.size))
+    return recv_exactly(conn, size)
+
+
+def recv_exactly(conn, size):
+    """Receive exactly the specified number of bytes.
+
+    Parameters
+    ----------
+    conn : socket.socket
+        socket connection
+    size : int
+        number of bytes to receive
+
+    Returns
+    -------
+    bytearray
+        received bytes
+
+    Raises
+    ------
+    IOError
+        if the connection is closed before all bytes are received
+    """
+    data = bytearray(size)
+    view = memoryview(data)
+    pos = 0
+    while pos < size:
+        num_bytes = conn.recv_into(view[pos:])
+        if num_bytes == 0:
+            raise IOError('Connection closed by the other end.')
+        pos += num_bytes
+    return data
+
+
+###############################################################################
+#                                  Payloads                                   #
+###############################################################################
+
+def pack_ids(veh_ids):
+    """Encode the names of vehicles (see ``unpack_ids``)."""
+    num = len(veh_ids)
+    return struct.pack('=i %di' % num, num, *veh_ids)
+
+
+def unpack_ids(values):
+    """Decode the names of vehicles encoded by ``pack_ids``."""
+    num, = struct.unpack_from('=i', values)
+    return struct.unpack_from('=%di' % num, values, 4)
+
+
+def pack_speeds(veh_ids, speeds):
+    """Encode the names and target speeds of vehicles.
+
+    Parameters
+    ----------
+    veh_ids : list of int
+        names of the vehicles in Aimsun
+    speeds : list of float
+        target speed of every vehicle (m/s)
+
+    Returns
+    -------
+    bytes
+        the encoded values
+    """
+    num = len(veh_ids)
+    return struct.pack('=i %di %df' % (num, num),
+                       num, *(list(veh_ids) + list(speeds)))
+
+
+def unpack_speeds(values):
+    """Decode the names and speeds of vehicles encoded by ``pack_speeds``."""
+    veh_ids = unpack_ids(values)
+    num = len(veh_ids)
+    return veh_ids, struct.unpack_from('=%df' % num, values, 4 + 4 * num)
+
+
+def tracking_info_values(tracking_info):
+    """Return the values of the tracking information sent to the client.
+
+    Parameters
+    ----------
+    tracking_info : InfVeh
+        tracking information of a vehicle, as returned by Aimsun
+
+    Returns
+    -------
+    tuple
+        the values of the attributes in TRACKING_FIELDS
+    """
+    return tuple(getattr(tracking_info, name) for name in TRACKING_FIELDS)
+
+
+def pack_tracking(records):
+    """Encode the tracking information, leaders and next sections of vehicles.
+
+    Parameters
+    ----------
+    records : list of (tuple, int, int)
+        for every vehicle, the values of its tracking information (see
+        ``tracking_info_values``), its leader, and its next section
+
+    Returns
+    -------
+    bytes
+        the encoded values
+    """
+    return b''.join(
+        BULK_TRACKING.pack(*(tuple(tracking_info) + (leader, next_section)))
+        for tracking_info, leader, next_section in records)
+
+
+def unpack_tracking(values):
+    """Decode the records encoded by ``pack_tracking``."""
+    records = []
+    for offset in range(0, len(values), BULK_TRACKING.size):
+        record = BULK_TRACKING.unpack_from(values, offset)
+        records.append((record[:21], record[21], record[22]))
+    return records
+
+
+###############################################################################
+#                               Server handlers                               #
+###############################################################################
+
+def handle_request(aimsun_api, command_type, values):
+    """Execute a command in Aimsun, and return the values of its reply.
+
+    Parameters
+    ----------
+    aimsun_api : module
+        the Aimsun API (AAPI), or any object with the same functions
+    command_type : int
+        the command
+    values : bytes
+        encoded values of the command
+
+    Returns
+    -------
+    bytes
+        encoded values returned to the client. For unknown commands, this is
+        the status -1001.
+    """
+    if command_type == ac.VEH_GET_BULK_TRACKING:
+        records = []
+        for veh_id in unpack_ids(values):
+            tracking_info = aimsun_api.AKIVehTrackedGetInf(veh_id)
+            leader = aimsun_api.AKIVehGetLeaderId(veh_id)
+            next_section = aimsun_api.AKIVehInfPathGetNextSection(
+                veh_id, tracking_info.idSection)
+            records.append(
+                (tracking_info_values(tracking_info), leader, next_section))
+        return pack_tracking(records)
+
+    elif command_type == ac.VEH_SET_BULK_SPEED:
+        veh_ids, speeds = unpack_speeds(values)
+        for veh_id, speed in zip(veh_ids, speeds):
+            # Aimsun speeds are in km/h
+            aimsun_api.AKIVehTrackedModifySpeed(veh_id, speed * 3.6)
+        # return the number of vehicles whose speed was set
+        return FRAME_LENGTH.pack(len(veh_ids))
+
+    return FRAME_LENGTH.pack(-1001)
@@ -80,6 +80,12 @@ VEH_GET_TIMESTEP = 0x14
 # TODO: not 100% sure what this is...
 VEH_GET_TIMEDELTA = 0x15
 
+# get the tracking information, leader, and next section of several vehicles
+VEH_GET_BULK_TRACKING = 0x19
+
+# set the speed of several vehicles
+VEH_SET_BULK_SPEED = 0x1A
+
 
 ###############################################################################
 #                           Traffic Light Commands                            #
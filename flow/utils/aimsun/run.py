@@ -6,6 +6,7 @@ import os
 sys.path.append(os.path.join(config.AIMSUN_NEXT_PATH,
                              'programming/Aimsun Next API/AAPIPython/Micro'))
 
+import flow.utils.aimsun.bulk as bulk
 import flow.utils.aimsun.constants as ac
 import AAPI as aimsun_api
 from AAPI import *
@@ -112,6 +113,14 @@ def threaded_client(conn):
             if data == '':
                 continue
 
+            # commands applying to several vehicles are sent with their values
+            # in a single length-prefixed message
+            if data[:1] == bulk.FRAME_MARKER:
+                command, values = bulk.recv_request(conn, data)
+                conn.sendall(bulk.pack_reply(
+                    bulk.handle_request(aimsun_api, command, values)))
+                continue
+
             # convert to integer
             data = int(data)
 
@@ -264,38 +273,10 @@ def threaded_client(conn):
                 veh_id, = retrieve_message(conn, 'i')
 
                 tracking_info = aimsun_api.AKIVehTrackedGetInf(veh_id)
-                output = (
-                          # tracking_info.report,
-                          # tracking_info.idVeh,
-                          # tracking_info.type,
-                          tracking_info.CurrentPos,
-                          tracking_info.distance2End,
-                          tracking_info.xCurrentPos,
-                          tracking_info.yCurrentPos,
-                          tracking_info.zCurrentPos,
-                          tracking_info.xCurrentPosBack,
-                          tracking_info.yCurrentPosBack,
-                          tracking_info.zCurrentPosBack,
-                          tracking_info.CurrentSpeed,
-                          # tracking_info.PreviousSpeed,
-                          tracking_info.TotalDistance,
-                          # tracking_info.SystemGenerationT,
-                          # tracking_info.SystemEntranceT,
-                          tracking_info.SectionEntranceT,
-                          tracking_info.CurrentStopTime,
-                          tracking_info.stopped,
-                          tracking_info.idSection,
-                          tracking_info.segment,
-                          tracking_info.numberLane,
-                          tracking_info.idJunction,
-                          tracking_info.idSectionFrom,
-                          tracking_info.idLaneFrom,
-                          tracking_info.idSectionTo,
-                          tracking_info.idLaneTo)
+                output = bulk.tracking_info_values(tracking_info)
 
                 send_message(conn,
-                             in_format='f f f f f f f f f f f f f i i i i i i '
-                                       'i i',
+                             in_format=bulk.TRACKING_FORMAT,
                              values=output)
 
             elif data == ac.VEH_GET_LEADER:
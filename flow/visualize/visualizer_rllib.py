@@ -17,6 +17,7 @@ from datetime import datetime
 import gym
 import numpy as np
 import os
+import shutil
 import sys
 
 import ray
@@ -28,6 +29,7 @@ from ray.tune.registry import register_env
 
 # import flow.envs
 from flow.core.util import emission_to_csv
+from flow.renderer.writer import VIDEO_NAME
 from flow.utils.registry import make_create_env
 from flow.utils.rllib import get_flow_params
 from flow.utils.rllib import get_rllib_config
@@ -116,7 +118,8 @@ def visualizer_rllib(args):
     if args.save_render:
         sim_params.render = 'drgb'
         sim_params.pxpm = 4
-        sim_params.save_render = True
+        # the frames are encoded into a movie while the rollouts are run
+        sim_params.save_render = 'video'
 
     # Recreate the scenario from the pickled parameters
     exp_tag = flow_params['exp_tag']
@@ -268,20 +271,18 @@ def visualizer_rllib(args):
 
         emission_to_csv(emission_path)
 
-    # if we wanted to save the render, here we create the movie
+    # if we wanted to save the render, here we copy the movie
     if args.save_render:
         dirs = os.listdir(os.path.expanduser('~')+'/flow_rendering')
         dirs.sort(key=lambda date: datetime.strptime(date, "%Y-%m-%d-%H%M%S"))
         recent_dir = dirs[-1]
-        # create the movie
+        # the movie was encoded by the renderer while rendering
         movie_dir = os.path.expanduser('~') + '/flow_rendering/' + recent_dir
         save_dir = os.path.expanduser('~') + '/flow_movies'
         if not os.path.exists(save_dir):
             os.mkdir(save_dir)
-        os_cmd = "cd " + movie_dir + " && ffmpeg -i frame_%06d.png"
-        os_cmd += " -pix_fmt yuv420p " + dirs[-1] + ".mp4"
-        os_cmd += "&& cp " + dirs[-1] + ".mp4 " + save_dir + "/"
-        os.system(os_cmd)
+        shutil.copy(os.path.join(movie_dir, VIDEO_NAME),
+                    os.path.join(save_dir, recent_dir + ".mp4"))
 
 
 def create_parser():
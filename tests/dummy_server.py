@@ -10,6 +10,7 @@ import sys
 import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import flow.utils.aimsun.bulk as bulk  # noqa
 import flow.utils.aimsun.constants as ac  # noqa
 
 PORT = 9999
@@ -18,6 +19,39 @@ exited_vehicles = [6, 7, 8, 9, 10]
 tl_ids = [1, 2, 3, 4, 5]
 
 
+class DummyTrackingInfo(object):
+    """Tracking information of a vehicle, as returned by the dummy API."""
+
+    def __init__(self, veh_id):
+        # the position of every vehicle is its name
+        values = (veh_id, 5, 6, 7, 8, 9, 10, 11, 12, 14, 17, 18, 19, 20, 21,
+                  22, 23, 24, 25, 26, 27)
+        for name, value in zip(bulk.TRACKING_FIELDS, values):
+            setattr(self, name, value)
+
+
+class DummyAimsunAPI(object):
+    """Functions of the Aimsun API used by the bulk commands."""
+
+    @staticmethod
+    def AKIVehTrackedGetInf(veh_id):
+        return DummyTrackingInfo(veh_id)
+
+    @staticmethod
+    def AKIVehGetLeaderId(veh_id):
+        # the leader of every vehicle is twice its name
+        return 2 * veh_id
+
+    @staticmethod
+    def AKIVehInfPathGetNextSection(veh_id, section):
+        # the next section of every vehicle is three times its name
+        return 3 * veh_id
+
+    @staticmethod
+    def AKIVehTrackedModifySpeed(veh_id, speed):
+        return 0
+
+
 def send_message(conn, in_format, values):
     """Send a message to the client.
 
@@ -110,6 +144,14 @@ def threaded_client(conn):
             if data == '':
                 continue
 
+            # commands applying to several vehicles are sent with their values
+            # in a single length-prefixed message
+            if data[:1] == bulk.FRAME_MARKER:
+                command, values = bulk.recv_request(conn, data)
+                conn.sendall(bulk.pack_reply(
+                    bulk.handle_request(DummyAimsunAPI, command, values)))
+                continue
+
             # convert to integer
             data = int(data)
 
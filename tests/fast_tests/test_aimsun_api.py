@@ -1,8 +1,11 @@
 import flow.config as config
+import flow.utils.aimsun.bulk as bulk
 import flow.utils.aimsun.constants
+import flow.utils.aimsun.constants as ac
 from flow.utils.aimsun.api import FlowAimsunAPI
 import unittest
 import os
+import socket
 import subprocess
 import numpy as np
 
@@ -27,6 +30,115 @@ class TestConstants(unittest.TestCase):
         self.assertEqual(len(var), np.unique(variables).shape[0])
 
 
+class StubTrackingInfo(object):
+    """Tracking information of a vehicle, as returned by StubAimsunAPI."""
+
+    def __init__(self, veh_id):
+        for i, name in enumerate(bulk.TRACKING_FIELDS):
+            setattr(self, name, 100 * veh_id + i)
+
+
+class StubAimsunAPI(object):
+    """Stand-in for the functions of the Aimsun API used by the server."""
+
+    def __init__(self):
+        self.next_section_calls = []
+        self.speeds = {}
+
+    def AKIVehTrackedGetInf(self, veh_id):
+        return StubTrackingInfo(veh_id)
+
+    def AKIVehGetLeaderId(self, veh_id):
+        return veh_id + 1
+
+    def AKIVehInfPathGetNextSection(self, veh_id, section):
+        self.next_section_calls.append((veh_id, section))
+        return veh_id + 2
+
+    def AKIVehTrackedModifySpeed(self, veh_id, speed):
+        self.speeds[veh_id] = speed
+        return 0
+
+
+class TestBulkCommands(unittest.TestCase):
+    """Tests for the messages of the bulk commands, shared by the client in
+    flow/utils/aimsun/api.py and the server in flow/utils/aimsun/run.py."""
+
+    def setUp(self):
+        self.aimsun_api = StubAimsunAPI()
+
+    def test_payloads(self):
+        """Verify that the encoded values are decoded back unchanged."""
+        self.assertTupleEqual(bulk.unpack_ids(bulk.pack_ids([4, 5, 6])),
+                              (4, 5, 6))
+        self.assertTupleEqual(bulk.unpack_ids(bulk.pack_ids([])), ())
+        self.assertTupleEqual(
+            bulk.unpack_speeds(bulk.pack_speeds([4, 5], [1.5, 2.5])),
+            ((4, 5), (1.5, 2.5)))
+
+        records = [(tuple(range(21)), 7, 8), (tuple(range(21, 42)), 9, 10)]
+        self.assertListEqual(
+            bulk.unpack_tracking(bulk.pack_tracking(records)), records)
+        self.assertListEqual(bulk.unpack_tracking(b''), [])
+
+    def test_framing(self):
+        """Verify that requests and replies are received in full, even when
+        they are split across several packets."""
+        client, server = socket.socketpair()
+        try:
+            values = bulk.pack_ids(list(range(5000)))
+            client.sendall(bulk.pack_request(ac.VEH_GET_BULK_TRACKING, values))
+            # the server only reads the first byte to detect the framing
+            command, received = bulk.recv_request(server, server.recv(1))
+            self.assertEqual(command, ac.VEH_GET_BULK_TRACKING)
+            self.assertEqual(received, values)
+
+            server.sendall(bulk.pack_reply(values))
+            self.assertEqual(bytes(bulk.recv_reply(client)), values)
+
+            # the client is notified when the server closes the connection
+            server.sendall(bulk.FRAME_LENGTH.pack(10) + b'abc')
+            server.close()
+            self.assertRaises(IOError, bulk.recv_reply, client)
+        finally:
+            client.close()
+            server.close()
+
+    def test_bulk_tracking(self):
+        """Verify the tracking information returned by the server."""
+        output = bulk.handle_request(
+            self.aimsun_api, ac.VEH_GET_BULK_TRACKING, bulk.pack_ids([1, 2]))
+
+        records = bulk.unpack_tracking(output)
+        self.assertEqual(len(records), 2)
+        for veh_id, (tracking_info, leader, next_section) in \
+                zip([1, 2], records):
+            self.assertTupleEqual(
+                tracking_info, tuple(100 * veh_id + i for i in range(21)))
+            self.assertEqual(leader, veh_id + 1)
+            self.assertEqual(next_section, veh_id + 2)
+
+        # the next section is requested from the current section (idSection)
+        idx = bulk.TRACKING_FIELDS.index('idSection')
+        self.assertListEqual(self.aimsun_api.next_section_calls,
+                             [(1, 100 + idx), (2, 200 + idx)])
+
+    def test_bulk_set_speed(self):
+        """Verify that the server sets the speeds of vehicles in km/h."""
+        output = bulk.handle_request(
+            self.aimsun_api, ac.VEH_SET_BULK_SPEED,
+            bulk.pack_speeds([1, 2], [10., 20.]))
+
+        self.assertTupleEqual(bulk.FRAME_LENGTH.unpack(output), (2,))
+        self.assertDictEqual(self.aimsun_api.speeds, {1: 36., 2: 72.})
+
+    def test_unknown_command(self):
+        """Verify that the server returns -1001 for unknown commands."""
+        output = bulk.handle_request(
+            self.aimsun_api, ac.VEH_GET_TRACKING, bulk.pack_ids([1]))
+        self.assertTupleEqual(bulk.FRAME_LENGTH.unpack(output), (-1001,))
+
+
 class TestDummyAPI(unittest.TestCase):
     """Tests the functionality of FlowAimsunAPI.
 
@@ -133,6 +245,33 @@ class TestDummyAPI(unittest.TestCase):
         tl_ids = self.kernel_api.get_traffic_light_ids()
         self.assertEqual(len(tl_ids), 0)
 
+    def test_bulk_methods(self):
+        # test the get_bulk_tracking_info method
+        bulk_info = self.kernel_api.get_bulk_tracking_info([1, 2, 3])
+        self.assertEqual(len(bulk_info), 3)
+        for veh_id, (tracking_info, leader, next_section) in \
+                zip([1, 2, 3], bulk_info):
+            self.assertTupleEqual(
+                tracking_info,
+                (veh_id, 5, 6, 7, 8, 9, 10, 11, 12, 14, 17, 18, 19, 20, 21,
+                 22, 23, 24, 25, 26, 27))
+            self.assertEqual(leader, 2 * veh_id)
+            self.assertEqual(next_section, 3 * veh_id)
+
+        # test the get_bulk_tracking_info method with many vehicles, whose
+        # information does not fit in a single packet
+        veh_ids = list(range(1000))
+        bulk_info = self.kernel_api.get_bulk_tracking_info(veh_ids)
+        self.assertListEqual([info[1] for info in bulk_info],
+                             [2 * veh_id for veh_id in veh_ids])
+
+        # test the get_bulk_tracking_info method with no vehicles
+        self.assertListEqual(self.kernel_api.get_bulk_tracking_info([]), [])
+
+        # test the set_bulk_speed method
+        self.assertEqual(
+            self.kernel_api.set_bulk_speed([1, 2, 3], [4., 5., 6.]), 3)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,55 @@
+import json
+import os
+import tempfile
+import unittest
+
+from flow.benchmarks.benchmark_throughput import scale_flow_params, \
+    run_benchmarks
+from flow.benchmarks.bottleneck0 import flow_params as bottleneck0_params
+from flow.benchmarks.figureeight1 import flow_params as figureeight1_params
+
+
+class TestBenchmarkThroughput(unittest.TestCase):
+    """Tests the throughput and latency benchmark of flow/benchmarks."""
+
+    def test_scale_flow_params(self):
+        """Check that the fleet is scaled without modifying the benchmark."""
+        flow_params = scale_flow_params(figureeight1_params, 3)
+        self.assertEqual(flow_params['veh'].num_vehicles, 42)
+        self.assertEqual(flow_params['veh'].num_rl_vehicles, 21)
+        self.assertEqual(figureeight1_params['veh'].num_vehicles, 14)
+
+        flow_params = scale_flow_params(bottleneck0_params, 2)
+        self.assertEqual(flow_params['net'].additional_params['scaling'], 2)
+        self.assertListEqual(
+            [inflow['vehsPerHour'] for inflow in
+             flow_params['net'].inflows.get()],
+            [2 * inflow['vehsPerHour'] for inflow in
+             bottleneck0_params['net'].inflows.get()])
+        self.assertEqual(
+            bottleneck0_params['net'].additional_params['scaling'], 1)
+
+    def test_run_benchmarks(self):
+        """Check that the results of the benchmarks are written as json."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output = os.path.join(tmp_dir, 'results.json')
+            run_benchmarks(['merge0'], scales=[1, 2], isolate=False,
+                           output=output, horizon=10, policy='noop',
+                           simulator='numpy')
+            with open(output) as f:
+                results = json.load(f)
+
+        self.assertEqual(len(results['results']), 2)
+        for scale, result in zip([1, 2], results['results']):
+            self.assertNotIn('error', result)
+            self.assertEqual(result['scale'], scale)
+            self.assertEqual(result['num_vehicles'], 5 * scale)
+            self.assertEqual(result['num_steps'], 10)
+            self.assertGreater(result['env_steps_per_sec'], 0)
+            self.assertGreater(result['peak_rss']['self'], 0)
+            self.assertEqual(
+                result['profile']['phases']['step']['count'], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
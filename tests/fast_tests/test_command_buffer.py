@@ -0,0 +1,180 @@
+import socket
+import struct
+import threading
+import unittest
+
+import traci
+import traci.constants as tc
+from traci.exceptions import TraCIException
+
+from flow.core.kernel.simulation.command_buffer import TraCICommandBuffer
+
+
+class FakeTraCIServer(object):
+    """Acknowledges all TraCI commands it receives, and logs them.
+
+    Commands on the objects in ``failing_ids`` are answered with an error.
+    """
+
+    def __init__(self, failing_ids=()):
+        self.failing_ids = failing_ids
+        # list of messages, each a list of (command id, object id)
+        self.messages = []
+
+        self._server = socket.socket()
+        self._server.bind(("localhost", 0))
+        self._server.listen(1)
+        self.port = self._server.getsockname()[1]
+
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _serve(self):
+        conn, _ = self._server.accept()
+        while True:
+            header = self._recv(conn, 4)
+            if header is None:
+                break
+            length = struct.unpack("!i", header)[0]
+            data = self._recv(conn, length - 4)
+
+            commands, response = [], bytes()
+            offset = 0
+            while offset < len(data):
+                cmd_length = data[offset]
+                start = offset
+                offset += 1
+                if cmd_length == 0:
+                    cmd_length = struct.unpack(
+                        "!i", data[offset:offset + 4])[0]
+                    offset += 4
+                cmd_id = data[offset]
+                obj_id = None
+                if cmd_id != tc.CMD_CLOSE:
+                    id_length = struct.unpack(
+                        "!i", data[offset + 2:offset + 6])[0]
+                    obj_id = data[offset + 6:offset + 6 + id_length].decode()
+                commands.append((cmd_id, obj_id))
+                offset = start + cmd_length
+
+                err = b"failed" if obj_id in self.failing_ids else b""
+                response += struct.pack(
+                    "!BBBi", 7 + len(err), cmd_id, 0xFF if err else 0x00,
+                    len(err)) + err
+
+            self.messages.append(commands)
+            conn.sendall(struct.pack("!i", len(response) + 4) + response)
+            if commands[-1][0] == tc.CMD_CLOSE:
+                break
+        conn.close()
+        self._server.close()
+
+    @staticmethod
+    def _recv(conn, length):
+        data = bytes()
+        while len(data) < length:
+            chunk = conn.recv(length - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+
+class TestTraCICommandBuffer(unittest.TestCase):
+    """Tests the buffer of TraCI set-commands of the sumo kernel."""
+
+    def connect(self, failing_ids=()):
+        self.server = FakeTraCIServer(failing_ids)
+        self.kernel_api = traci.connect(self.server.port, numRetries=1)
+        self.addCleanup(self.kernel_api.close)
+        return TraCICommandBuffer(self.kernel_api)
+
+    def test_single_message(self):
+        """Check that all queued commands are sent in a single message."""
+        buffer = self.connect()
+        for i in range(100):
+            buffer.add(("veh{}".format(i), "slowDown"),
+                       self.kernel_api.vehicle.slowDown,
+                       "veh{}".format(i), 10, 1)
+        buffer.add(("veh0", "setColor"), self.kernel_api.vehicle.setColor,
+                   "veh0", (255, 0, 0, 255))
+        self.assertEqual(len(buffer), 101)
+
+        buffer.flush()
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(len(self.server.messages), 1)
+        self.assertEqual(len(self.server.messages[0]), 101)
+        self.assertEqual(self.server.messages[0][-1],
+                         (tc.CMD_SET_VEHICLE_VARIABLE, "veh0"))
+
+        # nothing is sent if no command is queued
+        buffer.flush()
+        self.assertEqual(len(self.server.messages), 1)
+
+        # the connection can still be used to send regular commands
+        self.kernel_api.vehicle.setSpeed("veh0", 0)
+        self.assertEqual(len(self.server.messages), 2)
+
+    def test_deduplication(self):
+        """Check that later commands replace earlier ones with the same key."""
+        buffer = self.connect()
+        buffer.add(("veh0", "slowDown"), self.kernel_api.vehicle.slowDown,
+                   "veh0", 10, 1)
+        buffer.add(("veh1", "slowDown"), self.kernel_api.vehicle.slowDown,
+                   "veh1", 10, 1)
+        buffer.add(("veh0", "slowDown"), self.kernel_api.vehicle.slowDown,
+                   "veh0", 5, 1)
+        buffer.add(("veh2", "slowDown"), self.kernel_api.vehicle.slowDown,
+                   "veh2", 10, 1)
+        buffer.discard("veh2")
+
+        buffer.flush()
+        self.assertListEqual(
+            [obj_id for _, obj_id in self.server.messages[0]],
+            ["veh1", "veh0"])
+
+    def test_errors(self):
+        """Check that errors are raised after all results are read."""
+        buffer = self.connect(failing_ids=("veh0", "veh1"))
+        buffer.add(("veh0", "setColor"), self.kernel_api.vehicle.setColor,
+                   "veh0", (255, 0, 0, 255), ignore_errors=True)
+        buffer.add(("veh1", "slowDown"), self.kernel_api.vehicle.slowDown,
+                   "veh1", 10, 1)
+        buffer.add(("veh2", "slowDown"), self.kernel_api.vehicle.slowDown,
+                   "veh2", 10, 1)
+        self.assertRaises(TraCIException, buffer.flush)
+        self.assertEqual(len(self.server.messages[0]), 3)
+
+        # errors of commands added with ignore_errors are not raised
+        buffer.add(("veh0", "setColor"), self.kernel_api.vehicle.setColor,
+                   "veh0", (255, 0, 0, 255), ignore_errors=True)
+        buffer.flush()
+
+        # the connection is still usable
+        self.kernel_api.vehicle.setSpeed("veh2", 0)
+        self.assertEqual(len(self.server.messages), 3)
+
+    def test_unsupported_connection(self):
+        """Check that commands are sent one by one by unknown versions."""
+        self.connect()
+        # the connection lacks one of the internals used by the buffer
+        message = self.kernel_api._string
+        del self.kernel_api._string
+        try:
+            buffer = TraCICommandBuffer(self.kernel_api)
+            self.assertFalse(buffer.pipelined)
+
+            calls = []
+            buffer.add(("veh0", "slowDown"), calls.append, "veh0")
+            buffer.add(("veh1", "slowDown"), calls.append, "veh1")
+            buffer.flush()
+            self.assertListEqual(calls, ["veh0", "veh1"])
+        finally:
+            self.kernel_api._string = message
+
+        self.assertTrue(TraCICommandBuffer(self.kernel_api).pipelined)
+
+
+if __name__ == '__main__':
+    unittest.main()
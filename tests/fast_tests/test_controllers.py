@@ -1,4 +1,5 @@
 import unittest
+from unittest import mock
 
 from flow.core.experiment import Experiment
 from flow.core.params import EnvParams, InitialConfig, NetParams
@@ -8,6 +9,7 @@ from flow.core.params import SumoCarFollowingParams
 from flow.controllers.routing_controllers import ContinuousRouter
 from flow.controllers.car_following_models import IDMController, \
     OVMController, BCMController, LinearOVM, CFMController
+from flow.controllers.base_controller import get_batch_actions
 from tests.setup_scripts import ring_road_exp_setup
 import os
 import numpy as np
@@ -284,6 +286,150 @@ class TestIDMController(unittest.TestCase):
         ]
 
 
+class TestBatchedControllers(unittest.TestCase):
+    """
+    Tests that controllers evaluated in batches return the same actions as
+    controllers evaluated one vehicle at a time.
+    """
+
+    def setUp(self):
+        # add vehicles with different controllers, parameters, and failsafes
+        vehicles = VehicleParams()
+        vehicles.add(
+            veh_id="idm",
+            acceleration_controller=(IDMController, {"noise": 0}),
+            routing_controller=(ContinuousRouter, {}),
+            car_following_params=SumoCarFollowingParams(
+                tau=1, accel=1, decel=5),
+            num_vehicles=3)
+        vehicles.add(
+            veh_id="idm_failsafe",
+            acceleration_controller=(IDMController, {
+                "noise": 0, "fail_safe": "instantaneous"}),
+            routing_controller=(ContinuousRouter, {}),
+            car_following_params=SumoCarFollowingParams(
+                tau=1, accel=1, decel=5),
+            num_vehicles=3)
+        vehicles.add(
+            veh_id="ovm",
+            acceleration_controller=(OVMController, {
+                "fail_safe": "safe_velocity"}),
+            routing_controller=(ContinuousRouter, {}),
+            car_following_params=SumoCarFollowingParams(
+                accel=15, decel=5),
+            num_vehicles=2)
+        vehicles.add(
+            veh_id="bcm",
+            acceleration_controller=(BCMController, {}),
+            routing_controller=(ContinuousRouter, {}),
+            car_following_params=SumoCarFollowingParams(
+                accel=15, decel=5),
+            num_vehicles=2)
+
+        # create the environment and scenario classes for a ring road
+        self.env, scenario = ring_road_exp_setup(vehicles=vehicles)
+
+    def tearDown(self):
+        # terminate the traci instance
+        self.env.terminate()
+
+        # free data used by the class
+        self.env = None
+
+    def test_get_batch_actions(self):
+        self.env.reset()
+        ids = self.env.k.vehicle.get_ids()
+
+        test_headways = [1, 3, 5, 8, 10, 15, 20, 25, 30, 40]
+        for i, veh_id in enumerate(ids):
+            self.env.k.vehicle.set_headway(veh_id, test_headways[i])
+
+        requested_accel = get_batch_actions(self.env, ids)
+
+        expected_accel = [
+            self.env.k.vehicle.get_acc_controller(veh_id).get_action(self.env)
+            for veh_id in ids
+        ]
+
+        np.testing.assert_array_almost_equal(requested_accel, expected_accel)
+
+    def test_overridden_get_accel(self):
+        """Check that subclasses overriding get_accel are not batched."""
+        class ConstantIDMController(IDMController):
+            def get_accel(self, env):
+                return 0.5
+
+        self.env.reset()
+        ids = self.env.k.vehicle.get_ids()
+        controllers = {
+            veh_id: ConstantIDMController(
+                veh_id, car_following_params=SumoCarFollowingParams())
+            for veh_id in ids}
+
+        self.assertIsNotNone(IDMController(
+            ids[0], car_following_params=SumoCarFollowingParams())
+            .get_batch_key())
+        self.assertIsNone(controllers[ids[0]].get_batch_key())
+
+        # the accelerations are computed by the subclass through get_action
+        with mock.patch.object(self.env.k.vehicle, "get_acc_controller",
+                               side_effect=controllers.get):
+            requested_accel = get_batch_actions(self.env, ids)
+
+        np.testing.assert_array_almost_equal(requested_accel,
+                                             [0.5] * len(ids))
+
+    def test_batch_failsafes(self):
+        """Check that the batched and scalar failsafes agree on leaders."""
+        self.env.reset()
+        ids = self.env.k.vehicle.get_ids()
+
+        # vehicles whose headways are small enough to trigger the failsafes
+        for veh_id in ids:
+            self.env.k.vehicle.set_headway(veh_id, 0.01)
+
+        # the first two vehicles have no leader, which the vehicle kernel may
+        # denote with either an empty id or None
+        no_lead = {ids[0]: "", ids[1]: None}
+        get_leader = self.env.k.vehicle.get_leader
+
+        def get_leader_stub(veh_id, error=""):
+            if isinstance(veh_id, (list, np.ndarray)):
+                return [get_leader_stub(v, error) for v in veh_id]
+            if veh_id in no_lead:
+                return no_lead[veh_id]
+            return get_leader(veh_id, error)
+
+        controllers = [self.env.k.vehicle.get_acc_controller(veh_id)
+                       for veh_id in ids]
+        action = np.full(len(ids), 3.)
+
+        with mock.patch.object(self.env.k.vehicle, "get_leader",
+                               side_effect=get_leader_stub):
+            batch_instantaneous = controllers[0] \
+                .get_batch_safe_action_instantaneous(
+                    self.env, np.array(ids, dtype=object), action)
+            scalar_instantaneous = [
+                controller.get_safe_action_instantaneous(self.env, 3.)
+                for controller in controllers]
+
+            batch_safe_velocity = controllers[0] \
+                .get_batch_safe_velocity_action(
+                    self.env, np.array(ids, dtype=object), action)
+            scalar_safe_velocity = [
+                controller.get_safe_velocity_action(self.env, 3.)
+                for controller in controllers]
+
+        np.testing.assert_array_almost_equal(batch_instantaneous,
+                                             scalar_instantaneous)
+        np.testing.assert_array_almost_equal(batch_safe_velocity,
+                                             scalar_safe_velocity)
+
+        # vehicles without a leader keep their actions, and the others stop
+        np.testing.assert_array_almost_equal(
+            batch_instantaneous, [3., 3.] + [0.] * (len(ids) - 2))
+
+
 class TestInstantaneousFailsafe(unittest.TestCase):
     """
     Tests that the instantaneous failsafe of the base acceleration controller
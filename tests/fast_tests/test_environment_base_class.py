@@ -99,6 +99,59 @@ class TestEmissionPath(unittest.TestCase):
         self.assertIsNone(self.env.sim_params.emission_path)
 
 
+class TestLibsumo(unittest.TestCase):
+    """
+    Tests that running sumo in-process through libsumo produces the same
+    rollouts as running sumo in a separate process.
+    """
+
+    def run_env(self, use_libsumo):
+        vehicles = VehicleParams()
+        vehicles.add(
+            veh_id="test",
+            acceleration_controller=(IDMController, {}),
+            routing_controller=(ContinuousRouter, {}),
+            num_vehicles=5)
+
+        env, _ = ring_road_exp_setup(
+            sim_params=SumoParams(use_libsumo=use_libsumo),
+            vehicles=vehicles)
+
+        if use_libsumo:
+            # no sumo process is started
+            self.assertIsNone(env.k.simulation.sumo_proc)
+
+        positions = []
+        for _ in range(2):
+            env.reset()
+            for _ in range(20):
+                env.step(None)
+                ids = env.k.vehicle.get_ids()
+                positions.append(env.k.vehicle.get_position(ids))
+        env.terminate()
+
+        return positions
+
+    def test_libsumo(self):
+        np.testing.assert_array_almost_equal(
+            self.run_env(use_libsumo=False), self.run_env(use_libsumo=True))
+
+    def test_numpy_arguments(self):
+        """Check that numpy scalars are accepted as arguments by libsumo."""
+        env, _ = ring_road_exp_setup(sim_params=SumoParams(use_libsumo=True))
+        env.reset()
+        veh_id = env.k.vehicle.get_ids()[0]
+        env.k.vehicle.set_max_speed(veh_id, np.float32(5.5))
+        env.step(None)
+        self.assertAlmostEqual(
+            env.k.vehicle.kernel_api.vehicle.getMaxSpeed(veh_id), 5.5)
+        env.k.vehicle.set_max_speed(veh_id, np.array([6.5]))
+        env.step(None)
+        self.assertAlmostEqual(
+            env.k.vehicle.kernel_api.vehicle.getMaxSpeed(veh_id), 6.5)
+        env.terminate()
+
+
 class TestApplyingActionsWithSumo(unittest.TestCase):
     """
     Tests the apply_acceleration, apply_lane_change, and choose_routes
@@ -16,6 +16,7 @@ from flow.envs import LaneChangeAccelEnv, LaneChangeAccelPOEnv, AccelEnv, \
     WaveAttenuationEnv, WaveAttenuationPOEnv, WaveAttenuationMergePOEnv, \
     TestEnv, TwoLoopsMergePOEnv, DesiredVelocityEnv
 from flow.envs.loop.wave_attenuation import v_eq_max_function
+from flow.envs.bottleneck_env import EDGE_LIST
 
 
 os.environ["TEST_FLAG"] = "True"
@@ -806,11 +807,136 @@ class TestDesiredVelocityEnv(unittest.TestCase):
         self.assertAlmostEqual(
             env.k.vehicle.get_inflow_rate(250)/expected_inflow, 1, 1)
 
+    def test_detector_observations(self):
+        """Tests that the observations computed by the virtual detectors
+        match the ones obtained by binning every vehicle."""
+        np.random.seed(seed=123)
+
+        sim_params = SumoParams(sim_step=0.5)
+
+        vehicles = VehicleParams()
+        vehicles.add(veh_id="human")
+        vehicles.add(veh_id="followerstopper",
+                     acceleration_controller=(RLController, {}))
+
+        controlled_segments = [("1", 1, False), ("2", 2, True), ("3", 2, True),
+                               ("4", 2, True), ("5", 1, False)]
+        num_observed_segments = [("1", 1), ("2", 3), ("3", 3), ("4", 3),
+                                 ("5", 1)]
+        env_params = EnvParams(
+            additional_params={
+                "target_velocity": 40,
+                "disable_tb": True,
+                "disable_ramp_metering": True,
+                "controlled_segments": controlled_segments,
+                "symmetric": False,
+                "observed_segments": num_observed_segments,
+                "reset_inflow": False,
+                "lane_change_duration": 5,
+                "max_accel": 3,
+                "max_decel": 3,
+                "inflow_range": [1000, 2000]
+            }
+        )
+
+        inflow = InFlows()
+        inflow.add(veh_type="human", edge="1", vehs_per_hour=2000,
+                   departLane="random", departSpeed=10)
+        inflow.add(veh_type="followerstopper", edge="1", vehs_per_hour=500,
+                   departLane="random", departSpeed=10)
+
+        net_params = NetParams(
+            inflows=inflow,
+            no_internal_links=False,
+            additional_params={"scaling": 1, "speed_limit": 23})
+
+        scenario = BottleneckScenario(
+            name="bay_bridge_toll",
+            vehicles=vehicles,
+            net_params=net_params)
+
+        env = DesiredVelocityEnv(env_params, sim_params, scenario)
+        env.reset()
+
+        num_rl = 0
+        for _ in range(200):
+            env.step(rl_actions=None)
+            np.testing.assert_allclose(env.get_state(),
+                                       binned_bottleneck_state(env))
+
+            k = env.k.vehicle
+            bottleneck_ids = k.get_ids_by_edge(['3', '4'])
+            self.assertAlmostEqual(env.get_bottleneck_density(),
+                                   len(bottleneck_ids) / 280)
+            lanes = ["3_0", "3_1", "4_0"]
+            self.assertAlmostEqual(
+                env.get_bottleneck_density(lanes),
+                len([veh_id for veh_id in bottleneck_ids
+                     if "{}_{}".format(k.get_edge(veh_id),
+                                       k.get_lane(veh_id)) in lanes]) / 280)
+
+            veh_ids = k.get_ids_by_edge(['3', '4', '5'])
+            self.assertAlmostEqual(
+                env.get_avg_bottleneck_velocity(),
+                sum(k.get_speed(veh_ids)) / len(veh_ids)
+                if len(veh_ids) != 0 else 0)
+
+            num_rl = max(num_rl, len(set(k.get_rl_ids()) & set(veh_ids)))
+
+        # the bottleneck was reached by rl vehicles during the rollout
+        self.assertGreater(num_rl, 0)
+        env.terminate()
+
 
 ###############################################################################
 #                              Utility methods                                #
 ###############################################################################
 
+def binned_bottleneck_state(env):
+    """Compute the observation of a DesiredVelocityEnv by binning every
+    vehicle in the segments of the observed edges.
+
+    Parameters
+    ----------
+    env : flow.envs.DesiredVelocityEnv
+        the environment
+
+    Returns
+    -------
+    numpy.ndarray
+        the observation expected from env.get_state()
+    """
+    num_norm = 20
+    counts, rl_counts, speeds, rl_speeds = [], [], [], []
+    for i, edge in enumerate(EDGE_LIST):
+        shape = (env.num_obs_segments[i], env.k.scenario.num_lanes(edge))
+        num_vehicles, num_rl_vehicles = np.zeros(shape), np.zeros(shape)
+        vehicle_speeds, rl_vehicle_speeds = np.zeros(shape), np.zeros(shape)
+        for veh_id in env.k.vehicle.get_ids_by_edge(edge):
+            segment = np.searchsorted(
+                env.obs_slices[edge], env.k.vehicle.get_position(veh_id)) - 1
+            lane = env.k.vehicle.get_lane(veh_id)
+            if veh_id in env.k.vehicle.get_rl_ids():
+                rl_vehicle_speeds[segment, lane] += \
+                    env.k.vehicle.get_speed(veh_id)
+                num_rl_vehicles[segment, lane] += 1
+            else:
+                vehicle_speeds[segment, lane] += \
+                    env.k.vehicle.get_speed(veh_id)
+                num_vehicles[segment, lane] += 1
+        counts.append(num_vehicles.flatten())
+        rl_counts.append(num_rl_vehicles.flatten())
+        speeds.append(vehicle_speeds.flatten())
+        rl_speeds.append(rl_vehicle_speeds.flatten())
+
+    counts, rl_counts = np.concatenate(counts), np.concatenate(rl_counts)
+    mean_speed = np.concatenate(speeds) / np.maximum(counts, 1)
+    mean_rl_speed = np.concatenate(rl_speeds) / np.maximum(rl_counts, 1)
+    outflow = env.k.vehicle.get_outflow_rate(20 * env.sim_step) / 2000.0
+    return np.concatenate((counts / num_norm, rl_counts / num_norm,
+                           mean_speed / 50, mean_rl_speed / 50, [outflow]))
+
+
 def test_additional_params(env_class,
                            sim_params,
                            scenario,
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import flow.core.kernel.scenario.net_cache as net_cache
+from flow.core.kernel.scenario.net_cache import NetworkCache
+
+
+class TestNetworkCache(unittest.TestCase):
+    """Tests the cache of networks generated by netconvert."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = NetworkCache(os.path.join(self.tmp_dir, "cache"))
+
+        # network file, as it would be generated by netconvert
+        self.net_path = os.path.join(self.tmp_dir, "test.net.xml")
+        with open(self.net_path, "w") as f:
+            f.write("<net/>")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_key(self):
+        nodes = [{"id": "a", "x": "0", "y": "0"}]
+        edges = [{"id": "e", "from": "a", "to": "a", "length": "10"}]
+
+        # the key does not depend on the order of the attributes
+        self.assertEqual(
+            self.cache.key(nodes=nodes, edges=edges),
+            self.cache.key(edges=edges,
+                           nodes=[{"y": "0", "x": "0", "id": "a"}]))
+
+        # the key depends on the values of the attributes
+        self.assertNotEqual(
+            self.cache.key(nodes=nodes, edges=edges),
+            self.cache.key(nodes=[{"id": "a", "x": "1", "y": "0"}],
+                           edges=edges))
+
+    def test_key_version(self):
+        key = self.cache.key(nodes=[], edges=[])
+
+        # the key depends on the version of netconvert
+        version = net_cache.netconvert_version()
+        net_cache._netconvert_version = version + " (other build)"
+        try:
+            self.assertNotEqual(self.cache.key(nodes=[], edges=[]), key)
+        finally:
+            net_cache._netconvert_version = version
+        self.assertEqual(self.cache.key(nodes=[], edges=[]), key)
+
+    def test_get_put(self):
+        key = self.cache.key(nodes=[], edges=[])
+        out_path = os.path.join(self.tmp_dir, "out.net.xml")
+
+        # nothing is returned before the entry is added
+        self.assertIsNone(self.cache.get(key, out_path))
+        self.assertFalse(os.path.exists(out_path))
+
+        edges = {"e": {"length": 10, "lanes": 1, "speed": 30}}
+        connections = {"next": {}, "prev": {}}
+        self.cache.put(key, self.net_path, edges, connections)
+
+        # the parsed data is returned, and the network file is restored
+        self.assertEqual(self.cache.get(key, out_path), (edges, connections))
+        with open(out_path) as f:
+            self.assertEqual(f.read(), "<net/>")
+
+        # no temporary files are left in the cache
+        self.assertEqual(len(os.listdir(self.cache.path)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,240 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+from flow.core.params import SumoParams
+from flow.renderer.numpy_renderer import NumpyRenderer as Renderer
+from flow.renderer.writer import load_render_data
+from tests.setup_scripts import ring_road_exp_setup
+
+
+def ring_network(radius=38, num_points=50):
+    """Return the polygons of the two lanes of a ring road."""
+    network = []
+    for r in [radius, radius + 3.2]:
+        angles = np.linspace(0, 2 * np.pi, num_points)
+        network.append(np.stack((r * np.cos(angles) + 40,
+                                 r * np.sin(angles) + 40), axis=1)
+                       .ravel().tolist())
+    return network
+
+
+class TestNumpyRenderer(unittest.TestCase):
+    """Tests numpy_renderer"""
+
+    def setUp(self):
+        self.sight_radius = 10
+        self.pxpm = 3
+        self.renderer = Renderer(
+            ring_network(),
+            "drgb",
+            save_render=False,
+            sight_radius=self.sight_radius,
+            pxpm=self.pxpm,
+            show_radius=True)
+
+        # one human vehicle at the top of the ring, driving west, and one RL
+        # vehicle at the bottom of the ring, driving east
+        self.human = [[40, 78, 270]]
+        self.machine = [[40, 2, 90]]
+
+    def pixel(self, x, y):
+        """Return the row and column of the pixel of a point."""
+        x, y = self.renderer.to_pixels(x, y)
+        return self.renderer.height - 1 - int(y), int(x)
+
+    def test_frame(self):
+        renderer = self.renderer
+        frame = renderer.render(
+            self.human, self.machine, [0.2], [0.8], [], [])
+
+        # the frame covers the network and the sight of the vehicles
+        self.assertEqual(frame.shape, (renderer.height, renderer.width, 3))
+        self.assertEqual(frame.dtype, np.uint8)
+        np.testing.assert_array_equal(frame[0, 0], [32, 32, 32])
+
+        # the lanes are drawn in the dynamic color of the lanes
+        np.testing.assert_array_equal(frame[self.pixel(2, 40)],
+                                      [224, 224, 224])
+
+        # the vehicles are drawn behind their front bumper, with the
+        # colors of their speeds (in BGR)
+        human_color, machine_color = renderer.vehicle_colors([0.2], [0.8])
+        np.testing.assert_array_equal(frame[self.pixel(42, 78)],
+                                      human_color[0][::-1])
+        np.testing.assert_array_equal(frame[self.pixel(38, 2)],
+                                      machine_color[0][::-1])
+        self.assertFalse(
+            (frame[self.pixel(38, 78)] == human_color[0][::-1]).all())
+
+        # the sight radius is drawn around RL vehicles only
+        radius = self.sight_radius * renderer.y_scale
+        row, col = self.pixel(40, 2 + radius)
+        self.assertTrue(any(
+            (frame[row + i, col] == machine_color[0][::-1]).all()
+            for i in range(-1, 2)))
+        row, col = self.pixel(40, 78 - radius)
+        self.assertFalse(any(
+            (frame[row + i, col] == human_color[0][::-1]).all()
+            for i in range(-1, 2)))
+
+        # the static layer is not modified by the vehicles
+        frame = renderer.render([], [], [], [], [], [])
+        np.testing.assert_array_equal(frame, renderer.lane_layer)
+
+    def test_gray(self):
+        renderer = Renderer(ring_network(), "gray", pxpm=self.pxpm)
+        frame = renderer.render(
+            self.human, self.machine, [0.2], [0.8], [], [])
+        self.assertEqual(frame.shape, (renderer.height, renderer.width))
+        np.testing.assert_array_equal(
+            frame, cv2.cvtColor(renderer.frame, cv2.COLOR_BGR2GRAY))
+
+    def test_sight(self):
+        self.renderer.render(self.human, self.machine, [0.2], [0.8], [], [])
+        sight = self.renderer.get_sight(self.machine[0], "rl_0")
+
+        # the sight is a disk around the vehicle
+        size = 2 * self.sight_radius * self.pxpm
+        self.assertEqual(sight.shape, (size, size, 3))
+        np.testing.assert_array_equal(sight[0, 0], [0, 0, 0])
+        self.assertTrue((sight[size // 2, size // 2] != 0).any())
+
+    def test_sights(self):
+        orientations = [[40, 2, 90], [2, 40, 0], [40, 78, 270], [78, 40, 33]]
+        ids = ["rl_0", "rl_1", "rl_2", "rl_3"]
+        for mode in ["drgb", "gray"]:
+            renderer = Renderer(
+                ring_network(), mode, sight_radius=self.sight_radius,
+                pxpm=self.pxpm)
+            renderer.render(orientations[:2], orientations[2:],
+                            [0.2, 0.5], [0.8, 1], [], [])
+
+            # the batched sights match the sights of every vehicle
+            sights = renderer.get_sights(orientations, ids)
+            expected = [renderer.get_sight(orientation, veh_id)
+                        for orientation, veh_id in zip(orientations, ids)]
+            np.testing.assert_array_equal(sights, expected)
+
+            # the output buffer is reused
+            self.assertIs(renderer.get_sights(orientations[:3], ids).base,
+                          sights.base)
+            size = 2 * self.sight_radius * self.pxpm
+            self.assertEqual(renderer.get_sights([], []).shape[:3],
+                             (0, size, size))
+
+        # the parts of the sights outside of the frame are black
+        sights = renderer.get_sights([[-20, -20, 0]], ["rl_0"])
+        self.assertEqual(sights.shape, (1, size, size))
+        np.testing.assert_array_equal(sights[0, :size // 4, :size // 4], 0)
+
+    def test_save_render(self):
+        path = tempfile.mkdtemp()
+        try:
+            network = ring_network()
+            renderer = Renderer(network, "drgb", save_render=True, path=path,
+                                sight_radius=self.sight_radius, pxpm=self.pxpm)
+            renderer.writer.chunk_size = 2
+            frames = []
+            for i in range(5):
+                machine = [[40, 2 + i, 90]]
+                frames.append(renderer.render(
+                    self.human, machine, [0.2], [0.8],
+                    [[i, 100, "human_0"]], [[i, 100, "rl_0"]]).copy())
+                sights = renderer.get_sights(machine, ["rl_0"]).copy()
+            renderer.close()
+
+            # the frames and sights are written as PNG images
+            for i, frame in enumerate(frames):
+                np.testing.assert_array_equal(cv2.imread(os.path.join(
+                    renderer.path, "frame_%06d.png" % (i + 1))), frame)
+            np.testing.assert_array_equal(cv2.imread(os.path.join(
+                renderer.path, "sight_rl_0_000005.png")), sights[0])
+
+            # the network and the vehicles of every frame are written in
+            # chunks of records
+            data = load_render_data(os.path.join(renderer.path, "data.npy"))
+            self.assertEqual(len(data), 6)
+            self.assertListEqual(data[0], network)
+            self.assertListEqual(data[5], [
+                self.human, [[40, 6, 90]], [0.2], [0.8],
+                [[4, 100, "human_0"]], [[4, 100, "rl_0"]]])
+        finally:
+            shutil.rmtree(path)
+
+    def test_save_video(self):
+        path = tempfile.mkdtemp()
+        try:
+            for mode, pix_fmt in [("drgb", "bgr24"), ("gray", "gray")]:
+                with mock.patch("flow.renderer.writer.subprocess.Popen") \
+                        as popen:
+                    renderer = Renderer(
+                        ring_network(), mode, save_render="video",
+                        path=os.path.join(path, mode), pxpm=self.pxpm)
+                    frames = []
+                    for i in range(3):
+                        frames.append(renderer.render(
+                            self.human, [[40, 2 + i, 90]], [0.2], [0.8],
+                            [], []).copy())
+                    renderer.close()
+
+                # a single ffmpeg process encodes the raw frames of the
+                # renderer into a video, padded to an even width and height
+                self.assertEqual(popen.call_count, 1)
+                args = popen.call_args[0][0]
+                self.assertEqual(args[0], "ffmpeg")
+                self.assertEqual(args[args.index("-f") + 1], "rawvideo")
+                self.assertEqual(args[args.index("-pix_fmt") + 1], pix_fmt)
+                self.assertEqual(args[args.index("-s") + 1], "%dx%d" % (
+                    renderer.width, renderer.height))
+                self.assertEqual(args[args.index("-vf") + 1],
+                                 "pad=ceil(iw/2)*2:ceil(ih/2)*2")
+                self.assertEqual(args[-3:], [
+                    "-pix_fmt", "yuv420p",
+                    os.path.join(renderer.path, "frames.mp4")])
+
+                # the bytes of every frame are written to the input pipe of
+                # ffmpeg, which is then closed and waited for
+                encoder = popen.return_value
+                written = [call[0][0]
+                           for call in encoder.stdin.write.call_args_list]
+                self.assertListEqual(
+                    written, [frame.tobytes() for frame in frames])
+                self.assertEqual(len(written[0]), renderer.width
+                                 * renderer.height * (3 if mode == "drgb"
+                                                      else 1))
+                encoder.stdin.close.assert_called_once_with()
+                encoder.wait.assert_called_once_with()
+
+                # no PNG image is written
+                self.assertListEqual(
+                    [f for f in os.listdir(renderer.path)
+                     if f.endswith(".png")], [])
+        finally:
+            shutil.rmtree(path)
+
+
+class TestNumpyRendererEnv(unittest.TestCase):
+    """Tests rendering an environment with the numpy renderer."""
+
+    def test_render(self):
+        env, _ = ring_road_exp_setup(sim_params=SumoParams(
+            render="drgb", renderer="numpy", sight_radius=10))
+        self.assertIsInstance(env.renderer, Renderer)
+
+        env.reset()
+        for _ in range(5):
+            env.step(None)
+            self.assertEqual(env.frame.shape, (env.renderer.height,
+                                               env.renderer.width, 3))
+            self.assertEqual(len(env.sights), len(env.k.vehicle.get_rl_ids()))
+        env.terminate()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,236 @@
+import unittest
+
+import numpy as np
+
+from flow.controllers import IDMController, RLController, ContinuousRouter
+from flow.core.params import SumoParams, InitialConfig, NetParams, \
+    InFlows, SumoCarFollowingParams
+from flow.core.params import VehicleParams
+from flow.scenarios.loop import LoopScenario, \
+    ADDITIONAL_NET_PARAMS as LOOP_PARAMS
+from flow.scenarios.merge import MergeScenario, \
+    ADDITIONAL_NET_PARAMS as MERGE_PARAMS
+from tests.setup_scripts import numpy_env_setup
+
+
+class TestNumpyRing(unittest.TestCase):
+    """Tests the numpy simulator on a single lane ring road."""
+
+    def setUp(self):
+        vehicles = VehicleParams()
+        vehicles.add(
+            veh_id="idm",
+            acceleration_controller=(IDMController, {}),
+            routing_controller=(ContinuousRouter, {}),
+            num_vehicles=21)
+        vehicles.add(
+            veh_id="rl",
+            acceleration_controller=(RLController, {}),
+            routing_controller=(ContinuousRouter, {}),
+            num_vehicles=1)
+
+        self.env = numpy_env_setup(
+            LoopScenario, NetParams(additional_params=LOOP_PARAMS), vehicles,
+            InitialConfig(bunching=20))
+
+    def tearDown(self):
+        self.env.terminate()
+        self.env = None
+
+    def test_reset(self):
+        """Check that all vehicles are placed at their starting positions."""
+        self.env.reset()
+
+        ids = self.env.k.vehicle.get_ids()
+        self.assertEqual(len(ids), 22)
+        for veh_id in ids:
+            _, edge, lane, pos, speed = self.env.initial_state[veh_id]
+            self.assertEqual(self.env.k.vehicle.get_edge(veh_id), edge)
+            self.assertEqual(self.env.k.vehicle.get_lane(veh_id), lane)
+            self.assertAlmostEqual(
+                self.env.k.vehicle.get_position(veh_id), pos)
+
+    def test_step(self):
+        """Check that vehicles move around the ring without colliding."""
+        self.env.reset()
+        for _ in range(500):
+            self.env.step(np.array([1]))
+            self.assertFalse(self.env.k.simulation.check_collision())
+
+        # all vehicles are still in the network, and are moving
+        ids = self.env.k.vehicle.get_ids()
+        self.assertEqual(len(ids), 22)
+        self.assertTrue(np.all(
+            np.array(self.env.k.vehicle.get_speed(ids)) >= 0))
+        self.assertGreater(np.mean(self.env.k.vehicle.get_speed(ids)), 0)
+
+        # every vehicle is the follower of its leader
+        for veh_id in ids:
+            leader = self.env.k.vehicle.get_leader(veh_id)
+            self.assertEqual(self.env.k.vehicle.get_follower(leader), veh_id)
+            self.assertGreaterEqual(self.env.k.vehicle.get_headway(veh_id), 0)
+
+    def test_get_x_by_id(self):
+        """Check that the positions of several vehicles match get_x."""
+        self.env.reset()
+        for _ in range(50):
+            self.env.step(np.array([1]))
+
+        ids = self.env.k.vehicle.get_ids() + ["foo"]
+        expected = [self.env.k.vehicle.get_x_by_id(veh_id) for veh_id in ids]
+        self.assertListEqual(self.env.k.vehicle.get_x_by_id(ids), expected)
+        np.testing.assert_array_equal(
+            self.env.k.vehicle.get_x_by_id(np.array(ids)), expected)
+
+        # the absolute positions are mapped back to the same edges
+        ids, expected = ids[:-1], expected[:-1]
+        edges, positions = self.env.k.scenario.get_edge_batch(expected)
+        self.assertListEqual(list(edges), self.env.k.vehicle.get_edge(ids))
+        np.testing.assert_array_almost_equal(
+            positions, self.env.k.vehicle.get_position(ids))
+
+    def test_detectors(self):
+        """Check that virtual detectors count the vehicles of every edge."""
+        edges = self.env.k.scenario.get_edge_list()
+        for edge in edges:
+            self.env.k.vehicle.add_detector(edge, edge, num_segments=4)
+            self.env.k.vehicle.add_detector(edge + "_rl", edge, rl=True)
+        self.env.reset()
+        for _ in range(50):
+            self.env.step(np.array([1]))
+
+        vehicle = self.env.k.vehicle
+        for edge in edges:
+            ids = vehicle.get_ids_by_edge(edge)
+            detector = vehicle.get_detector(edge)
+            self.assertEqual(detector.count.shape, (4, 1))
+            self.assertEqual(detector.count.sum(), len(ids))
+            self.assertAlmostEqual(detector.total_speed.sum(),
+                                   sum(vehicle.get_speed(ids)))
+            self.assertEqual(vehicle.get_detector(edge + "_rl").count.sum(),
+                             len(set(ids) & set(vehicle.get_rl_ids())))
+
+    def test_apply_acceleration(self):
+        """Check that requested accelerations are followed."""
+        self.env.reset()
+        rl_id = self.env.k.vehicle.get_rl_ids()[0]
+        for _ in range(10):
+            self.env.step(np.array([1]))
+        speed = self.env.k.vehicle.get_speed(rl_id)
+        self.env.step(np.array([1]))
+        self.assertAlmostEqual(self.env.k.vehicle.get_speed(rl_id),
+                               speed + 0.1)
+
+
+class TestNumpySnapshots(unittest.TestCase):
+    """Tests saving and restoring the state of the numpy simulator."""
+
+    def setUp(self):
+        vehicles = VehicleParams()
+        vehicles.add(
+            veh_id="idm",
+            acceleration_controller=(IDMController, {"noise": 0.2}),
+            routing_controller=(ContinuousRouter, {}),
+            num_vehicles=21)
+        vehicles.add(
+            veh_id="rl",
+            acceleration_controller=(RLController, {}),
+            routing_controller=(ContinuousRouter, {}),
+            num_vehicles=1)
+
+        self.env = numpy_env_setup(
+            LoopScenario, NetParams(additional_params=LOOP_PARAMS), vehicles,
+            InitialConfig(bunching=20),
+            SumoParams(sim_step=0.1, reset_from_snapshot=True))
+
+    def tearDown(self):
+        self.env.terminate()
+        self.env = None
+
+    def test_reset_from_snapshot(self):
+        """Check that resets restore the state after the first reset."""
+        obs = self.env.reset()
+        self.assertIsNotNone(self.env.initial_snapshot)
+        for _ in range(50):
+            self.env.step(np.array([1]))
+        np.testing.assert_array_almost_equal(self.env.reset(), obs)
+
+        # the vehicles kernel matches the simulator after the reset
+        ids = self.env.k.vehicle.get_ids()
+        self.assertEqual(len(ids), 22)
+        for veh_id in ids:
+            _, edge, lane, pos, _ = self.env.initial_state[veh_id]
+            self.assertEqual(self.env.k.vehicle.get_edge(veh_id), edge)
+            self.assertAlmostEqual(
+                self.env.k.vehicle.get_position(veh_id), pos)
+
+        # the simulation continues from the restored state
+        for _ in range(50):
+            self.env.step(np.array([1]))
+            self.assertFalse(self.env.k.simulation.check_collision())
+        self.assertGreater(
+            np.mean(self.env.k.vehicle.get_speed(ids)), 0)
+
+    def test_branching(self):
+        """Check that rollouts branched from a snapshot are identical."""
+        self.env.reset()
+        for _ in range(20):
+            self.env.step(np.array([1]))
+        state = self.env.k.save_state()
+
+        speeds = []
+        for _ in range(2):
+            self.env.k.load_state(state)
+            # seed the noise of the controllers, which is not part of the
+            # state of the simulation
+            np.random.seed(0)
+            for _ in range(20):
+                self.env.step(np.array([0.5]))
+            ids = self.env.k.vehicle.get_ids()
+            speeds.append(self.env.k.vehicle.get_speed(ids))
+
+        np.testing.assert_array_almost_equal(speeds[0], speeds[1])
+
+
+class TestNumpyInflows(unittest.TestCase):
+    """Tests inflows and outflows in the numpy simulator."""
+
+    def test_merge(self):
+        vehicles = VehicleParams()
+        vehicles.add(
+            veh_id="human",
+            acceleration_controller=(IDMController, {}),
+            car_following_params=SumoCarFollowingParams(
+                speed_mode="obey_safe_speed"),
+            num_vehicles=0)
+
+        inflows = InFlows()
+        inflows.add(veh_type="human", edge="inflow_highway",
+                    vehs_per_hour=1800, departLane="free", departSpeed=10)
+        inflows.add(veh_type="human", edge="inflow_merge",
+                    vehs_per_hour=360, departLane="free", departSpeed=7.5)
+
+        env = numpy_env_setup(
+            MergeScenario,
+            NetParams(inflows=inflows, additional_params=MERGE_PARAMS),
+            vehicles)
+        env.reset()
+
+        num_arrived = 0
+        for _ in range(1500):
+            env.step(None)
+            self.assertFalse(env.k.simulation.check_collision())
+            num_arrived += env.k.vehicle.get_num_arrived()
+
+        # vehicles entered from both inflows, and some vehicles exited
+        ids = env.k.vehicle.get_ids()
+        self.assertTrue(any(veh_id.startswith("flow_0.") for veh_id in ids))
+        self.assertTrue(any(veh_id.startswith("flow_1.") for veh_id in ids))
+        self.assertGreater(num_arrived, 0)
+        self.assertEqual(env.k.vehicle.num_vehicles, len(ids))
+
+        env.terminate()
+
+
+if __name__ == '__main__':
+    unittest.main()
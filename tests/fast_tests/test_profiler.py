@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+import unittest
+
+from flow.controllers import IDMController, ContinuousRouter
+from flow.core.params import EnvParams, NetParams, InitialConfig
+from flow.core.params import VehicleParams
+from flow.core.profiler import Profiler
+from flow.envs.loop.loop_accel import ADDITIONAL_ENV_PARAMS
+from flow.scenarios.loop import LoopScenario, \
+    ADDITIONAL_NET_PARAMS as LOOP_PARAMS
+from tests.setup_scripts import numpy_env_setup
+
+
+class TestProfiler(unittest.TestCase):
+    """Tests the profiler of the phases of environments."""
+
+    def test_phases(self):
+        profiler = Profiler(enabled=True)
+        for _ in range(3):
+            profiler.start_step()
+            with profiler.phase('outer'):
+                with profiler.phase('inner'):
+                    pass
+                with profiler.phase('inner'):
+                    pass
+            profiler.count('events', 2)
+
+        self.assertEqual(profiler.num_steps, 3)
+        self.assertEqual(profiler.stats['outer'].count, 3)
+        self.assertEqual(profiler.stats['inner'].count, 6)
+        self.assertEqual(profiler.counters['events'], 6)
+        self.assertGreaterEqual(profiler.stats['outer'].total,
+                                profiler.stats['inner'].total)
+        self.assertListEqual(sorted(profiler.last_step), ['inner', 'outer'])
+
+        profiler.reset_stats()
+        self.assertEqual(len(profiler.stats), 0)
+        self.assertEqual(len(profiler.counters), 0)
+
+    def test_disabled(self):
+        profiler = Profiler(enabled=False)
+        profiler.start_step()
+        with profiler.phase('outer'):
+            profiler.count('events')
+        self.assertEqual(len(profiler.stats), 0)
+        self.assertEqual(len(profiler.counters), 0)
+        self.assertEqual(profiler.num_steps, 0)
+
+    def test_env(self):
+        """Check that the timings of an environment are collected."""
+        vehicles = VehicleParams()
+        vehicles.add(
+            veh_id="idm",
+            acceleration_controller=(IDMController, {}),
+            routing_controller=(ContinuousRouter, {}),
+            num_vehicles=22)
+
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        env = numpy_env_setup(
+            LoopScenario, NetParams(additional_params=LOOP_PARAMS), vehicles,
+            InitialConfig(bunching=20),
+            env_params=EnvParams(
+                additional_params=dict(ADDITIONAL_ENV_PARAMS,
+                                       sort_vehicles=False),
+                profile=True, profile_interval=5, profile_path=path))
+
+        env.reset()
+        for _ in range(10):
+            _, _, _, info = env.step(None)
+        self.assertIn('timings', info)
+        self.assertIn('step.simulation_step', info['timings'])
+        self.assertGreaterEqual(info['timings']['step'],
+                                info['timings']['step.simulation_step'])
+
+        stats = env.profiler.stats
+        self.assertEqual(stats['step'].count, 10)
+        self.assertEqual(stats['reset'].count, 1)
+        self.assertEqual(stats['generate_network'].count, 1)
+        self.assertEqual(env.profiler.counters['controlled_vehicles'], 220)
+
+        # the statistics are written periodically and upon termination
+        env.terminate()
+        with open(path) as f:
+            data = json.load(f)
+        os.remove(path)
+        self.assertEqual(data['num_steps'], 10)
+        self.assertEqual(data['phases']['step']['count'], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
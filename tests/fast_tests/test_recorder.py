@@ -0,0 +1,123 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from flow.controllers import IDMController, ContinuousRouter
+from flow.core.experiment import Experiment
+from flow.core.kernel.recorder import TrajectoryRecorder, load_trajectories
+from flow.core.params import SumoParams, NetParams, InitialConfig
+from flow.core.params import VehicleParams
+from flow.scenarios.loop import LoopScenario, \
+    ADDITIONAL_NET_PARAMS as LOOP_PARAMS
+from tests.setup_scripts import numpy_env_setup
+
+
+class TestTrajectoryRecorder(unittest.TestCase):
+    """Tests the trajectory recorder of the flow kernel."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+        vehicles = VehicleParams()
+        vehicles.add(
+            veh_id="idm",
+            acceleration_controller=(IDMController, {}),
+            routing_controller=(ContinuousRouter, {}),
+            num_vehicles=22)
+        self.env = numpy_env_setup(
+            LoopScenario, NetParams(additional_params=LOOP_PARAMS), vehicles,
+            InitialConfig(bunching=20),
+            SumoParams(sim_step=0.1, emission_path=self.tmp_dir,
+                       record_trajectories=True))
+
+    def tearDown(self):
+        self.env.terminate()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_env(self):
+        """Check that all steps of all rollouts are recorded."""
+        self.env.reset()
+        for _ in range(50):
+            self.env.step(None)
+        speeds = dict(zip(self.env.k.vehicle.get_ids(),
+                          self.env.k.vehicle.get_speed(
+                              self.env.k.vehicle.get_ids())))
+        self.env.reset()
+        for _ in range(10):
+            self.env.step(None)
+        self.env.k.close()
+
+        data = load_trajectories(self.env.k.recorder.path)
+
+        # one row per vehicle and per step, including the resets
+        self.assertEqual(len(data["id"]), 22 * (51 + 11))
+        np.testing.assert_array_equal(np.unique(data["rollout"]), [0, 1])
+
+        # the data of the last step of the first rollout
+        last = (data["rollout"] == 0) & np.isclose(data["time"], 5)
+        self.assertEqual(np.sum(last), 22)
+        for veh_id, speed in zip(data["id"][last], data["speed"][last]):
+            self.assertAlmostEqual(speed, speeds[veh_id])
+        self.assertCountEqual(np.unique(data["edge_id"]),
+                              ["bottom", "left", "right", "top"])
+
+    def test_buffers(self):
+        """Check that data spanning several buffers is written in order."""
+        path = os.path.join(self.tmp_dir, "test-trajectories.bin")
+        recorder = TrajectoryRecorder(path, sim_step=0.1, buffer_size=5)
+
+        self.env.reset()
+        recorder.record(self.env.k.vehicle, reset=True)
+        for _ in range(3):
+            self.env.step(None)
+            recorder.record(self.env.k.vehicle, reset=False)
+        recorder.flush()
+
+        data = load_trajectories(path)
+        self.assertEqual(len(data["id"]), 22 * 4)
+        np.testing.assert_array_almost_equal(
+            data["time"], np.repeat([0, 0.1, 0.2, 0.3], 22))
+        np.testing.assert_array_almost_equal(
+            data["relative_position"][-22:],
+            self.env.k.vehicle.get_position(list(data["id"][-22:])))
+
+    def test_write_error(self):
+        """Check that errors of the writer are raised instead of hanging."""
+        path = os.path.join(self.tmp_dir, "test-trajectories.bin")
+        recorder = TrajectoryRecorder(path, sim_step=0.1)
+
+        # the output file cannot be opened by the writer
+        os.remove(path)
+        os.mkdir(path)
+
+        self.env.reset()
+        recorder.record(self.env.k.vehicle, reset=True)
+        self.assertRaises(OSError, recorder.flush)
+
+        # the error is raised again once the next buffer is submitted
+        recorder.record(self.env.k.vehicle, reset=False)
+        self.assertRaises(OSError, recorder.flush)
+
+    def test_convert_to_csv(self):
+        """Check that experiments convert the recorded trajectories."""
+        Experiment(self.env).run(num_runs=1, num_steps=10,
+                                 convert_to_csv=True)
+
+        path = os.path.join(self.tmp_dir, "{0}-trajectories.csv".format(
+            self.env.scenario.name))
+        with open(path) as f:
+            rows = list(csv.DictReader(f))
+        data = load_trajectories(self.env.k.recorder.path)
+        self.assertEqual(len(rows), len(data["id"]))
+
+        # rows are sorted by vehicle, and chronologically for every vehicle
+        keys = [(row["id"], float(row["time"])) for row in rows]
+        self.assertEqual(keys, sorted(keys))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,13 +2,15 @@ import unittest
 import os
 import numpy as np
 from tests.setup_scripts import ring_road_exp_setup
-from flow.core.params import EnvParams
+from flow.core.params import EnvParams, NetParams, SumoLaneChangeParams
 from flow.core.params import VehicleParams
 from flow.controllers import RLController
 from flow.core.rewards import average_velocity, total_velocity, min_delay
 from flow.core.rewards import desired_velocity, reward_rl_opening_headways
 from flow.core.rewards import penalize_near_standstill, penalize_standstill
 from flow.core.rewards import punish_small_rl_headways, boolean_action_penalty
+from flow.core.rewards import RewardState, compose, rl_forward_progress
+from flow.core.rewards import punish_rl_lane_changes
 
 os.environ["TEST_FLAG"] = "True"
 
@@ -199,6 +201,35 @@ class TestRewards(unittest.TestCase):
                                                   penalty_exponent=2),
                          -20)
 
+    def test_punish_rl_lane_changes(self):
+        """Test the punish_rl_lane_changes method."""
+        vehicles = VehicleParams()
+        vehicles.add("rl", acceleration_controller=(RLController, {}),
+                     lane_change_params=SumoLaneChangeParams(
+                         lane_change_mode="aggressive"),
+                     num_vehicles=1)
+        net_params = NetParams(additional_params={
+            "length": 230, "lanes": 2, "speed_limit": 30, "resolution": 40})
+
+        env, scenario = ring_road_exp_setup(vehicles=vehicles,
+                                            net_params=net_params)
+        env.reset()
+
+        # no penalty is imposed before the vehicle changes lanes
+        env.step(rl_actions=None)
+        self.assertEqual(punish_rl_lane_changes(env, penalty=2), 0)
+
+        # the penalty is imposed at the step the vehicle changes lanes
+        env.k.vehicle.apply_lane_change(["rl_0"], [1])
+        rewards = []
+        for _ in range(5):
+            env.step(rl_actions=None)
+            rewards.append(punish_rl_lane_changes(env, penalty=2))
+        self.assertEqual(env.k.vehicle.get_lane("rl_0"), 1)
+        self.assertListEqual(sorted(rewards), [-2, 0, 0, 0, 0])
+
+        env.terminate()
+
     def test_boolean_action_penalty(self):
         """Test the boolean_action_penalty method."""
         actions = [False, False, False, False, False]
@@ -247,6 +278,36 @@ class TestRewards(unittest.TestCase):
         env.k.vehicle.set_follower('test_rl_0', None)
         self.assertAlmostEqual(reward_rl_opening_headways(env, 0.5, 2), 0)
 
+    def test_compose(self):
+        """Test composite rewards evaluated on a single snapshot."""
+        vehicles = VehicleParams()
+        vehicles.add("test", num_vehicles=5)
+        vehicles.add("test_rl", acceleration_controller=(RLController, {}),
+                     num_vehicles=2)
+
+        env_params = EnvParams(additional_params={
+            "target_velocity": 10, "max_accel": 1, "max_decel": 1,
+            "sort_vehicles": False})
+
+        env, scenario = ring_road_exp_setup(vehicles=vehicles,
+                                            env_params=env_params)
+        env.k.vehicle.test_set_speed("test_0", 5)
+        env.k.vehicle.test_set_speed("test_rl_0", 2)
+
+        reward_fn = compose(
+            (1, average_velocity),
+            (2, rl_forward_progress, {"gain": 1}),
+            (0.5, penalize_standstill),
+        )
+        self.assertAlmostEqual(reward_fn(env), 1 + 2 * 2 - 0.5 * 5)
+
+        # the arrays of a snapshot are only collected once
+        state = RewardState(env)
+        np.testing.assert_array_equal(state.rl_speeds, [2, 0])
+        env.k.vehicle.test_set_speed("test_rl_1", 3)
+        self.assertAlmostEqual(rl_forward_progress(state, gain=1), 2)
+        self.assertAlmostEqual(rl_forward_progress(env, gain=1), 5)
+
 
 if __name__ == '__main__':
     unittest.main()
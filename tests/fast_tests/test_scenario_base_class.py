@@ -46,6 +46,18 @@ class TestGetX(unittest.TestCase):
         pos = 4.72
         self.assertAlmostEqual(self.env.k.scenario.get_x(edge, pos), -1001)
 
+    def test_getx_batch(self):
+        edges = ["bottom", ":bottom", "", "right"]
+        positions = [4.72, 0.1, 4.72, 10]
+        np.testing.assert_array_almost_equal(
+            self.env.k.scenario.get_x_batch(edges, positions),
+            [self.env.k.scenario.get_x(edge, pos)
+             for edge, pos in zip(edges, positions)])
+
+        # unknown edges raise an error, as with get_x
+        self.assertRaises(KeyError, self.env.k.scenario.get_x_batch,
+                          ["bottom", "foo"], [0, 0])
+
 
 class TestGetEdge(unittest.TestCase):
     """
@@ -74,6 +86,18 @@ class TestGetEdge(unittest.TestCase):
         self.assertTupleEqual(
             self.env.k.scenario.get_edge(x2), (":bottom", 0.1))
 
+    def test_get_edge_batch(self):
+        xs = [5, 0.1, 0, 100, self.env.k.scenario.length() - 1, -1]
+        edges, positions = self.env.k.scenario.get_edge_batch(xs)
+        for x, edge, pos in zip(xs[:-1], edges, positions):
+            expected = self.env.k.scenario.get_edge(x)
+            self.assertEqual(edge, expected[0])
+            self.assertAlmostEqual(pos, expected[1])
+
+        # positions before the start of the network are not located
+        self.assertEqual(edges[-1], "")
+        self.assertEqual(positions[-1], -1001)
+
 
 class TestEvenStartPos(unittest.TestCase):
     """
@@ -0,0 +1,109 @@
+import unittest
+
+import numpy as np
+
+from flow.core.kernel.cache import StepCache
+from tests.setup_scripts import ring_road_exp_setup
+
+
+class TestStepCache(unittest.TestCase):
+    """Tests the step-scoped cache of derived kernel quantities."""
+
+    def setUp(self):
+        self.cache = StepCache()
+        self.calls = []
+
+        def double(x):
+            self.calls.append(x)
+            return 2 * x
+
+        self.cache.register("double", double)
+
+    def test_register_get(self):
+        """Check that values are computed once per set of arguments."""
+        self.assertEqual(self.cache.get("double", 1), 2)
+        self.assertEqual(self.cache.get("double", 1), 2)
+        self.assertEqual(self.cache.get("double", 2), 4)
+        self.assertListEqual(self.calls, [1, 2])
+
+        # only registered quantities may be requested
+        self.assertIn("double", self.cache)
+        self.assertNotIn("foo", self.cache)
+        self.assertRaises(KeyError, self.cache.get, "foo")
+
+        # registering a quantity again replaces its function and its values
+        self.cache.register("double", lambda x: 3 * x)
+        self.assertEqual(self.cache.get("double", 1), 3)
+
+    def test_invalidate_clear(self):
+        """Check that values are recomputed once removed from the cache."""
+        self.cache.register("triple", lambda x: 3 * x)
+        self.cache.get("double", 1)
+        self.cache.get("double", 2)
+        self.cache.get("triple", 1)
+
+        # only the values of the invalidated quantity are removed
+        self.cache.invalidate("double")
+        self.cache.get("double", 1)
+        self.cache.get("triple", 1)
+        self.assertListEqual(self.calls, [1, 2, 1])
+        self.assertEqual(self.cache.misses["triple"], 1)
+
+        # all values are removed when the cache is cleared
+        self.cache.clear()
+        self.cache.get("double", 1)
+        self.cache.get("triple", 1)
+        self.assertListEqual(self.calls, [1, 2, 1, 1])
+        self.assertEqual(self.cache.misses["triple"], 2)
+
+    def test_stats(self):
+        """Check that the hits and misses of every quantity are counted."""
+        self.cache.register("triple", lambda x: 3 * x)
+        self.cache.get("double", 1)
+        self.cache.get("double", 1)
+        self.cache.get("double", 2)
+        self.cache.get("triple", 1)
+        self.assertDictEqual(self.cache.stats(), {
+            "double": {"hits": 1, "misses": 2},
+            "triple": {"hits": 0, "misses": 1}})
+
+        # the cached values are kept when the counters are reset
+        self.cache.reset_stats()
+        self.assertDictEqual(self.cache.stats(), {})
+        self.cache.get("double", 1)
+        self.assertDictEqual(self.cache.stats(),
+                             {"double": {"hits": 1, "misses": 0}})
+
+
+class TestKernelStepCache(unittest.TestCase):
+    """Tests the cache of the Flow kernel."""
+
+    def test_step(self):
+        """Check that derived quantities are memoized within a step."""
+        env, _ = ring_road_exp_setup()
+        env.reset()
+        cache = env.k.cache
+        cache.register("mean_speed", lambda: np.mean(
+            env.k.vehicle.get_speed(env.k.vehicle.get_ids())))
+
+        # the vehicles sorted during the step are reused until the next step
+        env.step(rl_actions=None)
+        cache.reset_stats()
+        env.get_state()
+        self.assertListEqual(list(env.sorted_ids), env.k.vehicle.get_ids())
+        self.assertDictEqual(cache.stats(),
+                             {"sorted_ids": {"hits": 2, "misses": 0}})
+
+        # values are recomputed after the next simulation step
+        speed = cache.get("mean_speed")
+        self.assertEqual(cache.get("mean_speed"), speed)
+        env.step(rl_actions=None)
+        cache.get("mean_speed")
+        self.assertDictEqual(cache.stats()["mean_speed"],
+                             {"hits": 1, "misses": 2})
+
+        env.terminate()
+
+
+if __name__ == '__main__':
+    unittest.main()
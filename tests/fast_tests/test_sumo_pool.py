@@ -0,0 +1,99 @@
+import random
+import subprocess
+import sys
+import unittest
+
+from sumolib.miscutils import getFreeSocketPort
+
+from flow.core.kernel import Kernel
+from flow.core.kernel.simulation.sumo_pool import SumoProcessPool, \
+    kill_sumo, wait_for_port
+from flow.core.params import NetParams, SumoParams, VehicleParams
+from flow.scenarios.loop import LoopScenario, ADDITIONAL_NET_PARAMS
+
+# script listening on the port passed as an argument for a few seconds
+LISTEN_SCRIPT = """
+import socket, sys, time
+s = socket.socket()
+time.sleep(0.2)
+s.bind(("localhost", int(sys.argv[1])))
+s.listen(1)
+time.sleep(5)
+"""
+
+
+class TestWaitForPort(unittest.TestCase):
+    """Tests the readiness check of processes started ahead of time."""
+
+    def test_listening(self):
+        port = getFreeSocketPort()
+        proc = subprocess.Popen([sys.executable, "-c", LISTEN_SCRIPT,
+                                 str(port)])
+        try:
+            wait_for_port(port, proc)
+            # the process is still running, and the port is in use
+            self.assertIsNone(proc.poll())
+        finally:
+            proc.kill()
+            proc.wait()
+
+    def test_terminated(self):
+        port = getFreeSocketPort()
+        proc = subprocess.Popen([sys.executable, "-c", "pass"])
+        proc.wait()
+        self.assertRaises(RuntimeError, wait_for_port, port, proc)
+
+
+class TestSumoProcessPool(unittest.TestCase):
+    """Tests the seeds of the sumo instances started ahead of time."""
+
+    def setUp(self):
+        kernel = Kernel(simulator="traci", sim_params=SumoParams())
+        kernel.scenario.generate_network(LoopScenario(
+            name="SumoPoolTest",
+            vehicles=VehicleParams(),
+            net_params=NetParams(additional_params=ADDITIONAL_NET_PARAMS)))
+        self.sumo_call = ["sumo", "-c", kernel.scenario.cfg, "--no-step-log"]
+
+    @staticmethod
+    def take(pool, seed):
+        """Take an instance from the pool, and return its seed."""
+        proc, traci_connection, _ = pool.get(seed=seed)
+        traci_connection.close()
+        kill_sumo(proc)
+        return int(proc.args[proc.args.index("--seed") + 1])
+
+    def test_seeds(self):
+        random.seed(0)
+        pool = SumoProcessPool(self.sumo_call, seed=42)
+        try:
+            # the first instance is started on demand with the requested seed
+            self.assertIsNone(pool.next_seed())
+            self.assertEqual(self.take(pool, 7), 7)
+
+            # the next instances are started ahead of time with the seeds of
+            # the pool
+            seeds = []
+            for _ in range(3):
+                seed = pool.next_seed()
+                self.assertEqual(self.take(pool, seed), seed)
+                seeds.append(seed)
+
+            # instances started with another seed than the requested one are
+            # not used
+            seed = pool.next_seed() + 1
+            self.assertEqual(self.take(pool, seed), seed)
+        finally:
+            pool.close()
+
+        # the seeds only depend on the seed of the pool
+        rng = random.Random(42)
+        self.assertListEqual(seeds, [rng.randint(0, 1e5) for _ in range(3)])
+
+    def test_default(self):
+        # instances are only started ahead of time if requested
+        self.assertEqual(SumoParams().prewarm_instances, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
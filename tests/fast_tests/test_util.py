@@ -3,13 +3,17 @@ import csv
 import os
 import json
 import collections
+import shutil
+import tempfile
+
+import numpy as np
 
 from flow.core.params import VehicleParams
 from flow.core.params import TrafficLightParams
 from flow.controllers import IDMController, ContinuousRouter, RLController
 from flow.core.params import SumoParams, EnvParams, NetParams, InitialConfig, \
     InFlows, SumoCarFollowingParams
-from flow.core.util import emission_to_csv
+from flow.core.util import emission_to_csv, emission_to_columnar
 from flow.utils.flow_warnings import deprecation_warning
 from flow.utils.registry import make_create_env
 from flow.utils.rllib import FlowParamsEncoder, get_flow_params
@@ -24,6 +28,12 @@ class TestEmissionToCSV(unittest.TestCase):
     the components are correct.
     """
 
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
     def test_emission_to_csv(self):
         # current path
         current_path = os.path.realpath(__file__).rsplit("/", 1)[0]
@@ -55,6 +65,40 @@ class TestEmissionToCSV(unittest.TestCase):
         # I don't think is a problem
         self.assertEqual(len(dict1), 104)
 
+    def test_emission_to_csv_chunks(self):
+        """Check that converting in chunks yields the same csv file."""
+        current_path = os.path.realpath(__file__).rsplit("/", 1)[0]
+        emission_path = current_path + "/test_files/test-emission.xml"
+        filename = os.path.join(self.tmp_dir, "test-emission.csv")
+
+        emission_to_csv(emission_path, filename)
+        with open(filename, "r") as infile:
+            expected = infile.read()
+
+        # chunks small enough for the rows to be merged from several files
+        emission_to_csv(emission_path, filename, chunk_size=7)
+        with open(filename, "r") as infile:
+            self.assertEqual(infile.read(), expected)
+
+    def test_emission_to_columnar(self):
+        """Check that the npz file contains the data of the csv file."""
+        current_path = os.path.realpath(__file__).rsplit("/", 1)[0]
+        emission_path = current_path + "/test_files/test-emission.xml"
+        csv_path = os.path.join(self.tmp_dir, "test-emission.csv")
+        npz_path = os.path.join(self.tmp_dir, "test-emission.npz")
+
+        emission_to_csv(emission_path, csv_path)
+        emission_to_columnar(emission_path, npz_path, chunk_size=7)
+
+        with open(csv_path) as infile:
+            rows = list(csv.DictReader(infile))
+        data = np.load(npz_path)
+
+        self.assertEqual(len(data["id"]), 104)
+        self.assertListEqual(list(data["id"]), [row["id"] for row in rows])
+        np.testing.assert_array_almost_equal(
+            data["speed"], [float(row["speed"]) for row in rows])
+
 
 class TestWarnings(unittest.TestCase):
     """Tests warning functions located in flow.utils.warnings"""
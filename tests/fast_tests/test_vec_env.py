@@ -0,0 +1,88 @@
+import unittest
+
+import numpy as np
+
+from flow.controllers import IDMController, RLController, ContinuousRouter
+from flow.core.params import SumoParams, EnvParams, InitialConfig, NetParams
+from flow.core.params import VehicleParams
+from flow.envs import VecEnv
+from flow.envs.loop.loop_accel import ADDITIONAL_ENV_PARAMS
+from flow.scenarios.loop import ADDITIONAL_NET_PARAMS
+
+
+def ring_flow_params(horizon=20):
+    """Return the flow_params of a ring road on the numpy simulator."""
+    vehicles = VehicleParams()
+    vehicles.add(
+        veh_id="idm",
+        acceleration_controller=(IDMController, {}),
+        routing_controller=(ContinuousRouter, {}),
+        num_vehicles=5)
+    vehicles.add(
+        veh_id="rl",
+        acceleration_controller=(RLController, {}),
+        routing_controller=(ContinuousRouter, {}),
+        num_vehicles=1)
+
+    return dict(
+        exp_tag="vec_env_test",
+        env_name="AccelEnv",
+        scenario="LoopScenario",
+        simulator="numpy",
+        sim=SumoParams(sim_step=0.1),
+        env=EnvParams(
+            horizon=horizon,
+            additional_params=dict(ADDITIONAL_ENV_PARAMS,
+                                   sort_vehicles=False)),
+        net=NetParams(additional_params=ADDITIONAL_NET_PARAMS),
+        veh=vehicles,
+        initial=InitialConfig(),
+    )
+
+
+class TestVecEnv(unittest.TestCase):
+    """Tests the batching and auto-resetting of environments in VecEnv."""
+
+    def run_vec_env(self, parallel):
+        env = VecEnv(ring_flow_params(horizon=20), num_envs=3,
+                     parallel=parallel)
+        try:
+            obs = env.reset()
+            self.assertEqual(
+                obs.shape, (3,) + env.observation_space.shape)
+
+            for i in range(20):
+                actions = np.ones((3,) + env.action_space.shape)
+                obs, rewards, dones, infos = env.step(actions)
+                self.assertEqual(
+                    obs.shape, (3,) + env.observation_space.shape)
+                self.assertEqual(rewards.shape, (3,))
+                self.assertEqual(dones.shape, (3,))
+                self.assertEqual(len(infos), 3)
+
+            # all environments reached their horizon, and were reset
+            self.assertTrue(np.all(dones))
+            for info in infos:
+                self.assertIn("terminal_observation", info)
+
+            # the environments are identical and deterministic
+            np.testing.assert_array_almost_equal(obs[0], obs[1])
+            np.testing.assert_array_almost_equal(rewards[0], rewards[2])
+        finally:
+            env.close()
+
+    def test_sequential(self):
+        self.run_vec_env(parallel=False)
+
+    def test_parallel(self):
+        self.run_vec_env(parallel=True)
+
+    def test_wrong_number_of_actions(self):
+        env = VecEnv(ring_flow_params(), num_envs=2, parallel=False)
+        env.reset()
+        self.assertRaises(ValueError, env.step, np.zeros((3, 1)))
+        env.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,12 @@ from flow.controllers.car_following_models import IDMController, \
     SimCarFollowingController
 from flow.controllers.lane_change_controllers import StaticLaneChanger
 from flow.controllers.rlcontroller import RLController
+from flow.core.kernel.vehicle.columnar import ColumnarVehicleState
+from flow.core.kernel.vehicle.counters import RollingCounter, \
+    TrafficCounters
+from flow.core.kernel.vehicle.detectors import Detectors, SegmentGrid
+from flow.core.kernel.vehicle.multi_lane import MultiLaneHeadways
+from flow.core.kernel.vehicle.ordering import VehicleOrder
 
 from tests.setup_scripts import ring_road_exp_setup, highway_exp_setup
 
@@ -209,6 +215,45 @@ class TestVehiclesClass(unittest.TestCase):
         self.assertEqual(env.k.vehicle.num_rl_vehicles,
                          len(env.k.vehicle.get_rl_ids()))
 
+    def test_redundant_speeds(self):
+        """
+        Check that speeds identical to the speed last set by flow are not sent
+        to sumo again while sumo still applies them.
+        """
+        vehicles = VehicleParams()
+        vehicles.add("test", num_vehicles=5)
+        env, _ = ring_road_exp_setup(vehicles=vehicles)
+        env.reset()
+        commands = env.k.simulation.command_buffer
+        commands.clear()
+
+        # the vehicles are stopped, and asked to remain stopped
+        ids = env.k.vehicle.get_ids()
+        env.k.vehicle.apply_acceleration(ids, [-1] * len(ids))
+        self.assertEqual(len(commands), len(ids))
+        commands.flush()
+
+        env.k.vehicle.apply_acceleration(ids, [-1] * len(ids))
+        self.assertEqual(len(commands), 0)
+
+        # new speeds are sent
+        env.k.vehicle.apply_acceleration(ids[:2], [1, 1])
+        self.assertEqual(len(commands), 2)
+        commands.flush()
+
+        # speeds are sent again before sumo stops applying them
+        env.k.vehicle.time_counter += int(1 / env.sim_step)
+        env.k.vehicle.apply_acceleration(ids[2:], [-1] * (len(ids) - 2))
+        self.assertEqual(len(commands), len(ids) - 2)
+        commands.flush()
+
+        # the speeds of removed vehicles are forgotten
+        veh_id = ids[2]
+        env.k.vehicle.remove(veh_id)
+        self.assertNotIn(veh_id, env.k.vehicle._speeds)
+
+        env.terminate()
+
 
 class TestMultiLaneData(unittest.TestCase):
     """
@@ -602,5 +647,357 @@ class TestObservedIDs(unittest.TestCase):
         self.assertCountEqual(env.k.vehicle.get_observed_ids(), ["test_1"])
 
 
+class TestColumnarVehicleState(unittest.TestCase):
+    """Tests the columnar store used by the TraCI vehicle kernel."""
+
+    def test_rows(self):
+        state = ColumnarVehicleState(capacity=2)
+
+        # check that rows are stable and that the store grows when needed
+        rows = [state.add("test_{}".format(i)) for i in range(5)]
+        self.assertListEqual(rows, [0, 1, 2, 3, 4])
+        self.assertEqual(state.add("test_3"), 3)
+        self.assertGreaterEqual(state.capacity, 5)
+        self.assertEqual(len(state), 5)
+
+        # check that the rows of removed vehicles are recycled
+        state.remove("test_1")
+        self.assertNotIn("test_1", state)
+        self.assertEqual(state.row("test_1"), -1)
+        self.assertEqual(state.add("test_5"), 1)
+        np.testing.assert_array_equal(
+            state.rows(["test_5", "test_1", "test_4"]), [1, -1, 4])
+
+    def test_getters(self):
+        state = ColumnarVehicleState()
+        for i in range(3):
+            row = state.add("test_{}".format(i))
+            state.speed[row] = i
+            state.edge[row] = state.edge_code("edge{}".format(i % 2))
+        state.leader[state.row("test_0")] = state.row("test_1")
+
+        # single ids return python objects, and errors for missing vehicles
+        self.assertEqual(state.get(state.speed, "test_2", -1001), 2)
+        self.assertEqual(state.get(state.speed, "test_9", -1001), -1001)
+        self.assertEqual(state.get_edge("test_1", ""), "edge1")
+        self.assertEqual(state.get_neighbor(state.leader, "test_0", ""),
+                         "test_1")
+        self.assertIsNone(state.get_neighbor(state.leader, "test_1", ""))
+
+        # lists of ids return lists
+        self.assertListEqual(
+            state.get(state.speed, ["test_1", "test_9"], -1001), [1, -1001])
+        self.assertListEqual(state.get_edge(["test_0", "test_2"], ""),
+                             ["edge0", "edge0"])
+
+        # arrays of ids return arrays
+        speeds = state.get(state.speed, np.array(["test_2", "test_0"]), -1001)
+        self.assertIsInstance(speeds, np.ndarray)
+        np.testing.assert_array_equal(speeds, [2, 0])
+        np.testing.assert_array_equal(
+            state.get_edge(np.array(["test_1", "test_9"]), ""), ["edge1", ""])
+
+        # removing a leader clears the reference to it
+        state.remove("test_1")
+        self.assertIsNone(state.get_neighbor(state.leader, "test_0", ""))
+
+
+class TestMultiLaneHeadways(unittest.TestCase):
+    """Tests the vectorized multi-lane engine on a two-edge network."""
+
+    class Scenario:
+        """Two consecutive two-lane edges, "a" and "b", of length 100."""
+
+        def get_edge_list(self):
+            return ["a", "b"]
+
+        def get_junction_list(self):
+            return []
+
+        def num_lanes(self, edge):
+            return 2
+
+        def edge_length(self, edge):
+            return 100
+
+        def next_edge(self, edge, lane):
+            return [("b", lane)] if edge == "a" else []
+
+        def prev_edge(self, edge, lane):
+            return [("a", lane)] if edge == "b" else []
+
+    def test_lane_data(self):
+        state = ColumnarVehicleState()
+        for veh_id, edge, lane, pos in [("x", "a", 0, 10), ("y", "a", 1, 50),
+                                        ("z", "b", 0, 20)]:
+            row = state.add(veh_id)
+            state.edge[row] = state.edge_code(edge)
+            state.lane[row] = lane
+            state.position[row] = pos
+            state.length[row] = 5
+
+        engine = MultiLaneHeadways()
+        engine.update(self.Scenario(), state)
+
+        def data(veh_id):
+            row = state.row(veh_id)
+            return (
+                engine.get_neighbors(engine.leaders, row, state.ids, None),
+                engine.get(engine.headways, row, None),
+                engine.get_neighbors(engine.followers, row, state.ids, None),
+                engine.get(engine.tailways, row, None))
+
+        # leaders are found on the next edge if the current lane is empty
+        self.assertEqual(data("x"), (["z", "y"], [105, 35], ["", ""],
+                                     [1000, 1000]))
+        # followers are found on the previous edge
+        self.assertEqual(data("z"), (["", ""], [1000, 1000], ["x", "y"],
+                                     [105, 65]))
+
+        self.assertListEqual(engine.get_ids_by_edge(state, "a"), ["x", "y"])
+        self.assertListEqual(engine.get_ids_by_edge(state, "c"), [])
+
+    def test_spatial_queries(self):
+        state = ColumnarVehicleState()
+        for veh_id, edge, lane, pos in [
+                ("a0", "a", 0, 10), ("a1", "a", 1, 20), ("a2", "a", 0, 30),
+                ("a3", "a", 1, 40), ("a4", "a", 0, 50), ("b0", "b", 1, 5)]:
+            row = state.add(veh_id)
+            state.edge[row] = state.edge_code(edge)
+            state.lane[row] = lane
+            state.position[row] = pos
+            state.length[row] = 5
+
+        engine = MultiLaneHeadways()
+        engine.update(self.Scenario(), state)
+
+        def ids(rows):
+            return state.ids[rows].tolist()
+
+        # vehicles on several edges, ordered by edge, lane, and position
+        self.assertListEqual(
+            ids(engine.rows_by_edge(state, ["b", "c", "a"])),
+            ["b0", "a0", "a2", "a4", "a1", "a3"])
+        self.assertListEqual(ids(engine.rows_by_edge(state, [])), [])
+
+        # k closest vehicles to the end of an edge, on all lanes
+        self.assertListEqual(ids(engine.rows_closest_to_end(state, "a", 3)),
+                             ["a4", "a3", "a2"])
+        self.assertListEqual(ids(engine.rows_closest_to_end(state, "b", 3)),
+                             ["b0"])
+        self.assertListEqual(ids(engine.rows_closest_to_end(state, "c", 3)),
+                             [])
+
+        # vehicles in a segment of an edge, on all lanes or on one lane
+        self.assertListEqual(ids(engine.rows_in_segment(state, "a", 20, 50)),
+                             ["a1", "a2", "a3"])
+        self.assertListEqual(
+            ids(engine.rows_in_segment(state, "a", 20, 50, lane=0)), ["a2"])
+        self.assertListEqual(
+            ids(engine.rows_in_segment(state, "a", 0, 100, lane=2)), [])
+        self.assertListEqual(
+            ids(engine.rows_in_segment(state, "c", 0, 100)), [])
+
+        # vehicles within a distance of a vehicle, on the same edge
+        self.assertListEqual(
+            ids(engine.rows_within(state.row("a2"), 10)), ["a1", "a3"])
+        self.assertListEqual(ids(engine.rows_within(state.row("b0"), 100)),
+                             [])
+        self.assertListEqual(ids(engine.rows_within(-1, 100)), [])
+
+
+class TestTrafficCounters(unittest.TestCase):
+    """Tests the rolling counters of departed and arrived vehicles."""
+
+    def test_rolling_counter(self):
+        """Check the windowed sums against the full history of counts."""
+        np.random.seed(0)
+        counts = np.random.randint(0, 4, size=50)
+        counter = RollingCounter(capacity=10)
+        self.assertEqual(counter.rate(5, sim_step=0.5), 0)
+
+        for i, count in enumerate(counts):
+            counter.append(["veh_{}".format(j) for j in range(count)])
+            self.assertEqual(counter.last, count)
+            self.assertEqual(len(counter.last_ids), count)
+            for window in (1, 3, 10):
+                expected = counts[max(i + 1 - window, 0):i + 1]
+                self.assertEqual(counter.sum(window), expected.sum())
+                self.assertAlmostEqual(
+                    counter.rate(window, sim_step=0.5),
+                    3600 * expected.sum() / (len(expected) * 0.5))
+
+        # windows longer than the capacity grow the counter, keeping the
+        # counts that are still stored
+        self.assertEqual(counter.sum(20), counts[-10:].sum())
+        counter.reserve(20)
+        self.assertEqual(counter.capacity, 20)
+        self.assertEqual(counter.sum(10), counts[-10:].sum())
+        for count in counts[:15]:
+            counter.append([None] * count)
+        self.assertEqual(counter.sum(20),
+                         counts[-5:].sum() + counts[:15].sum())
+
+        # the capacity is kept when the counter is cleared
+        counter.clear()
+        self.assertEqual(counter.num_steps, 0)
+        self.assertEqual(counter.sum(5), 0)
+        self.assertEqual(counter.capacity, 20)
+
+    def test_traffic_counters(self):
+        """Check the rates and ids of departed and arrived vehicles."""
+        counters = TrafficCounters(sim_step=0.5, window=2)
+        self.assertEqual(counters.arrived_ids, 0)
+        self.assertEqual(counters.departed_ids, 0)
+        self.assertEqual(counters.num_arrived, 0)
+        self.assertEqual(counters.outflow_rate(10), 0)
+
+        counters.append(["a", "b"], [])
+        counters.append(["c"], ["a"])
+        self.assertListEqual(counters.departed_ids, ["c"])
+        self.assertListEqual(counters.arrived_ids, ["a"])
+        self.assertEqual(counters.num_arrived, 1)
+        self.assertAlmostEqual(counters.inflow_rate(1), 3600 * 3 / 1)
+        self.assertAlmostEqual(counters.inflow_rate(0.5), 3600 * 1 / 0.5)
+        self.assertAlmostEqual(counters.outflow_rate(1), 3600 * 1 / 1)
+
+        # rates over time spans longer than the initial window
+        for _ in range(10):
+            counters.append(["d"], [])
+        self.assertAlmostEqual(counters.inflow_rate(5), 3600 * 4 / 2)
+        for _ in range(10):
+            counters.append(["d"], [])
+        self.assertAlmostEqual(counters.inflow_rate(5), 3600 * 10 / 5)
+
+        counters.clear()
+        self.assertEqual(counters.arrived_ids, 0)
+        self.assertEqual(counters.outflow_rate(5), 0)
+
+
+class TestDetectors(unittest.TestCase):
+    """Tests the virtual detectors of the vehicle kernels."""
+
+    def test_segment_grid(self):
+        """Check the aggregates of detectors against the vehicles."""
+        state = ColumnarVehicleState()
+        for veh_id, edge, lane, pos, speed in [
+                ("a0", "a", 0, 0, 1), ("a1", "a", 1, 20, 2),
+                ("a2", "a", 0, 30, 3), ("a3", "a", 1, 50, 4),
+                ("a4", "a", 0, 100, 5), ("rl", "a", 0, 40, 6),
+                ("b0", "b", 1, 5, 7)]:
+            row = state.add(veh_id)
+            state.edge[row] = state.edge_code(edge)
+            state.lane[row] = lane
+            state.position[row] = pos
+            state.speed[row] = speed
+            state.length[row] = 5
+
+        engine = MultiLaneHeadways()
+        engine.update(TestMultiLaneHeadways.Scenario(), state)
+
+        detectors = Detectors()
+        detectors.add(
+            SegmentGrid("grid", "a", [0, 50, 100], [0, 1], extend=True))
+        detectors.add(SegmentGrid("loop", "a", [20, 40], [0]))
+        detectors.add(
+            SegmentGrid("human", "a", [0, 50, 100], [0, 1], rl=False))
+        detectors.add(SegmentGrid("rl", "a", [0, 50, 100], [0, 1], rl=True))
+        detectors.add(SegmentGrid("b", "b", [0, 4], [0, 1], extend=True))
+        detectors.update_columnar(state, engine, rl_ids=["rl"])
+
+        # segments are closed at their start and open at their end, unless
+        # the grid is extended
+        grid = detectors.get("grid")
+        np.testing.assert_array_equal(grid.count, [[3, 1], [1, 1]])
+        np.testing.assert_array_almost_equal(
+            grid.mean_speed, [[10 / 3, 2], [5, 4]])
+        np.testing.assert_array_almost_equal(
+            grid.density, [[60, 20], [20, 20]])
+        np.testing.assert_array_almost_equal(
+            grid.flow, [[3600 * 10 / 50, 3600 * 2 / 50],
+                        [3600 * 5 / 50, 3600 * 4 / 50]])
+        np.testing.assert_array_almost_equal(
+            grid.occupancy, [[0.3, 0.1], [0.1, 0.1]])
+
+        np.testing.assert_array_equal(detectors.get("loop").count, [[1]])
+        np.testing.assert_array_equal(
+            detectors.get("human").count, [[2, 1], [0, 1]])
+        np.testing.assert_array_equal(
+            detectors.get("rl").count, [[1, 0], [0, 0]])
+        np.testing.assert_array_equal(detectors.get("b").count, [[0, 1]])
+
+        # detectors are updated as the vehicles move
+        state.lane[state.row("a0")] = 1
+        engine.update(TestMultiLaneHeadways.Scenario(), state)
+        detectors.update_columnar(state, engine, rl_ids=["rl"])
+        np.testing.assert_array_equal(grid.count, [[2, 2], [1, 1]])
+
+        self.assertRaises(KeyError, detectors.get, "foo")
+        self.assertRaises(ValueError, SegmentGrid, "foo", "a", [0], [0])
+        self.assertRaises(ValueError, SegmentGrid, "foo", "a", [0, 1], [])
+
+    def test_missing_rl_ids(self):
+        """Check that RL vehicles missing from the state are skipped."""
+        # the last row of the state is used by a human-driven vehicle
+        state = ColumnarVehicleState(capacity=2)
+        for veh_id, pos in [("h0", 10), ("h1", 60)]:
+            row = state.add(veh_id)
+            state.edge[row] = state.edge_code("a")
+            state.lane[row] = 0
+            state.position[row] = pos
+            state.speed[row] = 1
+            state.length[row] = 5
+
+        engine = MultiLaneHeadways()
+        engine.update(TestMultiLaneHeadways.Scenario(), state)
+
+        detectors = Detectors()
+        detectors.add(SegmentGrid("human", "a", [0, 50, 100], [0], rl=False))
+        detectors.add(SegmentGrid("rl", "a", [0, 50, 100], [0], rl=True))
+        detectors.update_columnar(state, engine, rl_ids=["arrived_rl"])
+
+        np.testing.assert_array_equal(
+            detectors.get("human").count, [[1], [1]])
+        np.testing.assert_array_equal(detectors.get("rl").count, [[0], [0]])
+
+
+class TestVehicleOrder(unittest.TestCase):
+    """Tests the incremental ordering of vehicles."""
+
+    def test_order(self):
+        """Check the order against a full sort as vehicles move."""
+        np.random.seed(0)
+        ids = ["veh_{}".format(i) for i in range(50)]
+        keys = np.random.uniform(0, 100, size=len(ids))
+
+        order = VehicleOrder(columns={"prev_pos": np.nan})
+        order.sync(ids)
+        np.testing.assert_array_equal(order.keys, -1001)
+        order.set_keys(keys)
+        for _ in range(20):
+            self.assertListEqual(
+                order.sorted_ids,
+                [ids[i] for i in np.argsort(keys, kind="mergesort")])
+            np.testing.assert_array_equal(keys[order.order],
+                                          np.sort(keys))
+
+            # a few vehicles overtake their neighbors
+            keys = keys + np.random.uniform(0, 2, size=len(ids))
+            order.set_keys(keys)
+
+        # vehicles leave and enter the network; new vehicles are placed first
+        keys = dict(zip(ids, keys))
+        ids = ids[5:] + ["new_0", "new_1"]
+        order.sync(ids)
+        self.assertListEqual(order.sorted_ids[:2], ["new_0", "new_1"])
+        self.assertListEqual(
+            order.sorted_ids[2:],
+            sorted(ids[:-2], key=lambda veh_id: keys[veh_id]))
+        np.testing.assert_array_equal(order.columns["prev_pos"][-2:], np.nan)
+        self.assertDictEqual(
+            order.as_dict(),
+            {veh_id: keys.get(veh_id, -1001) for veh_id in ids})
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -15,7 +15,7 @@ from flow.core.params import SumoParams, EnvParams, InitialConfig, NetParams, \
 from flow.core.params import TrafficLightParams
 from flow.core.params import VehicleParams
 from flow.envs.green_wave_env import GreenWaveTestEnv
-from flow.envs.loop.loop_accel import AccelEnv
+from flow.envs.loop.loop_accel import AccelEnv, ADDITIONAL_ENV_PARAMS
 from flow.scenarios.figure_eight import Figure8Scenario
 from flow.scenarios.grid import SimpleGridScenario
 from flow.scenarios.highway import HighwayScenario
@@ -115,6 +115,51 @@ def ring_road_exp_setup(sim_params=None,
     return env, scenario
 
 
+def numpy_env_setup(scenario_class,
+                    net_params,
+                    vehicles,
+                    initial_config=None,
+                    sim_params=None,
+                    env_params=None):
+    """
+    Create an environment that runs on the numpy simulator.
+
+    Parameters
+    ----------
+    scenario_class : type
+        class of the scenario, e.g. LoopScenario
+    net_params : flow.core.params.NetParams
+        network-specific configuration parameters
+    vehicles : flow.core.params.VehicleParams
+        vehicles to be placed in the network
+    initial_config : flow.core.params.InitialConfig
+        specifies starting positions of vehicles, defaults to evenly
+        distributed vehicles across the length of the network
+    sim_params : flow.core.params.SumoParams
+        simulation parameters, defaults to a time step of 0.1s
+    env_params : flow.core.params.EnvParams
+        environment-specific parameters, defaults to the parameters of an
+        AccelEnv whose vehicles are not sorted
+
+    Returns
+    -------
+    flow.envs.loop.loop_accel.AccelEnv
+        the environment
+    """
+    scenario = scenario_class(
+        name="numpy_test",
+        vehicles=vehicles,
+        net_params=net_params,
+        initial_config=initial_config or InitialConfig())
+
+    return AccelEnv(
+        env_params=env_params or EnvParams(additional_params=dict(
+            ADDITIONAL_ENV_PARAMS, sort_vehicles=False)),
+        sim_params=sim_params or SumoParams(sim_step=0.1),
+        scenario=scenario,
+        simulator='numpy')
+
+
 def figure_eight_exp_setup(sim_params=None,
                            vehicles=None,
                            env_params=None,